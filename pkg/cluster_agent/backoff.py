@@ -0,0 +1,50 @@
+"""
+Backoff - delays between the retries of a failing operation
+"""
+import random
+
+# bounds the exponent of the consecutive failures count
+_MAX_EXPONENT = 32
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter - the delay doubles with each consecutive
+    failure, up to the max delay, and is randomly shortened by up to the
+    jitter fraction, so operations which failed together (such as all the
+    watches once the apiserver restarts) don't retry together.
+    """
+
+    DEFAULT_BASE_SECONDS = 1
+    DEFAULT_MAX_SECONDS = 60
+    DEFAULT_JITTER = 0.5
+
+    def __init__(
+            self,
+            base_seconds: float = DEFAULT_BASE_SECONDS,
+            max_seconds: float = DEFAULT_MAX_SECONDS,
+            jitter: float = DEFAULT_JITTER,
+    ):
+        """
+        :param base_seconds: the delay after the first failure
+        :param max_seconds: max delay
+        :param jitter: the delay fraction to randomly shorten it by, between
+        0 (no jitter) and 1
+        """
+        if base_seconds < 0 or max_seconds < base_seconds:
+            raise ValueError("Invalid delays, must be 0 <= base seconds <= max seconds")
+        if not 0 <= jitter <= 1:
+            raise ValueError("Invalid jitter value, must be between 0 and 1")
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.jitter = jitter
+
+    def get_delay(self, failures_count: int) -> float:
+        """
+        Gets the delay after given consecutive failures count
+        """
+        if failures_count < 1:
+            return 0
+        exponent = min(failures_count - 1, _MAX_EXPONENT)
+        delay = min(self.max_seconds, self.base_seconds * 2 ** exponent)
+        return delay * (1 - self.jitter * random.random())
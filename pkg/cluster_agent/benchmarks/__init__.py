@@ -0,0 +1,3 @@
+"""
+Cluster agent benchmarks
+"""
@@ -0,0 +1,67 @@
+"""
+Events batch benchmark - measures the forwarder side cost of assembling
+batches of pre-serialized events, compared to serializing the batches.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.batch_benchmark [--events 10000] [--batch 1000] [--size medium]
+"""
+import time
+import argparse
+import encoders
+from events_sender import EventsSender
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _create_events(pods):
+    """ Creates watch events of given pods """
+    return [
+        WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+        for pod in pods
+    ]
+
+
+def _benchmark(name, function, batches):
+    """ Runs given function on each batch & prints the results """
+    start_time = time.perf_counter()
+    for batch in batches:
+        function(batch)
+    elapsed_seconds = time.perf_counter() - start_time
+    print(
+        f"{name:>16}: {elapsed_seconds * 1000:9.2f}ms, "
+        f"{elapsed_seconds / len(batches) * 1000:8.2f}ms/batch"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    pods = generate_pods(args.events, size=args.size)
+    events = _create_events(pods)
+    batches = [
+        events[i:i + args.batch] for i in range(0, len(events), args.batch)
+    ]
+    print(
+        f"{args.events} {args.size} pod events, {args.batch} events per batch, "
+        f"{encoders.get_json_backend()} JSON backend"
+    )
+    _benchmark(
+        "dump dicts",
+        lambda batch: encoders.dumps([event.to_dict() for event in batch]),
+        batches
+    )
+    start_time = time.perf_counter()
+    for event in events:
+        event.serialize()
+    print(
+        f"{'pre-serialize':>16}: "
+        f"{(time.perf_counter() - start_time) * 1000:9.2f}ms (at creation)"
+    )
+    _benchmark("join fragments", EventsSender.serialize_events, batches)
+
+
+if __name__ == "__main__":
+    main()
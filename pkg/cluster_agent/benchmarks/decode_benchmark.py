@@ -0,0 +1,123 @@
+"""
+Decoding benchmark - measures the apiserver response bytes of a big pods
+list (JSON, and gzip compressed JSON as the apiserver compresses big
+responses), and the CPU of decoding the list & watch events to the cluster
+discovery events data: by the kubernetes client models vs. the model decoder.
+
+The apiserver protobuf encoding isn't measured - there are no python
+bindings of the kubernetes protobuf schemas to decode it by.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.decode_benchmark [--pods 5000] [--size medium]
+"""
+import gzip
+import json
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+import kubernetes_asyncio
+from model_decoder import ModelDecoder
+from benchmarks.fake_apiserver import to_api_object
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _decode_list_by_models(api_client, body: str):
+    """ Decodes the list as the cluster discovery does by default """
+    response = api_client.deserialize(
+        response=SimpleNamespace(data=body),
+        response_type="V1PodList"
+    )
+    return [item.to_dict() for item in response.items]
+
+
+def _decode_list_by_decoder(model_decoder: ModelDecoder, body: str):
+    """ Decodes the list as the cluster discovery does by a model decoder """
+    return [
+        model_decoder.decode(item, "V1Pod")
+        for item in json.loads(body)["items"]
+    ]
+
+
+def _decode_event_by_models(api_client, line: str):
+    """ Decodes a watch event as the kubernetes client watch does """
+    event = json.loads(line)
+    return api_client.deserialize(
+        response=SimpleNamespace(data=json.dumps(event["object"])),
+        response_type="V1Pod"
+    ).to_dict()
+
+
+def _decode_event_by_decoder(model_decoder: ModelDecoder, line: str):
+    return model_decoder.decode(json.loads(line)["object"], "V1Pod")
+
+
+def _benchmark(name, function, values, pods_count: int):
+    """ Runs given function on each value & prints the results """
+    start_time = time.process_time()
+    for value in values:
+        function(value)
+    elapsed_seconds = time.process_time() - start_time
+    print(
+        f"{name:>24}: {elapsed_seconds * 1000:9.2f}ms CPU, "
+        f"{elapsed_seconds / pods_count * 1e6:8.2f}us/pod"
+    )
+
+
+async def _run(args):
+    api_pods = [to_api_object(pod, "V1Pod") for pod in generate_pods(args.pods, size=args.size)]
+    body = json.dumps({
+        "kind": "PodList",
+        "apiVersion": "v1",
+        "metadata": {"resourceVersion": "1"},
+        "items": api_pods,
+    })
+    lines = [json.dumps({"type": "MODIFIED", "object": pod}) for pod in api_pods]
+    raw_bytes = len(body.encode())
+    compressed_bytes = len(gzip.compress(body.encode()))
+    print(f"{args.pods} {args.size} pods list")
+    print(f"{'JSON':>24}: {raw_bytes / 2 ** 20:9.2f}MB, {raw_bytes / args.pods:8.0f} bytes/pod")
+    print(
+        f"{'gzip JSON':>24}: {compressed_bytes / 2 ** 20:9.2f}MB, "
+        f"{compressed_bytes / args.pods:8.0f} bytes/pod"
+    )
+    api_client = kubernetes_asyncio.client.ApiClient()
+    model_decoder = ModelDecoder()
+    try:
+        _benchmark(
+            "list, client models",
+            lambda value: _decode_list_by_models(api_client, value),
+            [body],
+            args.pods
+        )
+        _benchmark(
+            "list, model decoder",
+            lambda value: _decode_list_by_decoder(model_decoder, value),
+            [body],
+            args.pods
+        )
+        _benchmark(
+            "watch, client models",
+            lambda value: _decode_event_by_models(api_client, value),
+            lines,
+            args.pods
+        )
+        _benchmark(
+            "watch, model decoder",
+            lambda value: _decode_event_by_decoder(model_decoder, value),
+            lines,
+            args.pods
+        )
+    finally:
+        await api_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", type=int, default=5000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Delta events benchmark - measures the sent bytes of high churn pods MODIFIED
+events (status conditions & restart counts updates), as deltas vs. in full.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.delta_benchmark [--pods 1000] [--updates 10] [--size medium]
+"""
+import copy
+import time
+import argparse
+from datetime import datetime, timedelta
+from delta_encoder import DeltaEncoder
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _update_pod(pod, update_index: int):
+    """
+    Creates an updated pod version - bumps the resource version, a
+    condition transition time & the containers restart count
+    """
+    pod = copy.deepcopy(pod)
+    pod["metadata"]["resource_version"] = str(
+        int(pod["metadata"]["resource_version"]) + 1
+    )
+    condition = pod["status"]["conditions"][update_index % 4]
+    condition["last_transition_time"] = datetime.now() + timedelta(seconds=update_index)
+    for status in pod["status"]["container_statuses"]:
+        status["restart_count"] += 1
+    return pod
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    pods = generate_pods(args.pods, size=args.size)
+    updates = []
+    for update_index in range(args.updates):
+        pods = [_update_pod(pod, update_index) for pod in pods]
+        updates.extend(pods)
+
+    encoder = DeltaEncoder()
+    full_bytes = 0
+    sent_bytes = 0
+    start_time = time.perf_counter()
+    for pod in updates:
+        event = WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+        full_bytes += event.get_serialized_size()
+        sent_bytes += encoder.encode(event).get_serialized_size()
+    elapsed_seconds = time.perf_counter() - start_time
+    stats = encoder.get_stats()
+    print(f"{args.pods} {args.size} pods, {args.updates} updates each")
+    print(f"full events:  {full_bytes / len(updates):8.0f} bytes/event")
+    print(f"sent events:  {sent_bytes / len(updates):8.0f} bytes/event")
+    print(
+        f"deltas:       {stats['delta_events']} of {len(updates)} events, "
+        f"{stats['delta_size_ratio']:.3f} of their full size"
+    )
+    print(f"encoding:     {elapsed_seconds / len(updates) * 1e6:8.0f}us/event")
+
+
+if __name__ == "__main__":
+    main()
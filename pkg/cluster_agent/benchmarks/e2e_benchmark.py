@@ -0,0 +1,342 @@
+"""
+End to end benchmark - runs the agent pipeline (ClusterDiscovery ->
+InMemoryEventsManager -> Forwarder -> EventsSender) against a fake
+apiserver & a stand-in collector, through the initial list of the synthetic
+cluster and then pods churn.
+The fake apiserver & the collector run in a separate process, hence the
+reported peak RSS & CPU time are of the agent alone.
+Reports the events/sec of each phase, the p50/p99 end to end latency of the
+modified pods (apiserver emit to collector receive) and the agent peak RSS &
+CPU seconds.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.e2e_benchmark [--pods 5000] [--nodes 100] [--deployments 200] [--size medium]
+        [--churn-rate 500] [--churn-seconds 10] [--deltas] [--templates] [--intern]
+        [--compression-threshold 0]
+"""
+import time
+import asyncio
+import argparse
+import logging
+import resource
+import multiprocessing
+import aiohttp
+import kubernetes_asyncio
+from cluster_discovery import ClusterDiscovery
+from delta_encoder import DeltaEncoder
+from epsagon_client import EpsagonClient
+from events_manager import InMemoryEventsManager
+from events_sender import EventsSender
+from forwarder import Forwarder
+from interning import Interner
+from memory_accounting import MemoryAccountant
+from templates import TemplateEncoder
+from benchmarks.fake_apiserver import (
+    CHURN_PATH,
+    STATS_PATH,
+    FakeApiServer,
+    start_app,
+)
+from benchmarks.fixtures import POD_SIZES
+from benchmarks.stand_in_collector import COLLECTOR_PATH, StandInCollector
+
+TEST_EPSAGON_TOKEN = "benchmark-token"
+TEST_CLUSTER_NAME = "benchmark-cluster"
+POLL_INTERVAL_SECONDS = 0.05
+# the cluster discovery cluster info event
+CLUSTER_EVENTS_COUNT = 1
+
+
+async def _serve(create_server, args, connection):
+    """
+    Serves the apiserver & the stand-in collector, until the given
+    connection is closed or written to.
+    """
+    server = create_server(args)
+    collector = StandInCollector(
+        TEST_EPSAGON_TOKEN,
+        TEST_CLUSTER_NAME,
+        should_apply_deltas=args.deltas
+    )
+    server_runner, server_url = await start_app(server.create_app())
+    collector_runner, collector_url = await start_app(collector.create_app())
+    stop_event = asyncio.Event()
+    asyncio.get_event_loop().add_reader(connection.fileno(), stop_event.set)
+    connection.send((server_url, collector_url))
+    await stop_event.wait()
+    await server_runner.cleanup()
+    await collector_runner.cleanup()
+
+
+def _run_servers(create_server, args, connection):
+    """ Servers process main function """
+    asyncio.run(_serve(create_server, args, connection))
+
+
+def start_servers(create_server, args):
+    """
+    Starts the apiserver & the stand-in collector in a separate process.
+    :param create_server: creates the apiserver (which has a create_app
+    method) of given args
+    :return: the servers process, its connection, the apiserver url & the
+    collector url
+    """
+    connection, servers_connection = multiprocessing.Pipe()
+    servers_process = multiprocessing.Process(
+        target=_run_servers,
+        args=(create_server, args, servers_connection),
+        daemon=True
+    )
+    servers_process.start()
+    server_url, collector_url = connection.recv()
+    return servers_process, connection, server_url, collector_url
+
+
+def stop_servers(servers_process, connection):
+    """ Stops the servers process """
+    connection.send(None)
+    servers_process.join()
+
+
+def add_agent_arguments(parser: argparse.ArgumentParser):
+    """ Adds the agent pipeline arguments to the given parser """
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--deltas", action="store_true")
+    parser.add_argument("--templates", action="store_true")
+    parser.add_argument("--intern", action="store_true")
+    parser.add_argument("--compression-threshold", type=int, default=0)
+
+
+def get_cpu_seconds() -> float:
+    """ Gets the process user & system CPU time, in seconds """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def get_peak_rss_mb() -> float:
+    """ Gets the process peak RSS, in MB (ru_maxrss is in KB on linux) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def get_stats(session: aiohttp.ClientSession, url: str):
+    """ Gets the stats of the apiserver or the collector at given url """
+    async with session.get(f"{url}{STATS_PATH}") as response:
+        return await response.json()
+
+
+async def wait_for_events(
+        session: aiohttp.ClientSession,
+        collector_url: str,
+        events_count: int,
+        timeout_seconds: float
+):
+    """
+    Waits until the collector received the given events count
+    :return: the collector stats
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        stats = await get_stats(session, collector_url)
+        if stats["events"] >= events_count or time.monotonic() >= deadline:
+            return stats
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+def print_phase(name: str, events_count: int, elapsed_seconds: float):
+    """ Prints a benchmark phase throughput """
+    print(
+        f"{name:>14}: {events_count} events in {elapsed_seconds:.3f}s, "
+        f"{events_count / elapsed_seconds:.0f} events/sec"
+    )
+
+
+def _format_ms(seconds: float) -> str:
+    """ Formats the given seconds as milliseconds """
+    return "n/a" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+
+def print_results(collector_stats, cpu_seconds: float, should_print_latency=True):
+    """ Prints the latency, the agent resources usage & the collector stats """
+    if should_print_latency:
+        print(
+            f"{'latency':>14}: p50 {_format_ms(collector_stats['latency_p50_seconds'])}, "
+            f"p99 {_format_ms(collector_stats['latency_p99_seconds'])}, "
+            f"max {_format_ms(collector_stats['latency_max_seconds'])} "
+            f"({collector_stats['latency_samples']} samples)"
+        )
+    print(f"{'agent peak RSS':>14}: {get_peak_rss_mb():.1f}MB")
+    print(f"{'agent CPU':>14}: {cpu_seconds:.2f}s")
+    print(
+        f"{'collector':>14}: {collector_stats['batches']} batches, "
+        f"{collector_stats['received_bytes'] / 2 ** 20:.1f}MB, "
+        f"{collector_stats['events_counts']}, "
+        f"{collector_stats['invalid_batches']} invalid batches, "
+        f"{collector_stats['conflicts']} conflicts"
+    )
+
+
+class AgentPipeline:
+    """
+    The agent pipeline, run against the given apiserver & collector
+    """
+
+    @classmethod
+    async def create(cls, args, server_url: str, collector_url: str):
+        """
+        Creates the agent pipeline, configured by the agent arguments (see
+        add_agent_arguments)
+        """
+        self = cls()
+        self.timeout = args.timeout
+        configuration = kubernetes_asyncio.client.Configuration()
+        configuration.host = server_url
+        self.api_client = kubernetes_asyncio.client.ApiClient(configuration)
+        self.epsagon_client = await EpsagonClient.create(TEST_EPSAGON_TOKEN)
+        events_manager = InMemoryEventsManager(
+            compression_threshold=args.compression_threshold or None
+        )
+        self.forwarder = Forwarder(
+            events_manager,
+            EventsSender(
+                self.epsagon_client,
+                f"{collector_url}{COLLECTOR_PATH}",
+                TEST_CLUSTER_NAME,
+                TEST_EPSAGON_TOKEN,
+                template_encoder=TemplateEncoder() if args.templates else None
+            ),
+            # as the agent - deltas are sent one batch at a time, in order
+            max_workers=1 if args.deltas else Forwarder.DEFAULT_MAX_WORKERS
+        )
+        self.cluster_discovery = ClusterDiscovery(
+            events_manager.write_event,
+            api_client=self.api_client,
+            should_serialize_events=True,
+            interner=Interner() if args.intern else None,
+            delta_encoder=DeltaEncoder() if args.deltas else None,
+        )
+        self.memory_accountant = self._create_memory_accountant()
+        self.tasks = []
+        return self
+
+    def _create_memory_accountant(self) -> MemoryAccountant:
+        """ Creates a memory accountant of the pipeline components """
+        memory_accountant = MemoryAccountant()
+        memory_accountant.register(
+            "events_queue",
+            self.forwarder.events_manager.estimate_memory_bytes
+        )
+        memory_accountant.register(
+            "in_flight_batches",
+            self.forwarder.estimate_memory_bytes
+        )
+        template_encoder = self.forwarder.events_sender.template_encoder
+        if template_encoder:
+            memory_accountant.register(
+                "sent_templates",
+                template_encoder.estimate_memory_bytes
+            )
+        for name, component in (
+                ("delta_encoder", self.cluster_discovery.delta_encoder),
+                ("interner", self.cluster_discovery.interner),
+        ):
+            if component:
+                memory_accountant.register(name, component.estimate_memory_bytes)
+        return memory_accountant
+
+    def start(self):
+        """ Starts the forwarder & the cluster discovery """
+        self.tasks = [
+            asyncio.create_task(self.forwarder.start()),
+            asyncio.create_task(self.cluster_discovery.start()),
+        ]
+
+    async def stop(self):
+        """ Stops the cluster discovery, drains the forwarder & closes the clients """
+        self.tasks[1].cancel()
+        await asyncio.wait([self.tasks[1]])
+        await self.forwarder.drain(self.timeout)
+        await asyncio.wait([self.tasks[0]])
+        await self.epsagon_client.close()
+        await self.api_client.close()
+
+
+async def _run_agent(args, server_url: str, collector_url: str):
+    """
+    Runs the agent pipeline against the fake apiserver & the collector,
+    and prints the results
+    """
+    agent = await AgentPipeline.create(args, server_url, collector_url)
+    async with aiohttp.ClientSession() as session:
+        server_stats = await get_stats(session, server_url)
+        initial_events_count = server_stats["objects"] + CLUSTER_EVENTS_COUNT
+        start_cpu_seconds = get_cpu_seconds()
+        start_time = time.perf_counter()
+        agent.start()
+        collector_stats = await wait_for_events(
+            session, collector_url, initial_events_count, args.timeout
+        )
+        print_phase(
+            "initial list",
+            collector_stats["events"],
+            time.perf_counter() - start_time
+        )
+
+        churn_start_time = time.perf_counter()
+        async with session.post(
+                f"{server_url}{CHURN_PATH}",
+                params={"rate": args.churn_rate, "duration": args.churn_seconds}
+        ) as response:
+            response.raise_for_status()
+        await asyncio.sleep(args.churn_seconds)
+        while (await get_stats(session, server_url))["is_churning"]:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        server_stats = await get_stats(session, server_url)
+        collector_stats = await wait_for_events(
+            session,
+            collector_url,
+            initial_events_count + server_stats["emitted_events"],
+            args.timeout
+        )
+        print_phase(
+            "churn",
+            collector_stats["events"] - initial_events_count,
+            time.perf_counter() - churn_start_time
+        )
+        cpu_seconds = get_cpu_seconds() - start_cpu_seconds
+    await agent.stop()
+    print_results(collector_stats, cpu_seconds)
+
+
+def create_fake_apiserver(args) -> FakeApiServer:
+    """ Creates the fake apiserver of given args """
+    return FakeApiServer(args.pods, args.nodes, args.deployments, size=args.size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", type=int, default=5000)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--deployments", type=int, default=200)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    parser.add_argument("--churn-rate", type=float, default=500)
+    parser.add_argument("--churn-seconds", type=float, default=10)
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    servers_process, connection, server_url, collector_url = start_servers(
+        create_fake_apiserver, args
+    )
+    try:
+        print(
+            f"{args.pods} {args.size} pods, {args.nodes} nodes, "
+            f"{args.deployments} deployments, churn {args.churn_rate:.0f} pods/sec "
+            f"for {args.churn_seconds:.0f}s"
+        )
+        asyncio.run(_run_agent(args, server_url, collector_url))
+    finally:
+        stop_servers(servers_process, connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Fake kubernetes apiserver - serves the list & watch endpoints watched by the
+cluster discovery, for synthetic pods, nodes, deployments & namespaces, and
+modifies the pods at a configurable churn rate.
+Modified pods are annotated with their (monotonic clock) emit time, to
+measure the end to end latency (see stand_in_collector).
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.fake_apiserver [--pods 10000] [--nodes 100] [--deployments 200] [--size medium] [--port 8001]
+
+Control endpoints:
+    POST /benchmark/churn?rate=100&duration=10 - modifies pods at the given
+    rate (per second) for the given duration (seconds)
+    GET /benchmark/stats - the served objects & emitted events counts
+"""
+import json
+import time
+import asyncio
+import argparse
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+import kubernetes_asyncio
+from aiohttp import web
+from benchmarks.fixtures import (
+    CREATION_TIMESTAMP,
+    POD_SIZES,
+    generate_deployment,
+    generate_node,
+    generate_pod,
+)
+
+EMITTED_AT_ANNOTATION = "benchmark.epsagon.com/emitted-at"
+CHURN_PATH = "/benchmark/churn"
+STATS_PATH = "/benchmark/stats"
+GIT_VERSION = "v1.20.7"
+# the list & watch paths of the cluster discovery watched kinds
+KIND_PATHS = {
+    "Pod": "/api/v1/pods",
+    "Node": "/api/v1/nodes",
+    "Namespace": "/api/v1/namespaces",
+    "Deployment": "/apis/apps/v1/deployments",
+    "DaemonSet": "/apis/apps/v1/daemonsets",
+    "StatefulSet": "/apis/apps/v1/statefulsets",
+    "Event": "/api/v1/events",
+}
+VERSION_PATHS = ("/version", "/version/")
+
+
+def to_api_object(obj, model_type: str):
+    """
+    Converts an object shaped as the kubernetes client models `to_dict()`
+    output to its apiserver JSON form - camelCase keys (by the model
+    attribute map) and RFC 3339 datetimes.
+    :param model_type: the object model type, such as `V1Pod`
+    """
+    if obj is None:
+        return None
+    if model_type.startswith("list["):
+        return [to_api_object(value, model_type[len("list["):-1]) for value in obj]
+    if model_type.startswith("dict("):
+        value_type = model_type[len("dict("):-1].split(", ", 1)[1]
+        return {
+            key: to_api_object(value, value_type) for key, value in obj.items()
+        }
+    if model_type == "datetime":
+        return obj.isoformat().replace("+00:00", "Z")
+    model = getattr(kubernetes_asyncio.client.models, model_type, None)
+    if model is None:
+        # primitive types & free form objects
+        return obj
+    return {
+        model.attribute_map[key]: to_api_object(value, model.openapi_types[key])
+        for key, value in obj.items()
+        if value is not None
+    }
+
+
+async def handle_version(_request):
+    """ Handles a cluster version request """
+    return web.json_response({
+        "major": "1",
+        "minor": "20",
+        "gitVersion": GIT_VERSION,
+        "gitCommit": "0" * 40,
+        "gitTreeState": "clean",
+        "buildDate": "2021-01-01T00:00:00Z",
+        "goVersion": "go1.15.12",
+        "compiler": "gc",
+        "platform": "linux/amd64",
+    })
+
+
+def _generate_namespace(index: int) -> Dict:
+    """ Generates a namespace object """
+    return {
+        "api_version": "v1",
+        "kind": "Namespace",
+        "metadata": {
+            "name": f"namespace-{index}",
+            "uid": f"44444444-0000-0000-0000-{index:012x}",
+            "resource_version": str(index + 1),
+            "creation_timestamp": CREATION_TIMESTAMP,
+        },
+        "status": {"phase": "Active"},
+    }
+
+
+class _Resource:
+    """ the served objects of a kind, and its watchers """
+
+    HISTORY_SIZE = 10000
+
+    def __init__(self, kind: str, api_version: str):
+        self.kind = kind
+        self.api_version = api_version
+        self.objects: Dict[str, Dict] = {}
+        # serialized objects, by their uid
+        self.serialized_objects: Dict[str, bytes] = {}
+        # (resource version, serialized watch event) of the recent events
+        self.history: Deque[Tuple[int, bytes]] = deque(maxlen=self.HISTORY_SIZE)
+        self.watchers: Set[asyncio.Queue] = set()
+
+    def set_object(self, obj: Dict):
+        """ Sets (adds or replaces) an object """
+        uid = obj["metadata"]["uid"]
+        self.objects[uid] = obj
+        self.serialized_objects[uid] = json.dumps(obj).encode()
+
+    def emit(self, event_type: str, obj: Dict, resource_version: int):
+        """ Emits a watch event of given object to all the watchers """
+        line = json.dumps({"type": event_type, "object": obj}).encode() + b"\n"
+        self.history.append((resource_version, line))
+        for watcher in self.watchers:
+            watcher.put_nowait(line)
+
+
+class FakeApiServer:
+    """
+    Fake kubernetes apiserver - see module docstring
+    """
+
+    def __init__(
+            self,
+            pods_count: int,
+            nodes_count: int,
+            deployments_count: int,
+            size: str = "medium",
+            namespaces_count: int = 20,
+    ):
+        """
+        :param pods_count: to serve
+        :param nodes_count: to serve
+        :param deployments_count: to serve
+        :param size: of each pod, one of POD_SIZES
+        :param namespaces_count: to serve
+        """
+        self.resource_version: int = 0
+        self.emitted_events_count: int = 0
+        self.is_churning: bool = False
+        self._churn_task: asyncio.Task = None
+        self._resources: Dict[str, _Resource] = {}
+        containers_count = POD_SIZES[size]
+        self._add_resource(
+            "Pod", "v1", "V1Pod",
+            [
+                generate_pod(
+                    i,
+                    containers_count=containers_count,
+                    namespace_count=namespaces_count,
+                    node_count=max(nodes_count, 1),
+                    deployment_count=max(deployments_count, 1),
+                )
+                for i in range(pods_count)
+            ]
+        )
+        self._add_resource(
+            "Node", "v1", "V1Node",
+            [generate_node(i) for i in range(nodes_count)]
+        )
+        self._add_resource(
+            "Namespace", "v1", "V1Namespace",
+            [_generate_namespace(i) for i in range(namespaces_count)]
+        )
+        self._add_resource(
+            "Deployment", "apps/v1", "V1Deployment",
+            [
+                generate_deployment(
+                    i,
+                    containers_count=containers_count,
+                    namespace_count=namespaces_count
+                )
+                for i in range(deployments_count)
+            ]
+        )
+        self._add_resource("DaemonSet", "apps/v1", None, [])
+        self._add_resource("StatefulSet", "apps/v1", None, [])
+        self._add_resource("Event", "v1", None, [])
+        self._pods: List[Dict] = list(self._resources[KIND_PATHS["Pod"]].objects.values())
+
+    def _next_resource_version(self) -> int:
+        """ Gets the next resource version """
+        self.resource_version += 1
+        return self.resource_version
+
+    def _add_resource(
+            self,
+            kind: str,
+            api_version: str,
+            model_type: str,
+            objects: List[Dict]
+    ):
+        """ Adds a served resource, with the given objects """
+        resource = _Resource(kind, api_version)
+        for obj in objects:
+            obj = to_api_object(obj, model_type)
+            obj["metadata"]["resourceVersion"] = str(self._next_resource_version())
+            resource.set_object(obj)
+        self._resources[KIND_PATHS[kind]] = resource
+
+    def get_objects_count(self) -> int:
+        """ Gets the served objects count, of all kinds """
+        return sum(len(resource.objects) for resource in self._resources.values())
+
+    def get_stats(self) -> Dict:
+        """ Gets the served objects & emitted events counts """
+        return {
+            "objects": self.get_objects_count(),
+            "resource_version": self.resource_version,
+            "emitted_events": self.emitted_events_count,
+            "is_churning": self.is_churning,
+        }
+
+    def _modify_pod(self, index: int):
+        """ Modifies a pod - bumps its first container restart count """
+        resource = self._resources[KIND_PATHS["Pod"]]
+        pod = self._pods[index % len(self._pods)]
+        container_statuses = pod["status"].get("containerStatuses")
+        if container_statuses:
+            container_statuses[0]["restartCount"] += 1
+        pod["metadata"].setdefault("annotations", {})[EMITTED_AT_ANNOTATION] = (
+            repr(time.monotonic())
+        )
+        resource_version = self._next_resource_version()
+        pod["metadata"]["resourceVersion"] = str(resource_version)
+        resource.set_object(pod)
+        resource.emit("MODIFIED", pod, resource_version)
+        self.emitted_events_count += 1
+
+    async def churn(self, rate: float, duration_seconds: float):
+        """
+        Modifies pods at the given rate (per second), for the given duration
+        """
+        if not self._pods:
+            return
+        self.is_churning = True
+        start_time = time.monotonic()
+        modified_count = 0
+        try:
+            while True:
+                elapsed_seconds = time.monotonic() - start_time
+                if elapsed_seconds >= duration_seconds:
+                    break
+                due_count = int(elapsed_seconds * rate)
+                while modified_count < due_count:
+                    self._modify_pod(modified_count)
+                    modified_count += 1
+                await asyncio.sleep(0.01)
+        finally:
+            self.is_churning = False
+
+    async def _handle_list(self, request):
+        resource = self._resources[request.path]
+        if request.query.get("watch", "").lower() == "true":
+            return await self._handle_watch(request, resource)
+        header = json.dumps({
+            "kind": f"{resource.kind}List",
+            "apiVersion": resource.api_version,
+            "metadata": {"resourceVersion": str(self.resource_version)},
+        }).encode()
+        body = (
+            header[:-1] + b',"items":[' +
+            b",".join(resource.serialized_objects.values()) + b"]}"
+        )
+        return web.Response(body=body, content_type="application/json")
+
+    async def _handle_watch(self, request, resource: _Resource):
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        await response.prepare(request)
+        watcher = asyncio.Queue()
+        resource.watchers.add(watcher)
+        try:
+            resource_version = int(request.query.get("resourceVersion") or 0)
+            for event_resource_version, line in list(resource.history):
+                if event_resource_version > resource_version:
+                    await response.write(line)
+            while True:
+                await response.write(await watcher.get())
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            resource.watchers.discard(watcher)
+        return response
+
+    async def _handle_churn(self, request):
+        if self._churn_task and not self._churn_task.done():
+            return web.json_response({"error": "already churning"}, status=409)
+        self._churn_task = asyncio.create_task(self.churn(
+            float(request.query.get("rate", "100")),
+            float(request.query.get("duration", "10"))
+        ))
+        return web.json_response(self.get_stats())
+
+    async def _handle_stats(self, _request):
+        return web.json_response(self.get_stats())
+
+    def create_app(self) -> web.Application:
+        """ Creates the apiserver aiohttp application """
+        app = web.Application()
+        for path in VERSION_PATHS:
+            app.router.add_get(path, handle_version)
+        for path in self._resources:
+            app.router.add_get(path, self._handle_list)
+        app.router.add_post(CHURN_PATH, self._handle_churn)
+        app.router.add_get(STATS_PATH, self._handle_stats)
+        return app
+
+
+async def start_app(app: web.Application, host: str = "127.0.0.1", port: int = 0):
+    """
+    Starts the given aiohttp application
+    :return: the app runner & the listening url
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # pylint: disable=protected-access
+    return runner, f"http://{host}:{port}"
+
+
+async def _serve(args):
+    """ Serves the fake apiserver until interrupted """
+    server = FakeApiServer(args.pods, args.nodes, args.deployments, size=args.size)
+    _, url = await start_app(server.create_app(), args.host, args.port)
+    logging.info("Serving %d objects at %s", server.get_objects_count(), url)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", type=int, default=10000)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--deployments", type=int, default=200)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
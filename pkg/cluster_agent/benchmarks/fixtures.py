@@ -0,0 +1,312 @@
+"""
+Synthetic kubernetes objects, shaped as the cluster discovery events data
+(kubernetes client models `to_dict()` output).
+"""
+from datetime import datetime, timezone
+from typing import Dict, List
+
+CREATION_TIMESTAMP = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+# containers count per pod size
+POD_SIZES = {
+    "small": 1,
+    "medium": 4,
+    "huge": 30,
+}
+
+
+def _generate_container(pod_index: int, container_index: int) -> Dict:
+    """ Generates a pod container spec """
+    return {
+        "name": f"container-{container_index}",
+        "image": f"registry.example.com/team/app-{container_index}:1.0.{pod_index % 3}",
+        "image_pull_policy": "IfNotPresent",
+        "args": ["--port", str(8000 + container_index), "--log-level", "info"],
+        "env": [
+            {"name": f"ENV_VAR_{i}", "value": f"value-{i}", "value_from": None}
+            for i in range(5)
+        ],
+        "ports": [
+            {
+                "container_port": 8000 + container_index,
+                "protocol": "TCP",
+                "name": "http",
+                "host_ip": None,
+                "host_port": None,
+            }
+        ],
+        "resources": {
+            "limits": {"cpu": "500m", "memory": "512Mi"},
+            "requests": {"cpu": "100m", "memory": "128Mi"},
+        },
+        "volume_mounts": [
+            {
+                "name": "default-token",
+                "mount_path": "/var/run/secrets/kubernetes.io/serviceaccount",
+                "read_only": True,
+                "sub_path": None,
+            }
+        ],
+        "security_context": {
+            "allow_privilege_escalation": False,
+            "privileged": False,
+            "read_only_root_filesystem": True,
+            "run_as_non_root": True,
+        },
+        "termination_message_path": "/dev/termination-log",
+        "termination_message_policy": "File",
+    }
+
+
+def _generate_container_status(pod_index: int, container_index: int) -> Dict:
+    """ Generates a pod container status """
+    return {
+        "name": f"container-{container_index}",
+        "image": f"registry.example.com/team/app-{container_index}:1.0.{pod_index % 3}",
+        "image_id": f"docker-pullable://registry.example.com/team/app@sha256:{pod_index:064x}",
+        "container_id": f"containerd://{pod_index:032x}{container_index:032x}",
+        "ready": True,
+        "restart_count": 0,
+        "started": True,
+        "state": {
+            "running": {"started_at": CREATION_TIMESTAMP},
+            "terminated": None,
+            "waiting": None,
+        },
+    }
+
+
+def generate_pod(
+        index: int,
+        containers_count: int = POD_SIZES["medium"],
+        namespace_count: int = 20,
+        node_count: int = 100,
+        deployment_count: int = 200,
+) -> Dict:
+    """
+    Generates a pod object.
+    :param index: of the generated pod, used for its unique fields
+    :param containers_count: count of containers in the pod
+    """
+    deployment_index = index % deployment_count
+    namespace = f"namespace-{deployment_index % namespace_count}"
+    name = f"deployment-{deployment_index}-{index:08x}"
+    return {
+        "api_version": "v1",
+        "kind": "Pod",
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "uid": f"00000000-0000-0000-0000-{index:012x}",
+            "resource_version": str(1000 + index),
+            "creation_timestamp": CREATION_TIMESTAMP,
+            "labels": {
+                "app": f"deployment-{deployment_index}",
+                "pod-template-hash": f"{deployment_index:010x}",
+                "team": f"team-{deployment_index % 10}",
+            },
+            "annotations": {
+                "prometheus.io/scrape": "true",
+                "prometheus.io/port": "9090",
+            },
+            "owner_references": [
+                {
+                    "api_version": "apps/v1",
+                    "kind": "ReplicaSet",
+                    "name": f"deployment-{deployment_index}-{deployment_index:010x}",
+                    "uid": f"11111111-0000-0000-0000-{deployment_index:012x}",
+                    "controller": True,
+                    "block_owner_deletion": True,
+                }
+            ],
+        },
+        "spec": {
+            "containers": [
+                _generate_container(index, i) for i in range(containers_count)
+            ],
+            "dns_policy": "ClusterFirst",
+            "enable_service_links": True,
+            "node_name": f"node-{index % node_count}",
+            "priority": 0,
+            "restart_policy": "Always",
+            "scheduler_name": "default-scheduler",
+            "security_context": {},
+            "service_account": "default",
+            "service_account_name": "default",
+            "termination_grace_period_seconds": 30,
+            "tolerations": [
+                {
+                    "effect": "NoExecute",
+                    "key": "node.kubernetes.io/not-ready",
+                    "operator": "Exists",
+                    "toleration_seconds": 300,
+                    "value": None,
+                },
+                {
+                    "effect": "NoExecute",
+                    "key": "node.kubernetes.io/unreachable",
+                    "operator": "Exists",
+                    "toleration_seconds": 300,
+                    "value": None,
+                },
+            ],
+            "volumes": [
+                {
+                    "name": "default-token",
+                    "secret": {"default_mode": 420, "secret_name": "default-token"},
+                }
+            ],
+        },
+        "status": {
+            "phase": "Running",
+            "host_ip": f"10.0.{(index % node_count) // 250}.{(index % node_count) % 250}",
+            "pod_ip": f"10.1.{(index // 250) % 250}.{index % 250}",
+            "qos_class": "Burstable",
+            "start_time": CREATION_TIMESTAMP,
+            "conditions": [
+                {
+                    "type": condition_type,
+                    "status": "True",
+                    "last_probe_time": None,
+                    "last_transition_time": CREATION_TIMESTAMP,
+                }
+                for condition_type in (
+                    "Initialized", "Ready", "ContainersReady", "PodScheduled"
+                )
+            ],
+            "container_statuses": [
+                _generate_container_status(index, i)
+                for i in range(containers_count)
+            ],
+        },
+    }
+
+
+def generate_pods(count: int, size: str = "medium") -> List[Dict]:
+    """
+    Generates pod objects.
+    :param count: of pods to generate
+    :param size: of each pod, one of POD_SIZES
+    """
+    return [
+        generate_pod(i, containers_count=POD_SIZES[size])
+        for i in range(count)
+    ]
+
+
+def generate_node(index: int) -> Dict:
+    """
+    Generates a node object.
+    :param index: of the generated node, used for its unique fields
+    """
+    name = f"node-{index}"
+    return {
+        "api_version": "v1",
+        "kind": "Node",
+        "metadata": {
+            "name": name,
+            "uid": f"22222222-0000-0000-0000-{index:012x}",
+            "resource_version": str(index + 1),
+            "creation_timestamp": CREATION_TIMESTAMP,
+            "labels": {
+                "kubernetes.io/arch": "amd64",
+                "kubernetes.io/hostname": name,
+                "kubernetes.io/os": "linux",
+                "node.kubernetes.io/instance-type": "m5.xlarge",
+                "topology.kubernetes.io/zone": f"zone-{index % 3}",
+            },
+        },
+        "spec": {
+            "pod_cidr": f"10.1.{index % 250}.0/24",
+            "provider_id": f"aws:///zone-{index % 3}/i-{index:017x}",
+        },
+        "status": {
+            "addresses": [
+                {"type": "InternalIP", "address": f"10.0.{index // 250}.{index % 250}"},
+                {"type": "Hostname", "address": name},
+            ],
+            "allocatable": {"cpu": "3920m", "memory": "15143Mi", "pods": "58"},
+            "capacity": {"cpu": "4", "memory": "15854Mi", "pods": "58"},
+            "conditions": [
+                {
+                    "type": condition_type,
+                    "status": "True" if condition_type == "Ready" else "False",
+                    "last_heartbeat_time": CREATION_TIMESTAMP,
+                    "last_transition_time": CREATION_TIMESTAMP,
+                    "reason": f"Kubelet{condition_type}",
+                    "message": f"kubelet condition {condition_type}",
+                }
+                for condition_type in (
+                    "MemoryPressure", "DiskPressure", "PIDPressure", "Ready"
+                )
+            ],
+            "node_info": {
+                "architecture": "amd64",
+                "container_runtime_version": "containerd://1.4.6",
+                "kernel_version": "5.4.0",
+                "kube_proxy_version": "v1.20.7",
+                "kubelet_version": "v1.20.7",
+                "machine_id": f"{index:032x}",
+                "operating_system": "linux",
+                "os_image": "Ubuntu 20.04.2 LTS",
+                "boot_id": f"{index:032x}",
+                "system_uuid": f"{index:032x}",
+            },
+        },
+    }
+
+
+def generate_deployment(
+        index: int,
+        containers_count: int = POD_SIZES["medium"],
+        namespace_count: int = 20,
+) -> Dict:
+    """
+    Generates a deployment object, matching the pods of generate_pod.
+    :param index: of the generated deployment, used for its unique fields
+    :param containers_count: count of containers in the pod template
+    """
+    name = f"deployment-{index}"
+    labels = {"app": name, "team": f"team-{index % 10}"}
+    return {
+        "api_version": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {
+            "name": name,
+            "namespace": f"namespace-{index % namespace_count}",
+            "uid": f"33333333-0000-0000-0000-{index:012x}",
+            "resource_version": str(index + 1),
+            "generation": 1,
+            "creation_timestamp": CREATION_TIMESTAMP,
+            "labels": labels,
+        },
+        "spec": {
+            "replicas": 3,
+            "revision_history_limit": 10,
+            "selector": {"match_labels": {"app": name}},
+            "strategy": {
+                "type": "RollingUpdate",
+                "rolling_update": {"max_surge": "25%", "max_unavailable": "25%"},
+            },
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "containers": [
+                        _generate_container(index, i)
+                        for i in range(containers_count)
+                    ],
+                    "dns_policy": "ClusterFirst",
+                    "restart_policy": "Always",
+                    "scheduler_name": "default-scheduler",
+                    "termination_grace_period_seconds": 30,
+                },
+            },
+        },
+        "status": {
+            "available_replicas": 3,
+            "observed_generation": 1,
+            "ready_replicas": 3,
+            "replicas": 3,
+            "updated_replicas": 3,
+        },
+    }
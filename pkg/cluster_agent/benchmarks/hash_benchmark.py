@@ -0,0 +1,50 @@
+"""
+Events hashing benchmark - measures hashing pod events, by identity and by
+content digest, compared to hashing the whole event dict string.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.hash_benchmark [--events 10000] [--size medium]
+"""
+import time
+import argparse
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _hash_event_dict(event):
+    """ Hashes the whole event dict string, excluding the timestamp """
+    data = event.to_dict()
+    data["metadata"].pop("timestamp")
+    return hash(str(data))
+
+
+def _benchmark(name, function, events):
+    """ Runs given function on each event & prints the results """
+    start_time = time.perf_counter()
+    for event in events:
+        function(event)
+    elapsed_seconds = time.perf_counter() - start_time
+    print(
+        f"{name:>16}: {elapsed_seconds * 1000:9.2f}ms, "
+        f"{elapsed_seconds / len(events) * 1e6:8.2f}us/event"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    events = [
+        WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+        for pod in generate_pods(args.events, size=args.size)
+    ]
+    print(f"{args.events} {args.size} pod events")
+    _benchmark("event dict str", _hash_event_dict, events)
+    _benchmark("identity", hash, events)
+    _benchmark("content digest", WatchKubernetesEvent.get_content_digest, events)
+    _benchmark("set insertion", set().add, events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Interning benchmark - measures the memory held by a synthetic cluster pods,
+with & without interning.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.interning_benchmark [--pods 50000] [--size medium]
+"""
+import time
+import argparse
+import tracemalloc
+from interning import Interner
+from benchmarks.fixtures import generate_pod, POD_SIZES
+
+
+def _measure_pods(pods_count: int, size: str, interner: Interner = None):
+    """
+    Measures the memory held by the generated pods, interned by the given
+    interner (if given). The interner memory is included.
+    :return: the held bytes & the generation time, in seconds
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    pods = []
+    for i in range(pods_count):
+        pod = generate_pod(i, containers_count=POD_SIZES[size])
+        pods.append(interner.intern(pod) if interner else pod)
+    elapsed_seconds = time.perf_counter() - start_time
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, elapsed_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", type=int, default=50000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    print(f"{args.pods} {args.size} pods")
+    for name, interner in (("plain", None), ("interned", Interner())):
+        held_bytes, elapsed_seconds = _measure_pods(args.pods, args.size, interner)
+        print(
+            f"{name:>8}: {held_bytes / 2 ** 20:8.1f}MB, "
+            f"{held_bytes / args.pods:8.0f} bytes/pod, "
+            f"created in {elapsed_seconds:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+JSON backends benchmark - measures serializing pod events with each of the
+installed JSON backends, compared to the stdlib DateTimeEncoder.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.json_benchmark [--events 10000] [--size medium]
+"""
+import json
+import time
+import argparse
+from encoders import DateTimeEncoder, JsonSerializer, get_available_backends
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _dumps_datetime_encoder(obj) -> bytes:
+    """ Serializes using the stdlib DateTimeEncoder """
+    return json.dumps(obj, cls=DateTimeEncoder).encode("utf-8")
+
+
+def _benchmark(name, dumps, events_dicts):
+    """ Serializes each of the events dicts & prints the results """
+    start_time = time.perf_counter()
+    total_bytes = sum(len(dumps(event_dict)) for event_dict in events_dicts)
+    elapsed_seconds = time.perf_counter() - start_time
+    print(
+        f"{name:>16}: {elapsed_seconds * 1000:9.2f}ms, "
+        f"{elapsed_seconds / len(events_dicts) * 1e6:8.2f}us/event, "
+        f"{total_bytes / len(events_dicts):8.0f} bytes/event"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    events_dicts = [
+        WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod).to_dict()
+        for pod in generate_pods(args.events, size=args.size)
+    ]
+    print(f"{args.events} {args.size} pod events")
+    _benchmark("DateTimeEncoder", _dumps_datetime_encoder, events_dicts)
+    for backend in get_available_backends():
+        _benchmark(backend, JsonSerializer(backend).dumps, events_dicts)
+
+
+if __name__ == "__main__":
+    main()
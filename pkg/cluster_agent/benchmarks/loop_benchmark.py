@@ -0,0 +1,108 @@
+"""
+Event loop benchmark - compares the forwarding throughput of the default
+asyncio event loop and uvloop.
+Runs a local stand-in collector and forwards synthetic pod events to it
+using the Forwarder, EventsSender & EpsagonClient.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.loop_benchmark [--events 20000] [--size medium]
+"""
+import time
+import asyncio
+import argparse
+from aiohttp import web
+from epsagon_client import EpsagonClient
+from events_manager import InMemoryEventsManager
+from events_sender import EventsSender
+from forwarder import Forwarder
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+COLLECTOR_PATH = "/resources/v1"
+TEST_EPSAGON_TOKEN = "benchmark-token"
+TEST_CLUSTER_NAME = "benchmark-cluster"
+
+
+async def _start_collector():
+    """
+    Starts a local stand-in collector, which accepts all the posted data.
+    :return: the collector runner & url
+    """
+    async def handler(request):
+        await request.read()
+        return web.Response()
+
+    app = web.Application(client_max_size=0)
+    app.router.add_post(COLLECTOR_PATH, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # pylint: disable=protected-access
+    return runner, f"http://127.0.0.1:{port}{COLLECTOR_PATH}"
+
+
+async def _run_forwarding(pods):
+    """
+    Forwards an event per given pod to the stand-in collector.
+    :return: the elapsed time in seconds
+    """
+    runner, url = await _start_collector()
+    epsagon_client = await EpsagonClient.create(TEST_EPSAGON_TOKEN)
+    events_manager = InMemoryEventsManager()
+    forwarder = Forwarder(
+        events_manager,
+        EventsSender(epsagon_client, url, TEST_CLUSTER_NAME, TEST_EPSAGON_TOKEN)
+    )
+    for pod in pods:
+        await events_manager.write_event(
+            WatchKubernetesEvent(WatchKubernetesEventType.ADDED, pod)
+        )
+    start_time = time.perf_counter()
+    forwarder_task = asyncio.create_task(forwarder.start())
+    while forwarder.sent_events_count < len(pods):
+        await asyncio.sleep(0.01)
+    elapsed_seconds = time.perf_counter() - start_time
+    forwarder_task.cancel()
+    await asyncio.wait([forwarder_task])
+    await epsagon_client.close()
+    await runner.cleanup()
+    return elapsed_seconds
+
+
+def _benchmark(name, loop, pods):
+    """
+    Runs the forwarding benchmark on the given event loop & prints the results
+    """
+    try:
+        asyncio.set_event_loop(loop)
+        elapsed_seconds = loop.run_until_complete(_run_forwarding(pods))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+    print(
+        f"{name:>8}: {len(pods)} events in {elapsed_seconds:.3f}s, "
+        f"{len(pods) / elapsed_seconds:.0f} events/sec"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    args = parser.parse_args()
+    pods = generate_pods(args.events, size=args.size)
+    _benchmark("asyncio", asyncio.new_event_loop(), pods)
+    if uvloop:
+        _benchmark("uvloop", uvloop.new_event_loop(), pods)
+    else:
+        print("uvloop is not installed, skipping")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Events memory benchmark - measures the memory held per queued event.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.memory_benchmark [--events 20000] [--size medium]
+        [--compression-threshold 1000]
+"""
+import time
+import asyncio
+import argparse
+import tracemalloc
+from events_manager import InMemoryEventsManager
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from benchmarks.fixtures import generate_pods, POD_SIZES
+
+
+def _measure(function) -> int:
+    """
+    Measures the memory allocated, and still held, by given function.
+    :return: the allocated bytes & the function result
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+async def _measure_backlog(
+        events_count: int,
+        size: str,
+        compression_threshold: int = None
+):
+    """
+    Measures the memory held by an events manager backlog, and the time
+    to read all the backlog events.
+    :return: the held bytes & the read time, in seconds
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events_manager = InMemoryEventsManager(
+        compression_threshold=compression_threshold
+    )
+    for pod in generate_pods(events_count, size=size):
+        await events_manager.write_event(
+            WatchKubernetesEvent(WatchKubernetesEventType.ADDED, pod)
+        )
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start_time = time.perf_counter()
+    while not events_manager.is_empty():
+        await events_manager.get_events(max_size=1000)
+    return after - before, time.perf_counter() - start_time
+
+
+async def _run(events_count: int, size: str, compression_threshold: int):
+    """ Runs the benchmark & prints the results """
+    events_manager = InMemoryEventsManager()
+    pods_bytes, pods = _measure(lambda: generate_pods(events_count, size=size))
+
+    def create_events():
+        return [
+            WatchKubernetesEvent(WatchKubernetesEventType.ADDED, pod)
+            for pod in pods
+        ]
+
+    events_bytes, events = _measure(create_events)
+    for event in events:
+        await events_manager.write_event(event)
+    serialized_bytes, _ = _measure(
+        lambda: [event.serialize() for event in events]
+    )
+    print(f"{events_count} {size} pod events queued")
+    print(f"pod data:         {pods_bytes / events_count:10.0f} bytes/event")
+    print(f"event wrapper:    {events_bytes / events_count:10.0f} bytes/event")
+    print(f"serialized cache: {serialized_bytes / events_count:10.0f} bytes/event")
+    del pods, events
+    events_manager.clean()
+    for name, threshold in (
+            ("backlog", None),
+            ("compressed backlog", compression_threshold),
+    ):
+        backlog_bytes, read_seconds = await _measure_backlog(
+            events_count,
+            size,
+            threshold
+        )
+        print(
+            f"{name + ':':<19}{backlog_bytes / events_count:9.0f} bytes/event, "
+            f"read in {read_seconds * 1000:.0f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    parser.add_argument("--compression-threshold", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(_run(args.events, args.size, args.compression_threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Replay - feeds a watch recording (see recorder, EPSAGON_RECORD_DIR) back
+through the agent pipeline, at the recorded speed, N times faster or as fast
+as possible. The recorded list responses & watch events are served by a
+replay apiserver, hence the whole pipeline runs as is - with no network or
+cluster. The events are sent to a stand-in collector.
+Reports the events/sec, the agent peak RSS & CPU seconds. To profile the
+agent, run the replay under a profiler (e.g. `python -m cProfile -m ...`).
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.replay <recording dir> [--speed 1] [--deltas] [--templates] [--intern]
+        [--compression-threshold 0]
+    (--speed 0 replays as fast as possible)
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import logging
+from typing import Dict, List
+import aiohttp
+from aiohttp import web
+from recorder import (
+    WatchRecord,
+    WatchRecordPhase,
+    get_recording_path,
+    read_recording,
+)
+from benchmarks.e2e_benchmark import (
+    CLUSTER_EVENTS_COUNT,
+    AgentPipeline,
+    add_agent_arguments,
+    get_cpu_seconds,
+    get_stats,
+    print_phase,
+    print_results,
+    start_servers,
+    stop_servers,
+    wait_for_events,
+)
+from benchmarks.fake_apiserver import (
+    KIND_PATHS,
+    STATS_PATH,
+    VERSION_PATHS,
+    handle_version,
+)
+
+# watch event types which aren't written as events by the cluster discovery
+NOT_WRITTEN_WATCH_EVENT_TYPES = ("ERROR", "BOOKMARK")
+
+
+class ReplayApiServer:
+    """
+    Serves a watch recording - the Nth list request of a kind is served
+    with its Nth recorded list response (the last one once all were served),
+    and the recorded watch events of a kind are streamed once, each at its
+    recorded time (divided by the speed) since the first request.
+    """
+
+    def __init__(self, recording_dir: str, speed: float = 1):
+        """
+        :param recording_dir: of the recording files
+        :param speed: replay speed factor, 0 to replay as fast as possible
+        """
+        if speed < 0:
+            raise ValueError("Invalid speed value, must be >= 0")
+        self.speed = speed
+        self.replayed_events_count: int = 0
+        self._lists: Dict[str, List[bytes]] = {}
+        self._watch_records: Dict[str, List[WatchRecord]] = {}
+        self._list_requests_counts: Dict[str, int] = {}
+        self._watch_cursors: Dict[str, int] = {}
+        self._start_time: float = None
+        self.duration_seconds: float = 0
+        self.expected_events_count: int = CLUSTER_EVENTS_COUNT
+        self._kinds = {path: kind for kind, path in KIND_PATHS.items()}
+        for kind in KIND_PATHS:
+            path = get_recording_path(recording_dir, kind)
+            if os.path.exists(path):
+                self._load_recording(kind, path)
+
+    def _load_recording(self, kind: str, path: str):
+        """
+        Loads the recording of given kind, and counts its expected events -
+        the items of its first list response & its watch events
+        """
+        lists = []
+        watch_records = []
+        for record in read_recording(path):
+            self.duration_seconds = max(self.duration_seconds, record.time)
+            if record.phase == WatchRecordPhase.LIST:
+                if not lists:
+                    self.expected_events_count += len(
+                        json.loads(record.data).get("items") or []
+                    )
+                lists.append(record.data.encode())
+            else:
+                watch_records.append(record)
+                event_type = json.loads(record.data).get("type")
+                if event_type not in NOT_WRITTEN_WATCH_EVENT_TYPES:
+                    self.expected_events_count += 1
+        self._lists[kind] = lists
+        self._watch_records[kind] = watch_records
+        self._list_requests_counts[kind] = 0
+        self._watch_cursors[kind] = 0
+
+    def get_stats(self) -> Dict:
+        """ Gets the replay progress """
+        return {
+            "duration_seconds": self.duration_seconds,
+            "expected_events": self.expected_events_count,
+            "replayed_events": self.replayed_events_count,
+        }
+
+    def _get_start_time(self) -> float:
+        """ Gets the replay start time - of the first request """
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+        return self._start_time
+
+    def _get_list_body(self, kind: str) -> bytes:
+        """ Gets the list response body of the next list request of given kind """
+        lists = self._lists.get(kind)
+        if not lists:
+            return json.dumps({
+                "kind": f"{kind}List",
+                "metadata": {"resourceVersion": "1"},
+                "items": [],
+            }).encode()
+        index = min(self._list_requests_counts[kind], len(lists) - 1)
+        self._list_requests_counts[kind] += 1
+        return lists[index]
+
+    async def _handle_list(self, request):
+        self._get_start_time()
+        kind = self._kinds[request.path]
+        if request.query.get("watch", "").lower() == "true":
+            return await self._handle_watch(request, kind)
+        return web.Response(body=self._get_list_body(kind), content_type="application/json")
+
+    async def _handle_watch(self, request, kind: str):
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        await response.prepare(request)
+        records = self._watch_records.get(kind) or []
+        try:
+            while self._watch_cursors.get(kind, 0) < len(records):
+                record = records[self._watch_cursors[kind]]
+                if self.speed:
+                    delay = (
+                        self._get_start_time() + record.time / self.speed -
+                        time.monotonic()
+                    )
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                self._watch_cursors[kind] += 1
+                await response.write(record.data.encode() + b"\n")
+                self.replayed_events_count += 1
+            # keeps the watch open, as the apiserver does
+            await asyncio.Event().wait()
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return response
+
+    async def _handle_stats(self, _request):
+        return web.json_response(self.get_stats())
+
+    def create_app(self) -> web.Application:
+        """ Creates the replay apiserver aiohttp application """
+        app = web.Application()
+        for path in VERSION_PATHS:
+            app.router.add_get(path, handle_version)
+        for path in self._kinds:
+            app.router.add_get(path, self._handle_list)
+        app.router.add_get(STATS_PATH, self._handle_stats)
+        return app
+
+
+def _create_replay_apiserver(args) -> ReplayApiServer:
+    """ Creates the replay apiserver of given args """
+    return ReplayApiServer(args.recording_dir, speed=args.speed)
+
+
+async def _run_agent(args, server_url: str, collector_url: str):
+    """
+    Runs the agent pipeline against the replay apiserver & the collector,
+    and prints the results
+    """
+    agent = await AgentPipeline.create(args, server_url, collector_url)
+    async with aiohttp.ClientSession() as session:
+        server_stats = await get_stats(session, server_url)
+        print(
+            f"{server_stats['expected_events']} events recorded in "
+            f"{server_stats['duration_seconds']:.1f}s, replay speed "
+            f"{args.speed or 'as fast as possible'}"
+        )
+        replay_seconds = (
+            server_stats["duration_seconds"] / args.speed if args.speed else 0
+        )
+        start_cpu_seconds = get_cpu_seconds()
+        start_time = time.perf_counter()
+        agent.start()
+        collector_stats = await wait_for_events(
+            session,
+            collector_url,
+            server_stats["expected_events"],
+            replay_seconds + args.timeout
+        )
+        print_phase(
+            "replay",
+            collector_stats["events"],
+            time.perf_counter() - start_time
+        )
+        cpu_seconds = get_cpu_seconds() - start_cpu_seconds
+    await agent.stop()
+    # the recorded objects emit times (if any) aren't of this run
+    print_results(collector_stats, cpu_seconds, should_print_latency=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("recording_dir")
+    parser.add_argument("--speed", type=float, default=1)
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    servers_process, connection, server_url, collector_url = start_servers(
+        _create_replay_apiserver, args
+    )
+    try:
+        asyncio.run(_run_agent(args, server_url, collector_url))
+    finally:
+        stop_servers(servers_process, connection)
+
+
+if __name__ == "__main__":
+    main()
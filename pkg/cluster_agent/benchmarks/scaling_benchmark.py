@@ -0,0 +1,305 @@
+"""
+Memory scaling benchmark - sweeps the synthetic cluster size, and records the
+agent peak RSS & the estimated memory of its components (see
+memory_accounting) in each phase:
+- initial list: the whole cluster is listed & sent
+- steady watch: pods churn
+- collector outage: pods churn while the collector is stalled, until the
+queued events are sent
+Each cluster size runs in a fresh agent process, against its own fake
+apiserver & stand-in collector (see e2e_benchmark), hence the peak RSS of
+each run is of the agent alone. The per phase peak RSS is fitted linearly to
+the pods count, and projected to a bigger cluster.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.scaling_benchmark [--pods 1000,5000,20000] [--size medium]
+        [--pods-per-node 30] [--pods-per-deployment 25] [--churn-rate 200]
+        [--phase-seconds 10] [--project-pods 100000] [--output results.json]
+        [--deltas] [--templates] [--intern] [--compression-threshold 10000]
+"""
+import copy
+import json
+import time
+import asyncio
+import argparse
+import logging
+import threading
+import multiprocessing
+from typing import Dict, List, Tuple
+import aiohttp
+from memory_accounting import get_rss_bytes
+from benchmarks.e2e_benchmark import (
+    CLUSTER_EVENTS_COUNT,
+    POLL_INTERVAL_SECONDS,
+    AgentPipeline,
+    add_agent_arguments,
+    create_fake_apiserver,
+    get_stats,
+    start_servers,
+    stop_servers,
+    wait_for_events,
+)
+from benchmarks.fake_apiserver import CHURN_PATH
+from benchmarks.fixtures import POD_SIZES
+from benchmarks.stand_in_collector import OUTAGE_PATH
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.02
+ACCOUNTING_SAMPLE_INTERVAL_SECONDS = 0.5
+PHASES = ("initial list", "steady watch", "outage")
+MB = 2 ** 20
+
+
+class _RssSampler:
+    """
+    Samples the process RSS in a thread - the event loop might be blocked
+    while the memory peaks (e.g. while deserializing a big list)
+    """
+
+    def __init__(self):
+        self.peak_rss_bytes: int = get_rss_bytes()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL_SECONDS):
+            self.peak_rss_bytes = max(self.peak_rss_bytes, get_rss_bytes())
+
+    def start(self):
+        """ Starts sampling """
+        self._thread.start()
+
+    def stop(self):
+        """ Stops sampling """
+        self._stop_event.set()
+        self._thread.join()
+
+    def reset(self) -> int:
+        """
+        Starts a new phase
+        :return: the peak RSS since the last reset
+        """
+        peak_rss_bytes = max(self.peak_rss_bytes, get_rss_bytes())
+        self.peak_rss_bytes = get_rss_bytes()
+        return peak_rss_bytes
+
+
+async def _sample_accounting(agent: AgentPipeline, phase: Dict):
+    """
+    Samples the agent memory accounting, until cancelled. Keeps the
+    components bytes of the sample with the most accounted bytes.
+    """
+    while True:
+        components_bytes = agent.memory_accountant.get_components_bytes()
+        accounted_bytes = sum(size for size in components_bytes.values() if size)
+        if accounted_bytes >= phase["peak_accounted_bytes"]:
+            phase["peak_accounted_bytes"] = accounted_bytes
+            phase["components_bytes"] = components_bytes
+        await asyncio.sleep(ACCOUNTING_SAMPLE_INTERVAL_SECONDS)
+
+
+async def _run_phase(agent: AgentPipeline, rss_sampler: _RssSampler, run_phase) -> Dict:
+    """
+    Runs a phase, and measures its memory usage
+    :param run_phase: the phase coroutine function, returns the phase events
+    count
+    :return: the phase results
+    """
+    phase = {"peak_accounted_bytes": 0, "components_bytes": {}}
+    rss_sampler.reset()
+    start_time = time.perf_counter()
+    sampling_task = asyncio.create_task(_sample_accounting(agent, phase))
+    try:
+        phase["events"] = await run_phase()
+    finally:
+        sampling_task.cancel()
+        await asyncio.wait([sampling_task])
+    phase["seconds"] = time.perf_counter() - start_time
+    phase["peak_rss_bytes"] = rss_sampler.reset()
+    phase["end_rss_bytes"] = get_rss_bytes()
+    return phase
+
+
+async def _churn(
+        session: aiohttp.ClientSession,
+        server_url: str,
+        rate: float,
+        duration_seconds: float
+):
+    """ Churns the apiserver pods, and waits until the churn ends """
+    async with session.post(
+            f"{server_url}{CHURN_PATH}",
+            params={"rate": rate, "duration": duration_seconds}
+    ) as response:
+        response.raise_for_status()
+    await asyncio.sleep(duration_seconds)
+    while (await get_stats(session, server_url))["is_churning"]:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def _run_agent(args, server_url: str, collector_url: str) -> Dict:
+    """
+    Runs the agent pipeline phases against the fake apiserver & the collector
+    :return: the results - the baseline RSS, the objects count & the phases
+    """
+    rss_sampler = _RssSampler()
+    rss_sampler.start()
+    agent = await AgentPipeline.create(args, server_url, collector_url)
+    results = {"baseline_rss_bytes": get_rss_bytes(), "phases": {}}
+    async with aiohttp.ClientSession() as session:
+        server_stats = await get_stats(session, server_url)
+        results["objects"] = server_stats["objects"]
+        sent_events_count = 0
+
+        async def wait_for_sent_events():
+            nonlocal sent_events_count
+            expected_events_count = (
+                results["objects"] + CLUSTER_EVENTS_COUNT +
+                (await get_stats(session, server_url))["emitted_events"]
+            )
+            collector_stats = await wait_for_events(
+                session, collector_url, expected_events_count, args.timeout
+            )
+            events_count = collector_stats["events"] - sent_events_count
+            sent_events_count = collector_stats["events"]
+            return events_count
+
+        async def initial_list():
+            agent.start()
+            return await wait_for_sent_events()
+
+        async def steady_watch():
+            await _churn(session, server_url, args.churn_rate, args.phase_seconds)
+            return await wait_for_sent_events()
+
+        async def outage():
+            async with session.post(
+                    f"{collector_url}{OUTAGE_PATH}",
+                    params={"duration": args.phase_seconds}
+            ) as response:
+                response.raise_for_status()
+            await _churn(session, server_url, args.churn_rate, args.phase_seconds)
+            return await wait_for_sent_events()
+
+        for name, run_phase in zip(PHASES, (initial_list, steady_watch, outage)):
+            results["phases"][name] = await _run_phase(agent, rss_sampler, run_phase)
+    await agent.stop()
+    rss_sampler.stop()
+    return results
+
+
+def _run_scale(args, connection):
+    """ Agent process main function - runs a single cluster size """
+    servers_process, servers_connection, server_url, collector_url = start_servers(
+        create_fake_apiserver, args
+    )
+    try:
+        connection.send(asyncio.run(_run_agent(args, server_url, collector_url)))
+    finally:
+        stop_servers(servers_process, servers_connection)
+
+
+def _get_scale_args(args, pods_count: int):
+    """ Gets the args of a single cluster size - keeps the cluster shape """
+    scale_args = copy.copy(args)
+    scale_args.pods = pods_count
+    scale_args.nodes = max(pods_count // args.pods_per_node, 1)
+    scale_args.deployments = max(pods_count // args.pods_per_deployment, 1)
+    return scale_args
+
+
+def _run_scale_process(args, pods_count: int) -> Dict:
+    """ Runs a single cluster size in a fresh agent process """
+    connection, agent_connection = multiprocessing.Pipe()
+    agent_process = multiprocessing.Process(
+        target=_run_scale,
+        args=(_get_scale_args(args, pods_count), agent_connection)
+    )
+    agent_process.start()
+    try:
+        return connection.recv()
+    finally:
+        agent_process.join()
+
+
+def fit_linear(points: List[Tuple[float, float]]) -> Tuple[float, float]:
+    """
+    Fits a line to the given (x, y) points, by least squares
+    :return: the slope & the intercept
+    """
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0, mean_y
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+    return slope, mean_y - slope * mean_x
+
+
+def _format_components(components_bytes: Dict[str, int]) -> str:
+    """ Formats the components estimated bytes, biggest first """
+    return ", ".join(
+        f"{name} {(size or 0) / MB:.1f}MB"
+        for name, size in sorted(
+            components_bytes.items(), key=lambda item: -(item[1] or 0)
+        )
+    )
+
+
+def _print_results(all_results: Dict[int, Dict], project_pods: int):
+    """ Prints the results table & the per phase projection """
+    print(
+        f"{'pods':>8} {'objects':>8} {'phase':>13} {'events/s':>9} "
+        f"{'peak RSS':>9} {'end RSS':>9} {'accounted':>10}  components"
+    )
+    for pods_count, results in sorted(all_results.items()):
+        for name, phase in results["phases"].items():
+            print(
+                f"{pods_count:>8} {results['objects']:>8} {name:>13} "
+                f"{phase['events'] / phase['seconds']:>9.0f} "
+                f"{phase['peak_rss_bytes'] / MB:>7.1f}MB "
+                f"{phase['end_rss_bytes'] / MB:>7.1f}MB "
+                f"{phase['peak_accounted_bytes'] / MB:>8.1f}MB  "
+                f"{_format_components(phase['components_bytes'])}"
+            )
+    if len(all_results) < 2:
+        return
+    print(f"\nprojected peak RSS at {project_pods} pods:")
+    for name in PHASES:
+        slope, intercept = fit_linear([
+            (pods_count, results["phases"][name]["peak_rss_bytes"])
+            for pods_count, results in all_results.items()
+        ])
+        print(
+            f"{name:>13}: {(intercept + slope * project_pods) / MB:.0f}MB "
+            f"({slope / 1024:.1f}KB per pod + {intercept / MB:.0f}MB)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pods", default="1000,5000,20000")
+    parser.add_argument("--size", choices=POD_SIZES.keys(), default="medium")
+    parser.add_argument("--pods-per-node", type=int, default=30)
+    parser.add_argument("--pods-per-deployment", type=int, default=25)
+    parser.add_argument("--churn-rate", type=float, default=200)
+    parser.add_argument("--phase-seconds", type=float, default=10)
+    parser.add_argument("--project-pods", type=int, default=100000)
+    parser.add_argument("--output")
+    add_agent_arguments(parser)
+    parser.set_defaults(compression_threshold=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    all_results = {}
+    for pods_count in (int(count) for count in args.pods.split(",")):
+        print(f"running {pods_count} {args.size} pods...")
+        all_results[pods_count] = _run_scale_process(args, pods_count)
+    _print_results(all_results, args.project_pods)
+    if args.output:
+        with open(args.output, "w") as writer:
+            json.dump(all_results, writer, indent=2)
+
+
+if __name__ == "__main__":
+    main()
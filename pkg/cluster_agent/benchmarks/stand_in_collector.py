@@ -0,0 +1,246 @@
+"""
+Stand-in Epsagon collector - decodes & validates the posted events batches:
+the token & cluster name, the compressed events, the template references
+(see templates) and optionally the delta events (see delta_encoder).
+Measures the end to end latency of the pods modified by the fake apiserver
+(see fake_apiserver). Can simulate a collector outage - a stalled collector,
+which holds the posted batches until the outage ends.
+
+Usage (from pkg/cluster_agent):
+    python -m benchmarks.stand_in_collector [--port 8002] [--apply-deltas]
+
+Endpoints:
+    POST /resources/v1 - receives events batches
+    POST /benchmark/outage?duration=10 - stalls for the given duration (seconds)
+    GET /benchmark/stats - the received events counts & latency percentiles
+"""
+import json
+import time
+import zlib
+import base64
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from aiohttp import web
+import json_patch
+from kubernetes_event import KubernetesEventType, WatchKubernetesEventType
+from templates import TemplateException, resolve_templates
+from benchmarks.fake_apiserver import EMITTED_AT_ANNOTATION, STATS_PATH, start_app
+
+COLLECTOR_PATH = "/resources/v1"
+OUTAGE_PATH = "/benchmark/outage"
+
+
+class CollectorValidationException(Exception):
+    pass
+
+
+def _decode(data: str):
+    """ Decodes compressed data """
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    """
+    Gets the given percentile (0-100) of the given sorted values, None if
+    there are no values
+    """
+    if not sorted_values:
+        return None
+    index = round(percentile / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+class StandInCollector:
+    """
+    Stand-in Epsagon collector - see module docstring
+    """
+
+    def __init__(
+            self,
+            epsagon_token: str = None,
+            cluster_name: str = None,
+            should_apply_deltas: bool = False,
+    ):
+        """
+        :param epsagon_token: expected in each batch, if given
+        :param cluster_name: expected in each batch, if given
+        :param should_apply_deltas: whether to keep the received objects and
+        apply the received delta events on them. Otherwise, delta events are
+        counted but not validated.
+        """
+        self.epsagon_token = epsagon_token
+        self.cluster_name = cluster_name
+        self.should_apply_deltas = should_apply_deltas
+        self.batches_count: int = 0
+        self.received_bytes: int = 0
+        self.events_counts: Dict[str, int] = defaultdict(int)
+        self.invalid_batches_count: int = 0
+        self.conflicts_count: int = 0
+        self.latencies: List[float] = []
+        self._outage_end_time: float = 0
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._objects: Dict[Tuple[Any, Any], Dict] = {}
+
+    def _get_events(self, body: Dict) -> List[Dict]:
+        """
+        Gets the events of given batch body, with their templates resolved
+        """
+        if self.epsagon_token is not None and body["epsagon_token"] != self.epsagon_token:
+            raise CollectorValidationException("Unexpected epsagon token")
+        if self.cluster_name is not None and body["cluster_name"] != self.cluster_name:
+            raise CollectorValidationException("Unexpected cluster name")
+        events = _decode(body["data"])
+        if not isinstance(events, list):
+            raise CollectorValidationException("Events data isn't a list")
+        session_id = body.get("templates_session")
+        if session_id is None:
+            return events
+        templates = self._sessions.setdefault(session_id, {})
+        templates.update(_decode(body["templates"]))
+        return resolve_templates(events, templates)
+
+    def _apply_delta(self, delta: Dict) -> Dict:
+        """
+        Applies the given delta event payload on its base object
+        :return: the patched object
+        """
+        key = (delta["kind"], delta["metadata"]["uid"])
+        base = self._objects.get(key)
+        if base is None:
+            raise CollectorValidationException(f"Unknown delta base object {key}")
+        if base["metadata"]["resource_version"] != delta["base_resource_version"]:
+            raise CollectorValidationException(f"Unexpected delta base version {key}")
+        obj = json_patch.apply(base, delta["patch"])
+        self._objects[key] = obj
+        return obj
+
+    def _handle_event(self, event: Dict, received_time: float):
+        """
+        Validates & counts the given event, records its latency if it's a
+        modified pod event of the fake apiserver
+        """
+        kind = event["metadata"]["kind"]
+        if "timestamp" not in event["metadata"]:
+            raise CollectorValidationException("Missing event timestamp")
+        payload = event["payload"]
+        obj = None
+        if kind == KubernetesEventType.WATCH.value:
+            obj = payload["object"]
+            self.events_counts[payload["type"]] += 1
+            if self.should_apply_deltas:
+                key = (obj.get("kind"), obj["metadata"].get("uid"))
+                if payload["type"] == WatchKubernetesEventType.DELETED.value:
+                    self._objects.pop(key, None)
+                else:
+                    self._objects[key] = obj
+        elif kind == KubernetesEventType.WATCH_DELTA.value:
+            self.events_counts[kind] += 1
+            if self.should_apply_deltas:
+                obj = self._apply_delta(payload)
+        else:
+            self.events_counts[kind] += 1
+        if obj is None:
+            return
+        annotations = obj["metadata"].get("annotations") or {}
+        emitted_at = annotations.get(EMITTED_AT_ANNOTATION)
+        if emitted_at is not None:
+            self.latencies.append(received_time - float(emitted_at))
+
+    def start_outage(self, duration_seconds: float):
+        """
+        Starts an outage - the batches posted until it ends are held, and
+        handled once it ends
+        """
+        self._outage_end_time = time.monotonic() + duration_seconds
+
+    def is_in_outage(self) -> bool:
+        """ Returns whether the collector is in an outage """
+        return time.monotonic() < self._outage_end_time
+
+    async def handle(self, request):
+        """ Handles a posted events batch """
+        body = await request.read()
+        outage_seconds = self._outage_end_time - time.monotonic()
+        if outage_seconds > 0:
+            await asyncio.sleep(outage_seconds)
+        received_time = time.monotonic()
+        self.batches_count += 1
+        self.received_bytes += len(body)
+        try:
+            for event in self._get_events(json.loads(body)):
+                self._handle_event(event, received_time)
+        except TemplateException:
+            self.conflicts_count += 1
+            return web.Response(status=409)
+        except (
+                ValueError,
+                KeyError,
+                TypeError,
+                zlib.error,
+                json_patch.JsonPatchException,
+                CollectorValidationException,
+        ):
+            logging.exception("Invalid events batch")
+            self.invalid_batches_count += 1
+            return web.Response(status=400)
+        return web.Response()
+
+    def get_stats(self) -> Dict:
+        """ Gets the received events counts & latency percentiles """
+        latencies = sorted(self.latencies)
+        return {
+            "batches": self.batches_count,
+            "received_bytes": self.received_bytes,
+            "events": sum(self.events_counts.values()),
+            "events_counts": dict(self.events_counts),
+            "invalid_batches": self.invalid_batches_count,
+            "conflicts": self.conflicts_count,
+            "latency_samples": len(latencies),
+            "latency_p50_seconds": get_percentile(latencies, 50),
+            "latency_p99_seconds": get_percentile(latencies, 99),
+            "latency_max_seconds": latencies[-1] if latencies else None,
+            "is_in_outage": self.is_in_outage(),
+        }
+
+    async def _handle_outage(self, request):
+        self.start_outage(float(request.query.get("duration", "10")))
+        return web.json_response(self.get_stats())
+
+    async def _handle_stats(self, _request):
+        return web.json_response(self.get_stats())
+
+    def create_app(self) -> web.Application:
+        """ Creates the collector aiohttp application """
+        app = web.Application(client_max_size=0)
+        app.router.add_post(COLLECTOR_PATH, self.handle)
+        app.router.add_post(OUTAGE_PATH, self._handle_outage)
+        app.router.add_get(STATS_PATH, self._handle_stats)
+        return app
+
+
+async def _serve(args):
+    """ Serves the stand-in collector until interrupted """
+    collector = StandInCollector(should_apply_deltas=args.apply_deltas)
+    _, url = await start_app(collector.create_app(), args.host, args.port)
+    logging.info("Collecting at %s%s", url, COLLECTOR_PATH)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--apply-deltas", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,38 @@
 """
 Cluster discovery - watch & publish events in the cluster
 """
+import json
+import inspect
+from types import SimpleNamespace
 import asyncio
 import logging
 import socket
-from dataclasses import dataclass
-from typing import Callable, Any, Dict
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import partial
+from http import HTTPStatus
+from typing import Callable, Any, Collection, Dict, Optional, Tuple
 from traceback import format_exc
 import kubernetes_asyncio
+from kubernetes_asyncio.client.rest import ApiException
 from aiohttp.client_exceptions import ClientError
+from backoff import Backoff
+from delta_encoder import DeltaEncoder
+from dynamic_targets import (
+    DEFAULT_EVENTS_RATE,
+    EVENTS_BURST_SECONDS,
+    DynamicListEndpoint,
+    DynamicResource,
+    decode_object,
+    deserialize_object,
+    discover_resources,
+)
+from interning import Interner
+from model_decoder import ModelDecoder
+from rate_limiter import TokenBucket
+from recorder import WatchRecorder
 from kubernetes_event import (
     KubernetesEvent,
     WatchKubernetesEvent,
@@ -17,11 +41,85 @@ from kubernetes_event import (
     KubernetesEventType,
 )
 
+class WatchState(Enum):
+    """ watch target state """
+    PENDING = "pending" # waiting for a list slot
+    LISTING = "listing"
+    WATCHING = "watching"
+    BACKOFF = "backoff" # failed, waiting to restart
+
+
+@dataclass
+class WatchHealth:
+    """ watch target health """
+    state: WatchState = WatchState.PENDING
+    lists_count: int = 0
+    restarts_count: int = 0
+    consecutive_failures: int = 0 # since the last listed or received event
+    last_error: str = None
+    last_event_time: float = None # wall clock time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "lists_count": self.lists_count,
+            "restarts_count": self.restarts_count,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_event_time": self.last_event_time,
+        }
+
+
 @dataclass
 class WatchTarget:
     """ watch target """
     endpoint: Callable # endpoint to watch
     last_resource_version: Any = None # used to avoid full resyncs
+    args: Tuple = () # endpoint positional args, such as the namespace
+    rate_limiter: TokenBucket = None # if given, limits the watch events rate
+    health: WatchHealth = field(default_factory=WatchHealth)
+
+    def on_event(self):
+        """ Marks the target healthy once an event is received """
+        self.health.last_event_time = time.time()
+        self.health.consecutive_failures = 0
+
+def _get_return_type(endpoint: Callable) -> str:
+    """
+    Gets the response model type of given endpoint, by the `:rtype:` of its
+    method docstring as the kubernetes client does - for example,
+    `V1PodList`. The method of a callable object is its __call__.
+    """
+    if not inspect.isroutine(endpoint):
+        endpoint = type(endpoint).__call__
+    for line in (endpoint.__doc__ or "").splitlines():
+        line = line.strip()
+        if line.startswith(":rtype:"):
+            return line[len(":rtype:"):].strip()
+    return ""
+
+def _get_watch_return_type(endpoint: Callable) -> str:
+    """
+    Gets the watched object model type of given list endpoint, as the
+    kubernetes client watch does - for example, `V1Pod` for `V1PodList`.
+    """
+    if isinstance(endpoint, DynamicListEndpoint):
+        return endpoint.resource.watch_return_type
+    return_type = _get_return_type(endpoint)
+    if return_type.endswith("List"):
+        return return_type[:-len("List")]
+    return return_type
+
+
+@dataclass
+class RawWatchEvent:
+    """
+    A raw (not converted) watch event
+    """
+    return_type: str # the watched object model type, such as `V1Pod`
+    uid: Any # the watched object uid
+    data: str # the raw watch event json
+
 
 class ClusterDiscoveryException(Exception):
     pass
@@ -36,14 +134,104 @@ class ClusterDiscovery:
 
     # default time to wait between watch attemps
     RETRY_INTERVAL_SECONDS = 30
+    # default max watch targets listed at once
+    MAX_CONCURRENT_LISTS = 5
+    CLUSTER_SCOPED_KINDS = ("Node", "Namespace")
+    RESOURCE_KINDS = ("Pod", "Node", "Namespace", "Deployment", "DaemonSet", "StatefulSet")
+
+    @classmethod
+    def get_watch_targets_count(
+            cls,
+            should_collect_resources: bool,
+            should_collect_events: bool,
+            resources: Collection[DynamicResource] = None,
+    ) -> int:
+        """
+        Gets the watch targets count of a cluster wide discovery of given
+        params, before its resources are discovered - each target watch holds
+        an API connection.
+        """
+        count = len(resources or ())
+        if should_collect_resources:
+            count += len(cls.RESOURCE_KINDS)
+        if should_collect_events:
+            count += 1
+        return count
+
+    def _create_namespaced_watch_targets(
+            self,
+            should_collect_resources: bool,
+            should_collect_events: bool,
+            namespace: str,
+    ) -> Dict[str, WatchTarget]:
+        """
+        Creates the watch targets of the namespaced kinds in given namespace
+        """
+        targets = {}
+        if should_collect_resources:
+            targets.update(
+                {
+                    "Pod": WatchTarget(
+                        self.client.list_namespaced_pod,
+                        args=(namespace,)
+                    ),
+                    "Deployment": WatchTarget(
+                        self.apps_api_client.list_namespaced_deployment,
+                        args=(namespace,)
+                    ),
+                    "DaemonSet": WatchTarget(
+                        self.apps_api_client.list_namespaced_daemon_set,
+                        args=(namespace,)
+                    ),
+                    "StatefulSet": WatchTarget(
+                        self.apps_api_client.list_namespaced_stateful_set,
+                        args=(namespace,)
+                    ),
+                }
+            )
+        if should_collect_events:
+            targets["Event"] = WatchTarget(
+                self.client.list_namespaced_event,
+                args=(namespace,)
+            )
+        return targets
 
     def _create_watch_targets(
             self,
             should_collect_resources: bool,
             should_collect_events: bool,
+            namespace: str = None,
+            kinds: Collection[str] = None,
+    ) -> Dict[str, WatchTarget]:
+        """
+        Creates watch targets - all pods, nodes & deployments, or only the
+        namespaced kinds of given namespace. If kinds are given, only these
+        kinds are watched.
+        """
+        if namespace is not None:
+            targets = self._create_namespaced_watch_targets(
+                should_collect_resources,
+                should_collect_events,
+                namespace
+            )
+        else:
+            targets = self._create_cluster_watch_targets(
+                should_collect_resources,
+                should_collect_events
+            )
+        if kinds is not None:
+            targets = {
+                kind: target for kind, target in targets.items() if kind in kinds
+            }
+        return targets
+
+    def _create_cluster_watch_targets(
+            self,
+            should_collect_resources: bool,
+            should_collect_events: bool,
     ) -> Dict[str, WatchTarget]:
         """
-        Creates watch targets - all pods, nodes & deployments.
+        Creates the watch targets of all the namespaces
         """
         targets = {}
         if should_collect_resources:
@@ -74,29 +262,136 @@ class ClusterDiscovery:
             should_collect_events=False,
             api_client=None,
             retry_interval_seconds=RETRY_INTERVAL_SECONDS,
+            raw_watch_event_handler=None,
+            should_serialize_events=False,
+            serialization_executor: Executor = None,
+            interner: Interner = None,
+            delta_encoder: DeltaEncoder = None,
+            recorder: WatchRecorder = None,
+            namespace: str = None,
+            kinds: Collection[str] = None,
+            resources: Collection[DynamicResource] = None,
+            backoff: Backoff = None,
+            lists_semaphore: asyncio.Semaphore = None,
+            model_decoder: ModelDecoder = None,
     ):
         """
         :param event_handler: to write events to
         :param api_client: of the cluster to discover. If not given, using the
         default one.
+        :param raw_watch_event_handler: if given, watch events are not
+        converted to KubernetesEvents. Instead, each raw watch event is written
+        to this handler as a RawWatchEvent.
+        :param should_serialize_events: whether to serialize each event once
+        created, before writing it to the event handler
+        :param serialization_executor: if given, events are serialized in
+        this executor rather than on the event loop
+        :param interner: if given, used to intern each event data once
+        created, to share its repeated strings & sub-structures
+        :param delta_encoder: if given, used to encode watch MODIFIED events
+        as deltas against the previously written version of their object
+        :param recorder: if given, the raw list responses & watch events are
+        recorded to it
+        :param namespace: if given, only the namespaced kinds of this
+        namespace are watched, and the cluster info isn't collected
+        :param kinds: if given, only these kinds are watched, and only the
+        cluster scoped resources of the given resources
+        :param resources: more resources to watch, resolved by the apiserver
+        discovery API once started. Each resource watch events rate is
+        limited independently.
+        :param backoff: the delays before restarting a failed watch target,
+        by its consecutive failures. If not given, using the default one.
+        :param lists_semaphore: bounds the watch targets listed at once, may
+        be shared with other discoveries. If not given, up to
+        MAX_CONCURRENT_LISTS targets are listed at once.
+        :param model_decoder: if given, the list responses & watch events are
+        decoded by it straight to dicts, rather than to client models
         """
         self.i = 0
         self.event_handler = event_handler
+        self.raw_watch_event_handler = raw_watch_event_handler
+        self.should_serialize_events = should_serialize_events
+        self.serialization_executor = serialization_executor
+        self.interner = interner
+        self.delta_encoder = delta_encoder
+        self.recorder = recorder
+        self.model_decoder = model_decoder
         self.client = kubernetes_asyncio.client.CoreV1Api(api_client=api_client)
         self.version_client = kubernetes_asyncio.client.VersionApi(api_client=api_client)
         self.apps_api_client = kubernetes_asyncio.client.AppsV1Api(api_client=api_client)
         self.should_collect_resources = should_collect_resources
+        self.namespace = namespace
+        self.kinds = kinds
+        self.resources = resources
+        self._is_discovered = not resources
         self.watch_targets = self._create_watch_targets(
             should_collect_resources,
-            should_collect_events
+            should_collect_events,
+            namespace=namespace,
+            kinds=kinds
         )
+        self.backoff = backoff or Backoff()
+        self.lists_semaphore = lists_semaphore
         self.watch_tasks = []
+        self.discover_tasks = []
         if retry_interval_seconds < 0:
             raise ValueError("Retry interval seconds must be bigger than 0")
 
         self.retry_interval_seconds = retry_interval_seconds
 
 
+    async def _add_dynamic_watch_targets(self):
+        """
+        Resolves the configured resources by the apiserver discovery API, and
+        adds their watch targets - in a namespace, only the namespaced
+        resources are watched. A resource of an already watched kind is
+        skipped.
+        """
+        api_client = self.client.api_client
+        for resource in await discover_resources(api_client, self.resources):
+            if resource.namespaced and self.kinds is not None:
+                continue
+            if not resource.namespaced and self.namespace is not None:
+                continue
+            if resource.kind in self.watch_targets:
+                logging.warning("%s is already watched, skipping", resource.kind)
+                continue
+            events_rate = resource.resource.events_rate or DEFAULT_EVENTS_RATE
+            self.watch_targets[resource.kind] = WatchTarget(
+                DynamicListEndpoint(
+                    api_client,
+                    resource,
+                    namespace=self.namespace if resource.namespaced else None
+                ),
+                rate_limiter=TokenBucket(
+                    events_rate,
+                    capacity=events_rate * EVENTS_BURST_SECONDS
+                )
+            )
+            logging.info("Watching %s as %s", resource.resource, resource.kind)
+        self._is_discovered = True
+
+    async def _write_event(self, kubernetes_event: KubernetesEvent):
+        """
+        Writes the given event to the event handler. Interns the event data
+        first if an interner is given, encodes the event if a delta encoder is
+        given, and serializes the event if should_serialize_events is set.
+        """
+        if self.interner:
+            kubernetes_event.data = self.interner.intern(kubernetes_event.data)
+        if self.delta_encoder:
+            kubernetes_event = self.delta_encoder.encode(kubernetes_event)
+        if self.should_serialize_events:
+            if self.serialization_executor:
+                await asyncio.get_event_loop().run_in_executor(
+                    self.serialization_executor,
+                    kubernetes_event.serialize
+                )
+            else:
+                kubernetes_event.serialize()
+        await self.event_handler(kubernetes_event)
+
+
     def _update_resource_version(
             self,
             kind,
@@ -109,18 +404,74 @@ class ClusterDiscovery:
         self.watch_targets[kind].last_resource_version = resource_version
 
 
-    async def _get_initial_list(self, kind, target):
+    def _is_recording(self) -> bool:
+        """
+        Returns whether the raw traffic is recorded
+        """
+        return self.recorder is not None and self.recorder.is_recording
+
+    def _decode_list(self, target, body: str) -> SimpleNamespace:
+        """
+        Decodes the given raw list response of given endpoint by the model
+        decoder - its items are dicts, rather than client models
+        """
+        response = json.loads(body)
+        return_type = _get_watch_return_type(target)
+        metadata = response.get("metadata") or {}
+        return SimpleNamespace(
+            items=[
+                self.model_decoder.decode(item, return_type)
+                for item in response.get("items") or []
+            ],
+            metadata=SimpleNamespace(resource_version=metadata.get("resourceVersion"))
+        )
+
+    async def _list(self, kind, target, args=()):
+        """
+        Lists the given watch target endpoint. If recording, the raw response
+        is recorded, then deserialized as the kubernetes client does (or
+        decoded by the model decoder, if given).
+        :param args: the endpoint positional args
+        """
+        is_dynamic = isinstance(target, DynamicListEndpoint)
+        should_decode = self.model_decoder is not None and not is_dynamic
+        if not self._is_recording() and not should_decode:
+            return await target(*args)
+        response = await target(*args, _preload_content=False)
+        try:
+            body = (await response.read()).decode("utf-8")
+        finally:
+            response.release()
+        if self._is_recording():
+            self.recorder.record_list(kind, body)
+        if is_dynamic:
+            return target.deserialize_list(body)
+        if should_decode:
+            return self._decode_list(target, body)
+        return self.client.api_client.deserialize(
+            response=SimpleNamespace(data=body),
+            response_type=_get_return_type(target)
+        )
+
+    async def _get_initial_list(self, kind, target, args=()):
         """
         Performs initial list of given watch target endpoint.
+        :param args: the endpoint positional args
         """
-        response = await target()
+        response = await self._list(kind, target, args)
         for item in response.items:
-            item.kind = kind
+            if isinstance(item, dict):
+                # already decoded by the model decoder
+                item["kind"] = kind
+                data = item
+            else:
+                item.kind = kind
+                data = item.to_dict()
             kubernetes_event = WatchKubernetesEvent(
                 WatchKubernetesEventType.ADDED,
-                item.to_dict()
+                data
             )
-            await self.event_handler(kubernetes_event)
+            await self._write_event(kubernetes_event)
 
         return response.metadata.resource_version
 
@@ -132,11 +483,26 @@ class ClusterDiscovery:
         async for event in stream:
             try:
                 event_type = event.get("type")
+                if self._is_recording():
+                    self.recorder.record_watch_event(kind, json.dumps({
+                        "type": event_type,
+                        "object": event.get("raw_object"),
+                    }))
                 if not event_type or event_type.lower() == "error":
                     raise ErrorWatchEventException("Received an error event")
                 logging.debug("Received event: %s", event)
+                target.on_event()
+                if target.rate_limiter:
+                    await target.rate_limiter.acquire()
+                if isinstance(event.get("object"), dict):
+                    # a dynamic target object, the watch has no model of it
+                    event["object"] = deserialize_object(
+                        self.client.api_client,
+                        event["object"],
+                        _get_watch_return_type(target.endpoint)
+                    )
                 kubernetes_event = WatchKubernetesEvent.from_watch_dict(event)
-                await self.event_handler(kubernetes_event)
+                await self._write_event(kubernetes_event)
                 resource_version = kubernetes_event.get_resource_version()
                 self._update_resource_version(
                     kind,
@@ -148,41 +514,180 @@ class ClusterDiscovery:
                 logging.debug("Skipping invalid event")
 
 
-    async def _start_watch(self, kind, target):
+    async def _hand_off_raw_event(self, return_type: str, line: str, event: Dict):
         """
-        Watches given cluster endpoint.
-        For each streamed event, creating KubernetesEvent and writing the
-        event to the event handler. Ignoring invalid event object.
+        Writes the given raw watch event as is to the raw watch event handler
+        :return: the watched object resource version
         """
-        if not target.last_resource_version:
-            # resource first time retrieval
-            resource_version = await self._get_initial_list(kind, target.endpoint)
-            self._update_resource_version(
-                kind,
-                target,
-                resource_version
-            )
-        else:
-            # continue watch from last preserved resource version
-            resource_version = target.last_resource_version
+        metadata = (event.get("object") or {}).get("metadata") or {}
+        await self.raw_watch_event_handler(
+            RawWatchEvent(return_type, metadata.get("uid"), line)
+        )
+        return metadata.get("resourceVersion")
 
+    async def _write_decoded_event(self, return_type: str, _line: str, event: Dict):
+        """
+        Decodes the watched object of given raw watch event by the model
+        decoder, and writes the event
+        :return: the watched object resource version, None if the event is
+        invalid (skipped)
+        """
         try:
-            while True:
-                logging.debug("Start watch for %s", kind)
+            if WatchKubernetesEvent.OBJECT_FIELD_KEY in event:
+                event[WatchKubernetesEvent.OBJECT_FIELD_KEY] = decode_object(
+                    self.model_decoder,
+                    event[WatchKubernetesEvent.OBJECT_FIELD_KEY],
+                    return_type
+                )
+            kubernetes_event = WatchKubernetesEvent.from_watch_dict(event)
+        except KubernetesEventException:
+            logging.debug("Skipping invalid event")
+            return None
+        await self._write_event(kubernetes_event)
+        return kubernetes_event.get_resource_version()
+
+    def _get_raw_line_handler(self, target) -> Optional[Callable]:
+        """
+        Gets the handler of the raw watch events of given target - hands
+        them off to the raw watch event handler, or decodes them by the
+        model decoder.
+        :return: None if the watch events are converted to client models
+        """
+        if self.raw_watch_event_handler:
+            return partial(
+                self._hand_off_raw_event,
+                _get_watch_return_type(target.endpoint)
+            )
+        if self.model_decoder:
+            return partial(
+                self._write_decoded_event,
+                _get_watch_return_type(target.endpoint)
+            )
+        return None
+
+    async def _run_raw_watch(self, kind, target, stream, handle_line):
+        """
+        Runs the raw watch stream of given watch target and watch resource
+        kind. Only parses each watch event json, the event is converted &
+        written by handle_line.
+        :param handle_line: async (line, event) handler, returns the watched
+        object resource version (None to skip the event)
+        """
+        async for line in stream:
+            if self._is_recording():
+                self.recorder.record_watch_event(kind, line)
+            event = json.loads(line)
+            event_type = event.get("type")
+            if not event_type or event_type.lower() == "error":
+                raise ErrorWatchEventException("Received an error event")
+            target.on_event()
+            if target.rate_limiter:
+                await target.rate_limiter.acquire()
+            resource_version = await handle_line(line, event)
+            if resource_version is None:
+                continue
+            # used by the watch stream to resume after a read timeout
+            stream.resource_version = resource_version
+            self._update_resource_version(kind, target, resource_version)
+            logging.debug("%s new resource version: %s", kind, resource_version)
+
+    async def _watch(self, kind, target):
+        """
+        Watches given cluster endpoint from its last resource version,
+        restarting the watch whenever its stream ends (by the apiserver
+        timeout).
+        For each streamed event, creating KubernetesEvent and writing the
+        event to the event handler. Ignoring invalid event object.
+        """
+        handle_line = self._get_raw_line_handler(target)
+        while True:
+            logging.debug("Start watch for %s", kind)
+            if handle_line:
+                w = kubernetes_asyncio.watch.Watch(return_type="str")
+            else:
                 w = kubernetes_asyncio.watch.Watch()
-                stream = w.stream(target.endpoint, resource_version=resource_version)
+            stream = w.stream(
+                target.endpoint,
+                *target.args,
+                resource_version=target.last_resource_version
+            )
+            if handle_line:
+                await self._run_raw_watch(kind, target, stream, handle_line)
+            else:
                 await self._run_watch(kind, target, stream)
-        except ClientError:
-            logging.debug("Client Error: %s", format_exc())
-            # resource version timeout, restarting watch
-            # from last preserved resource version
-            await self._start_watch(kind, target)
-        except ErrorWatchEventException:
-            logging.debug("Restarting %s watch due to an error event", kind)
-            self._update_resource_version(kind, target, None)
-            await self._start_watch(kind, target)
-        except asyncio.CancelledError:
-            pass
+
+    def _reset_watch(self, kind, target):
+        """
+        Resets the given target watch - it's listed again on restart
+        """
+        self._update_resource_version(kind, target, None)
+        if self.delta_encoder:
+            # events might have been missed, sending full objects
+            self.delta_encoder.reset(kind)
+
+    async def _start_watch(self, kind, target):
+        """
+        Supervises the watch of given target until cancelled - lists it first
+        (bounded by the lists semaphore, so the targets lists are staggered),
+        then watches it.
+        A failed watch is restarted once its backoff delay (by its
+        consecutive failures, jittered) has passed - on a client error or an
+        API error, from the last preserved resource version; on an error
+        event or once the resource version is gone (410), by listing it
+        again.
+        """
+        health = target.health
+        while True:
+            try:
+                if not target.last_resource_version:
+                    # resource first time retrieval
+                    health.state = WatchState.PENDING
+                    async with self.lists_semaphore:
+                        health.state = WatchState.LISTING
+                        resource_version = await self._get_initial_list(
+                            kind,
+                            target.endpoint,
+                            target.args
+                        )
+                    self._update_resource_version(
+                        kind,
+                        target,
+                        resource_version
+                    )
+                    health.lists_count += 1
+                    health.consecutive_failures = 0
+                health.state = WatchState.WATCHING
+                await self._watch(kind, target)
+            except ClientError as exception:
+                logging.debug("Client Error: %s", format_exc())
+                # resource version timeout or connection error, restarting
+                # watch from last preserved resource version
+                error = exception
+            except ErrorWatchEventException as exception:
+                logging.debug("Restarting %s watch due to an error event", kind)
+                self._reset_watch(kind, target)
+                error = exception
+            except ApiException as exception:
+                if exception.status == HTTPStatus.GONE:
+                    logging.debug("Restarting %s watch, its resource version is gone", kind)
+                    self._reset_watch(kind, target)
+                else:
+                    # e.g. forbidden or a server error, retrying after the
+                    # backoff delay
+                    logging.debug("API Error: %s", format_exc())
+                error = exception
+            except asyncio.CancelledError:
+                return
+            health.state = WatchState.BACKOFF
+            health.restarts_count += 1
+            health.consecutive_failures += 1
+            health.last_error = repr(error)
+            delay = self.backoff.get_delay(health.consecutive_failures)
+            logging.debug("Restarting %s watch in %.2f seconds", kind, delay)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                return
 
     def _stop_all(self):
         """
@@ -199,54 +704,71 @@ class ClusterDiscovery:
         """
         Collects the cluster info
         """
+        version = None
         try:
-            version = None
-            try:
-                version: str = (await self.version_client.get_code()).git_version
-            except Exception as exception:
-                logging.debug("Could not extract cluster version")
-                logging.error(str(exception))
-                logging.error(format_exc())
-            try:
-                data = {"version": version}
-                kubernetes_event = KubernetesEvent(KubernetesEventType.CLUSTER, data)
-                await self.event_handler(kubernetes_event)
-            except KubernetesEventException:
-                logging.debug("Failed to create cluster event")
-                raise
+            version: str = (await self.version_client.get_code()).git_version
         except asyncio.CancelledError:
-            pass
+            # the discovery is stopped, its watches mustn't start
+            raise
+        except Exception as exception:
+            logging.debug("Could not extract cluster version")
+            logging.error(str(exception))
+            logging.error(format_exc())
+        try:
+            data = {"version": version}
+            kubernetes_event = KubernetesEvent(KubernetesEventType.CLUSTER, data)
+            await self._write_event(kubernetes_event)
+        except KubernetesEventException:
+            logging.debug("Failed to create cluster event")
+            raise
 
     async def start(self):
         """
         Starts watch task per target (see _create_watch_targets) and runs
         more discovery tasks such as retrieving cluster level information.
-        In case of watch resync issues, restarting all watches from the last
-        preserved resource version.
+        Each failed watch is restarted independently (see _start_watch).
         In case of other network issues, stopping all tasks and restarting
         after RETRY_INTERVAL_SECONDS.
         """
-        try:
-            await self._collect_cluster_info()
-            self.discover_tasks = [
-                asyncio.create_task(self._start_watch(kind, target))
-                for kind, target in self.watch_targets.items()
-            ]
-            await asyncio.gather(
-                *self.discover_tasks,
-                loop = asyncio.get_event_loop()
-            )
-        except (socket.gaierror, ClientError):
-            self.stop()
-            logging.error(
-                "Connection error, retrying in %d seconds",
-                self.retry_interval_seconds
-            )
-            await asyncio.sleep(self.retry_interval_seconds)
-            await self.start()
-        except asyncio.CancelledError:
-            self.stop()
+        if self.lists_semaphore is None:
+            self.lists_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_LISTS)
+        while True:
+            try:
+                if not self._is_discovered:
+                    await self._add_dynamic_watch_targets()
+                if self.namespace is None:
+                    await self._collect_cluster_info()
+                self.discover_tasks = [
+                    asyncio.create_task(self._start_watch(kind, target))
+                    for kind, target in self.watch_targets.items()
+                ]
+                await asyncio.gather(
+                    *self.discover_tasks,
+                    loop = asyncio.get_event_loop()
+                )
+                return
+            except (socket.gaierror, ClientError):
+                self.stop()
+                logging.error(
+                    "Connection error, retrying in %d seconds",
+                    self.retry_interval_seconds
+                )
+                try:
+                    await asyncio.sleep(self.retry_interval_seconds)
+                except asyncio.CancelledError:
+                    return
+            except asyncio.CancelledError:
+                self.stop()
+                return
 
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Gets the health of each watch target, by its kind
+        """
+        return {
+            kind: target.health.to_dict()
+            for kind, target in self.watch_targets.items()
+        }
 
     def stop(self):
         """
@@ -0,0 +1,187 @@
+"""
+Configuration watcher - watches a mounted configuration directory
+(such as a mounted ConfigMap) and applies configuration changes live.
+"""
+import os
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+from typing import Callable, Dict, Optional
+
+# inotify events which indicate a change in the watched directory.
+# A mounted ConfigMap is updated by atomically replacing the `..data`
+# symlink, hence IN_MOVED_TO & IN_CREATE are required as well.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+INOTIFY_READ_SIZE = 4096
+
+
+def _create_inotify_fd(path: str) -> Optional[int]:
+    """
+    Creates a non blocking inotify file descriptor, watching the given path.
+    Returns None if inotify is not available or the path cannot be watched.
+    """
+    try:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6",
+            use_errno=True
+        )
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, path.encode(), INOTIFY_WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class ConfWatcher:
+    """
+    Watches configuration files in a given directory. Each configuration
+    key is a file in the directory, and has a handler which is called
+    with the file (stripped) content whenever it changes, or with None
+    if the file doesn't exist.
+    Uses inotify when available, otherwise falls back to polling the
+    files modification time.
+    """
+
+    DEFAULT_POLL_INTERVAL_SECONDS = 5
+    # safety net interval, used when changes are notified by inotify
+    INOTIFY_POLL_INTERVAL_SECONDS = 120
+
+    def __init__(
+            self,
+            conf_dir: str,
+            poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS
+    ):
+        """
+        :param conf_dir: the configuration directory to watch
+        :param poll_interval_seconds: interval between polls, in case
+        inotify is not available
+        """
+        if poll_interval_seconds <= 0:
+            raise ValueError("Poll interval seconds must be bigger than 0")
+        self.conf_dir = conf_dir
+        self.poll_interval_seconds = poll_interval_seconds
+        self.handlers: Dict[str, Callable[[Optional[str]], None]] = {}
+        self.values: Dict[str, Optional[str]] = {}
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._changed: Optional[asyncio.Event] = None
+        self._inotify_fd = None
+
+    def register(self, key: str, handler: Callable[[Optional[str]], None]):
+        """
+        Registers a handler for a given configuration key.
+        The handler is called on the next reload, and on every value change.
+        """
+        self.handlers[key] = handler
+        self.values.pop(key, None)
+        self._mtimes.pop(key, None)
+
+    def _get_mtime(self, key: str) -> Optional[float]:
+        """
+        Gets the modification time of given key file, None if not exists
+        """
+        try:
+            return os.stat(os.path.join(self.conf_dir, key)).st_mtime
+        except OSError:
+            return None
+
+    def _read_value(self, key: str) -> Optional[str]:
+        """
+        Reads given key file content, None if cannot be read
+        """
+        try:
+            with open(os.path.join(self.conf_dir, key), "r") as reader:
+                return reader.read().strip()
+        except OSError:
+            return None
+
+    def reload(self, force: bool = False):
+        """
+        Reloads the configuration - calls the handler of each key which
+        its value has been changed.
+        :param force: if set, reads all the keys even if their modification
+        time hasn't changed.
+        """
+        for key, handler in list(self.handlers.items()):
+            mtime = self._get_mtime(key)
+            if not force and key in self._mtimes and self._mtimes[key] == mtime:
+                continue
+            self._mtimes[key] = mtime
+            value = self._read_value(key) if mtime is not None else None
+            if key in self.values and self.values[key] == value:
+                continue
+            self.values[key] = value
+            try:
+                handler(value)
+            except Exception: # pylint: disable=broad-except
+                logging.exception("Failed to apply `%s` configuration", key)
+
+    def _on_inotify_event(self):
+        """
+        Called when the inotify file descriptor is readable. Drains all
+        the pending inotify events and notifies a change.
+        """
+        try:
+            while os.read(self._inotify_fd, INOTIFY_READ_SIZE):
+                pass
+        except OSError:
+            pass
+        self._changed.set()
+
+    def _start_inotify(self) -> bool:
+        """
+        Starts watching the configuration directory using inotify.
+        Returns whether inotify is used.
+        """
+        self._inotify_fd = _create_inotify_fd(self.conf_dir)
+        if self._inotify_fd is None:
+            return False
+        asyncio.get_event_loop().add_reader(
+            self._inotify_fd,
+            self._on_inotify_event
+        )
+        return True
+
+    def _stop_inotify(self):
+        """
+        Stops watching the configuration directory using inotify
+        """
+        if self._inotify_fd is None:
+            return
+        asyncio.get_event_loop().remove_reader(self._inotify_fd)
+        os.close(self._inotify_fd)
+        self._inotify_fd = None
+
+    async def start(self):
+        """
+        Starts watching the configuration directory, until cancelled.
+        """
+        interval = self.poll_interval_seconds
+        self._changed = asyncio.Event()
+        if self._start_inotify():
+            logging.debug("Watching %s using inotify", self.conf_dir)
+            interval = max(interval, self.INOTIFY_POLL_INTERVAL_SECONDS)
+        try:
+            while True:
+                self.reload()
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._stop_inotify()
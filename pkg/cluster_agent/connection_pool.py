@@ -0,0 +1,111 @@
+"""
+Kubernetes API connection pool - a single ApiClient shared by the cluster
+discovery & the Leases coordination, its connections pool sized by the
+watches, and the pool usage metrics
+"""
+import time
+from typing import Any, Dict
+import aiohttp
+import kubernetes_asyncio
+
+# pool connections beyond the watches - for the lists, the apiserver
+# discovery & the Leases requests
+DEFAULT_HEADROOM = 10
+
+
+def get_pool_size(watches_count: int, headroom: int = DEFAULT_HEADROOM) -> int:
+    """
+    Gets the connections pool size of given watches count - each watch holds
+    a connection for as long as it runs, so the pool must fit all of them,
+    and still have connections left for the other requests
+    """
+    if watches_count < 0 or headroom < 1:
+        raise ValueError("Invalid pool size, watches count must be >= 0 and headroom >= 1")
+    return watches_count + headroom
+
+
+class ConnectionPoolMetrics:
+    """
+    Connections pool usage metrics, traced by an aiohttp trace config - the
+    connections created & reused, and the requests which waited for a free
+    connection (the pool was exhausted) and for how long.
+    """
+
+    def __init__(self):
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_connection_queued_start.append(self._on_queued_start)
+        self.trace_config.on_connection_queued_end.append(self._on_queued_end)
+        self.trace_config.on_connection_create_end.append(self._on_create_end)
+        self.trace_config.on_connection_reuseconn.append(self._on_reuse)
+        self.created_connections_count: int = 0
+        self.reused_connections_count: int = 0
+        self.waiting_requests_count: int = 0
+        self.waited_requests_count: int = 0
+        self.total_wait_seconds: float = 0
+        self.max_wait_seconds: float = 0
+        self._connector: aiohttp.BaseConnector = None
+
+    async def _on_queued_start(self, _session, trace_config_ctx, _params):
+        trace_config_ctx.queued_time = time.monotonic()
+        self.waiting_requests_count += 1
+
+    async def _on_queued_end(self, _session, trace_config_ctx, _params):
+        wait_seconds = time.monotonic() - trace_config_ctx.queued_time
+        self.waiting_requests_count -= 1
+        self.waited_requests_count += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    async def _on_create_end(self, _session, _trace_config_ctx, _params):
+        self.created_connections_count += 1
+
+    async def _on_reuse(self, _session, _trace_config_ctx, _params):
+        self.reused_connections_count += 1
+
+    def instrument(self, api_client: kubernetes_asyncio.client.ApiClient):
+        """
+        Traces the connections of given ApiClient
+        """
+        session = api_client.rest_client.pool_manager
+        self.trace_config.freeze()
+        session.trace_configs.append(self.trace_config)
+        self._connector = session.connector
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "created_connections": self.created_connections_count,
+            "reused_connections": self.reused_connections_count,
+            "waiting_requests": self.waiting_requests_count,
+            "waited_requests": self.waited_requests_count,
+            "total_wait_seconds": self.total_wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+        if self._connector is not None:
+            stats["limit"] = self._connector.limit
+            # aiohttp has no public API of the connections in use
+            stats["connections_in_use"] = len(getattr(self._connector, "_acquired", ()))
+        return stats
+
+
+def create_api_client(
+        pool_size: int,
+        metrics: ConnectionPoolMetrics = None,
+        configuration: kubernetes_asyncio.client.Configuration = None,
+) -> kubernetes_asyncio.client.ApiClient:
+    """
+    Creates an ApiClient of given connections pool size. Must be called
+    from a coroutine, as it creates its aiohttp session.
+    :param pool_size: max connections at once, 0 for no limit
+    :param metrics: if given, traces the ApiClient connections
+    :param configuration: of the cluster. If not given, using (a copy of)
+    the default one.
+    """
+    if pool_size < 0:
+        raise ValueError("Pool size must be 0 (no limit) or bigger")
+    if configuration is None:
+        configuration = kubernetes_asyncio.client.Configuration.get_default_copy()
+    configuration.connection_pool_maxsize = pool_size
+    api_client = kubernetes_asyncio.client.ApiClient(configuration)
+    if metrics:
+        metrics.instrument(api_client)
+    return api_client
@@ -0,0 +1,110 @@
+"""
+Debug HTTP server - serves the agent runtime stats (such as the memory
+accounting & the event loop lag) and triggers the profiler on demand.
+
+Endpoints:
+    GET /debug/stats - the stats of all the providers
+    GET /debug/stats/{name} - the stats of a single provider
+    POST /debug/profile/cpu?duration=30 - profiles the CPU, responds once done
+    POST /debug/profile/memory - starts tracing memory allocations, or writes
+    the allocations diff if already tracing
+    POST /debug/tasks - dumps the asyncio tasks
+"""
+import asyncio
+import logging
+from typing import Callable, Dict
+from aiohttp import web
+from profiler import Profiler
+
+DEBUG_PATH = "/debug"
+
+
+class DebugServer:
+    """
+    Debug HTTP server - see module docstring. Meant to be reached by a port
+    forward, hence listens on the loopback interface by default.
+    """
+
+    DEFAULT_HOST = "127.0.0.1"
+
+    def __init__(self, profiler: Profiler, port: int, host: str = DEFAULT_HOST):
+        """
+        :param profiler: to trigger
+        :param port: to listen on, 0 to pick a free port
+        :param host: to listen on
+        """
+        self.profiler = profiler
+        self.host = host
+        self.port = port
+        self._stats_providers: Dict[str, Callable[[], Dict]] = {}
+
+    def add_stats_provider(self, name: str, get_stats: Callable[[], Dict]):
+        """
+        Adds a stats provider, served by its name
+        """
+        self._stats_providers[name] = get_stats
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Gets the stats of all the providers
+        """
+        return {
+            name: get_stats() for name, get_stats in self._stats_providers.items()
+        }
+
+    async def _handle_stats(self, _request):
+        return web.json_response(self.get_stats())
+
+    async def _handle_provider_stats(self, request):
+        get_stats = self._stats_providers.get(request.match_info["name"])
+        if get_stats is None:
+            raise web.HTTPNotFound()
+        return web.json_response(get_stats())
+
+    async def _handle_profile_cpu(self, request):
+        try:
+            duration_seconds = float(request.query.get("duration", "0"))
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid duration") from None
+        output_path = await self.profiler.profile_cpu(duration_seconds or None)
+        if output_path is None:
+            return web.json_response({"error": "already profiling"}, status=409)
+        return web.json_response({"path": output_path})
+
+    async def _handle_profile_memory(self, _request):
+        output_path = self.profiler.snapshot_memory()
+        return web.json_response({
+            "path": output_path,
+            "is_tracing": output_path is None,
+        })
+
+    async def _handle_tasks(self, _request):
+        return web.json_response({"path": self.profiler.dump_tasks()})
+
+    def create_app(self) -> web.Application:
+        """ Creates the debug aiohttp application """
+        app = web.Application()
+        app.router.add_get(f"{DEBUG_PATH}/stats", self._handle_stats)
+        app.router.add_get(f"{DEBUG_PATH}/stats/{{name}}", self._handle_provider_stats)
+        app.router.add_post(f"{DEBUG_PATH}/profile/cpu", self._handle_profile_cpu)
+        app.router.add_post(f"{DEBUG_PATH}/profile/memory", self._handle_profile_memory)
+        app.router.add_post(f"{DEBUG_PATH}/tasks", self._handle_tasks)
+        return app
+
+    async def start(self):
+        """
+        Serves the debug endpoints, until cancelled.
+        """
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, self.host, self.port)
+            await site.start()
+            if not self.port:
+                self.port = site._server.sockets[0].getsockname()[1] # pylint: disable=protected-access
+            logging.info("Serving debug endpoints at %s:%d", self.host, self.port)
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await runner.cleanup()
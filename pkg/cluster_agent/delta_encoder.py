@@ -0,0 +1,176 @@
+"""
+Delta encoder - encodes watch MODIFIED events as JSON patches against the
+previously sent version of the watched object
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Tuple
+import json_patch
+from memory_accounting import estimate_items_size
+from kubernetes_event import (
+    KubernetesEvent,
+    WatchDeltaKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+
+
+@dataclass
+class _SentObject:
+    """ the last sent version of a watched object """
+    obj: Dict
+    deltas_count: int # deltas sent since the last full object
+    snapshot_time: float # monotonic time of the last full object
+
+
+class DeltaEncoder:
+    """
+    Encodes watch MODIFIED events as WatchDeltaKubernetesEvents - a JSON patch
+    against the previously sent version of the object (by its kind & uid).
+    The full object is sent on its first event, periodically (every
+    max_deltas deltas or snapshot_interval_seconds), once reset (e.g. after
+    a watch gap) and whenever the patch isn't smaller than the full object.
+    The encoded events must be sent in order - one batch in flight at a
+    time - and the sent objects must not be changed. Once encoded events
+    are lost (not sent), the encoder must be reset.
+    """
+
+    DEFAULT_MAX_DELTAS = 20
+    DEFAULT_SNAPSHOT_INTERVAL_SECONDS = 300
+    DEFAULT_MAX_OBJECTS = 100000
+
+    def __init__(
+            self,
+            max_deltas: int = DEFAULT_MAX_DELTAS,
+            snapshot_interval_seconds: float = DEFAULT_SNAPSHOT_INTERVAL_SECONDS,
+            max_objects: int = DEFAULT_MAX_OBJECTS,
+            excluded_kinds: Collection[str] = (),
+    ):
+        """
+        :param max_deltas: to send between full objects
+        :param snapshot_interval_seconds: max time between full objects
+        :param max_objects: count of sent objects to hold, the oldest is
+        dropped (and sent in full on its next event) once reached
+        :param excluded_kinds: of objects whose events are returned as is,
+        such as the kinds whose events might not be sent once encoded
+        """
+        if max_objects < 1:
+            raise ValueError("Invalid max objects value, must be > 0")
+        self.max_deltas = max_deltas
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.max_objects = max_objects
+        self.excluded_kinds = frozenset(excluded_kinds)
+        self._sent_objects: Dict[Tuple[Any, Any], _SentObject] = {}
+        self.full_events_count: int = 0
+        self.delta_events_count: int = 0
+        # serialized size of the sent deltas & of their full events
+        self.delta_bytes: int = 0
+        self.delta_full_bytes: int = 0
+
+    def reset(self, kind: str = None):
+        """
+        Drops the sent objects - their next events are sent in full.
+        :param kind: if given, drops only the objects of this kind
+        """
+        if kind is None:
+            self._sent_objects = {}
+            return
+        self._sent_objects = {
+            key: sent_object
+            for key, sent_object in self._sent_objects.items()
+            if key[0] != kind
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gets the encoder stats - sent events counts & the deltas size compared
+        to their full events size
+        """
+        return {
+            "full_events": self.full_events_count,
+            "delta_events": self.delta_events_count,
+            "delta_bytes": self.delta_bytes,
+            "delta_full_bytes": self.delta_full_bytes,
+            "delta_size_ratio": (
+                self.delta_bytes / self.delta_full_bytes
+                if self.delta_full_bytes else None
+            ),
+            "objects": len(self._sent_objects),
+        }
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the sent objects (sampled)
+        """
+        return estimate_items_size(
+            self._sent_objects.values(),
+            len(self._sent_objects)
+        )
+
+    def _encode_delta(
+            self,
+            event: WatchKubernetesEvent,
+            sent_object: _SentObject
+    ) -> KubernetesEvent:
+        """
+        Encodes the given MODIFIED event as a delta, if it's due and smaller
+        than the full event.
+        :return: the delta event, None if the full event should be sent
+        """
+        if (
+                sent_object.deltas_count >= self.max_deltas or
+                time.monotonic() - sent_object.snapshot_time >=
+                self.snapshot_interval_seconds
+        ):
+            return None
+        base_metadata = sent_object.obj.get("metadata") or {}
+        delta_event = WatchDeltaKubernetesEvent(
+            event.data,
+            base_metadata.get("resource_version"),
+            json_patch.diff(sent_object.obj, event.data)
+        )
+        delta_size = delta_event.get_serialized_size()
+        full_size = event.get_serialized_size()
+        if delta_size >= full_size:
+            return None
+        self.delta_events_count += 1
+        self.delta_bytes += delta_size
+        self.delta_full_bytes += full_size
+        return delta_event
+
+    def encode(self, event: KubernetesEvent) -> KubernetesEvent:
+        """
+        Encodes the given event - watch MODIFIED events are encoded as deltas
+        when possible, other events (and the events of the excluded kinds)
+        are returned as is.
+        """
+        if not isinstance(event, WatchKubernetesEvent) or not isinstance(event.data, dict):
+            return event
+        if event.data.get("kind") in self.excluded_kinds:
+            return event
+        uid = (event.data.get("metadata") or {}).get("uid")
+        if uid is None:
+            return event
+        key = (event.data.get("kind"), uid)
+        if event.watch_event_type == WatchKubernetesEventType.DELETED:
+            self._sent_objects.pop(key, None)
+            self.full_events_count += 1
+            return event
+
+        sent_object = self._sent_objects.get(key)
+        if (
+                sent_object is not None and
+                event.watch_event_type == WatchKubernetesEventType.MODIFIED
+        ):
+            delta_event = self._encode_delta(event, sent_object)
+            if delta_event is not None:
+                sent_object.obj = event.data
+                sent_object.deltas_count += 1
+                return delta_event
+
+        if sent_object is None and len(self._sent_objects) >= self.max_objects:
+            # drops the oldest sent object
+            del self._sent_objects[next(iter(self._sent_objects))]
+        self._sent_objects[key] = _SentObject(event.data, 0, time.monotonic())
+        self.full_events_count += 1
+        return event
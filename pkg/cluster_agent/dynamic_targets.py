@@ -0,0 +1,313 @@
+"""
+Dynamic watch targets - watches resources configured by their group,
+version & resource (GVR), such as CRDs and built-in kinds with no dedicated
+watch target. The resources are resolved by the apiserver discovery API, and
+listed & watched through the API client directly, with no generated client.
+"""
+import re
+import json
+import logging
+from dataclasses import dataclass
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import kubernetes_asyncio
+from kubernetes_asyncio.client.rest import ApiException
+from model_decoder import ModelDecoder
+
+# the watch return type of resources with no client model
+DYNAMIC_OBJECT_TYPE = "object"
+# default watch events per second of each resource, and its burst duration
+DEFAULT_EVENTS_RATE = 100
+EVENTS_BURST_SECONDS = 10
+# metadata fields whose list items are converted as the client models do
+_METADATA_OBJECT_LISTS = ("ownerReferences",)
+_CAMEL_CASE_PATTERN = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def _to_snake_case(name: str) -> str:
+    """ Converts the given camelCase name to snake_case """
+    return _CAMEL_CASE_PATTERN.sub("_", name).lower()
+
+
+def _to_camel_case(name: str) -> str:
+    """ Converts the given snake_case name to camelCase """
+    first, *rest = name.split("_")
+    return first + "".join(word.capitalize() for word in rest)
+
+
+def _convert_metadata(metadata: Dict) -> Dict:
+    """
+    Converts the given raw object metadata as the client models do - the
+    fields names to snake_case, keeping the labels & annotations keys
+    """
+    converted = {}
+    for key, value in metadata.items():
+        if key in _METADATA_OBJECT_LISTS and isinstance(value, list):
+            value = [
+                {_to_snake_case(item_key): item_value for item_key, item_value in item.items()}
+                for item in value
+            ]
+        converted[_to_snake_case(key)] = value
+    return converted
+
+
+@dataclass(frozen=True)
+class DynamicResource:
+    """ a configured resource to watch """
+    group: str # empty for the core group
+    version: str
+    resource: str # the plural resource name, such as `replicasets`
+    events_rate: Optional[float] = None # watch events per second, None for the default
+
+    @property
+    def group_version(self) -> str:
+        """ the resource API version, such as `apps/v1` or `v1` """
+        return f"{self.group}/{self.version}" if self.group else self.version
+
+    @property
+    def api_path(self) -> str:
+        """ the resource group version API path """
+        return f"/apis/{self.group_version}" if self.group else f"/api/{self.version}"
+
+    @property
+    def is_built_in(self) -> bool:
+        """ whether the resource is served by kubernetes, rather than a CRD """
+        return "." not in self.group or self.group.endswith(".k8s.io")
+
+    def __str__(self):
+        return f"{self.group_version}/{self.resource}"
+
+    @classmethod
+    def parse(cls, value: str) -> "DynamicResource":
+        """
+        Parses a resource by its `<group>/<version>/<resource>` (or
+        `<version>/<resource>` of the core group) name, optionally followed by
+        `=<events rate>` - for example `apps/v1/replicasets=50`
+        """
+        name, _, events_rate = value.strip().partition("=")
+        parts = name.strip().split("/")
+        if len(parts) == 2:
+            parts.insert(0, "")
+        if len(parts) != 3 or not all(parts[1:]):
+            raise ValueError(f"Invalid resource `{value}`, must be <group>/<version>/<resource>")
+        group, version, resource = parts
+        return cls(
+            group,
+            version,
+            resource,
+            events_rate=float(events_rate) if events_rate else None
+        )
+
+
+def parse_resources(value: str) -> List[DynamicResource]:
+    """
+    Parses the given comma separated resources (see DynamicResource.parse)
+    """
+    return [
+        DynamicResource.parse(resource) for resource in value.split(",") if resource.strip()
+    ]
+
+
+@dataclass(frozen=True)
+class DiscoveredResource:
+    """ a resource resolved by the apiserver discovery API """
+    resource: DynamicResource
+    kind: str
+    namespaced: bool
+
+    @property
+    def watch_return_type(self) -> str:
+        """
+        The watched object model type, such as `V1ReplicaSet`, or
+        DYNAMIC_OBJECT_TYPE if the client has no model of the resource (CRDs)
+        """
+        if not self.resource.is_built_in:
+            return DYNAMIC_OBJECT_TYPE
+        model_name = f"{self.resource.version.capitalize()}{self.kind}"
+        if hasattr(kubernetes_asyncio.client.models, model_name):
+            return model_name
+        return DYNAMIC_OBJECT_TYPE
+
+
+class DynamicObject:
+    """
+    A watched object of a resource with no client model - converted to a
+    dict as the models are by its metadata, the rest is kept as is
+    """
+
+    __slots__ = ("data", "kind")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.kind = data.get("kind")
+
+    def to_dict(self) -> Dict:
+        data = dict(self.data)
+        data["kind"] = self.kind
+        metadata = data.get("metadata")
+        if isinstance(metadata, dict):
+            data["metadata"] = _convert_metadata(metadata)
+        return data
+
+
+def deserialize_object(api_client, obj: Dict, return_type: str):
+    """
+    Deserializes the given raw watched object by its watch return type
+    """
+    if return_type == DYNAMIC_OBJECT_TYPE:
+        return DynamicObject(obj)
+    return api_client.deserialize(
+        response=SimpleNamespace(data=json.dumps(obj)),
+        response_type=return_type
+    )
+
+
+def decode_object(model_decoder: ModelDecoder, obj: Dict, return_type: str) -> Dict:
+    """
+    Decodes the given raw watched object by its watch return type, straight
+    to the dict its deserialized object converts to
+    """
+    if return_type == DYNAMIC_OBJECT_TYPE:
+        return DynamicObject(obj).to_dict()
+    return model_decoder.decode(obj, return_type)
+
+
+async def _get(api_client, path: str, query_params: List[Tuple[str, Any]] = None):
+    """
+    Sends a GET request of the given API path, and returns the response
+    without reading it, as the generated clients do with
+    `_preload_content=False`
+    """
+    response = await api_client.call_api(
+        path,
+        "GET",
+        query_params=query_params or [],
+        header_params={"Accept": "application/json"},
+        auth_settings=["BearerToken"],
+        _preload_content=False,
+    )
+    if not HTTPStatus.OK <= response.status < HTTPStatus.MULTIPLE_CHOICES:
+        try:
+            body = await response.read()
+        finally:
+            response.release()
+        raise ApiException(status=response.status, reason=body.decode("utf-8"))
+    return response
+
+
+async def _get_json(api_client, path: str) -> Dict:
+    """ Gets the JSON body of the given API path """
+    response = await _get(api_client, path)
+    try:
+        return json.loads(await response.read())
+    finally:
+        response.release()
+
+
+async def discover_resources(
+        api_client,
+        resources: Iterable[DynamicResource]
+) -> List[DiscoveredResource]:
+    """
+    Resolves the given resources kinds & scopes by the apiserver discovery
+    API - a single request per group version. Resources which aren't served
+    (such as CRDs which aren't installed) or can't be watched are skipped.
+    """
+    resources_by_api_path: Dict[str, List[DynamicResource]] = {}
+    for resource in resources:
+        resources_by_api_path.setdefault(resource.api_path, []).append(resource)
+    discovered_resources = []
+    for api_path, group_resources in resources_by_api_path.items():
+        group_version = group_resources[0].group_version
+        try:
+            resource_list = await _get_json(api_client, api_path)
+        except ApiException as exception:
+            if exception.status != HTTPStatus.NOT_FOUND:
+                raise
+            logging.warning("%s is not served, skipping its resources", group_version)
+            continue
+        api_resources = {
+            api_resource["name"]: api_resource
+            for api_resource in resource_list.get("resources", [])
+        }
+        for resource in group_resources:
+            api_resource = api_resources.get(resource.resource)
+            if api_resource is None:
+                logging.warning("%s is not served, skipping", resource)
+                continue
+            if not {"list", "watch"}.issubset(api_resource.get("verbs", [])):
+                logging.warning("%s can't be watched, skipping", resource)
+                continue
+            discovered_resources.append(
+                DiscoveredResource(
+                    resource,
+                    api_resource["kind"],
+                    bool(api_resource.get("namespaced")),
+                )
+            )
+    return discovered_resources
+
+
+class DynamicListEndpoint:
+    """
+    A list endpoint of a discovered resource - called as the generated
+    clients list endpoints are, by the cluster discovery & the kubernetes
+    client watch. Lists return SimpleNamespace responses, of the resource
+    model items or of DynamicObject items if it has no model.
+    """
+
+    def __init__(self, api_client, resource: DiscoveredResource, namespace: str = None):
+        """
+        :param api_client: the ApiClient of the cluster
+        :param resource: to list & watch
+        :param namespace: if given, lists the (namespaced) resource in this
+        namespace only
+        """
+        self.api_client = api_client
+        self.resource = resource
+        self.namespace = namespace
+        path = resource.resource.api_path
+        if namespace is not None:
+            path += f"/namespaces/{namespace}"
+        self.path = f"{path}/{resource.resource.resource}"
+
+    def deserialize_list(self, body: str) -> SimpleNamespace:
+        """
+        Deserializes the given raw list response
+        """
+        response = json.loads(body)
+        api_version = self.resource.resource.group_version
+        return_type = self.resource.watch_return_type
+        items = []
+        for item in response.get("items") or []:
+            # list items have no kind & API version
+            item.setdefault("apiVersion", api_version)
+            item.setdefault("kind", self.resource.kind)
+            items.append(deserialize_object(self.api_client, item, return_type))
+        metadata = response.get("metadata") or {}
+        return SimpleNamespace(
+            items=items,
+            metadata=SimpleNamespace(resource_version=metadata.get("resourceVersion"))
+        )
+
+    async def __call__(self, _preload_content: bool = True, **kwargs):
+        """
+        Lists the resource, or watches it if `watch=True`
+        :param _preload_content: if False, returns the response without
+        reading it
+        :param kwargs: the query params, such as `resource_version`
+        """
+        query_params = [
+            (_to_camel_case(key), value)
+            for key, value in kwargs.items()
+            if value is not None and not key.startswith("_")
+        ]
+        response = await _get(self.api_client, self.path, query_params)
+        if not _preload_content:
+            return response
+        try:
+            body = (await response.read()).decode("utf-8")
+        finally:
+            response.release()
+        return self.deserialize_list(body)
@@ -1,8 +1,17 @@
 """
 Common json encoders
 """
+import json
 from datetime import datetime
 from json import JSONEncoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 
 class DateTimeEncoder(JSONEncoder):
@@ -15,3 +24,118 @@ class DateTimeEncoder(JSONEncoder):
         if isinstance(o, datetime):
             return str(o)
         return super(DateTimeEncoder, self).default(o)
+
+
+class JsonSerializerException(Exception):
+    pass
+
+
+def _default(o):
+    """
+    Serializes types which aren't natively supported by the JSON backends
+    """
+    if isinstance(o, datetime):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _dumps_orjson(obj, sort_keys: bool = False) -> bytes:
+    """ Serializes using orjson """
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+def _dumps_ujson(obj, sort_keys: bool = False) -> bytes:
+    """ Serializes using ujson """
+    return ujson.dumps(
+        obj,
+        ensure_ascii=False,
+        escape_forward_slashes=False,
+        sort_keys=sort_keys,
+        default=_default
+    ).encode("utf-8")
+
+
+def _dumps_json(obj, sort_keys: bool = False) -> bytes:
+    """ Serializes using the standard library json module """
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        default=_default
+    ).encode("utf-8")
+
+
+class JsonSerializer:
+    """
+    Serializes objects to compact UTF-8 JSON bytes, using the fastest
+    available JSON backend (orjson, then ujson, then the standard library).
+    All the backends produce the same output for kubernetes objects data -
+    strings, integers, booleans, nulls, lists, dicts & datetimes (serialized
+    as `str(datetime)`). Floats in exponent notation are backend specific.
+    """
+
+    DUMPS_FUNCTIONS = {
+        "orjson": _dumps_orjson,
+        "ujson": _dumps_ujson,
+        "json": _dumps_json,
+    }
+
+    def __init__(self, backend: str = None):
+        """
+        :param backend: JSON backend name, see DUMPS_FUNCTIONS. Defaults to
+        the fastest available backend.
+        """
+        available_backends = get_available_backends()
+        if backend is None:
+            backend = available_backends[0]
+        if backend not in self.DUMPS_FUNCTIONS:
+            raise JsonSerializerException(f"Unknown JSON backend `{backend}`")
+        if backend not in available_backends:
+            raise JsonSerializerException(f"JSON backend `{backend}` is not installed")
+        self.backend = backend
+        self.dumps = self.DUMPS_FUNCTIONS[backend]
+
+
+def get_available_backends():
+    """
+    Gets the installed JSON backends, fastest first
+    """
+    return tuple(
+        backend for backend, module in (
+            ("orjson", orjson),
+            ("ujson", ujson),
+            ("json", json),
+        )
+        if module is not None
+    )
+
+
+_SERIALIZER = JsonSerializer()
+
+
+def set_json_backend(backend: str = None):
+    """
+    Sets the JSON backend used by `dumps`, see JsonSerializer
+    """
+    global _SERIALIZER  # pylint: disable=global-statement
+    _SERIALIZER = JsonSerializer(backend)
+
+
+def get_json_backend() -> str:
+    """
+    Gets the JSON backend used by `dumps`
+    """
+    return _SERIALIZER.backend
+
+
+def dumps(obj, sort_keys: bool = False) -> bytes:
+    """
+    Serializes the given object to compact UTF-8 JSON bytes
+    :param sort_keys: whether to sort the dicts keys, for an output which
+    doesn't depend on the dicts keys order
+    """
+    return _SERIALIZER.dumps(obj, sort_keys=sort_keys)
@@ -10,6 +10,16 @@ class EpsagonClientException(Exception):
     pass
 
 
+async def _is_final_response(response) -> bool:
+    """
+    Returns whether the given response shouldn't be retried - it succeeded,
+    or it's a conflict, which the caller resolves rather than a retry
+    """
+    return response.status < HTTPStatus.BAD_REQUEST or (
+        response.status == HTTPStatus.CONFLICT
+    )
+
+
 class EpsagonClient:
     """
     Async Epsagon client
@@ -27,17 +37,20 @@ class EpsagonClient:
         if not epsagon_token:
             raise ValueError("Epsagon token must be given")
         self.epsagon_token = epsagon_token
+        # error responses are retried by their status, rather than raised
+        # (see post) - a raised ClientResponseError would be retried as
+        # any other ClientError
         retry_options = ExponentialRetry(
             attempts=retry_attempts,
-            exceptions=(ClientError,)
+            exceptions={ClientError},
+            evaluate_response_callback=_is_final_response
         )
         self.client = RetryClient(
             auth=BasicAuth(login=self.epsagon_token),
             headers={
                 "Content-Type": "application/json",
             },
-            retry_options=retry_options,
-            raise_for_status=True
+            retry_options=retry_options
         )
         return self
 
@@ -46,10 +59,11 @@ class EpsagonClient:
         Posts data to Epsagon given url.
         :param url: endpoint to post the data to
         :param data: to send
+        Raises ClientResponseError if the final response has an error
         HTTP status code.
         """
-        async with self.client.post(url, data=data):
-            pass
+        async with self.client.post(url, data=data) as response:
+            response.raise_for_status()
 
     async def close(self):
         """
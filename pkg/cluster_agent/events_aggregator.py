@@ -0,0 +1,239 @@
+"""
+Kubernetes (core/v1) Events aggregator - collapses repeated Event updates and
+rate limits noisy Events
+"""
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Tuple
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+from memory_accounting import estimate_items_size
+from rate_limiter import KeyedTokenBuckets
+
+EVENT_KIND = "Event"
+
+
+@dataclass
+class _EventWindow:
+    """ the collapse window of an Event key """
+    start_time: float # monotonic
+    pending_event: WatchKubernetesEvent = None # latest collapsed update
+
+
+class EventsAggregator:
+    """
+    Aggregates the core/v1 Event watch events, written to the given event
+    handler. Other events are written as is.
+    - Collapse: updates of the same Event key (involved object, reason & type)
+    within a window are collapsed - the first update is written right away,
+    and the latest of the following updates is written once the window ends.
+    - Rate limit: Events are rate limited per namespace and per reason, using
+    token buckets. Events over the limits are suppressed.
+    - Summary: the collapsed & suppressed Events counts are periodically
+    written as an events summary event.
+    Event deletions are neither collapsed nor rate limited - they're written
+    right away, and drop the pending update of the deleted Event.
+    See start - must run for collapsed Events to be written.
+    """
+
+    DEFAULT_WINDOW_SECONDS = 10
+    DEFAULT_NAMESPACE_RATE = 20
+    DEFAULT_NAMESPACE_BURST = 200
+    DEFAULT_REASON_RATE = 50
+    DEFAULT_REASON_BURST = 500
+    DEFAULT_SUMMARY_INTERVAL_SECONDS = 60
+
+    def __init__(
+            self,
+            event_handler,
+            window_seconds: float = DEFAULT_WINDOW_SECONDS,
+            namespace_rate: float = DEFAULT_NAMESPACE_RATE,
+            namespace_burst: float = DEFAULT_NAMESPACE_BURST,
+            reason_rate: float = DEFAULT_REASON_RATE,
+            reason_burst: float = DEFAULT_REASON_BURST,
+            summary_interval_seconds: float = DEFAULT_SUMMARY_INTERVAL_SECONDS,
+    ):
+        """
+        :param event_handler: to write the aggregated events to
+        :param window_seconds: to collapse Event updates in
+        :param namespace_rate: Events per second allowed per namespace
+        :param namespace_burst: Events burst allowed per namespace
+        :param reason_rate: Events per second allowed per reason
+        :param reason_burst: Events burst allowed per reason
+        :param summary_interval_seconds: between events summaries
+        """
+        if window_seconds <= 0:
+            raise ValueError("Invalid window seconds value, must be > 0")
+        self.event_handler = event_handler
+        self.window_seconds = window_seconds
+        self.summary_interval_seconds = summary_interval_seconds
+        self._namespace_buckets = KeyedTokenBuckets(namespace_rate, namespace_burst)
+        self._reason_buckets = KeyedTokenBuckets(reason_rate, reason_burst)
+        self._windows: Dict[Hashable, _EventWindow] = {}
+        self.collapsed_events_count: int = 0
+        self._suppressed_events: Dict[Tuple[Any, Any], int] = defaultdict(int)
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the collapse windows & their pending
+        Events (sampled)
+        """
+        return estimate_items_size(self._windows.items(), len(self._windows))
+
+    @staticmethod
+    def is_event(event: KubernetesEvent) -> bool:
+        """
+        Returns whether the given event is a core/v1 Event watch event
+        """
+        return (
+            isinstance(event, WatchKubernetesEvent) and
+            isinstance(event.data, dict) and
+            event.data.get("kind") == EVENT_KIND
+        )
+
+    @staticmethod
+    def _get_key(data: Dict) -> Hashable:
+        """
+        Gets the collapse key of given Event object - its involved object,
+        reason & type
+        """
+        involved_object = data.get("involved_object") or {}
+        involved_object_key = involved_object.get("uid") or (
+            involved_object.get("kind"),
+            involved_object.get("namespace"),
+            involved_object.get("name"),
+        )
+        return (involved_object_key, data.get("reason"), data.get("type"))
+
+    @staticmethod
+    def _get_object_key(data: Dict) -> Hashable:
+        """
+        Gets the key of given Event object itself - its uid, or its namespace
+        & name
+        """
+        metadata = data.get("metadata") or {}
+        return metadata.get("uid") or (metadata.get("namespace"), metadata.get("name"))
+
+    async def _write_deleted(self, event: WatchKubernetesEvent):
+        """
+        Writes the given Event deletion, ends its key window - the pending
+        update is dropped if it's of the deleted Event, otherwise written
+        """
+        window = self._windows.pop(self._get_key(event.data), None)
+        if window is not None and window.pending_event is not None:
+            pending_key = self._get_object_key(window.pending_event.data)
+            if pending_key != self._get_object_key(event.data):
+                await self._write_limited(window.pending_event)
+        await self.event_handler(event)
+
+    async def _write_limited(self, event: WatchKubernetesEvent):
+        """
+        Writes the given Event watch event, unless it's over the rate limits
+        """
+        namespace = (event.data.get("metadata") or {}).get("namespace")
+        reason = event.data.get("reason")
+        namespace_bucket = self._namespace_buckets.get(namespace)
+        reason_bucket = self._reason_buckets.get(reason)
+        if namespace_bucket.get_tokens() < 1 or reason_bucket.get_tokens() < 1:
+            self._suppressed_events[(namespace, reason)] += 1
+            return
+        namespace_bucket.try_acquire()
+        reason_bucket.try_acquire()
+        await self.event_handler(event)
+
+    async def write_event(self, event: KubernetesEvent):
+        """
+        Writes an event - aggregates core/v1 Event watch events
+        """
+        if not self.is_event(event):
+            await self.event_handler(event)
+            return
+        if event.watch_event_type == WatchKubernetesEventType.DELETED:
+            await self._write_deleted(event)
+            return
+        key = self._get_key(event.data)
+        window = self._windows.get(key)
+        now = time.monotonic()
+        if window is not None and now - window.start_time < self.window_seconds:
+            if window.pending_event is not None:
+                self.collapsed_events_count += 1
+            window.pending_event = event
+            return
+        if window is not None and window.pending_event is not None:
+            await self._write_limited(window.pending_event)
+        self._windows[key] = _EventWindow(now)
+        await self._write_limited(event)
+
+    async def flush(self, should_flush_all: bool = False):
+        """
+        Writes the pending Events of the ended windows
+        :param should_flush_all: if set, ends all the windows
+        """
+        now = time.monotonic()
+        ended_keys = [
+            key for key, window in self._windows.items()
+            if should_flush_all or now - window.start_time >= self.window_seconds
+        ]
+        for key in ended_keys:
+            window = self._windows.pop(key)
+            if window.pending_event is not None:
+                await self._write_limited(window.pending_event)
+
+    def _create_summary_event(self) -> KubernetesEvent:
+        """
+        Creates an events summary event of the collapsed & suppressed Events
+        since the last summary, and resets the counts.
+        :return: the summary event, None if no Events were collapsed or
+        suppressed
+        """
+        if not self.collapsed_events_count and not self._suppressed_events:
+            return None
+        summary_event = KubernetesEvent(
+            KubernetesEventType.EVENTS_SUMMARY,
+            {
+                "window_seconds": self.window_seconds,
+                "collapsed_events": self.collapsed_events_count,
+                "suppressed_events": [
+                    {"namespace": namespace, "reason": reason, "count": count}
+                    for (namespace, reason), count in self._suppressed_events.items()
+                ],
+            }
+        )
+        self.collapsed_events_count = 0
+        self._suppressed_events = defaultdict(int)
+        return summary_event
+
+    async def write_summary(self):
+        """
+        Writes an events summary event, if any Events were collapsed or
+        suppressed since the last summary
+        """
+        summary_event = self._create_summary_event()
+        if summary_event is not None:
+            logging.debug("Events summary: %s", summary_event.data)
+            await self.event_handler(summary_event)
+
+    async def start(self):
+        """
+        Periodically writes the collapsed Events & the events summary, until
+        cancelled. Once cancelled, writes all the pending Events and a last
+        summary.
+        """
+        last_summary_time = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(self.window_seconds / 2)
+                await self.flush()
+                if time.monotonic() - last_summary_time >= self.summary_interval_seconds:
+                    await self.write_summary()
+                    last_summary_time = time.monotonic()
+        except asyncio.CancelledError:
+            await self.flush(should_flush_all=True)
+            await self.write_summary()
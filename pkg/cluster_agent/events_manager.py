@@ -2,10 +2,13 @@
 Events managers module
 """
 import abc
+import zlib
 import logging
 from asyncio import Queue, wait_for, TimeoutError
-from typing import List
-from kubernetes_event import KubernetesEvent
+from collections import deque
+from typing import Deque, List, Tuple
+from kubernetes_event import KubernetesEvent, SerializedKubernetesEvent
+from memory_accounting import estimate_items_size
 
 
 class EventsManager(abc.ABC):
@@ -22,6 +25,13 @@ class EventsManager(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def size(self) -> int:
+        """
+        Returns the number of unread events
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     async def write_event(self, event: KubernetesEvent):
         """
@@ -81,20 +91,135 @@ class EventsManager(abc.ABC):
 
 class InMemoryEventsManager(EventsManager):
     """
-    Im memory events manager
+    Im memory events manager.
+    Optionally saves memory when the events backlog grows - once there are
+    compression_threshold unread events, new events are stored serialized and
+    compressed, in chunks of compression_chunk_size events. Events are
+    decompressed, as SerializedKubernetesEvents, only once read.
     """
 
-    def __init__(self, *args, **kwargs):
+    DEFAULT_COMPRESSION_CHUNK_SIZE = 1000
+    COMPRESSION_LEVEL = 1
+    # compact JSON never contains a raw new line
+    SERIALIZED_EVENTS_SEPARATOR = b"\n"
+
+    def __init__(
+            self,
+            *args,
+            compression_threshold: int = None,
+            compression_chunk_size: int = DEFAULT_COMPRESSION_CHUNK_SIZE,
+            **kwargs
+    ):
+        """
+        :param compression_threshold: unread events count to start compressing
+        events at. If not given, events are never compressed.
+        :param compression_chunk_size: events count to compress together
+        """
         super().__init__(*args, **kwargs)
+        if compression_threshold is not None and compression_threshold < 1:
+            raise ValueError("Invalid compression threshold value, must be > 0")
+        if compression_chunk_size < 1:
+            raise ValueError("Invalid compression chunk size value, must be > 0")
+        self.compression_threshold = compression_threshold
+        self.compression_chunk_size = compression_chunk_size
         self.events_queue = Queue()
+        self._init_backlog()
+
+    def _init_backlog(self):
+        """
+        Initializes the compressed events backlog
+        """
+        # compressed chunks of serialized events, oldest first
+        self._compressed_chunks: Deque[Tuple[int, bytes]] = deque()
+        # serialized events, not yet compressed
+        self._pending_events: List[bytes] = []
+        self._backlog_size = 0
 
     def is_empty(self) -> bool:
-        return self.events_queue.empty()
+        return self.size() == 0
+
+    def size(self) -> int:
+        return self.events_queue.qsize() + self._backlog_size
+
+    def get_backlog_stats(self) -> Tuple[int, int]:
+        """
+        Gets the compressed events backlog stats
+        :return: a tuple of the backlog events count & the backlog size in
+        bytes (compressed chunks and pending serialized events)
+        """
+        return (
+            self._backlog_size,
+            sum(len(chunk) for _, chunk in self._compressed_chunks) +
+            sum(len(event) for event in self._pending_events)
+        )
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the unread events - the queued events
+        (sampled) and the compressed events backlog
+        """
+        queued_events = self.events_queue._queue # pylint: disable=protected-access
+        return (
+            estimate_items_size(queued_events, len(queued_events)) +
+            self.get_backlog_stats()[1]
+        )
+
+    def _should_compress(self) -> bool:
+        """
+        Returns whether a written event should be added to the backlog
+        """
+        if self.compression_threshold is None:
+            return False
+        return (
+            self._backlog_size > 0 or
+            self.events_queue.qsize() >= self.compression_threshold
+        )
+
+    def _compress_pending_events(self):
+        """
+        Compresses the pending serialized events into a chunk
+        """
+        self._compressed_chunks.append((
+            len(self._pending_events),
+            zlib.compress(
+                self.SERIALIZED_EVENTS_SEPARATOR.join(self._pending_events),
+                self.COMPRESSION_LEVEL
+            )
+        ))
+        self._pending_events = []
+
+    def _restore_backlog_events(self):
+        """
+        Moves the oldest backlog events (a compressed chunk, or the pending
+        events) to the events queue
+        """
+        if self._compressed_chunks:
+            events_count, chunk = self._compressed_chunks.popleft()
+            serialized_events = zlib.decompress(chunk).split(
+                self.SERIALIZED_EVENTS_SEPARATOR
+            )
+        else:
+            events_count = len(self._pending_events)
+            serialized_events = self._pending_events
+            self._pending_events = []
+        self._backlog_size -= events_count
+        for serialized_event in serialized_events:
+            self.events_queue.put_nowait(
+                SerializedKubernetesEvent(serialized_event)
+            )
 
     async def write_event(self, event: KubernetesEvent):
-        await self.events_queue.put(event)
+        if not self._should_compress():
+            await self.events_queue.put(event)
+            return
+        self._pending_events.append(event.serialize())
+        self._backlog_size += 1
+        if len(self._pending_events) >= self.compression_chunk_size:
+            self._compress_pending_events()
 
     async def get_event(self) -> KubernetesEvent:
+        if self.events_queue.empty() and self._backlog_size > 0:
+            self._restore_backlog_events()
         return await self.events_queue.get()
 
     def clean(self):
@@ -102,3 +227,4 @@ class InMemoryEventsManager(EventsManager):
         Cleans all events.
         """
         self.events_queue = Queue()
+        self._init_backlog()
@@ -4,24 +4,100 @@ Kubernetes Events sender
 import json
 import base64
 import zlib
+import logging
+from http import HTTPStatus
 from typing import List
-from encoders import DateTimeEncoder
+from aiohttp.client_exceptions import ClientResponseError
 from kubernetes_event import KubernetesEvent
+from rate_limiter import BandwidthLimiter
+from templates import TemplateEncoder
+
+
+def _compress(data: bytes) -> str:
+    """
+    Compresses & base64 encodes the given data
+    """
+    return base64.b64encode(zlib.compress(data)).decode("utf-8")
+
 
 class EventsSender:
     """
     Events sender
     """
 
-    def __init__(self, client, url, cluster_name, epsagon_token):
+    def __init__(
+            self,
+            client,
+            url,
+            cluster_name,
+            epsagon_token,
+            template_encoder: TemplateEncoder = None,
+            bandwidth_limiter: BandwidthLimiter = None
+    ):
         """
         :param client: used to send events by
         :param url: to send the events to
+        :param template_encoder: if given, events are sent with their large
+        repeated sub-documents replaced by template references
+        :param bandwidth_limiter: if given, each request waits for the
+        limiter before being sent
         """
         self.client = client
         self.url = url
         self.epsagon_token = epsagon_token
         self.cluster_name = cluster_name
+        self.template_encoder = template_encoder
+        self.bandwidth_limiter = bandwidth_limiter
+
+    @staticmethod
+    def serialize_events(events: List[KubernetesEvent]) -> bytes:
+        """
+        Serializes the given events to a JSON array - same as dumping the
+        events dicts list, by joining the events serialized fragments.
+        """
+        return b"[" + b",".join(event.serialize() for event in events) + b"]"
+
+    async def _post(self, data_to_send: dict):
+        """
+        Posts the given data, once the bandwidth limiter allows it
+        """
+        body = json.dumps(data_to_send)
+        if self.bandwidth_limiter:
+            # json.dumps escapes non ascii chars, hence its length is in bytes
+            await self.bandwidth_limiter.acquire(len(body))
+        await self.client.post(self.url, body)
+
+    async def _send_templated_events(
+            self,
+            events: List[KubernetesEvent],
+            is_resend: bool = False
+    ):
+        """
+        Sends the given events with template references, and the templates
+        bodies which weren't sent in the current session.
+        If the collector doesn't know the session templates, resends the
+        events in a new session.
+        """
+        session_id, events_json, templates_json, template_hashes = (
+            self.template_encoder.encode_events(events)
+        )
+        data_to_send = {
+            "epsagon_token": self.epsagon_token,
+            "cluster_name": self.cluster_name,
+            "data": _compress(events_json),
+            "templates_session": session_id,
+            "templates": _compress(templates_json),
+        }
+        try:
+            await self._post(data_to_send)
+        except ClientResponseError as exception:
+            if exception.status != HTTPStatus.CONFLICT or is_resend:
+                raise
+            logging.debug("Unknown templates session, starting a new session")
+            self.template_encoder.reset_session(session_id)
+            await self._send_templated_events(events, is_resend=True)
+            return
+        self.template_encoder.mark_sent(session_id, template_hashes)
 
     async def send_events(self, events: List[KubernetesEvent]):
         """
@@ -30,15 +106,14 @@ class EventsSender:
         if not events:
             return
 
-        events = [event.to_dict() for event in events]
-        events_json = json.dumps(events, cls=DateTimeEncoder)
-        compressed_data = base64.b64encode(
-            zlib.compress(events_json.encode("utf-8"))
-        ).decode("utf-8")
+        if self.template_encoder:
+            await self._send_templated_events(events)
+            return
+
         data_to_send = {
             "epsagon_token": self.epsagon_token,
             "cluster_name": self.cluster_name,
-            "data": compressed_data,
+            "data": _compress(self.serialize_events(events)),
         }
 
-        await self.client.post(self.url, json.dumps(data_to_send))
+        await self._post(data_to_send)
@@ -1,11 +1,15 @@
 """
 KubernetesEvent forwarder
 """
+import time
 import asyncio
-from typing import List, Set
+import logging
+from itertools import chain
+from typing import Dict, List, Set, Tuple
 from kubernetes_event import KubernetesEvent
 from events_manager import EventsManager
 from events_sender import EventsSender
+from memory_accounting import estimate_items_size
 
 
 class Forwarder:
@@ -15,6 +19,7 @@ class Forwarder:
     DEFAULT_MAX_WORKERS = 5
     DEFAULT_MAX_EVENTS_TO_READ = 100
     DEFAULT_GET_EVENTS_TIMEOUT = 1
+    DEFAULT_DRAIN_MAX_EVENTS_TO_READ = 1000
 
     def __init__(
             self,
@@ -31,13 +36,43 @@ class Forwarder:
         """
         self.events_manager = events_manager
         self.events_sender = events_sender
+        self.set_max_workers(max_workers)
+        self.set_max_events_to_read(max_events_to_read)
+        self.running_workers: Set[asyncio.Task] = set()
+        self.in_flight_events_count: int = 0
+        # the events lists of the running workers, by their id
+        self._in_flight_batches: Dict[int, List[KubernetesEvent]] = {}
+        self.sent_events_count: int = 0
+        self.is_draining: bool = False
+        self._unforwarded_events: List[KubernetesEvent] = []
+        self._start_task: asyncio.Task = None
+
+    def set_max_workers(self, max_workers: int):
+        """
+        Sets the max workers count. Can be changed while the forwarder runs,
+        takes effect on the next forwarded events.
+        """
         if max_workers < 1:
             raise ValueError("Invalid workers count value, must be > 0")
         self.max_workers_count: int = max_workers
+
+    def set_max_events_to_read(self, max_events_to_read: int):
+        """
+        Sets the max events to read. Can be changed while the forwarder runs,
+        takes effect on the next read.
+        """
         if max_events_to_read < 1:
             raise ValueError("Invalid max events to read value, must be > 0")
         self.max_events_to_read: int = max_events_to_read
-        self.running_workers: Set[asyncio.Task] = set()
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the in-flight events batches (sampled)
+        """
+        return estimate_items_size(
+            chain.from_iterable(self._in_flight_batches.values()),
+            sum(len(events) for events in self._in_flight_batches.values())
+        )
 
     async def _forward_events(self, events: List[KubernetesEvent]):
         """
@@ -45,8 +80,22 @@ class Forwarder:
         """
         try:
             await self.events_sender.send_events(events)
+            self.sent_events_count += len(events)
         except asyncio.CancelledError:
             pass
+        finally:
+            self.in_flight_events_count -= len(events)
+            self._in_flight_batches.pop(id(events), None)
+
+    def _add_worker(self, events: List[KubernetesEvent]):
+        """
+        Adds a worker which forwards the given events list
+        """
+        self.in_flight_events_count += len(events)
+        self._in_flight_batches[id(events)] = events
+        self.running_workers.add(asyncio.create_task(
+            self._forward_events(events)
+        ))
 
     def _stop_all_workers(self):
         """
@@ -58,6 +107,8 @@ class Forwarder:
             elif not worker.cancelled():
                 worker.exception()
         self.running_workers = set()
+        # workers cancelled before they started don't release their batch
+        self._in_flight_batches = {}
 
     def _check_failed_workers(self, workers):
         """
@@ -70,6 +121,14 @@ class Forwarder:
                 self._stop_all_workers()
                 raise task_exception
 
+    def _log_failed_workers(self, workers):
+        """
+        Logs the finished workers errors, if any
+        """
+        for task in workers:
+            if not task.cancelled() and task.exception():
+                logging.error("Failed to forward events: %s", task.exception())
+
     def _get_finished_workers(self):
         """
         Gets the running workers tasks
@@ -82,29 +141,101 @@ class Forwarder:
         at each iteration using the events_manager, and sends them using the
         events_sender.
         """
+        self._start_task = asyncio.current_task()
+        events: List[KubernetesEvent] = []
         try:
-            while True:
-                events: List[KubernetesEvent] = await self.events_manager.get_events(
+            while not self.is_draining:
+                events = await self.events_manager.get_events(
                     self.max_events_to_read,
                     timeout=self.DEFAULT_GET_EVENTS_TIMEOUT
                 )
                 self._check_failed_workers(self._get_finished_workers())
                 if not events:
                     continue
-                if len(self.running_workers) < self.max_workers_count:
-                    self.running_workers.add(asyncio.create_task(
-                        self._forward_events(events)
-                    ))
-                else:
+                # max workers count might have been decreased while running
+                while len(self.running_workers) >= self.max_workers_count:
                     finished, unfinished = await asyncio.wait(
                         self.running_workers,
                         return_when=asyncio.FIRST_COMPLETED
                     )
                     self._check_failed_workers(finished)
                     self.running_workers = unfinished
-                    self.running_workers.add(asyncio.create_task(
-                        self._forward_events(events)
-                    ))
+                self._add_worker(events)
+                events = []
         except asyncio.CancelledError:
-            self._stop_all_workers()
+            if not self.is_draining:
+                self._stop_all_workers()
+            else:
+                # already read events are forwarded as well while draining
+                self._unforwarded_events = events
+
+    async def _flush(self, max_events_to_read: int):
+        """
+        Sends all the queued events and waits for all the workers to finish.
+        """
+        events, self._unforwarded_events = self._unforwarded_events, []
+        while events or not self.events_manager.is_empty():
+            if not events:
+                events = await self.events_manager.get_events(max_events_to_read)
+            while len(self.running_workers) >= self.max_workers_count:
+                finished, self.running_workers = await asyncio.wait(
+                    self.running_workers,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                self._log_failed_workers(finished)
+            self._add_worker(events)
+            events = []
+        if self.running_workers:
+            finished, self.running_workers = await asyncio.wait(
+                self.running_workers
+            )
+            self._log_failed_workers(finished)
+
+    async def drain(
+            self,
+            timeout: float,
+            max_events_to_read: int = DEFAULT_DRAIN_MAX_EVENTS_TO_READ
+    ) -> Tuple[int, int]:
+        """
+        Drains the forwarder - stops the forwarder from reading new events,
+        then sends all the queued events and waits for the in-flight events,
+        up to the given timeout.
+        Should be called once no more events are written to the events_manager.
+        :param timeout: in seconds, to drain the forwarder
+        :param max_events_to_read: batch size to send the queued events by
+        :return: a tuple of the flushed & lost events count
+        """
+        self.is_draining = True
+        deadline = time.monotonic() + timeout
+        if self._start_task and not self._start_task.done():
+            # let the start loop finish its current read - cancelling a read
+            # might lose an already read event
+            await asyncio.wait(
+                [self._start_task],
+                timeout=min(self.DEFAULT_GET_EVENTS_TIMEOUT * 2, timeout)
+            )
+        if self._start_task and not self._start_task.done():
+            self._start_task.cancel()
+            await asyncio.wait([self._start_task])
+        pending_events_count = (
+            self.in_flight_events_count +
+            len(self._unforwarded_events) +
+            self.events_manager.size()
+        )
+        sent_events_count = self.sent_events_count
+        try:
+            await asyncio.wait_for(
+                self._flush(max_events_to_read),
+                max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            logging.warning("Timed out while draining events")
+        except Exception: # pylint: disable=broad-except
+            logging.exception("Failed to drain events")
+        self._stop_all_workers()
+        flushed_events_count = self.sent_events_count - sent_events_count
+        return (
+            flushed_events_count,
+            max(pending_events_count - flushed_events_count, 0)
+        )
 
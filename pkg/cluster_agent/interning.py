@@ -0,0 +1,139 @@
+"""
+Interning - dedups repeated strings & sub-structures of kubernetes objects
+"""
+import sys
+from datetime import datetime
+from typing import Any, Dict, Hashable
+from memory_accounting import estimate_items_size
+
+# immutable leaf value types, compared by value
+SCALAR_TYPES = (str, int, float, bool, type(None), datetime)
+
+
+class Interner:
+    """
+    Interns kubernetes objects dicts (model `to_dict()` output, or parsed raw
+    JSON) - short strings are interned, and identical small dicts & lists
+    (such as tolerations, labels, security contexts or resources blocks) are
+    shared between all the interned objects.
+    Structures are shared bottom-up - a dict or list is shared only if all of
+    its items are scalars or shared structures themselves.
+    Interned objects share their sub-structures, hence must not be changed.
+    """
+
+    DEFAULT_MAX_STRING_LENGTH = 64
+    DEFAULT_MAX_SHARED_ITEMS = 32
+    DEFAULT_MAX_SHARED_STRUCTURES = 100000
+
+    def __init__(
+            self,
+            max_string_length: int = DEFAULT_MAX_STRING_LENGTH,
+            max_shared_items: int = DEFAULT_MAX_SHARED_ITEMS,
+            max_shared_structures: int = DEFAULT_MAX_SHARED_STRUCTURES,
+    ):
+        """
+        :param max_string_length: of strings to intern
+        :param max_shared_items: max items count of a dict/list to share
+        :param max_shared_structures: max shared structures to hold. Once
+        reached, all the held structures are released.
+        """
+        if max_shared_structures < 1:
+            raise ValueError("Invalid max shared structures value, must be > 0")
+        self.max_string_length = max_string_length
+        self.max_shared_items = max_shared_items
+        self.max_shared_structures = max_shared_structures
+        # structure key (its type & items keys) -> shared structure
+        self._structures: Dict[Hashable, Any] = {}
+        # count of structures replaced by a shared structure
+        self.deduped_structures_count = 0
+
+    def clear(self):
+        """
+        Releases all the held shared structures
+        """
+        self._structures = {}
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the shared structures (sampled)
+        """
+        return estimate_items_size(
+            self._structures.values(),
+            len(self._structures)
+        )
+
+    def _intern_item(self, value):
+        """
+        Interns a dict/list item.
+        :return: the interned item & its key - strings are keyed by
+        themselves, other scalars by their type & value, and shared
+        structures by their id (as they are held). If the item can't be
+        shared, its key is None.
+        """
+        value_type = type(value)
+        if value_type is str:
+            if len(value) <= self.max_string_length:
+                value = sys.intern(value)
+            return value, value
+        if value_type is dict or value_type is list:
+            value, is_shareable = self._intern(value)
+            return value, id(value) if is_shareable else None
+        if isinstance(value, SCALAR_TYPES):
+            return value, (value_type, value)
+        if isinstance(value, (dict, list)):
+            value, is_shareable = self._intern(value)
+            return value, id(value) if is_shareable else None
+        return value, None
+
+    def _share(self, key: Hashable, structure):
+        """
+        Gets the shared structure of given key, shares the given structure
+        if there's none
+        """
+        shared = self._structures.get(key)
+        if shared is not None:
+            self.deduped_structures_count += 1
+            return shared
+        self._structures[key] = structure
+        return structure
+
+    def _intern(self, obj):
+        """
+        Interns the given object.
+        :return: the interned object & whether it can be shared
+        """
+        if isinstance(obj, dict):
+            interned = {}
+            items_keys = []
+            for key, value in obj.items():
+                if type(key) is str:
+                    key = sys.intern(key)
+                interned[key], item_key = self._intern_item(value)
+                items_keys.append(key)
+                items_keys.append(item_key)
+            if len(obj) > self.max_shared_items or None in items_keys:
+                return interned, False
+            return self._share((dict, tuple(items_keys)), interned), True
+        if isinstance(obj, list):
+            interned = []
+            items_keys = []
+            for value in obj:
+                interned_value, item_key = self._intern_item(value)
+                interned.append(interned_value)
+                items_keys.append(item_key)
+            if len(obj) > self.max_shared_items or None in items_keys:
+                return interned, False
+            return self._share((list, tuple(items_keys)), interned), True
+        value, item_key = self._intern_item(obj)
+        return value, item_key is not None
+
+    def intern(self, obj):
+        """
+        Interns the given object - a dict, list or scalar.
+        :return: the interned object, equal to the given object
+        """
+        # nested structures are keyed by their id, hence the held structures
+        # are released only between interned objects
+        if len(self._structures) >= self.max_shared_structures:
+            self.clear()
+        return self._intern(obj)[0]
@@ -0,0 +1,144 @@
+"""
+JSON patch (RFC 6902) - diffs & applies patches of JSON documents
+"""
+import copy
+from typing import Any, Dict, List
+
+
+class JsonPatchException(Exception):
+    pass
+
+
+def _escape(token) -> str:
+    """
+    Escapes a JSON pointer reference token
+    """
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    """
+    Unescapes a JSON pointer reference token
+    """
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _diff(source, target, path: str, operations: List[Dict]):
+    """
+    Adds the operations which transform source to target at the given path
+    """
+    # shared (e.g. interned) sub-documents are skipped, other values are
+    # compared recursively - booleans aren't equal to numbers
+    if source is target:
+        return
+    if isinstance(source, dict) and isinstance(target, dict):
+        for key in source:
+            if key not in target:
+                operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            child_path = f"{path}/{_escape(key)}"
+            if key in source:
+                _diff(source[key], value, child_path, operations)
+            else:
+                operations.append({"op": "add", "path": child_path, "value": value})
+    elif isinstance(source, list) and isinstance(target, list):
+        common_length = min(len(source), len(target))
+        for i in range(common_length):
+            _diff(source[i], target[i], f"{path}/{i}", operations)
+        for i in range(len(source) - 1, common_length - 1, -1):
+            operations.append({"op": "remove", "path": f"{path}/{i}"})
+        for i in range(common_length, len(target)):
+            operations.append({"op": "add", "path": f"{path}/{i}", "value": target[i]})
+    elif type(source) != type(target) or source != target:
+        operations.append({"op": "replace", "path": path, "value": target})
+
+
+def diff(source, target) -> List[Dict]:
+    """
+    Gets the JSON patch which transforms the source document to the target
+    document. Uses add, remove & replace operations only.
+    The operations values are the target document values (not copied).
+    """
+    operations = []
+    _diff(source, target, "", operations)
+    return operations
+
+
+def _parse_path(path: str) -> List[str]:
+    """
+    Parses a JSON pointer to its reference tokens
+    """
+    if not path:
+        return []
+    if not path.startswith("/"):
+        raise JsonPatchException(f"Invalid path `{path}`")
+    return [_unescape(token) for token in path[1:].split("/")]
+
+
+def _get_list_index(container: List, token: str, is_add: bool) -> int:
+    """
+    Gets the list index referenced by given token
+    """
+    if is_add and token == "-":
+        return len(container)
+    if not token.isdigit():
+        raise JsonPatchException(f"Invalid list index `{token}`")
+    index = int(token)
+    if index > len(container) or (not is_add and index == len(container)):
+        raise JsonPatchException(f"List index `{token}` out of range")
+    return index
+
+
+def _apply_operation(document, operation: Dict):
+    """
+    Applies a single patch operation on the given document, in place.
+    :return: the patched document
+    """
+    op = operation.get("op")
+    if op not in ("add", "remove", "replace"):
+        raise JsonPatchException(f"Unsupported operation `{op}`")
+    tokens = _parse_path(operation.get("path", ""))
+    if not tokens:
+        if op == "remove":
+            raise JsonPatchException("Cannot remove the document root")
+        return copy.deepcopy(operation["value"])
+    container = document
+    for token in tokens[:-1]:
+        try:
+            if isinstance(container, list):
+                container = container[_get_list_index(container, token, False)]
+            else:
+                container = container[token]
+        except (KeyError, TypeError):
+            raise JsonPatchException(f"Invalid path `{operation['path']}`")
+    token = tokens[-1]
+    if isinstance(container, list):
+        index = _get_list_index(container, token, op == "add")
+        if op == "add":
+            container.insert(index, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            del container[index]
+        else:
+            container[index] = copy.deepcopy(operation["value"])
+    elif isinstance(container, dict):
+        if op != "add" and token not in container:
+            raise JsonPatchException(f"Invalid path `{operation['path']}`")
+        if op == "remove":
+            del container[token]
+        else:
+            container[token] = copy.deepcopy(operation["value"])
+    else:
+        raise JsonPatchException(f"Invalid path `{operation['path']}`")
+    return document
+
+
+def apply(document, patch: List[Dict]) -> Any:
+    """
+    Applies the given JSON patch (add, remove & replace operations) on the
+    given document. The document isn't changed.
+    :return: the patched document
+    """
+    document = copy.deepcopy(document)
+    for operation in patch:
+        document = _apply_operation(document, operation)
+    return document
@@ -3,23 +3,10 @@ Kubernetes events
 """
 import json
 import time
-from typing import Dict
+import hashlib
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
-from encoders import DateTimeEncoder
-
-class KubernetesEventEncoder(DateTimeEncoder):
-    """
-    JSON Encoder for kubernetes events
-    """
-    def default(self, o):  # pylint: disable=method-hidden
-        """
-        Overriding for specific serialization
-        """
-        if isinstance(o, KubernetesEvent):
-            return json.dumps(o.to_dict(), cls=DateTimeEncoder)
-
-        return super(KubernetesEventEncoder, self).default(o)
-
+import encoders
 
 class KubernetesEventException(Exception):
     pass
@@ -33,6 +20,8 @@ class KubernetesEventType(Enum):
     """
     CLUSTER = "cluster"
     WATCH = "watch"
+    WATCH_DELTA = "watch_delta"
+    EVENTS_SUMMARY = "events_summary"
 
 
 class WatchKubernetesEventType(Enum):
@@ -48,6 +37,14 @@ class KubernetesEvent:
     """
     Abstract kubernetes event
     """
+    __slots__ = (
+        "event_type",
+        "data",
+        "timestamp",
+        "_serialized",
+        "_content_digest",
+    )
+    CONTENT_DIGEST_SIZE = 16
 
     def __init__(self, event_type: KubernetesEventType, data):
         """
@@ -57,6 +54,8 @@ class KubernetesEvent:
         self.event_type = event_type
         self.data = data
         self.timestamp = time.time_ns()
+        self._serialized: bytes = None
+        self._content_digest: bytes = None
 
     def get_formatted_payload(self):
         """
@@ -79,27 +78,98 @@ class KubernetesEvent:
             "payload": self.get_formatted_payload(),
         }
 
+    def serialize(self) -> bytes:
+        """
+        Serializes the event dict (see to_dict) to compact JSON bytes.
+        The event is serialized once, on first use, and the result is cached -
+        hence the event must not be changed once serialized.
+        """
+        if self._serialized is None:
+            self._serialized = encoders.dumps(self.to_dict())
+        return self._serialized
+
+    def is_serialized(self) -> bool:
+        """
+        Returns whether the event has already been serialized
+        """
+        return self._serialized is not None
+
+    def get_serialized_size(self) -> int:
+        """
+        Gets the serialized event size, in bytes (see serialize)
+        """
+        return len(self.serialize())
+
+    def get_identity(self) -> Optional[Tuple]:
+        """
+        Gets the event identity - the event type and the kind, uid & resource
+        version of the event object.
+        If the event data has no uid or resource version, returns None.
+        """
+        if not isinstance(self.data, dict):
+            return None
+        metadata = self.data.get("metadata") or {}
+        uid = metadata.get("uid")
+        resource_version = metadata.get("resource_version")
+        if uid is None or resource_version is None:
+            return None
+        return (self.event_type, self.data.get("kind"), uid, resource_version)
+
+    def get_content_digest(self) -> bytes:
+        """
+        Gets a digest of the event content (the event type & formatted
+        payload), for content based deduplication. Independent of the
+        payload dicts keys order, as the payload equity is.
+        The digest is computed once, on first use, and cached.
+        """
+        if self._content_digest is None:
+            content = encoders.dumps(
+                [self.event_type.value, self.get_formatted_payload()],
+                sort_keys=True
+            )
+            self._content_digest = hashlib.blake2b(
+                content,
+                digest_size=self.CONTENT_DIGEST_SIZE
+            ).digest()
+        return self._content_digest
+
+    def _equals(self, other) -> bool:
+        """
+        Checks equity of events of the same type - by their identity if
+        both have one, otherwise by comparing the events data
+        """
+        identity = self.get_identity()
+        other_identity = other.get_identity()
+        if identity is not None and other_identity is not None:
+            return identity == other_identity
+        return self.data == other.data
+
     def __eq__(self, other):
         """
-        Checks equity by comparing the event type & data
+        Checks equity by comparing the event type & identity (or data)
         """
         return (
             type(self) == type(other) and
             self.event_type == other.event_type and
-            self.data == other.data
+            self._equals(other)
         )
 
     def __hash__(self):
-        """ gets the item hash """
-        data = self.to_dict()
-        data["metadata"].pop("timestamp")
-        return hash(str(data))
+        """
+        gets the item hash - by the event identity, falls back to the event
+        content digest for events with no identity
+        """
+        identity = self.get_identity()
+        if identity is not None:
+            return hash(identity)
+        return hash(self.get_content_digest())
 
 
 class WatchKubernetesEvent(KubernetesEvent):
     """
     Kubernetes watch event
     """
+    __slots__ = ("watch_event_type",)
     OBJECT_FIELD_KEY = "object"
     EVENT_FIELDS = (OBJECT_FIELD_KEY, "type")
 
@@ -124,7 +194,10 @@ class WatchKubernetesEvent(KubernetesEvent):
             if field not in raw_data:
                 raise InvalidWatchEventException(f"Missing `{field}` in event")
 
-        obj = raw_data[cls.OBJECT_FIELD_KEY].to_dict()
+        obj = raw_data[cls.OBJECT_FIELD_KEY]
+        if not isinstance(obj, dict):
+            # a client model, rather than an already decoded object
+            obj = obj.to_dict()
         event_type = raw_data["type"]
         if event_type not in (
             current_type.value for current_type in WatchKubernetesEventType
@@ -150,14 +223,128 @@ class WatchKubernetesEvent(KubernetesEvent):
             "object": super().get_formatted_payload()
         }
 
+    def get_identity(self) -> Optional[Tuple]:
+        """
+        Gets the watch event identity - the event object identity and the
+        watch event type.
+        """
+        identity = super().get_identity()
+        if identity is None:
+            return None
+        return identity + (self.watch_event_type,)
+
     def __eq__(self, other):
         """
-        Checks equity by comapring the data and the watch specific event type
+        Checks equity by comapring the identity (or data) and the watch
+        specific event type
         """
         return (
             type(self) == type(other) and
             self.watch_event_type == other.watch_event_type and
-            self.data == other.data
+            self._equals(other)
+        )
+
+    def __hash__(self):
+        """ gets the item hash """
+        return super().__hash__()
+
+
+class WatchDeltaKubernetesEvent(KubernetesEvent):
+    """
+    Kubernetes watch MODIFIED event, as a JSON patch (RFC 6902) of the watched
+    object against its base version - the previously sent one.
+    """
+    __slots__ = ()
+    # watched object metadata fields, identifying the patched object
+    METADATA_FIELDS = ("name", "namespace", "uid", "resource_version")
+
+    def __init__(
+            self,
+            watched_obj: Dict,
+            base_resource_version,
+            patch: List[Dict]
+    ):
+        """
+        :param watched_obj: the modified watched object
+        :param base_resource_version: of the watched object version to apply
+        the patch on
+        :param patch: the JSON patch operations
+        """
+        metadata = watched_obj.get("metadata") or {}
+        super().__init__(
+            KubernetesEventType.WATCH_DELTA,
+            {
+                "type": WatchKubernetesEventType.MODIFIED.value,
+                "kind": watched_obj.get("kind"),
+                "metadata": {
+                    field: metadata.get(field) for field in self.METADATA_FIELDS
+                },
+                "base_resource_version": base_resource_version,
+                "patch": patch,
+            }
+        )
+
+    def get_resource_version(self):
+        """
+        Gets the patched kubernetes object resource version
+        """
+        return self.data["metadata"]["resource_version"]
+
+
+class SerializedKubernetesEvent(KubernetesEvent):
+    """
+    A kubernetes event restored from its serialized form (see
+    KubernetesEvent.serialize). Only the serialized event is held - the event
+    dict is parsed from it on demand.
+    """
+    __slots__ = ()
+
+    def __init__(self, serialized: bytes):  # pylint: disable=super-init-not-called
+        """
+        :param serialized: the serialized event
+        """
+        self.event_type = None
+        self.data = None
+        self.timestamp = None
+        self._serialized: bytes = serialized
+        self._content_digest: bytes = None
+
+    def to_dict(self):
+        """
+        Parses the serialized event dict
+        """
+        return json.loads(self._serialized)
+
+    def get_formatted_payload(self):
+        """
+        Gets the serialized event payload
+        """
+        return self.to_dict()["payload"]
+
+    def get_identity(self) -> Optional[Tuple]:
+        """
+        Serialized events have no identity - compared by content
+        """
+        return None
+
+    def get_content_digest(self) -> bytes:
+        """
+        Gets a digest of the serialized event
+        """
+        if self._content_digest is None:
+            self._content_digest = hashlib.blake2b(
+                self._serialized,
+                digest_size=self.CONTENT_DIGEST_SIZE
+            ).digest()
+        return self._content_digest
+
+    def __eq__(self, other):
+        """
+        Checks equity by comparing the serialized events
+        """
+        return (
+            type(self) == type(other) and
+            self._serialized == other._serialized
         )
 
     def __hash__(self):
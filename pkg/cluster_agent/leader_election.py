@@ -0,0 +1,430 @@
+"""
+Leader election - the agent replicas elect a leader through a
+coordination.k8s.io Lease, and the standby replicas keep their watches warm
+without forwarding, to take over without relisting the cluster.
+"""
+import time
+import socket
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+import kubernetes_asyncio
+from kubernetes_asyncio.client.rest import ApiException
+from aiohttp.client_exceptions import ClientError
+from delta_encoder import DeltaEncoder
+from memory_accounting import estimate_items_size
+
+
+def _format_micro_time(value: datetime) -> str:
+    """
+    Formats the given time as a kubernetes MicroTime - which requires 6
+    fractional digits, while isoformat omits zero microseconds
+    """
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class LeaderElector:
+    """
+    Elects a leader between the replicas through a Lease, in the agent
+    namespace, held by the leader replica.
+    A Lease is expired once its record wasn't renewed for its duration,
+    measured by the local clock since it was observed (as client-go does), to
+    not depend on the replicas clocks skew. The leader steps down once it
+    fails to renew the Lease in time, before another replica can acquire it.
+    """
+
+    DEFAULT_LEASE_DURATION_SECONDS = 15
+    DEFAULT_RENEW_INTERVAL_SECONDS = 5
+
+    def __init__(
+            self,
+            identity: str,
+            namespace: str,
+            lease_name: str,
+            api_client=None,
+            lease_duration_seconds: float = DEFAULT_LEASE_DURATION_SECONDS,
+            renew_interval_seconds: float = DEFAULT_RENEW_INTERVAL_SECONDS,
+            labels: Dict[str, str] = None,
+    ):
+        """
+        :param identity: of this replica, unique between the replicas (the
+        pod name)
+        :param namespace: to create the Leases in (the agent namespace)
+        :param lease_name: the leader Lease name
+        :param api_client: of the cluster. If not given, using the default one.
+        :param lease_duration_seconds: Leases duration
+        :param renew_interval_seconds: interval between the Leases renewals,
+        must be less than half of the Leases duration
+        :param labels: of the created Leases
+        """
+        if renew_interval_seconds <= 0:
+            raise ValueError("Renew interval seconds must be bigger than 0")
+        if lease_duration_seconds <= 2 * renew_interval_seconds:
+            raise ValueError(
+                "Lease duration seconds must be bigger than twice the renew interval"
+            )
+        self.identity = identity
+        self.namespace = namespace
+        self.lease_name = lease_name
+        self.lease_duration_seconds = lease_duration_seconds
+        self.renew_interval_seconds = renew_interval_seconds
+        self.labels = labels or {}
+        self.coordination_client = kubernetes_asyncio.client.CoordinationV1Api(
+            api_client=api_client
+        )
+        # lease name -> its last observed record & the (monotonic) observe time
+        self._observed_leases: Dict[str, Tuple[Any, float]] = {}
+        # monotonic time of the last leader Lease renewal, None if not leader
+        self._leader_renew_time: float = None
+
+    @property
+    def leader_observed_time(self) -> Optional[float]:
+        """
+        The (monotonic) time a renewal of the leader Lease by another replica
+        was last observed, None if never observed
+        """
+        observed = self._observed_leases.get(self.lease_name)
+        return observed[1] if observed else None
+
+    def _create_lease_body(
+            self,
+            name: str,
+            holder_identity: Optional[str],
+            resource_version: str = None,
+            acquire_time: datetime = None,
+            lease_transitions: int = 0,
+    ) -> Dict:
+        """ Creates a Lease body, held by given holder """
+        now = datetime.now(timezone.utc)
+        metadata = {
+            "name": name,
+            "namespace": self.namespace,
+            "labels": self.labels,
+        }
+        if resource_version is not None:
+            metadata["resourceVersion"] = resource_version
+        return {
+            "apiVersion": "coordination.k8s.io/v1",
+            "kind": "Lease",
+            "metadata": metadata,
+            "spec": {
+                "holderIdentity": holder_identity,
+                "leaseDurationSeconds": max(int(self.lease_duration_seconds), 1),
+                "acquireTime": _format_micro_time(acquire_time or now),
+                "renewTime": _format_micro_time(now),
+                "leaseTransitions": lease_transitions,
+            },
+        }
+
+    def _is_expired(self, lease) -> bool:
+        """
+        Returns whether the given Lease is expired - its record didn't change
+        for the Leases duration since observed. A Lease without a holder is
+        expired. The replicas share the Leases duration.
+        """
+        spec = lease.spec
+        if not spec.holder_identity:
+            return True
+        now = time.monotonic()
+        record = (spec.holder_identity, spec.renew_time)
+        observed = self._observed_leases.get(lease.metadata.name)
+        if observed is None or observed[0] != record:
+            self._observed_leases[lease.metadata.name] = (record, now)
+            return False
+        return now - observed[1] > self.lease_duration_seconds
+
+    async def _read_lease(self, name: str):
+        """ Reads the Lease of given name, None if not found """
+        try:
+            return await self.coordination_client.read_namespaced_lease(
+                name,
+                self.namespace
+            )
+        except ApiException as exception:
+            if exception.status == HTTPStatus.NOT_FOUND:
+                return None
+            raise
+
+    async def _delete_lease(self, name: str):
+        """ Deletes the Lease of given name, if exists """
+        try:
+            await self.coordination_client.delete_namespaced_lease(name, self.namespace)
+        except ApiException as exception:
+            if exception.status != HTTPStatus.NOT_FOUND:
+                raise
+        self._observed_leases.pop(name, None)
+
+    async def _try_acquire_leadership(self) -> bool:
+        """
+        Acquires or renews the leader Lease. Concurrent replicas are resolved
+        by the Lease resource version - only one write succeeds.
+        :return: whether this replica is the leader
+        """
+        lease = await self._read_lease(self.lease_name)
+        try:
+            if lease is None:
+                await self.coordination_client.create_namespaced_lease(
+                    self.namespace,
+                    self._create_lease_body(self.lease_name, self.identity)
+                )
+            else:
+                holder_identity = lease.spec.holder_identity
+                is_holder = holder_identity == self.identity
+                if not is_holder and not self._is_expired(lease):
+                    self._leader_renew_time = None
+                    return False
+                await self.coordination_client.replace_namespaced_lease(
+                    self.lease_name,
+                    self.namespace,
+                    self._create_lease_body(
+                        self.lease_name,
+                        self.identity,
+                        resource_version=lease.metadata.resource_version,
+                        acquire_time=lease.spec.acquire_time if is_holder else None,
+                        lease_transitions=(
+                            (lease.spec.lease_transitions or 0) + (not is_holder)
+                        ),
+                    )
+                )
+        except ApiException as exception:
+            if exception.status != HTTPStatus.CONFLICT:
+                raise
+            # another replica acquired the leader Lease first
+            self._leader_renew_time = None
+            return False
+        self._leader_renew_time = time.monotonic()
+        return True
+
+    def _is_leader(self) -> bool:
+        """
+        Returns whether this replica is still the leader - it renewed the
+        leader Lease recently enough to step down before the Lease expires
+        for the other replicas
+        """
+        return (
+            self._leader_renew_time is not None and
+            time.monotonic() - self._leader_renew_time <
+            self.lease_duration_seconds - self.renew_interval_seconds
+        )
+
+    async def release(self):
+        """
+        Releases the leader Lease if held, for another replica to take over
+        without waiting for the Lease to expire
+        """
+        if not self._is_leader():
+            return
+        self._leader_renew_time = None
+        lease = await self._read_lease(self.lease_name)
+        if lease is None or lease.spec.holder_identity != self.identity:
+            return
+        body = self._create_lease_body(
+            self.lease_name,
+            None,
+            resource_version=lease.metadata.resource_version,
+            lease_transitions=lease.spec.lease_transitions or 0,
+        )
+        await self.coordination_client.replace_namespaced_lease(
+            self.lease_name,
+            self.namespace,
+            body
+        )
+
+    async def start(self, on_leadership_change: Callable[[bool], Awaitable]):
+        """
+        Acquires or renews the leader Lease every renew interval until
+        cancelled, and calls the given handler whenever this replica
+        leadership changes. While the apiserver can't be reached, steps down
+        once the leader Lease can't be renewed in time.
+        """
+        is_leader = False
+        while True:
+            try:
+                await self._try_acquire_leadership()
+            except (ApiException, ClientError, socket.gaierror) as exception:
+                logging.warning("Failed to renew the leader lease: %s", exception)
+            if self._is_leader() != is_leader:
+                is_leader = not is_leader
+                logging.info(
+                    "%s %s the leader lease",
+                    self.identity,
+                    "acquired" if is_leader else "lost"
+                )
+                await on_leadership_change(is_leader)
+            await asyncio.sleep(self.renew_interval_seconds)
+
+
+class WarmStandby:
+    """
+    Gates the events handlers by the replica leadership - the leader writes
+    its events through, while a standby replica keeps watching (its watches
+    & resource versions stay warm) and buffers its recent events instead.
+    On takeover, the buffered events since the previous leader was last seen
+    alive (minus the replay margin) are replayed, so the events which the
+    previous leader might not have forwarded are written at least once,
+    without relisting & resending the whole cluster. The buffer is pruned
+    whenever the leader is seen alive, hence holds about a renew interval
+    (plus the replay margin) of events.
+    The events are delta encoded only once written through, so a standby
+    never records the bases of events it might not send.
+    """
+
+    DEFAULT_REPLAY_MARGIN_SECONDS = 10
+    DEFAULT_MAX_BUFFERED_EVENTS = 100000
+
+    def __init__(
+            self,
+            elector: LeaderElector,
+            replay_margin_seconds: float = DEFAULT_REPLAY_MARGIN_SECONDS,
+            max_buffered_events: int = DEFAULT_MAX_BUFFERED_EVENTS,
+            delta_encoder: DeltaEncoder = None,
+    ):
+        """
+        :param elector: to follow the leadership of
+        :param replay_margin_seconds: the extra events time to replay, covers
+        the previous leader forwarding lag
+        :param max_buffered_events: count of events to buffer, the oldest is
+        dropped once reached
+        :param delta_encoder: if given, used to encode the written through
+        (and replayed) events, reset on takeover
+        """
+        if replay_margin_seconds < 0:
+            raise ValueError("Replay margin seconds must be 0 or bigger")
+        if max_buffered_events < 1:
+            raise ValueError("Invalid max buffered events value, must be > 0")
+        self.elector = elector
+        self.replay_margin_seconds = replay_margin_seconds
+        self.max_buffered_events = max_buffered_events
+        self.delta_encoder = delta_encoder
+        self.is_leader = False
+        # (monotonic receive time, handler, event) of the buffered events
+        self._buffer: Deque[Tuple[float, Callable, Any]] = deque()
+        self.dropped_events_count: int = 0
+        self.replayed_events_count: int = 0
+        self.takeovers_count: int = 0
+        # time from the previous leader last seen alive to the takeover
+        self.last_takeover_seconds: float = None
+
+    def create_handler(self, handler: Callable[[Any], Awaitable]):
+        """
+        Creates an events handler which writes to given handler while
+        leader, and buffers the events otherwise
+        """
+        async def write_event(event):
+            if self.is_leader:
+                await handler(self._encode(event))
+                return
+            self._buffer.append((time.monotonic(), handler, event))
+            self._prune()
+        return write_event
+
+    def _encode(self, event):
+        """
+        Delta encodes the given event, if a delta encoder is set
+        """
+        if self.delta_encoder:
+            return self.delta_encoder.encode(event)
+        return event
+
+    def _get_replay_start_time(self) -> Optional[float]:
+        """
+        Gets the receive time to replay the buffered events from, None to
+        replay all of them (the leader was never seen)
+        """
+        leader_observed_time = self.elector.leader_observed_time
+        if leader_observed_time is None:
+            return None
+        # the leader renewal is observed up to a renew interval late
+        return (
+            leader_observed_time -
+            self.elector.renew_interval_seconds -
+            self.replay_margin_seconds
+        )
+
+    def _prune(self):
+        """
+        Drops the buffered events which mustn't be replayed, and the oldest
+        events above max_buffered_events
+        """
+        start_time = self._get_replay_start_time()
+        if start_time is not None:
+            while self._buffer and self._buffer[0][0] < start_time:
+                self._buffer.popleft()
+        while len(self._buffer) > self.max_buffered_events:
+            self._buffer.popleft()
+            self.dropped_events_count += 1
+
+    async def _replay(self) -> int:
+        """
+        Replays the buffered events, including events buffered meanwhile,
+        then writes the next events through
+        :return: the replayed events count
+        """
+        self._prune()
+        replayed_events_count = 0
+        while self._buffer:
+            _, handler, event = self._buffer.popleft()
+            await handler(self._encode(event))
+            replayed_events_count += 1
+        self.is_leader = True
+        self.replayed_events_count += replayed_events_count
+        return replayed_events_count
+
+    async def _on_leadership_change(self, is_leader: bool):
+        if not is_leader:
+            self.is_leader = False
+            return
+        self.takeovers_count += 1
+        leader_observed_time = self.elector.leader_observed_time
+        if leader_observed_time is not None:
+            self.last_takeover_seconds = time.monotonic() - leader_observed_time
+        if self.delta_encoder:
+            # the previous leader sent the bases, this replica sends full
+            # objects until it has sent its own
+            self.delta_encoder.reset()
+        buffered_events_count = len(self._buffer)
+        replayed_events_count = await self._replay()
+        logging.info(
+            "Took over the leadership, replayed %d of %d buffered events",
+            replayed_events_count,
+            buffered_events_count
+        )
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the buffered events (sampled)
+        """
+        return estimate_items_size(
+            (event for _, _, event in self._buffer),
+            len(self._buffer)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gets the leadership & buffered events stats
+        """
+        return {
+            "is_leader": self.is_leader,
+            "buffered_events": len(self._buffer),
+            "dropped_events": self.dropped_events_count,
+            "replayed_events": self.replayed_events_count,
+            "takeovers": self.takeovers_count,
+            "last_takeover_seconds": self.last_takeover_seconds,
+        }
+
+    async def start(self):
+        """
+        Follows the leadership until cancelled, then releases the leader
+        Lease
+        """
+        try:
+            await self.elector.start(self._on_leadership_change)
+        finally:
+            self.is_leader = False
+            try:
+                await self.elector.release()
+            except (ApiException, ClientError, socket.gaierror) as exception:
+                logging.warning("Failed to release the leader lease: %s", exception)
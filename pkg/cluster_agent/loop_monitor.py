@@ -0,0 +1,169 @@
+"""
+Event loop lag monitor
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Dict, List
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag monitor - samples the event loop scheduling delay and
+    records it as a histogram.
+    If a slow callback threshold is given, a watchdog thread logs the stack
+    of the event loop thread whenever it is blocked for more than the
+    threshold.
+    """
+
+    DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.5
+    DEFAULT_LOG_INTERVAL_SECONDS = 300
+    # histogram buckets upper bounds, in seconds
+    HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float("inf"))
+
+    def __init__(
+            self,
+            sample_interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+            slow_callback_threshold_seconds: float = None,
+            log_interval_seconds: float = DEFAULT_LOG_INTERVAL_SECONDS,
+    ):
+        """
+        :param sample_interval_seconds: interval between lag samples
+        :param slow_callback_threshold_seconds: if given, logs the event loop
+        thread stack when blocked for more than this threshold
+        :param log_interval_seconds: interval between histogram summary logs
+        """
+        if sample_interval_seconds <= 0:
+            raise ValueError("Sample interval seconds must be bigger than 0")
+        if (
+                slow_callback_threshold_seconds is not None and
+                slow_callback_threshold_seconds <= 0
+        ):
+            raise ValueError("Slow callback threshold must be bigger than 0")
+        self.sample_interval_seconds = sample_interval_seconds
+        self.slow_callback_threshold_seconds = slow_callback_threshold_seconds
+        self.log_interval_seconds = log_interval_seconds
+        self.histogram: List[int] = [0] * len(self.HISTOGRAM_BUCKETS)
+        self.samples_count: int = 0
+        self.max_lag_seconds: float = 0
+        self.total_lag_seconds: float = 0
+        self._next_sample_time: float = None
+        self._reported_sample_time: float = None
+        self._loop_thread_id: int = None
+        self._watchdog_stop_event = threading.Event()
+        self._watchdog_thread: threading.Thread = None
+
+    def record(self, lag_seconds: float):
+        """
+        Records a single lag sample
+        """
+        lag_seconds = max(lag_seconds, 0)
+        for i, bucket in enumerate(self.HISTOGRAM_BUCKETS):
+            if lag_seconds <= bucket:
+                self.histogram[i] += 1
+                break
+        self.samples_count += 1
+        self.total_lag_seconds += lag_seconds
+        self.max_lag_seconds = max(self.max_lag_seconds, lag_seconds)
+
+    def get_histogram(self) -> Dict[str, int]:
+        """
+        Gets the lag histogram - the samples count per bucket upper bound
+        """
+        return {
+            f"le_{bucket}": count
+            for bucket, count in zip(self.HISTOGRAM_BUCKETS, self.histogram)
+        }
+
+    def get_stats(self) -> Dict:
+        """
+        Gets the lag statistics - the histogram, max & average lag
+        """
+        return {
+            "histogram": self.get_histogram(),
+            "samples_count": self.samples_count,
+            "max_lag_seconds": self.max_lag_seconds,
+            "avg_lag_seconds": (
+                self.total_lag_seconds / self.samples_count
+                if self.samples_count else 0
+            ),
+        }
+
+    def _check_blocked_loop(self):
+        """
+        Logs the event loop thread stack if the loop is blocked for more than
+        the slow callback threshold. Reports once per blocking callback.
+        """
+        next_sample_time = self._next_sample_time
+        if next_sample_time is None or next_sample_time == self._reported_sample_time:
+            return
+        blocked_seconds = time.monotonic() - next_sample_time
+        if blocked_seconds < self.slow_callback_threshold_seconds:
+            return
+        self._reported_sample_time = next_sample_time
+        frame = sys._current_frames().get(self._loop_thread_id) # pylint: disable=protected-access
+        if frame is None:
+            return
+        logging.warning(
+            "Event loop is blocked for more than %.3f seconds, stack:\n%s",
+            blocked_seconds,
+            "".join(traceback.format_stack(frame))
+        )
+
+    def _run_watchdog(self):
+        """
+        Watchdog thread main function
+        """
+        interval = self.slow_callback_threshold_seconds / 2
+        while not self._watchdog_stop_event.wait(interval):
+            self._check_blocked_loop()
+
+    def _start_watchdog(self):
+        """
+        Starts the watchdog thread, if a slow callback threshold is set
+        """
+        if self.slow_callback_threshold_seconds is None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._watchdog_stop_event.clear()
+        self._watchdog_thread = threading.Thread(
+            target=self._run_watchdog,
+            name="loop-lag-watchdog",
+            daemon=True
+        )
+        self._watchdog_thread.start()
+
+    def _stop_watchdog(self):
+        """
+        Stops the watchdog thread
+        """
+        if self._watchdog_thread is None:
+            return
+        self._watchdog_stop_event.set()
+        self._watchdog_thread.join()
+        self._watchdog_thread = None
+
+    async def start(self):
+        """
+        Starts sampling the event loop lag, until cancelled.
+        """
+        self._start_watchdog()
+        last_log_time = time.monotonic()
+        try:
+            while True:
+                self._next_sample_time = (
+                    time.monotonic() + self.sample_interval_seconds
+                )
+                await asyncio.sleep(self.sample_interval_seconds)
+                now = time.monotonic()
+                self.record(now - self._next_sample_time)
+                if now - last_log_time >= self.log_interval_seconds:
+                    last_log_time = now
+                    logging.debug("Event loop lag: %s", self.get_stats())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._stop_watchdog()
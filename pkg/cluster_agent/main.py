@@ -9,18 +9,48 @@ import os
 import signal
 
 import aiofiles
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from traceback import format_exc
 from aiohttp import client_exceptions
 from kubernetes_asyncio import config, client
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+from backoff import Backoff
 from cluster_discovery import ClusterDiscovery
+from events_aggregator import EVENT_KIND, EventsAggregator
 from events_manager import InMemoryEventsManager
 from events_sender import EventsSender
 from epsagon_client import EpsagonClient, EpsagonClientException
 from forwarder import Forwarder
 from logger_configurer import LoggerConfigurer
+from conf_watcher import ConfWatcher
+from connection_pool import (
+    DEFAULT_HEADROOM,
+    ConnectionPoolMetrics,
+    create_api_client,
+    get_pool_size,
+)
+from debug_server import DebugServer
+from delta_encoder import DeltaEncoder
+from dynamic_targets import parse_resources
+from encoders import set_json_backend
+from interning import Interner
+from leader_election import LeaderElector, WarmStandby
+from loop_monitor import LoopLagMonitor
+from memory_accounting import MemoryAccountant
+from model_decoder import ModelDecoder
+from multiprocess_pipeline import ShardedEventsDispatcher, WorkerConfig
+from profiler import Profiler
+from rate_limiter import BandwidthLimiter
+from recorder import WatchRecorder
+from sharding import ShardCoordinator, ShardedClusterDiscovery
+from templates import TemplateEncoder
 
 RESTART_WAIT_TIME_SECONDS = 60
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("EPSAGON_SHUTDOWN_TIMEOUT_SECONDS", "20"))
 EPSAGON_TOKEN = os.getenv("EPSAGON_TOKEN")
 CLUSTER_NAME = os.getenv("EPSAGON_CLUSTER_NAME")
 COLLECTOR_URL = os.getenv(
@@ -29,8 +59,114 @@ COLLECTOR_URL = os.getenv(
 )
 SHOULD_COLLECT_RESOURCES = os.getenv("EPSAGON_COLLECT_RESOURCES", "TRUE").upper() == "TRUE"
 SHOULD_COLLECT_EVENTS = os.getenv("EPSAGON_COLLECT_EVENTS", "FALSE").upper() == "TRUE"
+# more resources to watch, such as `apps/v1/replicasets,batch/v1/jobs=50` -
+# see DynamicResource.parse
+WATCH_RESOURCES = parse_resources(os.getenv("EPSAGON_WATCH_RESOURCES", ""))
+# max watch targets listed at once, shared by all the (sharded) discoveries
+MAX_CONCURRENT_LISTS = int(os.getenv(
+    "EPSAGON_MAX_CONCURRENT_LISTS",
+    str(ClusterDiscovery.MAX_CONCURRENT_LISTS)
+))
+WATCH_BACKOFF_BASE_SECONDS = float(os.getenv(
+    "EPSAGON_WATCH_BACKOFF_BASE_SECONDS",
+    str(Backoff.DEFAULT_BASE_SECONDS)
+))
+WATCH_BACKOFF_MAX_SECONDS = float(os.getenv(
+    "EPSAGON_WATCH_BACKOFF_MAX_SECONDS",
+    str(Backoff.DEFAULT_MAX_SECONDS)
+))
+# max kubernetes API connections, 0 to derive it from the watch targets
+API_CONNECTIONS_LIMIT = int(os.getenv("EPSAGON_API_CONNECTIONS_LIMIT", "0"))
+# API connections beyond the watch targets, for the lists & other requests
+API_CONNECTIONS_HEADROOM = int(os.getenv(
+    "EPSAGON_API_CONNECTIONS_HEADROOM",
+    str(DEFAULT_HEADROOM)
+))
+SHOULD_AGGREGATE_EVENTS = os.getenv("EPSAGON_AGGREGATE_EVENTS", "TRUE").upper() == "TRUE"
+EVENTS_WINDOW_SECONDS = float(os.getenv(
+    "EPSAGON_EVENTS_WINDOW_SECONDS",
+    str(EventsAggregator.DEFAULT_WINDOW_SECONDS)
+))
+EVENTS_NAMESPACE_RATE = float(os.getenv(
+    "EPSAGON_EVENTS_NAMESPACE_RATE",
+    str(EventsAggregator.DEFAULT_NAMESPACE_RATE)
+))
+EVENTS_REASON_RATE = float(os.getenv(
+    "EPSAGON_EVENTS_REASON_RATE",
+    str(EventsAggregator.DEFAULT_REASON_RATE)
+))
+WORKER_PROCESSES_COUNT = int(os.getenv("EPSAGON_WORKER_PROCESSES", "0"))
+WORKER_MAX_QUEUED_EVENTS = int(os.getenv(
+    "EPSAGON_WORKER_MAX_QUEUED_EVENTS",
+    str(ShardedEventsDispatcher.DEFAULT_MAX_QUEUED_EVENTS)
+))
+SHOULD_USE_UVLOOP = os.getenv("EPSAGON_USE_UVLOOP", "FALSE").upper() == "TRUE"
+JSON_BACKEND = os.getenv("EPSAGON_JSON_BACKEND") or None
+SHOULD_SERIALIZE_EVENTS = os.getenv("EPSAGON_SERIALIZE_EVENTS", "TRUE").upper() == "TRUE"
+SERIALIZATION_THREADS_COUNT = int(os.getenv("EPSAGON_SERIALIZATION_THREADS", "0"))
+SHOULD_DEDUP_TEMPLATES = os.getenv("EPSAGON_DEDUP_TEMPLATES", "FALSE").upper() == "TRUE"
+SHOULD_SEND_DELTAS = os.getenv("EPSAGON_DELTA_EVENTS", "FALSE").upper() == "TRUE"
+SHOULD_INTERN_EVENTS = os.getenv("EPSAGON_INTERN_EVENTS", "FALSE").upper() == "TRUE"
+# decode the watched objects straight to dicts, rather than to client models
+SHOULD_DECODE_MODELS = os.getenv("EPSAGON_DECODE_MODELS", "FALSE").upper() == "TRUE"
+# unread events count to start compressing the events backlog at, 0 to disable
+BACKLOG_COMPRESSION_THRESHOLD = int(
+    os.getenv("EPSAGON_BACKLOG_COMPRESSION_THRESHOLD", "10000")
+)
+# sent bytes per second limit (all the worker processes together), 0 to disable
+EGRESS_BYTES_PER_SECOND = float(os.getenv("EPSAGON_EGRESS_BYTES_PER_SECOND", "0"))
+# sent bytes burst allowance, defaults to one second of the limit
+EGRESS_BURST_BYTES = float(os.getenv("EPSAGON_EGRESS_BURST_BYTES", "0"))
+# if set, the raw list & watch traffic is recorded to this dir
+RECORD_DIR = os.getenv("EPSAGON_RECORD_DIR")
+# recording duration, 0 to record until the agent shuts down
+RECORD_SECONDS = float(os.getenv("EPSAGON_RECORD_SECONDS", "0"))
+SHOULD_MONITOR_LOOP_LAG = os.getenv("EPSAGON_MONITOR_LOOP_LAG", "TRUE").upper() == "TRUE"
+SLOW_CALLBACK_THRESHOLD_SECONDS = float(
+    os.getenv("EPSAGON_SLOW_CALLBACK_THRESHOLD_SECONDS", "1")
+)
+# whether to split the cluster discovery between the agent replicas
+SHOULD_SHARD = os.getenv("EPSAGON_SHARDED", "FALSE").upper() == "TRUE"
+SHARD_GROUP = os.getenv("EPSAGON_SHARD_GROUP", "epsagon-cluster-agent")
+# the replica identity & the namespace of its Leases, set by the downward API
+POD_NAME = os.getenv("POD_NAME") or socket.gethostname()
+POD_NAMESPACE = os.getenv("POD_NAMESPACE", "epsagon-monitoring")
+SHARD_LEASE_DURATION_SECONDS = float(os.getenv(
+    "EPSAGON_SHARD_LEASE_DURATION_SECONDS",
+    str(ShardCoordinator.DEFAULT_LEASE_DURATION_SECONDS)
+))
+SHARD_RENEW_INTERVAL_SECONDS = float(os.getenv(
+    "EPSAGON_SHARD_RENEW_INTERVAL_SECONDS",
+    str(ShardCoordinator.DEFAULT_RENEW_INTERVAL_SECONDS)
+))
+# whether to run as an active/standby replica - only the leader forwards
+SHOULD_ELECT_LEADER = os.getenv("EPSAGON_LEADER_ELECTION", "FALSE").upper() == "TRUE"
+LEADER_LEASE_NAME = os.getenv("EPSAGON_LEADER_LEASE_NAME", "epsagon-cluster-agent-leader")
+LEADER_LEASE_DURATION_SECONDS = float(os.getenv(
+    "EPSAGON_LEADER_LEASE_DURATION_SECONDS",
+    str(LeaderElector.DEFAULT_LEASE_DURATION_SECONDS)
+))
+LEADER_RENEW_INTERVAL_SECONDS = float(os.getenv(
+    "EPSAGON_LEADER_RENEW_INTERVAL_SECONDS",
+    str(LeaderElector.DEFAULT_RENEW_INTERVAL_SECONDS)
+))
+STANDBY_REPLAY_MARGIN_SECONDS = float(os.getenv(
+    "EPSAGON_STANDBY_REPLAY_MARGIN_SECONDS",
+    str(WarmStandby.DEFAULT_REPLAY_MARGIN_SECONDS)
+))
+STANDBY_MAX_BUFFERED_EVENTS = int(os.getenv(
+    "EPSAGON_STANDBY_MAX_BUFFERED_EVENTS",
+    str(WarmStandby.DEFAULT_MAX_BUFFERED_EVENTS)
+))
+SHOULD_MONITOR_MEMORY = os.getenv("EPSAGON_MONITOR_MEMORY", "TRUE").upper() == "TRUE"
+# the debug endpoints port, 0 to disable
+DEBUG_PORT = int(os.getenv("EPSAGON_DEBUG_PORT", "0"))
+DEBUG_HOST = os.getenv("EPSAGON_DEBUG_HOST", DebugServer.DEFAULT_HOST)
 EPSAGON_CONF_DIR = "/etc/epsagon"
-IS_DEBUG_FILE_PATH = f"{EPSAGON_CONF_DIR}/epsagon_debug"
+IS_DEBUG_CONF_KEY = "epsagon_debug"
+IS_DEBUG_FILE_PATH = f"{EPSAGON_CONF_DIR}/{IS_DEBUG_CONF_KEY}"
+FORWARDER_MAX_WORKERS_CONF_KEY = "forwarder_max_workers"
+FORWARDER_MAX_EVENTS_TO_READ_CONF_KEY = "forwarder_max_events_to_read"
 
 def _get_log_file_name():
     """
@@ -42,9 +178,22 @@ def _get_log_file_name():
         return "resources_log"
     return "events_log"
 
-LOG_FILE_PATH = f"{os.getenv('HOME', '/tmp')}/{_get_log_file_name()}"
+OUTPUT_DIR = os.getenv("HOME", "/tmp")
+LOG_FILE_PATH = f"{OUTPUT_DIR}/{_get_log_file_name()}"
 LOG_FORMAT = "%(asctime)s %(levelname)s %(module)s - %(funcName)s: %(message)s"
 LOGGER_CONFIGURER = LoggerConfigurer(LOG_FORMAT, LOG_FILE_PATH)
+CONF_WATCHER = ConfWatcher(EPSAGON_CONF_DIR)
+PROFILER = Profiler(
+    OUTPUT_DIR,
+    cpu_profile_duration_seconds=float(
+        os.getenv("EPSAGON_CPU_PROFILE_DURATION_SECONDS", "30")
+    )
+)
+LOOP_LAG_MONITOR = LoopLagMonitor(
+    slow_callback_threshold_seconds=SLOW_CALLBACK_THRESHOLD_SECONDS or None
+)
+MEMORY_ACCOUNTANT = MemoryAccountant()
+CONNECTION_POOL_METRICS = ConnectionPoolMetrics()
 
 
 async def _is_debug_mode():
@@ -62,12 +211,47 @@ async def _is_debug_mode():
     return os.getenv("EPSAGON_DEBUG", "").lower() == "true"
 
 
+def _debug_mode_handler(value):
+    """
+    Debug mode configuration handler - updates the main logger level.
+    If the debug mode is not configured, using the EPSAGON_DEBUG env var.
+    """
+    if value is None:
+        value = os.getenv("EPSAGON_DEBUG", "")
+    LOGGER_CONFIGURER.update_logger_level(value.lower() == "true")
+
+
+def _create_int_conf_handler(setter, default_value):
+    """
+    Creates a configuration handler which sets an int value using
+    the given setter. If the value is not configured, setting default_value.
+    """
+    def handler(value):
+        setter(int(value) if value else default_value)
+    return handler
+
+
 def _reload_handler():
     """
-    Reload configuration handler - reconfigures the main logger according
-    to the current debug mode.
+    Reload configuration handler - reloads & applies the whole configuration
+    """
+    CONF_WATCHER.reload(force=True)
+
+
+def _cpu_profile_handler():
+    """
+    CPU profile handler - dumps the asyncio tasks and profiles the event loop
     """
-    LOGGER_CONFIGURER.update_logger_level(_is_debug_mode())
+    PROFILER.dump_tasks()
+    asyncio.ensure_future(PROFILER.profile_cpu())
+
+
+def _memory_profile_handler():
+    """
+    Memory profile handler - starts tracing memory allocations, or writes
+    the allocations diff if already tracing
+    """
+    PROFILER.snapshot_memory()
 
 
 def _cancel_tasks(tasks):
@@ -79,53 +263,406 @@ def _cancel_tasks(tasks):
             task.cancel()
 
 
-async def _epsagon_conf_watcher(initial_debug_mode: bool):
+async def _graceful_shutdown(producer_tasks, forwarder, epsagon_client):
     """
-    Watches for changes in the epsagon conf.
-    If debug mode has been changed, updates the main logger
-    with the new logging level.
+    Gracefully shuts down the agent - stops all the watches and the other
+    events producers (in order), drains the forwarder up to
+    SHUTDOWN_TIMEOUT_SECONDS and closes the Epsagon client.
     """
-    debug_mode = initial_debug_mode
-    while True:
-        try:
-            current_debug_mode = await _is_debug_mode()
-            if debug_mode != current_debug_mode:
-                debug_mode = current_debug_mode
-                LOGGER_CONFIGURER.update_logger_level(debug_mode)
-        except Exception: # pylint: disable=broad-except
-            pass
-        await asyncio.sleep(120)
-
-
-async def run(is_debug_mode):
-    """
-    Runs the cluster discovery & forwarder.
-    """
-    asyncio.create_task(_epsagon_conf_watcher(is_debug_mode))
-    events_manager = InMemoryEventsManager()
-    epsagon_client = await EpsagonClient.create(EPSAGON_TOKEN)
-    events_sender = EventsSender(
-        epsagon_client,
-        COLLECTOR_URL,
-        CLUSTER_NAME,
-        EPSAGON_TOKEN
+    logging.info("Shutting down the agent")
+    start_time = time.monotonic()
+    for task in producer_tasks:
+        task.cancel()
+        await asyncio.wait([task])
+    flushed_events_count, lost_events_count = await forwarder.drain(
+        SHUTDOWN_TIMEOUT_SECONDS
     )
-    cluster_discovery = ClusterDiscovery(
-        events_manager.write_event,
+    if epsagon_client:
+        await epsagon_client.close()
+    logging.info(
+        "Agent shut down in %.2f seconds, %d events flushed, %d events lost",
+        time.monotonic() - start_time,
+        flushed_events_count,
+        lost_events_count
+    )
+
+
+def _register_memory_components(
+        events_manager,
+        forwarder,
+        events_sender,
+        cluster_discovery,
+        delta_encoder,
+        events_aggregator,
+        standby
+):
+    """
+    Registers the components which hold events or caches to the memory
+    accountant. In the multi process pipeline, only the cluster discovery
+    process is accounted.
+    """
+    if events_manager:
+        MEMORY_ACCOUNTANT.register("events_queue", events_manager.estimate_memory_bytes)
+        MEMORY_ACCOUNTANT.register("in_flight_batches", forwarder.estimate_memory_bytes)
+    if events_sender and events_sender.bandwidth_limiter:
+        MEMORY_ACCOUNTANT.register(
+            "egress_queue",
+            lambda: events_sender.bandwidth_limiter.queued_bytes
+        )
+    if events_sender and events_sender.template_encoder:
+        MEMORY_ACCOUNTANT.register(
+            "sent_templates",
+            events_sender.template_encoder.estimate_memory_bytes
+        )
+    if delta_encoder:
+        MEMORY_ACCOUNTANT.register(
+            "delta_encoder",
+            delta_encoder.estimate_memory_bytes
+        )
+    if cluster_discovery.interner:
+        MEMORY_ACCOUNTANT.register(
+            "interner",
+            cluster_discovery.interner.estimate_memory_bytes
+        )
+    if events_aggregator:
+        MEMORY_ACCOUNTANT.register(
+            "events_aggregator",
+            events_aggregator.estimate_memory_bytes
+        )
+    if standby:
+        MEMORY_ACCOUNTANT.register("standby_buffer", standby.estimate_memory_bytes)
+
+
+def _create_debug_server(events_sender, cluster_discovery, delta_encoder, standby):
+    """
+    Creates the debug server, if a debug port is configured
+    """
+    if not DEBUG_PORT:
+        return None
+    debug_server = DebugServer(PROFILER, DEBUG_PORT, host=DEBUG_HOST)
+    debug_server.add_stats_provider("memory", MEMORY_ACCOUNTANT.get_stats)
+    debug_server.add_stats_provider("loop_lag", LOOP_LAG_MONITOR.get_stats)
+    debug_server.add_stats_provider("api_connections", CONNECTION_POOL_METRICS.get_stats)
+    if events_sender and events_sender.bandwidth_limiter:
+        debug_server.add_stats_provider(
+            "egress",
+            events_sender.bandwidth_limiter.get_stats
+        )
+    if delta_encoder:
+        debug_server.add_stats_provider(
+            "delta_encoder",
+            delta_encoder.get_stats
+        )
+    if standby:
+        debug_server.add_stats_provider("leader_election", standby.get_stats)
+    debug_server.add_stats_provider("watches", cluster_discovery.get_stats)
+    return debug_server
+
+
+def _create_recorder():
+    """
+    Creates the watch recorder, if a recording dir is configured
+    """
+    if not RECORD_DIR:
+        return None
+    logging.info("Recording the watched traffic to %s", RECORD_DIR)
+    return WatchRecorder(RECORD_DIR, duration_seconds=RECORD_SECONDS or None)
+
+
+def _create_api_client():
+    """
+    Creates the kubernetes ApiClient shared by the cluster discovery & the
+    Leases coordination. Unless configured, its connections pool fits all the
+    watch targets plus headroom - sharded, the watch targets follow the
+    shard assignment, so the pool isn't limited.
+    """
+    pool_size = API_CONNECTIONS_LIMIT
+    if not pool_size and not SHOULD_SHARD:
+        pool_size = get_pool_size(
+            ClusterDiscovery.get_watch_targets_count(
+                SHOULD_COLLECT_RESOURCES,
+                SHOULD_COLLECT_EVENTS,
+                resources=WATCH_RESOURCES,
+            ),
+            headroom=API_CONNECTIONS_HEADROOM
+        )
+    logging.info("Kubernetes API connections limit: %s", pool_size or "none")
+    return create_api_client(pool_size, metrics=CONNECTION_POOL_METRICS)
+
+
+def _create_delta_encoder():
+    """
+    Creates the delta encoder, if sending deltas is enabled
+    """
+    if not SHOULD_SEND_DELTAS:
+        return None
+    # the aggregated Events might not be sent, hence they mustn't be the
+    # base of deltas
+    return DeltaEncoder(
+        excluded_kinds=(
+            (EVENT_KIND,) if SHOULD_COLLECT_EVENTS and SHOULD_AGGREGATE_EVENTS else ()
+        )
+    )
+
+
+def _create_warm_standby(api_client, delta_encoder):
+    """
+    Creates the warm standby, if leader election is enabled
+    :param delta_encoder: to encode the events written through the standby
+    by, if given
+    """
+    if not SHOULD_ELECT_LEADER:
+        return None
+    if SHOULD_SHARD:
+        logging.warning("Leader election is not supported with sharding, ignoring")
+        return None
+    logging.info("Electing a leader as %s, by %s lease", POD_NAME, LEADER_LEASE_NAME)
+    return WarmStandby(
+        LeaderElector(
+            POD_NAME,
+            POD_NAMESPACE,
+            LEADER_LEASE_NAME,
+            api_client=api_client,
+            lease_duration_seconds=LEADER_LEASE_DURATION_SECONDS,
+            renew_interval_seconds=LEADER_RENEW_INTERVAL_SECONDS,
+        ),
+        replay_margin_seconds=STANDBY_REPLAY_MARGIN_SECONDS,
+        max_buffered_events=STANDBY_MAX_BUFFERED_EVENTS,
+        delta_encoder=delta_encoder,
+    )
+
+
+def _create_cluster_discovery(event_handler, **kwargs):
+    """
+    Creates the cluster discovery - of this replica shard if sharding is
+    enabled, otherwise of the whole cluster
+    :param kwargs: the ClusterDiscovery keyword arguments
+    """
+    kwargs.update(
+        backoff=Backoff(
+            base_seconds=WATCH_BACKOFF_BASE_SECONDS,
+            max_seconds=WATCH_BACKOFF_MAX_SECONDS
+        ),
+        lists_semaphore=asyncio.Semaphore(MAX_CONCURRENT_LISTS),
+    )
+    if not SHOULD_SHARD:
+        return ClusterDiscovery(event_handler, **kwargs)
+    logging.info("Sharding the cluster discovery, as %s of %s", POD_NAME, SHARD_GROUP)
+    coordinator = ShardCoordinator(
+        POD_NAME,
+        POD_NAMESPACE,
+        SHARD_GROUP,
+        api_client=kwargs.get("api_client"),
+        lease_duration_seconds=SHARD_LEASE_DURATION_SECONDS,
+        renew_interval_seconds=SHARD_RENEW_INTERVAL_SECONDS,
+    )
+    return ShardedClusterDiscovery(
+        coordinator,
+        lambda **scope: ClusterDiscovery(event_handler, **kwargs, **scope),
+        delta_encoder=kwargs.get("delta_encoder"),
+        interner=kwargs.get("interner"),
+    )
+
+
+def _create_multiprocess_pipeline(recorder, standby, api_client):
+    """
+    Creates the multi process pipeline - the cluster discovery dispatches its
+    events to WORKER_PROCESSES_COUNT worker processes, which forward them.
+    :param recorder: to record the cluster discovery traffic to, if given
+    :param standby: to gate the dispatched events by, if given
+    :param api_client: of the cluster discovery
+    :return: the cluster discovery & the events dispatcher
+    """
+    dispatcher = ShardedEventsDispatcher(
+        WORKER_PROCESSES_COUNT,
+        WorkerConfig(
+            EPSAGON_TOKEN,
+            COLLECTOR_URL,
+            CLUSTER_NAME,
+            shutdown_timeout_seconds=SHUTDOWN_TIMEOUT_SECONDS,
+            restart_wait_time_seconds=RESTART_WAIT_TIME_SECONDS,
+            log_format=LOG_FORMAT,
+            is_debug=LOGGER_CONFIGURER.output_handler.level == logging.DEBUG,
+            json_backend=JSON_BACKEND,
+            should_dedup_templates=SHOULD_DEDUP_TEMPLATES,
+            should_decode_models=SHOULD_DECODE_MODELS,
+            backlog_compression_threshold=BACKLOG_COMPRESSION_THRESHOLD or None,
+            # the limit is split between the worker processes
+            egress_bytes_per_second=(
+                EGRESS_BYTES_PER_SECOND / WORKER_PROCESSES_COUNT or None
+            ),
+            egress_burst_bytes=(
+                EGRESS_BURST_BYTES / WORKER_PROCESSES_COUNT or None
+            ),
+        ),
+        max_queued_events=WORKER_MAX_QUEUED_EVENTS,
+    )
+    dispatcher.start_workers()
+    write_event = dispatcher.write_event
+    write_raw_watch_event = dispatcher.write_raw_watch_event
+    if standby:
+        write_event = standby.create_handler(write_event)
+        write_raw_watch_event = standby.create_handler(write_raw_watch_event)
+    cluster_discovery = _create_cluster_discovery(
+        write_event,
         should_collect_resources=SHOULD_COLLECT_RESOURCES,
         should_collect_events=SHOULD_COLLECT_EVENTS,
+        resources=WATCH_RESOURCES,
+        raw_watch_event_handler=write_raw_watch_event,
+        recorder=recorder,
+        api_client=api_client,
+        model_decoder=ModelDecoder() if SHOULD_DECODE_MODELS else None,
     )
-    forwarder = Forwarder(
+    return cluster_discovery, dispatcher
+
+
+async def run():
+    """
+    Runs the configuration watcher, cluster discovery & forwarder.
+    """
+    events_manager = None
+    events_sender = None
+    events_aggregator = None
+    epsagon_client = None
+    recorder = _create_recorder()
+    api_client = _create_api_client()
+    # the multi process pipeline doesn't send deltas
+    delta_encoder = _create_delta_encoder() if WORKER_PROCESSES_COUNT == 0 else None
+    standby = _create_warm_standby(api_client, delta_encoder)
+    if WORKER_PROCESSES_COUNT > 0:
+        cluster_discovery, forwarder = _create_multiprocess_pipeline(
+            recorder,
+            standby,
+            api_client
+        )
+    else:
+        events_manager = InMemoryEventsManager(
+            compression_threshold=BACKLOG_COMPRESSION_THRESHOLD or None
+        )
+        epsagon_client = await EpsagonClient.create(EPSAGON_TOKEN)
+        events_sender = EventsSender(
+            epsagon_client,
+            COLLECTOR_URL,
+            CLUSTER_NAME,
+            EPSAGON_TOKEN,
+            template_encoder=TemplateEncoder() if SHOULD_DEDUP_TEMPLATES else None,
+            bandwidth_limiter=(
+                BandwidthLimiter(
+                    EGRESS_BYTES_PER_SECOND,
+                    burst_bytes=EGRESS_BURST_BYTES or None
+                )
+                if EGRESS_BYTES_PER_SECOND > 0 else None
+            )
+        )
+        serialization_executor = None
+        if SHOULD_SERIALIZE_EVENTS and SERIALIZATION_THREADS_COUNT > 0:
+            serialization_executor = ThreadPoolExecutor(
+                max_workers=SERIALIZATION_THREADS_COUNT,
+                thread_name_prefix="epsagon-serializer"
+            )
+        event_handler = events_manager.write_event
+        if standby:
+            event_handler = standby.create_handler(event_handler)
+        if SHOULD_COLLECT_EVENTS and SHOULD_AGGREGATE_EVENTS:
+            events_aggregator = EventsAggregator(
+                event_handler,
+                window_seconds=EVENTS_WINDOW_SECONDS,
+                namespace_rate=EVENTS_NAMESPACE_RATE,
+                namespace_burst=EVENTS_NAMESPACE_RATE * 10,
+                reason_rate=EVENTS_REASON_RATE,
+                reason_burst=EVENTS_REASON_RATE * 10,
+            )
+            event_handler = events_aggregator.write_event
+        cluster_discovery = _create_cluster_discovery(
+            event_handler,
+            should_collect_resources=SHOULD_COLLECT_RESOURCES,
+            should_collect_events=SHOULD_COLLECT_EVENTS,
+            resources=WATCH_RESOURCES,
+            should_serialize_events=SHOULD_SERIALIZE_EVENTS,
+            serialization_executor=serialization_executor,
+            interner=Interner() if SHOULD_INTERN_EVENTS else None,
+            # a standby must not record the bases of the events it buffers,
+            # hence the standby encodes the events it writes through
+            delta_encoder=None if standby else delta_encoder,
+            recorder=recorder,
+            api_client=api_client,
+            model_decoder=ModelDecoder() if SHOULD_DECODE_MODELS else None,
+        )
+        forwarder = Forwarder(
+            events_manager,
+            events_sender
+        )
+        if delta_encoder:
+            # the deltas must reach the collector after their base versions,
+            # hence a single batch is in flight at a time
+            forwarder.set_max_workers(1)
+        else:
+            CONF_WATCHER.register(
+                FORWARDER_MAX_WORKERS_CONF_KEY,
+                _create_int_conf_handler(
+                    forwarder.set_max_workers,
+                    Forwarder.DEFAULT_MAX_WORKERS
+                )
+            )
+        CONF_WATCHER.register(
+            FORWARDER_MAX_EVENTS_TO_READ_CONF_KEY,
+            _create_int_conf_handler(
+                forwarder.set_max_events_to_read,
+                Forwarder.DEFAULT_MAX_EVENTS_TO_READ
+            )
+        )
+    CONF_WATCHER.register(IS_DEBUG_CONF_KEY, _debug_mode_handler)
+    asyncio.create_task(CONF_WATCHER.start())
+    if SHOULD_MONITOR_LOOP_LAG:
+        asyncio.create_task(LOOP_LAG_MONITOR.start())
+    _register_memory_components(
         events_manager,
-        events_sender
+        forwarder,
+        events_sender,
+        cluster_discovery,
+        delta_encoder,
+        events_aggregator,
+        standby
+    )
+    if SHOULD_MONITOR_MEMORY:
+        asyncio.create_task(MEMORY_ACCOUNTANT.start())
+    debug_server = _create_debug_server(
+        events_sender,
+        cluster_discovery,
+        delta_encoder,
+        standby
+    )
+    if debug_server:
+        asyncio.create_task(debug_server.start())
+    shutdown_event = asyncio.Event()
+    asyncio.get_event_loop().add_signal_handler(
+        signal.SIGTERM,
+        shutdown_event.set
     )
     while True:
+        shutdown_task = asyncio.create_task(shutdown_event.wait())
         try:
             tasks = [
                 asyncio.create_task(forwarder.start()),
                 asyncio.create_task(cluster_discovery.start())
             ]
-            await asyncio.gather(*tasks)
+            if events_aggregator:
+                tasks.append(asyncio.create_task(events_aggregator.start()))
+            if standby:
+                # stopped last, releases the leadership once the watches stop
+                tasks.append(asyncio.create_task(standby.start()))
+            tasks_future = asyncio.gather(*tasks)
+            await asyncio.wait(
+                (tasks_future, shutdown_task),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if shutdown_event.is_set():
+                await _graceful_shutdown(tasks[1:], forwarder, epsagon_client)
+                # retrieve the cancelled producer tasks error
+                if tasks_future.done() and not tasks_future.cancelled():
+                    tasks_future.exception()
+                break
+            tasks_future.result()
         except (
                 client_exceptions.ClientError,
                 socket.gaierror,
@@ -137,15 +674,41 @@ async def run(is_debug_mode):
                 RESTART_WAIT_TIME_SECONDS
             )
             _cancel_tasks(tasks)
-            events_manager.clean()
+            if events_manager:
+                events_manager.clean()
+            if events_sender and events_sender.template_encoder:
+                # the collector might not know the templates after reconnect
+                events_sender.template_encoder.reset_session()
+            if delta_encoder:
+                # the cleaned events are lost, sending full objects
+                delta_encoder.reset()
             await asyncio.sleep(RESTART_WAIT_TIME_SECONDS)
         except Exception as exception:
             logging.error(str(exception))
             logging.error(format_exc())
             logging.info("Agent is exiting due to an unexpected error")
             _cancel_tasks(tasks)
-            await epsagon_client.close()
+            if epsagon_client:
+                await epsagon_client.close()
             break
+        finally:
+            shutdown_task.cancel()
+    await api_client.close()
+    if recorder:
+        recorder.close()
+
+
+def _new_event_loop():
+    """
+    Creates a new event loop - an uvloop event loop if configured &
+    installed, otherwise the default asyncio event loop.
+    """
+    if SHOULD_USE_UVLOOP:
+        if uvloop:
+            logging.info("Using uvloop event loop")
+            return uvloop.new_event_loop()
+        logging.warning("uvloop is not installed, using the default event loop")
+    return asyncio.new_event_loop()
 
 
 def main():
@@ -165,6 +728,7 @@ def main():
         )
         return
 
+    set_json_backend(JSON_BACKEND)
     config.load_incluster_config()
     logging.info("Loaded cluster config")
     if is_debug:
@@ -176,9 +740,11 @@ def main():
             bool(loaded_conf.ssl_ca_cert),
             bool(loaded_conf.api_key)
         )
-    loop = asyncio.new_event_loop()
+    loop = _new_event_loop()
     loop.add_signal_handler(signal.SIGHUP, _reload_handler)
-    loop.run_until_complete(run(is_debug))
+    loop.add_signal_handler(signal.SIGUSR1, _cpu_profile_handler)
+    loop.add_signal_handler(signal.SIGUSR2, _memory_profile_handler)
+    loop.run_until_complete(run())
     loop.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""
+Memory accounting - estimates the bytes held by the agent components (the
+events queue, caches & in-flight batches), and reports them with the
+process RSS.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import resource
+from collections import deque
+from enum import Enum
+from itertools import islice
+from typing import Callable, Dict, Iterable, Set
+
+DEFAULT_SAMPLE_SIZE = 100
+# objects which are shared by the whole process, hence not held by a component
+_SHARED_TYPES = (type, Enum, type(None), bool)
+
+
+def get_rss_bytes() -> int:
+    """
+    Gets the process current RSS, in bytes. Falls back to the peak RSS
+    where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/statm", "r") as reader:
+            resident_pages = int(reader.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    Gets the process peak RSS, in bytes (ru_maxrss is in KB on linux)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _get_slots(obj_type: type) -> Iterable[str]:
+    """
+    Gets the slots names of given type & its bases
+    """
+    for cls in obj_type.__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        yield from slots
+
+
+def estimate_size(obj, seen: Set[int] = None) -> int:
+    """
+    Estimates the bytes held by given object & all the objects it refers
+    to - dicts, lists, tuples, sets, deques and objects' attributes. Objects
+    which were already seen are counted once.
+    :param seen: ids of the already counted objects, shared between calls
+    to not count shared objects twice
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if isinstance(obj, _SHARED_TYPES) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float)):
+            continue
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            pending.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                pending.append(obj.__dict__)
+            for slot in _get_slots(type(obj)):
+                if slot != "__dict__" and hasattr(obj, slot):
+                    pending.append(getattr(obj, slot))
+    return size
+
+
+def estimate_items_size(
+        items: Iterable,
+        count: int,
+        sample_size: int = DEFAULT_SAMPLE_SIZE
+) -> int:
+    """
+    Estimates the bytes held by the given items, by the average size of
+    (up to) sample_size of them - bounds the estimation time of big queues
+    and caches.
+    :param items: to estimate, such as a queue or a dict values
+    :param count: of the items
+    :param sample_size: items count to measure
+    """
+    if count <= 0:
+        return 0
+    seen = set()
+    sample_count = 0
+    sample_bytes = 0
+    for item in islice(items, sample_size):
+        sample_bytes += estimate_size(item, seen)
+        sample_count += 1
+    if not sample_count:
+        return 0
+    return int(sample_bytes / sample_count * count)
+
+
+class MemoryAccountant:
+    """
+    Reports the estimated bytes held by the registered agent components,
+    along with the process RSS. Each component is registered with an
+    estimator - a function which returns its held bytes estimation.
+    Estimators should be cheap, as they run on the event loop thread (see
+    estimate_items_size).
+    """
+
+    DEFAULT_LOG_INTERVAL_SECONDS = 300
+
+    def __init__(self, log_interval_seconds: float = DEFAULT_LOG_INTERVAL_SECONDS):
+        """
+        :param log_interval_seconds: interval between memory usage logs
+        """
+        if log_interval_seconds <= 0:
+            raise ValueError("Log interval seconds must be bigger than 0")
+        self.log_interval_seconds = log_interval_seconds
+        self._estimators: Dict[str, Callable[[], int]] = {}
+
+    def register(self, name: str, estimator: Callable[[], int]):
+        """
+        Registers a component, replaces an already registered component of
+        the same name
+        """
+        self._estimators[name] = estimator
+
+    def unregister(self, name: str):
+        """
+        Unregisters a component, if registered
+        """
+        self._estimators.pop(name, None)
+
+    def get_components_bytes(self) -> Dict[str, int]:
+        """
+        Gets the estimated bytes held by each registered component. A
+        failing estimator is reported as None.
+        """
+        components_bytes = {}
+        for name, estimator in self._estimators.items():
+            try:
+                components_bytes[name] = estimator()
+            except Exception: # pylint: disable=broad-except
+                logging.exception("Failed to estimate %s memory", name)
+                components_bytes[name] = None
+        return components_bytes
+
+    def get_stats(self) -> Dict:
+        """
+        Gets the process RSS & peak RSS, the estimated bytes of each
+        component, and their sum
+        """
+        components_bytes = self.get_components_bytes()
+        return {
+            "rss_bytes": get_rss_bytes(),
+            "peak_rss_bytes": get_peak_rss_bytes(),
+            "components_bytes": components_bytes,
+            "accounted_bytes": sum(
+                size for size in components_bytes.values() if size
+            ),
+        }
+
+    async def start(self):
+        """
+        Logs the memory usage periodically, until cancelled.
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.log_interval_seconds)
+                start_time = time.monotonic()
+                stats = self.get_stats()
+                logging.debug(
+                    "Memory usage (estimated in %.3f seconds): %s",
+                    time.monotonic() - start_time,
+                    stats
+                )
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,143 @@
+"""
+Model decoder - decodes raw API objects straight to the dicts their
+kubernetes client models convert to (`to_dict()`), with no model instances.
+The client deserializes a watched object by dumping & loading its JSON again,
+then instantiating (and validating) a model per nested object, which
+`to_dict()` converts back to dicts. The decoder instead compiles a converter
+per model type, by the models `openapi_types` & `attribute_map`.
+"""
+import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+import kubernetes_asyncio
+from dateutil.parser import parse
+from dateutil.tz import tzutc
+
+_PRIMITIVE_TYPES = {
+    "int": int,
+    "long": int,
+    "float": float,
+    "str": str,
+    "bool": bool,
+}
+# the datetimes format of the apiserver, such as `2021-01-01T00:00:00Z`
+_UTC_DATETIME_LENGTH = len("2021-01-01T00:00:00Z")
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetime(value: str) -> datetime.datetime:
+    """
+    Parses the given datetime as the client does - by dateutil, unless it is
+    in the apiserver UTC format
+    """
+    if len(value) == _UTC_DATETIME_LENGTH and value[10] == "T" and value[-1] == "Z":
+        try:
+            return datetime.datetime(
+                int(value[0:4]),
+                int(value[5:7]),
+                int(value[8:10]),
+                int(value[11:13]),
+                int(value[14:16]),
+                int(value[17:19]),
+                tzinfo=tzutc()
+            )
+        except ValueError:
+            pass
+    return parse(value)
+
+
+def _parse_date(value: str) -> datetime.date:
+    return parse(value).date()
+
+
+def _keep(value: Any) -> Any:
+    return value
+
+
+def _create_primitive_converter(primitive_type: type) -> Callable[[Any], Any]:
+    """ Creates a converter of a primitive type, as the client converts it """
+    def convert(value):
+        if type(value) is primitive_type:
+            return value
+        try:
+            return primitive_type(value)
+        except UnicodeEncodeError:
+            return str(value)
+        except TypeError:
+            return value
+    return convert
+
+
+class ModelDecoder:
+    """
+    Decodes raw (JSON loaded) API objects to their client models dicts. The
+    converter of each model type is compiled once, when first decoded.
+    """
+
+    def __init__(self):
+        # type name -> its compiled converter
+        self._converters: Dict[str, Callable[[Any], Any]] = {}
+
+    def decode(self, data: Any, type_name: str) -> Any:
+        """
+        Decodes the given raw object of given type name, such as `V1Pod`
+        :return: the dict its client model `to_dict()` returns
+        """
+        if data is None:
+            return None
+        return self._get_converter(type_name)(data)
+
+    def _get_converter(self, type_name: str) -> Callable[[Any], Any]:
+        converter = self._converters.get(type_name)
+        if converter is None:
+            converter = self._compile(type_name)
+            self._converters[type_name] = converter
+        return converter
+
+    def _compile(self, type_name: str) -> Callable[[Any], Any]:
+        """ Compiles the converter of given type name """
+        if type_name.startswith("list["):
+            convert_item = self._get_converter(type_name[len("list["):-1])
+            return lambda value: [
+                None if item is None else convert_item(item) for item in value
+            ]
+        if type_name.startswith("dict("):
+            convert_item = self._get_converter(type_name[len("dict("):-1].split(", ", 1)[1])
+            return lambda value: {
+                key: None if item is None else convert_item(item)
+                for key, item in value.items()
+            }
+        if type_name in _PRIMITIVE_TYPES:
+            return _create_primitive_converter(_PRIMITIVE_TYPES[type_name])
+        if type_name == "object":
+            return _keep
+        if type_name == "datetime":
+            return _parse_datetime
+        if type_name == "date":
+            return _parse_date
+        return self._compile_model(getattr(kubernetes_asyncio.client.models, type_name))
+
+    def _compile_model(self, model: type) -> Callable[[Any], Any]:
+        """
+        Compiles the converter of given model - missing fields are None, as
+        in the model dict
+        """
+        # (model attribute, JSON key, converter) per model field, compiled
+        # once the converter is registered - models may nest themselves
+        fields: List[Tuple[str, str, Callable[[Any], Any]]] = []
+
+        def convert(value):
+            if not isinstance(value, dict):
+                return {attr: None for attr, _, _ in fields}
+            result = {}
+            for attr, key, convert_field in fields:
+                field_value = value.get(key)
+                result[attr] = None if field_value is None else convert_field(field_value)
+            return result
+
+        self._converters[model.__name__] = convert
+        fields.extend(
+            (attr, model.attribute_map[attr], self._get_converter(attr_type))
+            for attr, attr_type in model.openapi_types.items()
+        )
+        return convert
@@ -0,0 +1,474 @@
+"""
+Multi process pipeline - dispatches the cluster discovery events to worker
+processes. Each worker process converts, encodes & sends its events using
+its own EpsagonClient.
+"""
+import sys
+import json
+import time
+import queue
+import pickle
+import socket
+import asyncio
+import logging
+import threading
+import multiprocessing
+import zlib
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+import kubernetes_asyncio
+from aiohttp.client_exceptions import ClientError
+from cluster_discovery import RawWatchEvent
+from dynamic_targets import decode_object, deserialize_object
+from encoders import set_json_backend
+from epsagon_client import EpsagonClient, EpsagonClientException
+from events_manager import InMemoryEventsManager
+from events_sender import EventsSender
+from forwarder import Forwarder
+from model_decoder import ModelDecoder
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventException,
+    WatchKubernetesEvent,
+)
+from rate_limiter import BandwidthLimiter
+from templates import TemplateEncoder
+
+
+@dataclass
+class WorkerConfig:
+    """ worker process configuration """
+    epsagon_token: str
+    collector_url: str
+    cluster_name: str
+    max_events_to_read: int = Forwarder.DEFAULT_MAX_EVENTS_TO_READ
+    # the drain timeout, unless the dispatcher has sent the time to drain in
+    shutdown_timeout_seconds: float = 20
+    restart_wait_time_seconds: float = 60
+    log_format: str = None
+    is_debug: bool = False
+    json_backend: str = None
+    backlog_compression_threshold: int = None
+    should_dedup_templates: bool = False
+    should_decode_models: bool = False
+    egress_bytes_per_second: float = None
+    egress_burst_bytes: float = None
+
+
+class WorkerProcessException(Exception):
+    pass
+
+
+@dataclass
+class WorkerDrain:
+    """ sent to a worker process last - its time to drain in """
+    timeout_seconds: float
+
+
+def get_shard(uid: Any, shards_count: int) -> int:
+    """
+    Gets the shard of given object uid. The shard is stable across processes,
+    hence all the events of an object are handled by the same worker.
+    Events with no uid (such as the cluster event) go to the first shard.
+    """
+    if uid is None:
+        return 0
+    return zlib.crc32(str(uid).encode()) % shards_count
+
+
+def convert_raw_watch_event(
+        raw_event: RawWatchEvent,
+        api_client: kubernetes_asyncio.client.ApiClient,
+        model_decoder: ModelDecoder = None,
+) -> WatchKubernetesEvent:
+    """
+    Converts a raw watch event to a WatchKubernetesEvent, the same way the
+    cluster discovery converts watch events.
+    :param model_decoder: if given, the watched object is decoded by it,
+    rather than deserialized to its client model
+    """
+    event = json.loads(raw_event.data)
+    obj = event.get(WatchKubernetesEvent.OBJECT_FIELD_KEY)
+    if obj is not None and model_decoder is not None:
+        event[WatchKubernetesEvent.OBJECT_FIELD_KEY] = decode_object(
+            model_decoder,
+            obj,
+            raw_event.return_type
+        )
+    elif obj is not None:
+        event[WatchKubernetesEvent.OBJECT_FIELD_KEY] = deserialize_object(
+            api_client,
+            obj,
+            raw_event.return_type
+        )
+    return WatchKubernetesEvent.from_watch_dict(event)
+
+
+async def _read_events(connection, events_manager, api_client, model_decoder=None):
+    """
+    Reads the dispatched events from the given connection and writes them
+    to the events manager, until the connection is closed.
+    :return: the time to drain in, if the dispatcher has sent it
+    """
+    loop = asyncio.get_event_loop()
+    messages = asyncio.Queue()
+
+    def on_readable():
+        try:
+            while connection.poll():
+                messages.put_nowait(connection.recv_bytes())
+        except (EOFError, OSError):
+            loop.remove_reader(connection.fileno())
+            messages.put_nowait(None)
+
+    loop.add_reader(connection.fileno(), on_readable)
+    drain_timeout_seconds = None
+    while True:
+        message = await messages.get()
+        if message is None:
+            break
+        event = pickle.loads(message)
+        if isinstance(event, WorkerDrain):
+            drain_timeout_seconds = event.timeout_seconds
+            continue
+        if isinstance(event, RawWatchEvent):
+            try:
+                event = convert_raw_watch_event(event, api_client, model_decoder)
+            except KubernetesEventException:
+                logging.debug("Skipping invalid event")
+                continue
+        await events_manager.write_event(event)
+    return drain_timeout_seconds
+
+
+async def _run_worker(connection, result_connection, config: WorkerConfig):
+    """
+    Runs a worker - forwards the dispatched events until the connection is
+    closed, then drains the forwarder and sends its lost events count to
+    the result connection.
+    """
+    events_manager = InMemoryEventsManager(
+        compression_threshold=config.backlog_compression_threshold
+    )
+    api_client = kubernetes_asyncio.client.ApiClient()
+    epsagon_client = await EpsagonClient.create(config.epsagon_token)
+    events_sender = EventsSender(
+        epsagon_client,
+        config.collector_url,
+        config.cluster_name,
+        config.epsagon_token,
+        template_encoder=(
+            TemplateEncoder() if config.should_dedup_templates else None
+        ),
+        bandwidth_limiter=(
+            BandwidthLimiter(
+                config.egress_bytes_per_second,
+                burst_bytes=config.egress_burst_bytes
+            )
+            if config.egress_bytes_per_second else None
+        )
+    )
+    # one batch in flight at a time - concurrent batches may reach the
+    # collector out of order, mixing up the events order of an object
+    forwarder = Forwarder(
+        events_manager,
+        events_sender,
+        max_workers=1,
+        max_events_to_read=config.max_events_to_read
+    )
+    reader_task = asyncio.create_task(
+        _read_events(
+            connection,
+            events_manager,
+            api_client,
+            ModelDecoder() if config.should_decode_models else None
+        )
+    )
+    while True:
+        forwarder_task = asyncio.create_task(forwarder.start())
+        await asyncio.wait(
+            (reader_task, forwarder_task),
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if reader_task.done():
+            break
+        try:
+            forwarder_task.result()
+        except (
+                ClientError,
+                socket.gaierror,
+                ConnectionRefusedError,
+                EpsagonClientException
+        ):
+            logging.error(
+                "Connection error, restarting worker in %d seconds",
+                config.restart_wait_time_seconds
+            )
+            if events_sender.template_encoder:
+                events_sender.template_encoder.reset_session()
+            await asyncio.sleep(config.restart_wait_time_seconds)
+
+    drain_timeout_seconds = reader_task.result()
+    flushed_events_count, lost_events_count = await forwarder.drain(
+        config.shutdown_timeout_seconds
+        if drain_timeout_seconds is None else drain_timeout_seconds
+    )
+    logging.info(
+        "Worker shut down, %d events flushed, %d events lost",
+        flushed_events_count,
+        lost_events_count
+    )
+    await epsagon_client.close()
+    await api_client.close()
+    result_connection.send(lost_events_count)
+    result_connection.close()
+
+
+def run_worker_process(connection, result_connection, config: WorkerConfig):
+    """
+    Worker process main function
+    """
+    logging.basicConfig(
+        stream=sys.stdout,
+        format=config.log_format,
+        level=logging.DEBUG if config.is_debug else logging.INFO
+    )
+    set_json_backend(config.json_backend)
+    asyncio.run(_run_worker(connection, result_connection, config))
+
+
+class _WorkerHandle:
+    """
+    A worker process handle - sends messages to the worker process using
+    a sender thread, so the event loop is never blocked on a full pipe.
+    """
+
+    # interval to check whether the handle is closed while idle
+    CLOSE_CHECK_INTERVAL_SECONDS = 0.1
+
+    def __init__(self, process, connection, result_connection, max_queued_messages: int):
+        """
+        :param process: the worker process
+        :param connection: to send the messages to the worker by
+        :param result_connection: to receive the worker lost events count by
+        :param max_queued_messages: count of messages to queue, the handle
+        is full once reached
+        """
+        self.process = process
+        self.connection = connection
+        self.result_connection = result_connection
+        self.messages = queue.Queue(maxsize=max_queued_messages)
+        self.dispatched_events_count: int = 0
+        # monotonic time the worker must be drained by, set once closed
+        self._drain_deadline: float = None
+        self.sender_thread = threading.Thread(
+            target=self._send_messages,
+            name=f"{process.name}-sender",
+            daemon=True
+        )
+        self.sender_thread.start()
+
+    def _send_messages(self):
+        """
+        Sender thread main function - once closed & all the messages are
+        sent, sends the worker its time left to drain in and closes the
+        connection
+        """
+        try:
+            while True:
+                try:
+                    message = self.messages.get(
+                        timeout=self.CLOSE_CHECK_INTERVAL_SECONDS
+                    )
+                except queue.Empty:
+                    if self._drain_deadline is not None:
+                        break
+                    continue
+                self.connection.send_bytes(message)
+            drain = WorkerDrain(max(self._drain_deadline - time.monotonic(), 0))
+            self.connection.send_bytes(pickle.dumps(drain, pickle.HIGHEST_PROTOCOL))
+        except (OSError, ValueError):
+            logging.error("Failed to send events to %s", self.process.name)
+        self.connection.close()
+
+    def send(self, message: bytes) -> bool:
+        """
+        Sends a message to the worker process
+        :return: False if the handle is full, the message isn't sent
+        """
+        try:
+            self.messages.put_nowait(message)
+        except queue.Full:
+            return False
+        self.dispatched_events_count += 1
+        return True
+
+    def close(self, drain_deadline: float):
+        """
+        Closes the worker connection, once all the messages are sent
+        :param drain_deadline: monotonic time the worker must be drained by
+        """
+        self._drain_deadline = drain_deadline
+
+    def get_lost_events_count(self) -> int:
+        """
+        Gets the lost events count of the exited worker - all its events if
+        it hasn't reported its count (e.g. it was terminated)
+        """
+        if not self.result_connection.poll():
+            return self.dispatched_events_count
+        try:
+            return self.result_connection.recv()
+        except (EOFError, OSError):
+            return self.dispatched_events_count
+
+
+class ShardedEventsDispatcher:
+    """
+    Dispatches events to worker processes, sharded by the event object uid
+    to preserve the events order of each object - each worker sends its
+    events batches one at a time.
+    The events queued to each worker are bounded - once a worker queue is
+    full, the writes wait for it (back pressuring the cluster discovery).
+    Can be used instead of a Forwarder - see start & drain.
+    """
+
+    MONITOR_INTERVAL_SECONDS = 1
+    # time given to the workers to exit, on top of the drain timeout
+    WORKER_EXIT_GRACE_SECONDS = 2
+    DEFAULT_MAX_QUEUED_EVENTS = 10000
+    # interval to retry writing to a full worker queue
+    FULL_QUEUE_RETRY_SECONDS = 0.01
+
+    def __init__(
+            self,
+            workers_count: int,
+            config: WorkerConfig,
+            max_queued_events: int = DEFAULT_MAX_QUEUED_EVENTS,
+    ):
+        """
+        :param workers_count: of worker processes to run
+        :param config: of each worker process
+        :param max_queued_events: count of events to queue to each worker,
+        in the dispatcher process
+        """
+        if workers_count < 1:
+            raise ValueError("Invalid workers count value, must be > 0")
+        if max_queued_events < 1:
+            raise ValueError("Invalid max queued events value, must be > 0")
+        self.workers_count = workers_count
+        self.config = config
+        self.max_queued_events = max_queued_events
+        self.dispatched_events_count: int = 0
+        # times a write has waited for a full worker queue
+        self.full_queue_waits_count: int = 0
+        self._workers: List[_WorkerHandle] = []
+
+    def start_workers(self):
+        """
+        Starts the worker processes
+        """
+        context = multiprocessing.get_context("spawn")
+        for i in range(self.workers_count):
+            receiver, sender = context.Pipe(duplex=False)
+            result_receiver, result_sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_worker_process,
+                args=(receiver, result_sender, self.config),
+                name=f"epsagon-worker-{i}",
+                daemon=True
+            )
+            process.start()
+            receiver.close()
+            result_sender.close()
+            self._workers.append(
+                _WorkerHandle(process, sender, result_receiver, self.max_queued_events)
+            )
+
+    async def _dispatch(self, uid: Any, message: bytes):
+        """
+        Dispatches a message to the worker of given object uid, waits while
+        the worker queue is full
+        """
+        worker = self._workers[get_shard(uid, self.workers_count)]
+        if not worker.send(message):
+            self.full_queue_waits_count += 1
+            while not worker.send(message):
+                await asyncio.sleep(self.FULL_QUEUE_RETRY_SECONDS)
+        self.dispatched_events_count += 1
+
+    async def write_event(self, event: KubernetesEvent):
+        """
+        Dispatches an event
+        """
+        metadata = {}
+        if isinstance(event.data, dict):
+            metadata = event.data.get("metadata") or {}
+        await self._dispatch(
+            metadata.get("uid"),
+            pickle.dumps(event, pickle.HIGHEST_PROTOCOL)
+        )
+
+    async def write_raw_watch_event(self, event: RawWatchEvent):
+        """
+        Dispatches a raw watch event, to be converted by the worker
+        """
+        await self._dispatch(event.uid, pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+
+    async def start(self):
+        """
+        Monitors the worker processes, until cancelled.
+        Raises WorkerProcessException if any of the workers has exited.
+        """
+        try:
+            while True:
+                for worker in self._workers:
+                    if not worker.process.is_alive():
+                        raise WorkerProcessException(
+                            f"{worker.process.name} exited with code "
+                            f"{worker.process.exitcode}"
+                        )
+                await asyncio.sleep(self.MONITOR_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            pass
+
+    async def drain(self, timeout: float) -> Tuple[int, int]:
+        """
+        Drains the dispatcher - closes the workers connections once all the
+        dispatched events are sent to the workers, and waits for the workers
+        to drain (by the same deadline) & exit. Workers which haven't exited
+        on time are terminated, all their events are counted as lost.
+        Should be called once no more events are written.
+        :param timeout: in seconds, to send the dispatched events to the
+        workers and for the workers to drain
+        :return: a tuple of the events count sent by the workers & the
+        events count which were lost
+        """
+        loop = asyncio.get_event_loop()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.close(deadline)
+        for worker in self._workers:
+            await loop.run_in_executor(
+                None,
+                worker.sender_thread.join,
+                max(deadline - time.monotonic(), 0)
+            )
+        lost_events_count = 0
+        deadline += self.WORKER_EXIT_GRACE_SECONDS
+        for worker in self._workers:
+            await loop.run_in_executor(
+                None,
+                worker.process.join,
+                max(deadline - time.monotonic(), 0)
+            )
+            if worker.process.is_alive():
+                logging.warning("Terminating %s", worker.process.name)
+                worker.process.terminate()
+                lost_events_count += worker.dispatched_events_count
+            else:
+                lost_events_count += worker.get_lost_events_count()
+        return (
+            self.dispatched_events_count - lost_events_count,
+            lost_events_count
+        )
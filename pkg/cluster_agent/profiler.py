@@ -0,0 +1,160 @@
+"""
+On demand profiler - CPU profiles, memory snapshot diffs & asyncio tasks dumps
+"""
+import os
+import io
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+
+class Profiler:
+    """
+    On demand profiler. Each profiling result is written to a file in the
+    output directory. Nothing is profiled or traced unless requested.
+    """
+
+    DEFAULT_CPU_PROFILE_DURATION_SECONDS = 30
+    # agent modules to group memory allocations by, the rest are grouped
+    # as `other`
+    DEFAULT_MODULES = (
+        "cluster_discovery",
+        "kubernetes_event",
+        "events_manager",
+        "events_sender",
+        "forwarder",
+    )
+    OTHER_MODULE = "other"
+    TOP_LINES_COUNT = 25
+
+    def __init__(
+            self,
+            output_dir: str,
+            cpu_profile_duration_seconds: float = DEFAULT_CPU_PROFILE_DURATION_SECONDS,
+            modules: Tuple[str] = DEFAULT_MODULES,
+    ):
+        """
+        :param output_dir: to write the profiling results to
+        :param cpu_profile_duration_seconds: default CPU profile duration
+        :param modules: to group memory allocations by
+        """
+        if cpu_profile_duration_seconds <= 0:
+            raise ValueError("CPU profile duration seconds must be bigger than 0")
+        self.output_dir = output_dir
+        self.cpu_profile_duration_seconds = cpu_profile_duration_seconds
+        self.modules = modules
+        self.is_profiling_cpu = False
+        self._memory_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def _get_output_path(self, name: str, extension: str = "txt") -> str:
+        """
+        Gets an output file path for given profiling result name
+        """
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(
+            self.output_dir,
+            f"epsagon_{name}_{timestamp}.{extension}"
+        )
+
+    async def profile_cpu(self, duration_seconds: float = None) -> Optional[str]:
+        """
+        Profiles the event loop thread for the given duration, and writes
+        the profile stats (sorted by cumulative time) and the raw profile.
+        If the CPU is already being profiled, returns None.
+        :param duration_seconds: to profile, defaults to
+        cpu_profile_duration_seconds
+        :return: the profile stats file path
+        """
+        if self.is_profiling_cpu:
+            logging.info("CPU is already being profiled")
+            return None
+        self.is_profiling_cpu = True
+        profile = cProfile.Profile()
+        try:
+            logging.info("Profiling CPU")
+            profile.enable()
+            await asyncio.sleep(duration_seconds or self.cpu_profile_duration_seconds)
+        finally:
+            profile.disable()
+            self.is_profiling_cpu = False
+
+        profile.dump_stats(self._get_output_path("cpu_profile", "prof"))
+        stats_output = io.StringIO()
+        pstats.Stats(profile, stream=stats_output).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats()
+        output_path = self._get_output_path("cpu_profile")
+        with open(output_path, "w") as writer:
+            writer.write(stats_output.getvalue())
+        logging.info("CPU profile written to %s", output_path)
+        return output_path
+
+    def _get_module(self, filename: str) -> str:
+        """
+        Gets the agent module of given file name
+        """
+        module = os.path.splitext(os.path.basename(filename))[0]
+        return module if module in self.modules else self.OTHER_MODULE
+
+    def _group_by_module(self, stats) -> Dict[str, Tuple[int, int]]:
+        """
+        Groups snapshot diff stats by module.
+        :return: size diff & count diff per module
+        """
+        modules = defaultdict(lambda: [0, 0])
+        for stat in stats:
+            module = modules[self._get_module(stat.traceback[0].filename)]
+            module[0] += stat.size_diff
+            module[1] += stat.count_diff
+        return {module: tuple(diffs) for module, diffs in modules.items()}
+
+    def snapshot_memory(self) -> Optional[str]:
+        """
+        Toggles memory tracing. The first call starts tracing memory
+        allocations, the next call writes the allocations diff since the
+        first call, grouped by module, and stops tracing.
+        :return: the memory diff file path, None if tracing has just started
+        """
+        if self._memory_snapshot is None:
+            tracemalloc.start()
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            logging.info("Started tracing memory allocations")
+            return None
+
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = snapshot.compare_to(self._memory_snapshot, "lineno")
+        self._memory_snapshot = None
+        output_path = self._get_output_path("memory_diff")
+        with open(output_path, "w") as writer:
+            writer.write("Allocations diff by module (size diff, count diff):\n")
+            for module, (size_diff, count_diff) in sorted(
+                    self._group_by_module(stats).items(),
+                    key=lambda item: -abs(item[1][0])
+            ):
+                writer.write(f"{module}: {size_diff:+d} B, {count_diff:+d}\n")
+            writer.write(f"\nTop {self.TOP_LINES_COUNT} lines:\n")
+            for stat in stats[:self.TOP_LINES_COUNT]:
+                writer.write(f"{stat}\n")
+        logging.info("Memory allocations diff written to %s", output_path)
+        return output_path
+
+    def dump_tasks(self) -> str:
+        """
+        Writes the stack of all the event loop tasks.
+        :return: the tasks dump file path
+        """
+        tasks = asyncio.all_tasks()
+        output_path = self._get_output_path("tasks")
+        with open(output_path, "w") as writer:
+            writer.write(f"{len(tasks)} tasks\n")
+            for task in tasks:
+                writer.write(f"\n{task!r}\n")
+                task.print_stack(file=writer)
+        logging.info("Tasks dump written to %s", output_path)
+        return output_path
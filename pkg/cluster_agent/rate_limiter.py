@@ -0,0 +1,195 @@
+"""
+Rate limiting - token buckets & a bandwidth limiter
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Hashable, Tuple
+
+
+class TokenBucket:
+    """
+    A token bucket - tokens are added at a constant rate, up to the bucket
+    capacity (the allowed burst). Each rate limited action takes tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        :param rate: tokens added per second
+        :param capacity: max tokens in the bucket, defaults to rate (one
+        second burst). The bucket starts full.
+        """
+        if rate <= 0:
+            raise ValueError("Invalid rate value, must be > 0")
+        if capacity is None:
+            capacity = rate
+        if capacity <= 0:
+            raise ValueError("Invalid capacity value, must be > 0")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens: float = capacity
+        self._update_time: float = time.monotonic()
+        self._lock: asyncio.Lock = None
+
+    def get_tokens(self) -> float:
+        """
+        Gets the current tokens count in the bucket
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._update_time) * self.rate
+        )
+        self._update_time = now
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Takes the given tokens count, if the bucket has enough tokens.
+        :return: True if the tokens were taken, False otherwise
+        """
+        if self.get_tokens() < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def get_wait_time(self, tokens: float = 1) -> float:
+        """
+        Gets the time, in seconds, until the bucket has the given tokens count
+        """
+        return max(tokens - self.get_tokens(), 0) / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        """
+        Takes the given tokens count, waits until the bucket has enough
+        tokens. Waiting acquires are served in order.
+        Tokens counts bigger than the bucket capacity are allowed - the
+        bucket goes into debt, delaying the next acquires.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            wait_time = self.get_wait_time(min(tokens, self.capacity))
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+                self.get_tokens()
+            self._tokens -= tokens
+
+
+class KeyedTokenBuckets:
+    """
+    Token buckets by key, all with the same rate & capacity. Buckets are
+    created on first use.
+    """
+
+    DEFAULT_MAX_KEYS = 10000
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float = None,
+            max_keys: int = DEFAULT_MAX_KEYS
+    ):
+        """
+        :param rate: tokens added per second, to each bucket
+        :param capacity: max tokens of each bucket
+        :param max_keys: buckets count to hold, all the buckets are dropped
+        (hence refilled) once reached
+        """
+        # validates the params
+        TokenBucket(rate, capacity)
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+
+    def get(self, key: Hashable) -> TokenBucket:
+        """
+        Gets the token bucket of given key
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets = {}
+            bucket = TokenBucket(self.rate, self.capacity)
+            self._buckets[key] = bucket
+        return bucket
+
+
+class BandwidthLimiter:
+    """
+    Limits the sent bytes rate, using a token bucket of bytes. Senders wait
+    for the limiter before sending, hence slow down their callers (e.g. the
+    forwarder stops reading events while all its workers wait).
+    """
+
+    DEFAULT_RATE_WINDOW_SECONDS = 10
+    DEFAULT_LOG_INTERVAL_SECONDS = 60
+
+    def __init__(
+            self,
+            bytes_per_second: float,
+            burst_bytes: float = None,
+            rate_window_seconds: float = DEFAULT_RATE_WINDOW_SECONDS,
+            log_interval_seconds: float = DEFAULT_LOG_INTERVAL_SECONDS,
+    ):
+        """
+        :param bytes_per_second: sent bytes rate limit
+        :param burst_bytes: bytes which can be sent at once, defaults to
+        bytes_per_second (one second burst)
+        :param rate_window_seconds: to measure the current sent bytes rate in
+        :param log_interval_seconds: between stats debug logs
+        """
+        self._bucket = TokenBucket(bytes_per_second, burst_bytes)
+        self.rate_window_seconds = rate_window_seconds
+        self.log_interval_seconds = log_interval_seconds
+        self.sent_bytes: int = 0
+        self.queued_bytes: int = 0
+        self.throttled_seconds: float = 0
+        self._sent_samples: Deque[Tuple[float, int]] = deque()
+        self._last_log_time: float = time.monotonic()
+
+    def get_current_rate(self) -> float:
+        """
+        Gets the sent bytes rate, in bytes per second, over the last rate
+        window
+        """
+        window_start_time = time.monotonic() - self.rate_window_seconds
+        while self._sent_samples and self._sent_samples[0][0] < window_start_time:
+            self._sent_samples.popleft()
+        return (
+            sum(sent_bytes for _, sent_bytes in self._sent_samples) /
+            self.rate_window_seconds
+        )
+
+    def get_stats(self) -> Dict:
+        """
+        Gets the limiter stats - the current rate, the total throttled time &
+        the bytes waiting to be sent
+        """
+        return {
+            "bytes_per_second_limit": self._bucket.rate,
+            "current_bytes_per_second": self.get_current_rate(),
+            "sent_bytes": self.sent_bytes,
+            "queued_bytes": self.queued_bytes,
+            "throttled_seconds": self.throttled_seconds,
+        }
+
+    async def acquire(self, sent_bytes: int):
+        """
+        Waits until the given bytes count can be sent
+        """
+        self.queued_bytes += sent_bytes
+        start_time = time.monotonic()
+        try:
+            await self._bucket.acquire(sent_bytes)
+        finally:
+            self.queued_bytes -= sent_bytes
+        now = time.monotonic()
+        self.throttled_seconds += now - start_time
+        self.sent_bytes += sent_bytes
+        self._sent_samples.append((now, sent_bytes))
+        if now - self._last_log_time >= self.log_interval_seconds:
+            self._last_log_time = now
+            logging.debug("Egress bandwidth: %s", self.get_stats())
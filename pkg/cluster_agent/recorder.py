@@ -0,0 +1,129 @@
+"""
+Watch recorder - records the raw list & watch traffic of the cluster
+discovery, per kind, to gzip compressed NDJSON files. The recordings can be
+replayed offline (see benchmarks/replay).
+"""
+import os
+import gzip
+import json
+import time
+import zlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+RECORDING_FILE_SUFFIX = ".ndjson.gz"
+
+
+class WatchRecordPhase:
+    """ recorded traffic phases """
+    LIST = "list"
+    WATCH = "watch"
+
+
+@dataclass
+class WatchRecord:
+    """ a recorded list response or watch event """
+    time: float # seconds since the recording started
+    phase: str # see WatchRecordPhase
+    data: str # the raw list response body / watch event line
+
+
+def get_recording_path(output_dir: str, kind: str) -> str:
+    """
+    Gets the recording file path of given kind
+    """
+    return os.path.join(output_dir, f"{kind}{RECORDING_FILE_SUFFIX}")
+
+
+def read_recording(path: str) -> Iterator[WatchRecord]:
+    """
+    Reads the records of given recording file. A truncated recording (such as
+    of a killed agent) is read up to its last complete record.
+    """
+    with gzip.open(path, "rb") as reader:
+        try:
+            for line in reader:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a partially written last line
+                    break
+                yield WatchRecord(record["time"], record["phase"], record["data"])
+        except (EOFError, zlib.error):
+            logging.warning("Recording %s is truncated", path)
+
+
+class WatchRecorder:
+    """
+    Records raw list responses & watch events, with their timing, to a gzip
+    compressed NDJSON file per kind. Each line is a record:
+    `{"time": <seconds since start>, "phase": "list"|"watch", "data": <raw>}`.
+    Blocks the event loop while writing - meant for recording sessions, not
+    for normal operation.
+    """
+
+    COMPRESSION_LEVEL = 1
+
+    def __init__(self, output_dir: str, duration_seconds: float = None):
+        """
+        :param output_dir: to write the recording files to, created if needed
+        :param duration_seconds: if given, stops recording after this time
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.duration_seconds = duration_seconds
+        self.is_recording: bool = True
+        self.records_count: int = 0
+        self._start_time: float = time.monotonic()
+        self._writers: Dict[str, gzip.GzipFile] = {}
+
+    def _get_writer(self, kind: str) -> gzip.GzipFile:
+        """
+        Gets the recording file writer of given kind
+        """
+        writer = self._writers.get(kind)
+        if writer is None:
+            writer = gzip.open(
+                get_recording_path(self.output_dir, kind),
+                "wb",
+                compresslevel=self.COMPRESSION_LEVEL
+            )
+            self._writers[kind] = writer
+        return writer
+
+    def _record(self, kind: str, phase: str, data: str):
+        """
+        Writes a record to the recording file of given kind
+        """
+        if not self.is_recording:
+            return
+        record_time = time.monotonic() - self._start_time
+        if self.duration_seconds is not None and record_time >= self.duration_seconds:
+            logging.info("Recording duration reached, stopping the recording")
+            self.close()
+            return
+        record = {"time": record_time, "phase": phase, "data": data}
+        self._get_writer(kind).write(json.dumps(record).encode() + b"\n")
+        self.records_count += 1
+
+    def record_list(self, kind: str, body: str):
+        """
+        Records a raw list response body of given kind
+        """
+        self._record(kind, WatchRecordPhase.LIST, body)
+
+    def record_watch_event(self, kind: str, line: str):
+        """
+        Records a raw watch event line of given kind
+        """
+        self._record(kind, WatchRecordPhase.WATCH, line.rstrip("\n"))
+
+    def close(self):
+        """
+        Stops recording & closes the recording files
+        """
+        self.is_recording = False
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
@@ -0,0 +1,368 @@
+"""
+Sharding - splits the cluster discovery between the agent replicas. The
+replicas coordinate through coordination.k8s.io Leases - each replica renews
+its own member Lease, and a single replica holds the leader Lease. The
+namespaces are split between the live members by consistent hashing, and the
+leader watches the cluster scoped kinds as well.
+"""
+import time
+import bisect
+import socket
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, Optional
+import kubernetes_asyncio
+from kubernetes_asyncio.client.rest import ApiException
+from aiohttp.client_exceptions import ClientError
+from cluster_discovery import ClusterDiscovery
+from delta_encoder import DeltaEncoder
+from interning import Interner
+from leader_election import LeaderElector
+
+SHARD_GROUP_LABEL = "app.epsagon.com/shard-group"
+
+
+def _hash(value: str) -> int:
+    """ Hashes the given value to a 64 bit int """
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(),
+        "big"
+    )
+
+
+class HashRing:
+    """
+    Consistent hash ring - each member is placed on the ring at virtual_nodes
+    points, and a key is owned by the member of the first point after the
+    key hash. Once a member is added or removed, only the keys of its points
+    move.
+    """
+
+    DEFAULT_VIRTUAL_NODES = 64
+
+    def __init__(self, members: Iterable[str], virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        """
+        :param members: to split the keys between
+        :param virtual_nodes: points count of each member
+        """
+        if virtual_nodes < 1:
+            raise ValueError("Invalid virtual nodes value, must be > 0")
+        self.members: FrozenSet[str] = frozenset(members)
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._owners = [member for _, member in points]
+
+    def get_owner(self, key: str) -> Optional[str]:
+        """
+        Gets the member which owns the given key, None if there are no members
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+@dataclass(frozen=True)
+class ShardAssignment:
+    """ the watched scope of a replica """
+    is_leader: bool # whether to watch the cluster scoped kinds
+    namespaces: FrozenSet[str] # to watch the namespaced kinds of
+    members: FrozenSet[str] # the live members identities
+
+
+class ShardCoordinator(LeaderElector):
+    """
+    Coordinates the replicas of a shard group through Leases, in the agent
+    namespace, labeled by the group:
+    - `<group>-member-<identity>` - renewed by each replica while running.
+    - `<group>-leader` - held by the leader replica (see LeaderElector).
+    The leader deletes the expired member Leases. A replica which fails to
+    renew its member Lease in time drops its namespaces, before the other
+    replicas take them over.
+    """
+
+    def __init__(
+            self,
+            identity: str,
+            namespace: str,
+            group: str,
+            api_client=None,
+            lease_duration_seconds: float = LeaderElector.DEFAULT_LEASE_DURATION_SECONDS,
+            renew_interval_seconds: float = LeaderElector.DEFAULT_RENEW_INTERVAL_SECONDS,
+            virtual_nodes: int = HashRing.DEFAULT_VIRTUAL_NODES,
+    ):
+        """
+        :param identity: of this replica, unique in the group (the pod name)
+        :param namespace: to create the Leases in (the agent namespace)
+        :param group: the shard group name, prefixes the Leases names
+        :param api_client: of the cluster. If not given, using the default one.
+        :param lease_duration_seconds: Leases duration
+        :param renew_interval_seconds: interval between the Leases renewals,
+        must be less than half of the Leases duration
+        :param virtual_nodes: hash ring points count of each member
+        """
+        super().__init__(
+            identity,
+            namespace,
+            f"{group}-leader",
+            api_client=api_client,
+            lease_duration_seconds=lease_duration_seconds,
+            renew_interval_seconds=renew_interval_seconds,
+            labels={SHARD_GROUP_LABEL: group},
+        )
+        self.group = group
+        self.virtual_nodes = virtual_nodes
+        self.core_client = kubernetes_asyncio.client.CoreV1Api(api_client=api_client)
+        self.assignment: ShardAssignment = None
+        # monotonic time of the last member Lease renewal
+        self._member_renew_time: float = None
+
+    @property
+    def member_lease_name(self) -> str:
+        """ this replica member Lease name """
+        return f"{self.group}-member-{self.identity}"
+
+    @property
+    def leader_lease_name(self) -> str:
+        """ the leader Lease name """
+        return self.lease_name
+
+    async def _renew_member_lease(self):
+        """ Creates or renews this replica member Lease """
+        lease = await self._read_lease(self.member_lease_name)
+        if lease is None:
+            await self.coordination_client.create_namespaced_lease(
+                self.namespace,
+                self._create_lease_body(self.member_lease_name, self.identity)
+            )
+        else:
+            await self.coordination_client.replace_namespaced_lease(
+                self.member_lease_name,
+                self.namespace,
+                self._create_lease_body(
+                    self.member_lease_name,
+                    self.identity,
+                    resource_version=lease.metadata.resource_version,
+                    acquire_time=lease.spec.acquire_time,
+                )
+            )
+        self._member_renew_time = time.monotonic()
+
+    def _is_member(self) -> bool:
+        """
+        Returns whether this replica is still a member - it renewed its
+        member Lease recently enough to drop its namespaces before the Lease
+        expires for the other replicas
+        """
+        return (
+            self._member_renew_time is not None and
+            time.monotonic() - self._member_renew_time <
+            self.lease_duration_seconds - self.renew_interval_seconds
+        )
+
+    async def _get_members(self, is_leader: bool) -> FrozenSet[str]:
+        """
+        Gets the live members identities, including this replica. The
+        leader deletes the expired member Leases.
+        """
+        leases = await self.coordination_client.list_namespaced_lease(
+            self.namespace,
+            label_selector=f"{SHARD_GROUP_LABEL}={self.group}"
+        )
+        member_prefix = f"{self.group}-member-"
+        members = {self.identity}
+        for lease in leases.items:
+            name = lease.metadata.name
+            if not name.startswith(member_prefix):
+                continue
+            if not self._is_expired(lease):
+                members.add(lease.spec.holder_identity)
+                continue
+            if is_leader and name != self.member_lease_name:
+                logging.info("Deleting expired member lease %s", name)
+                await self._delete_lease(name)
+        return frozenset(members)
+
+    async def _list_namespaces(self) -> FrozenSet[str]:
+        """ Lists the cluster namespaces names """
+        namespaces = await self.core_client.list_namespace()
+        return frozenset(namespace.metadata.name for namespace in namespaces.items)
+
+    async def _coordinate(self) -> ShardAssignment:
+        """
+        Renews the Leases & gets this replica assignment by the live members
+        """
+        await self._renew_member_lease()
+        is_leader = await self._try_acquire_leadership()
+        members = await self._get_members(is_leader)
+        ring = HashRing(members, self.virtual_nodes)
+        namespaces = frozenset(
+            namespace for namespace in await self._list_namespaces()
+            if ring.get_owner(namespace) == self.identity
+        )
+        return ShardAssignment(is_leader, namespaces, members)
+
+    async def release(self):
+        """
+        Releases the Leases - deletes this replica member Lease and releases
+        the leader Lease if held, for the other replicas to take over without
+        waiting for the Leases to expire
+        """
+        self._member_renew_time = None
+        await self._delete_lease(self.member_lease_name)
+        await super().release()
+
+    async def start(self, on_assignment: Callable[[ShardAssignment], Awaitable]):
+        """
+        Coordinates every renew interval until cancelled, and calls the given
+        handler whenever this replica assignment changes. While the Leases
+        can't be renewed, keeps the current assignment until the renew
+        deadlines pass - steps down once the leader Lease can't be renewed
+        in time, and drops its namespaces once its member Lease can't.
+        """
+        while True:
+            try:
+                assignment = await self._coordinate()
+            except (ApiException, ClientError, socket.gaierror) as exception:
+                logging.warning("Failed to coordinate the shards: %s", exception)
+                assignment = self.assignment
+                if assignment and (
+                        (assignment.is_leader and not self._is_leader()) or
+                        (assignment.namespaces and not self._is_member())
+                ):
+                    assignment = ShardAssignment(
+                        assignment.is_leader and self._is_leader(),
+                        assignment.namespaces if self._is_member() else frozenset(),
+                        assignment.members
+                    )
+            if assignment != self.assignment:
+                logging.info(
+                    "Shard assignment changed - leader: %s, %d namespaces, %d members",
+                    assignment.is_leader,
+                    len(assignment.namespaces),
+                    len(assignment.members)
+                )
+                self.assignment = assignment
+                await on_assignment(assignment)
+            await asyncio.sleep(self.renew_interval_seconds)
+
+
+class ShardedClusterDiscovery:
+    """
+    Runs the cluster discovery of this replica shard, by the shard
+    coordinator assignment - a ClusterDiscovery per assigned namespace, and
+    a ClusterDiscovery of the cluster scoped kinds & the cluster info while
+    leader. Discoveries are started & stopped as the assignment changes, a
+    started discovery lists its scope first.
+    """
+
+    # the cluster scoped discovery key
+    CLUSTER_SCOPE = None
+
+    def __init__(
+            self,
+            coordinator: ShardCoordinator,
+            create_discovery: Callable[..., ClusterDiscovery],
+            delta_encoder: DeltaEncoder = None,
+            interner: Interner = None,
+    ):
+        """
+        :param coordinator: to get the assignment from
+        :param create_discovery: creates a ClusterDiscovery, of given
+        `namespace` or `kinds` keyword arguments
+        :param delta_encoder: the delta encoder of the created discoveries,
+        if any
+        :param interner: the interner of the created discoveries, if any
+        """
+        self.coordinator = coordinator
+        self.create_discovery = create_discovery
+        self.delta_encoder = delta_encoder
+        self.interner = interner
+        # namespace (or CLUSTER_SCOPE) -> its discovery task
+        self._discovery_tasks: Dict[Optional[str], asyncio.Task] = {}
+        self._discoveries: Dict[Optional[str], ClusterDiscovery] = {}
+
+    def _start_discovery(self, key: Optional[str]):
+        """ Starts the discovery of given namespace, or the cluster scoped one """
+        if key is self.CLUSTER_SCOPE:
+            discovery = self.create_discovery(kinds=ClusterDiscovery.CLUSTER_SCOPED_KINDS)
+        else:
+            discovery = self.create_discovery(namespace=key)
+        self._discoveries[key] = discovery
+        self._discovery_tasks[key] = asyncio.create_task(discovery.start())
+
+    async def _stop_discoveries(self, keys: Iterable[Optional[str]]):
+        """ Stops the discoveries of given keys """
+        tasks = [self._discovery_tasks.pop(key) for key in keys]
+        for key in keys:
+            self._discoveries.pop(key, None)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def apply(self, assignment: ShardAssignment):
+        """
+        Starts & stops the discoveries by the given assignment
+        """
+        keys = set(assignment.namespaces)
+        if assignment.is_leader:
+            keys.add(self.CLUSTER_SCOPE)
+        await self._stop_discoveries(set(self._discovery_tasks) - keys)
+        for key in keys - set(self._discovery_tasks):
+            self._start_discovery(key)
+
+    def _check_discoveries(self, finished_tasks):
+        """
+        Raises the error of a failed discovery, if any, and drops the
+        finished discoveries
+        """
+        for key, task in list(self._discovery_tasks.items()):
+            if task in finished_tasks:
+                del self._discovery_tasks[key]
+                self._discoveries.pop(key, None)
+                if not task.cancelled():
+                    task.result()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Gets the watch targets health of each running discovery, by its
+        namespace (or `cluster` for the cluster scoped one)
+        """
+        return {
+            "cluster" if key is self.CLUSTER_SCOPE else key: discovery.get_stats()
+            for key, discovery in self._discoveries.items()
+        }
+
+    async def start(self):
+        """
+        Runs the shard coordinator & the assigned discoveries, until
+        cancelled or a discovery fails. Releases the coordinator Leases once
+        stopped.
+        """
+        coordinator_task = asyncio.create_task(self.coordinator.start(self.apply))
+        try:
+            while True:
+                finished_tasks, _ = await asyncio.wait(
+                    [coordinator_task, *self._discovery_tasks.values()],
+                    timeout=self.coordinator.renew_interval_seconds,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if coordinator_task in finished_tasks:
+                    coordinator_task.result()
+                self._check_discoveries(finished_tasks)
+        finally:
+            coordinator_task.cancel()
+            await asyncio.wait([coordinator_task])
+            await self._stop_discoveries(list(self._discovery_tasks))
+            self.coordinator.assignment = None
+            try:
+                await self.coordinator.release()
+            except (ApiException, ClientError, socket.gaierror) as exception:
+                logging.warning("Failed to release the shard leases: %s", exception)
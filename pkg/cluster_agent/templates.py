@@ -0,0 +1,228 @@
+"""
+Templates - content addressed dedup of large repeated sub-documents (such as
+the containers of pods of the same deployment) in the sent events
+"""
+import uuid
+import hashlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+import encoders
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    SerializedKubernetesEvent,
+    WatchKubernetesEvent,
+)
+from memory_accounting import estimate_items_size
+
+TEMPLATE_KEY = "$template"
+
+
+class TemplateException(Exception):
+    pass
+
+
+def get_template_hash(body: bytes) -> str:
+    """
+    Gets the content hash of given serialized template body
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def resolve_templates(obj, templates: Dict[str, Any]):
+    """
+    Resolves the template references in the given object - as done by the
+    collector.
+    :param templates: the template bodies, by their hash
+    :return: the resolved object
+    """
+    if isinstance(obj, dict):
+        if len(obj) == 1 and TEMPLATE_KEY in obj:
+            template_hash = obj[TEMPLATE_KEY]
+            if template_hash not in templates:
+                raise TemplateException(f"Unknown template `{template_hash}`")
+            return templates[template_hash]
+        return {
+            key: resolve_templates(value, templates)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, list):
+        return [resolve_templates(value, templates) for value in obj]
+    return obj
+
+
+class TemplateEncoder:
+    """
+    Encodes events with their large sub-documents, at the template paths of
+    the watched objects, replaced by a `{"$template": <content hash>}`
+    reference.
+    Each template body is sent once per session - the collector keeps the
+    session templates. If the collector doesn't know the session (e.g. after
+    a reconnect or a collector restart), a new session is started and the
+    template bodies are sent again.
+    """
+
+    DEFAULT_TEMPLATE_PATHS = (
+        ("spec", "containers"),
+        ("spec", "init_containers"),
+        ("spec", "tolerations"),
+        ("spec", "volumes"),
+        ("spec", "template"),
+    )
+    DEFAULT_MIN_TEMPLATE_SIZE = 256
+    DEFAULT_MAX_SESSION_TEMPLATES = 10000
+
+    def __init__(
+            self,
+            template_paths: Tuple[Tuple[str]] = DEFAULT_TEMPLATE_PATHS,
+            min_template_size: int = DEFAULT_MIN_TEMPLATE_SIZE,
+            max_session_templates: int = DEFAULT_MAX_SESSION_TEMPLATES,
+    ):
+        """
+        :param template_paths: of the watched objects sub-documents to
+        replace by templates
+        :param min_template_size: in bytes, of a serialized sub-document to
+        replace by a template
+        :param max_session_templates: templates count to send per session,
+        a new session is started once reached
+        """
+        if max_session_templates < 1:
+            raise ValueError("Invalid max session templates value, must be > 0")
+        self.template_paths = template_paths
+        # the serialized keys of the template paths sub-documents
+        self._template_keys = tuple(encoders.dumps(path[-1]) for path in template_paths)
+        self.min_template_size = min_template_size
+        self.max_session_templates = max_session_templates
+        self.session_id: str = None
+        self._sent_templates: Set[str] = set()
+        self.reset_session()
+
+    def reset_session(self, session_id: str = None):
+        """
+        Starts a new session - all the templates bodies are sent again.
+        :param session_id: if given, resets only if it's the current session
+        (another batch may have already reset it)
+        """
+        if session_id is not None and session_id != self.session_id:
+            return
+        self.session_id = uuid.uuid4().hex
+        self._sent_templates = set()
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimates the bytes held by the sent templates hashes (sampled)
+        """
+        return estimate_items_size(
+            self._sent_templates,
+            len(self._sent_templates)
+        )
+
+    def _replace_template(
+            self,
+            obj: Dict,
+            path: Tuple[str],
+            templates: Dict[str, bytes]
+    ) -> Dict:
+        """
+        Replaces the sub-document at the given path by a template reference.
+        The object isn't changed - the dicts along the path are copied.
+        :param templates: to add the template body to
+        :return: the object with the template reference
+        """
+        value = obj.get(path[0])
+        if len(path) > 1:
+            if not isinstance(value, dict):
+                return obj
+            replaced = self._replace_template(value, path[1:], templates)
+        else:
+            if not isinstance(value, (dict, list)) or not value:
+                return obj
+            body = encoders.dumps(value)
+            if len(body) < self.min_template_size:
+                return obj
+            template_hash = get_template_hash(body)
+            templates[template_hash] = body
+            replaced = {TEMPLATE_KEY: template_hash}
+        if replaced is value:
+            return obj
+        obj = dict(obj)
+        obj[path[0]] = replaced
+        return obj
+
+    def _get_watch_event_dict(self, event: KubernetesEvent) -> Optional[Dict]:
+        """
+        Gets the dict of given watch event, including watch events restored
+        from their serialized form (e.g. from a compressed backlog) which
+        might have templates
+        :return: the event dict, None if it isn't a watch event
+        """
+        if isinstance(event, WatchKubernetesEvent):
+            return event.to_dict()
+        if not isinstance(event, SerializedKubernetesEvent):
+            return None
+        serialized_event = event.serialize()
+        if not any(key in serialized_event for key in self._template_keys):
+            return None
+        event_dict = event.to_dict()
+        if event_dict["metadata"]["kind"] != KubernetesEventType.WATCH.value:
+            return None
+        return event_dict
+
+    def encode_event(self, event: KubernetesEvent) -> Tuple[bytes, Dict[str, bytes]]:
+        """
+        Encodes the given event with template references
+        :return: the serialized event & the referenced templates bodies
+        """
+        event_dict = self._get_watch_event_dict(event)
+        if event_dict is None:
+            return event.serialize(), {}
+        payload = event_dict["payload"]
+        obj = payload.get(WatchKubernetesEvent.OBJECT_FIELD_KEY)
+        if not isinstance(obj, dict):
+            return event.serialize(), {}
+        templates = {}
+        for path in self.template_paths:
+            obj = self._replace_template(obj, path, templates)
+        if not templates:
+            return event.serialize(), {}
+        event_dict["payload"] = dict(payload)
+        event_dict["payload"][WatchKubernetesEvent.OBJECT_FIELD_KEY] = obj
+        return encoders.dumps(event_dict), templates
+
+    def encode_events(
+            self,
+            events: List[KubernetesEvent]
+    ) -> Tuple[str, bytes, bytes, List[str]]:
+        """
+        Encodes the given events with template references. The templates
+        bodies which weren't sent in the current session are added - they
+        are considered as sent once the events are sent (see mark_sent).
+        :return: the session id, the serialized events array, the
+        serialized templates bodies (by their hash) to send & their hashes
+        """
+        if len(self._sent_templates) >= self.max_session_templates:
+            self.reset_session()
+        serialized_events = []
+        templates = {}
+        for event in events:
+            serialized_event, event_templates = self.encode_event(event)
+            serialized_events.append(serialized_event)
+            for template_hash, body in event_templates.items():
+                if template_hash not in self._sent_templates:
+                    templates[template_hash] = body
+        events_json = b"[" + b",".join(serialized_events) + b"]"
+        templates_json = b"{" + b",".join(
+            encoders.dumps(template_hash) + b":" + body
+            for template_hash, body in templates.items()
+        ) + b"}"
+        return self.session_id, events_json, templates_json, list(templates)
+
+    def mark_sent(self, session_id: str, template_hashes: List[str]):
+        """
+        Marks the given templates as sent - once the collector has received
+        them, so the next events reference them without their bodies.
+        Until then, concurrently encoded events carry the bodies as well.
+        :param session_id: the templates were sent in, ignored unless it's
+        the current session
+        """
+        if session_id == self.session_id:
+            self._sent_templates.update(template_hashes)
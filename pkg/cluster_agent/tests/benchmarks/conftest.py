@@ -0,0 +1,53 @@
+"""
+Common microbenchmarks settings - realistic pod fixtures of each size
+"""
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+import kubernetes_asyncio
+from benchmarks.fake_apiserver import to_api_object
+from benchmarks.fixtures import POD_SIZES, generate_pod
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(params=list(POD_SIZES))
+def pod_size(request) -> str:
+    """ the benchmarked pod size, one of POD_SIZES """
+    return request.param
+
+
+@pytest.fixture
+def pod(pod_size):
+    """ a pod, shaped as the cluster discovery events data """
+    return generate_pod(1, containers_count=POD_SIZES[pod_size])
+
+
+@pytest.fixture
+def api_pod_json(pod) -> str:
+    """ the pod, as served by the apiserver """
+    return json.dumps(to_api_object(pod, "V1Pod"))
+
+
+@pytest.fixture(scope="session")
+def api_client():
+    """ a kubernetes API client, used to deserialize objects only """
+    loop = asyncio.new_event_loop()
+
+    async def create_api_client():
+        return kubernetes_asyncio.client.ApiClient()
+
+    client = loop.run_until_complete(create_api_client())
+    yield client
+    loop.run_until_complete(client.close())
+    loop.close()
+
+
+@pytest.fixture
+def pod_model(api_client, api_pod_json):
+    """ the pod, as a kubernetes client model """
+    return api_client.deserialize(
+        response=SimpleNamespace(data=api_pod_json),
+        response_type="V1Pod"
+    )
@@ -0,0 +1,22 @@
+"""
+JSON encoders microbenchmarks
+"""
+import json
+import pytest
+from encoders import DateTimeEncoder, JsonSerializer, get_available_backends
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+
+
+@pytest.fixture
+def event_dict(pod):
+    """ a pod watch event dict, as serialized """
+    return WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod).to_dict()
+
+
+def test_datetime_encoder(benchmark, event_dict):
+    benchmark(json.dumps, event_dict, cls=DateTimeEncoder)
+
+
+@pytest.mark.parametrize("backend", get_available_backends())
+def test_json_serializer(benchmark, event_dict, backend):
+    benchmark(JsonSerializer(backend).dumps, event_dict)
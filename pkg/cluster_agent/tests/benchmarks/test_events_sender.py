@@ -0,0 +1,60 @@
+"""
+EventsSender microbenchmarks - encoding & compressing events batches
+"""
+import asyncio
+import pytest
+from events_sender import EventsSender
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+
+BATCH_SIZE = 100
+
+
+class NullClient:
+    """ A client which drops the posted data """
+
+    async def post(self, url, data):
+        pass
+
+
+@pytest.fixture
+def events_sender() -> EventsSender:
+    return EventsSender(NullClient(), "http://collector", "cluster", "token")
+
+
+def _create_events(pod):
+    """ Creates a batch of pod watch events """
+    return [
+        WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+        for _ in range(BATCH_SIZE)
+    ]
+
+
+def test_send_serialized_events(benchmark, events_sender, pod):
+    """
+    Sending a batch of already serialized events - as created by the cluster
+    discovery
+    """
+    events = _create_events(pod)
+    for event in events:
+        event.serialize()
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark(lambda: loop.run_until_complete(events_sender.send_events(events)))
+    finally:
+        loop.close()
+
+
+def test_send_events(benchmark, events_sender, pod):
+    """
+    Sending a batch of events, serializing them as well (a new batch per
+    round, as the serialized events are cached)
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark.pedantic(
+            lambda events: loop.run_until_complete(events_sender.send_events(events)),
+            setup=lambda: ((_create_events(pod),), {}),
+            rounds=20
+        )
+    finally:
+        loop.close()
@@ -0,0 +1,59 @@
+"""
+KubernetesEvent microbenchmarks
+"""
+import copy
+import json
+from types import SimpleNamespace
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from model_decoder import ModelDecoder
+
+
+def test_deserialize_watched_object(benchmark, api_client, api_pod_json):
+    """
+    Deserializing a watched object to its kubernetes client model, as the
+    watch does before the event is created
+    """
+    benchmark(
+        api_client.deserialize,
+        response=SimpleNamespace(data=api_pod_json),
+        response_type="V1Pod"
+    )
+
+
+def test_decode_watched_object(benchmark, api_pod_json):
+    """
+    Decoding a watched object straight to its model dict, by the model
+    decoder - instead of the deserialization & `from_watch_dict`
+    """
+    model_decoder = ModelDecoder()
+    benchmark(lambda: model_decoder.decode(json.loads(api_pod_json), "V1Pod"))
+
+
+def test_from_watch_dict(benchmark, pod_model):
+    benchmark(
+        WatchKubernetesEvent.from_watch_dict,
+        {"type": "MODIFIED", "object": pod_model}
+    )
+
+
+def test_to_dict(benchmark, pod):
+    event = WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+    benchmark(event.to_dict)
+
+
+def test_hash_identity(benchmark, pod):
+    """ Hashing an event with an identity (uid & resource version) """
+    event = WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+    benchmark(hash, event)
+
+
+def test_hash_content(benchmark, pod):
+    """
+    Hashing a new event with no identity - by its content digest (which is
+    cached, hence a new event per round)
+    """
+    pod = copy.deepcopy(pod)
+    del pod["metadata"]["uid"]
+    benchmark(
+        lambda: hash(WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod))
+    )
@@ -0,0 +1,129 @@
+"""
+Fake apiserver - serves the namespaces & the Leases, for the replicas
+coordination tests
+"""
+import json
+from contextlib import asynccontextmanager
+from typing import Dict, List
+import kubernetes_asyncio
+from aiohttp import web
+
+TEST_NAMESPACE = "epsagon-monitoring"
+TEST_NAMESPACES = [f"namespace-{i}" for i in range(50)]
+LEASES_PATH = "/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases"
+
+
+def _status(code: int, reason: str) -> web.Response:
+    """ Creates an apiserver Status error response """
+    return web.json_response(
+        {"kind": "Status", "apiVersion": "v1", "status": "Failure", "reason": reason, "code": code},
+        status=code
+    )
+
+
+class FakeApiServer:
+    """
+    Fake apiserver stand-in - serves the namespaces list, and the Leases
+    list, create, read, replace (by resource version) & delete endpoints
+    """
+
+    def __init__(self, namespaces: List[str]):
+        self.namespaces = namespaces
+        self.leases: Dict[str, Dict] = {}
+        self.resource_version = 0
+        # if set, the Leases requests fail with this status (e.g. no RBAC)
+        self.leases_error_status: int = None
+
+    @web.middleware
+    async def _fail_leases(self, request, handler):
+        if self.leases_error_status and "/leases" in request.path:
+            return _status(self.leases_error_status, "Failure")
+        return await handler(request)
+
+    def _store(self, lease: Dict) -> Dict:
+        self.resource_version += 1
+        lease["metadata"]["resourceVersion"] = str(self.resource_version)
+        self.leases[lease["metadata"]["name"]] = lease
+        return lease
+
+    async def _list_namespaces(self, _request):
+        return web.json_response({
+            "kind": "NamespaceList",
+            "apiVersion": "v1",
+            "metadata": {"resourceVersion": str(self.resource_version)},
+            "items": [{"metadata": {"name": name}} for name in self.namespaces],
+        })
+
+    async def _list_leases(self, request):
+        key, value = request.query["labelSelector"].split("=")
+        return web.json_response({
+            "kind": "LeaseList",
+            "apiVersion": "coordination.k8s.io/v1",
+            "metadata": {"resourceVersion": str(self.resource_version)},
+            "items": [
+                lease for lease in self.leases.values()
+                if lease["metadata"].get("labels", {}).get(key) == value
+            ],
+        })
+
+    async def _create_lease(self, request):
+        lease = json.loads(await request.read())
+        if lease["metadata"]["name"] in self.leases:
+            return _status(409, "AlreadyExists")
+        return web.json_response(self._store(lease), status=201)
+
+    async def _read_lease(self, request):
+        lease = self.leases.get(request.match_info["name"])
+        if lease is None:
+            return _status(404, "NotFound")
+        return web.json_response(lease)
+
+    async def _replace_lease(self, request):
+        stored_lease = self.leases.get(request.match_info["name"])
+        if stored_lease is None:
+            return _status(404, "NotFound")
+        lease = json.loads(await request.read())
+        if (
+                lease["metadata"].get("resourceVersion") !=
+                stored_lease["metadata"]["resourceVersion"]
+        ):
+            return _status(409, "Conflict")
+        return web.json_response(self._store(lease))
+
+    async def _delete_lease(self, request):
+        if self.leases.pop(request.match_info["name"], None) is None:
+            return _status(404, "NotFound")
+        return web.json_response({"kind": "Status", "status": "Success"})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._fail_leases])
+        path = LEASES_PATH.format(namespace=TEST_NAMESPACE)
+        app.router.add_get("/api/v1/namespaces", self._list_namespaces)
+        app.router.add_get(path, self._list_leases)
+        app.router.add_post(path, self._create_lease)
+        app.router.add_get(path + "/{name}", self._read_lease)
+        app.router.add_put(path + "/{name}", self._replace_lease)
+        app.router.add_delete(path + "/{name}", self._delete_lease)
+        return app
+
+
+@asynccontextmanager
+async def serve_fake_apiserver():
+    """
+    Serves a fake apiserver
+    :return: the fake apiserver & a kubernetes API client of it
+    """
+    server = FakeApiServer(TEST_NAMESPACES)
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    configuration = kubernetes_asyncio.client.Configuration()
+    configuration.host = f"http://127.0.0.1:{port}"
+    api_client = kubernetes_asyncio.client.ApiClient(configuration)
+    try:
+        yield server, api_client
+    finally:
+        await api_client.close()
+        await runner.cleanup()
@@ -0,0 +1,30 @@
+"""
+Backoff tests
+"""
+import pytest
+from backoff import Backoff
+
+
+def test_invalid_params():
+    """ Tests invalid delays & jitter """
+    with pytest.raises(ValueError):
+        Backoff(base_seconds=-1)
+    with pytest.raises(ValueError):
+        Backoff(base_seconds=2, max_seconds=1)
+    with pytest.raises(ValueError):
+        Backoff(jitter=1.5)
+
+
+def test_exponential_delays():
+    """ The delay doubles with each failure, up to the max delay """
+    backoff = Backoff(base_seconds=1, max_seconds=10, jitter=0)
+    assert [backoff.get_delay(failures) for failures in range(6)] == [0, 1, 2, 4, 8, 10]
+    assert backoff.get_delay(10 ** 6) == 10
+
+
+def test_jittered_delays():
+    """ The delays are randomly shortened by up to the jitter fraction """
+    backoff = Backoff(base_seconds=1, max_seconds=10, jitter=0.5)
+    delays = {backoff.get_delay(4) for _ in range(100)}
+    assert all(4 <= delay <= 8 for delay in delays)
+    assert len(delays) > 1
@@ -1,14 +1,25 @@
 """
 ClusterDiscovery tests
 """
+import json
 import asyncio
 import socket
 import pytest
 import kubernetes_asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from types import SimpleNamespace
 from typing import List, Dict, Set, Any
-from asynctest.mock import patch
-from cluster_discovery import ClusterDiscovery, WatchTarget
+from aiohttp.client_exceptions import ClientError
+from asynctest.mock import patch, MagicMock
+from kubernetes_asyncio.client.rest import ApiException
+from backoff import Backoff
+from cluster_discovery import ClusterDiscovery, RawWatchEvent, WatchState, WatchTarget
+from delta_encoder import DeltaEncoder
+from dynamic_targets import DynamicResource
+from interning import Interner
+from model_decoder import ModelDecoder
+from recorder import WatchRecorder, get_recording_path, read_recording
 from kubernetes_event import (
     KubernetesEvent,
     WatchKubernetesEvent,
@@ -374,6 +385,7 @@ async def _test_cluster_discovery(
         include_invalid_watch_event=False,
         watch_stream_error=None,
         resource_list_error=None,
+        **cluster_discovery_kwargs,
 ) -> ClusterDiscovery:
     """
     Tests the cluster discovery run.
@@ -384,6 +396,7 @@ async def _test_cluster_discovery(
     watch events
     :param watch_stream_error: error to be raised when the cluster discovery
     tries to watch its targets.
+    :param cluster_discovery_kwargs: additional cluster discovery params
     :return: the cluster discovery object
     """
     cluster_event = CLUSTER_EVENT
@@ -394,7 +407,10 @@ async def _test_cluster_discovery(
 
     version_client = ClientMock(error=cluster_error)
     manager = EventsManager()
-    cluster_discovery = ClusterDiscovery(manager.write_event)
+    cluster_discovery = ClusterDiscovery(
+        manager.write_event,
+        **cluster_discovery_kwargs
+    )
     if include_invalid_watch_event:
         for target_events in raw_events:
             target_events.append({ "invalid_event": "invalid"})
@@ -438,6 +454,66 @@ async def test_sanity(_, target_resource_lists, raw_target_events):
     await _test_cluster_discovery(target_resource_lists, raw_target_events)
 
 
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_serialize_events(_, target_resource_lists, raw_target_events):
+    """
+    Serialize events test - all the written events are already serialized
+    """
+    cluster_discovery = await _test_cluster_discovery(
+        target_resource_lists,
+        raw_target_events,
+        should_serialize_events=True
+    )
+    events = cluster_discovery.event_handler.__self__.events
+    assert events
+    assert all(event.is_serialized() for event in events)
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_serialize_events_in_executor(
+        _,
+        target_resource_lists,
+        raw_target_events
+):
+    """
+    Serialize events test - events are serialized in the given executor
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        cluster_discovery = await _test_cluster_discovery(
+            target_resource_lists,
+            raw_target_events,
+            should_serialize_events=True,
+            serialization_executor=executor
+        )
+    events = cluster_discovery.event_handler.__self__.events
+    assert events
+    assert all(event.is_serialized() for event in events)
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_intern_events(_, target_resource_lists, raw_target_events):
+    """
+    Intern events test - the written events are the expected events, with
+    their data interned
+    """
+    cluster_discovery = await _test_cluster_discovery(
+        target_resource_lists,
+        raw_target_events,
+        interner=Interner()
+    )
+    events = cluster_discovery.event_handler.__self__.events
+    assert all(
+        cluster_discovery.interner.intern(event.data) is event.data
+        for event in events
+    )
+
+
 @pytest.mark.asyncio
 @patch("kubernetes_asyncio.client")
 @patch("kubernetes_asyncio.watch.Watch", WatchMock)
@@ -533,6 +609,169 @@ async def test_watch_stream_handled_error(
     )
 
 
+def _create_supervised_discovery(targets: List[MockWatchTarget], **kwargs) -> ClusterDiscovery:
+    """
+    Creates a cluster discovery of given targets, restarting failed targets
+    with short backoff delays
+    """
+    cluster_discovery = ClusterDiscovery(
+        EventsManager().write_event,
+        backoff=Backoff(base_seconds=0.01, max_seconds=0.04, jitter=0),
+        **kwargs
+    )
+    _patch_cluster_discovery_watch_targets(cluster_discovery, targets, ClientMock())
+    return cluster_discovery
+
+
+async def _run_supervised_discovery(cluster_discovery: ClusterDiscovery):
+    """ Runs the given cluster discovery, which is expected to keep running """
+    task = (await run_coroutines_with_timeout(
+        (cluster_discovery.start(),),
+        verify_tasks_finished=False,
+        timeout=0.2
+    ))[0]
+    assert not task.done()
+    task.cancel()
+    await asyncio.wait([task])
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_watch_client_error_backoff(_):
+    """
+    A target whose watch fails with a client error is restarted alone,
+    from its last resource version, after a growing backoff delay
+    """
+    failing_target = MockWatchTarget("Pod", [{"a": "b"}], [], None, ClientError(), 0)
+    target = MockWatchTarget("Node", [{"c": "d"}], [], None, None, 0)
+    cluster_discovery = _create_supervised_discovery([failing_target, target])
+    await _run_supervised_discovery(cluster_discovery)
+    stats = cluster_discovery.get_stats()
+    # 0.01 + 0.02 + 0.04 + 0.04 ... seconds
+    assert 3 <= stats["Pod"]["restarts_count"] <= 8
+    assert stats["Pod"]["consecutive_failures"] == stats["Pod"]["restarts_count"]
+    assert stats["Pod"]["lists_count"] == 1
+    assert "ClientError" in stats["Pod"]["last_error"]
+    assert stats["Node"] == {
+        "state": WatchState.WATCHING.value,
+        "lists_count": 1,
+        "restarts_count": 0,
+        "consecutive_failures": 0,
+        "last_error": None,
+        "last_event_time": None,
+    }
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_watch_error_event_relists(_):
+    """
+    A target which receives an error event is listed again, after its
+    backoff delay
+    """
+    target = MockWatchTarget("Pod", [{"a": "b"}], [{"type": "ERROR"}], None, None, 0)
+    cluster_discovery = _create_supervised_discovery([target])
+    await _run_supervised_discovery(cluster_discovery)
+    health = cluster_discovery.watch_targets["Pod"].health
+    assert health.restarts_count >= 3
+    assert health.lists_count >= health.restarts_count
+    assert "ErrorWatchEventException" in health.last_error
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_watch_gone_relists(_):
+    """
+    A target whose resource version is gone (410) is listed again after its
+    backoff delay, and its kind is sent in full
+    """
+    target = MockWatchTarget("Pod", [{"a": "b"}], [], None, ApiException(status=410), 0)
+    delta_encoder = DeltaEncoder()
+    delta_encoder.reset = MagicMock()
+    cluster_discovery = _create_supervised_discovery([target], delta_encoder=delta_encoder)
+    await _run_supervised_discovery(cluster_discovery)
+    health = cluster_discovery.watch_targets["Pod"].health
+    assert health.restarts_count >= 3
+    assert health.lists_count >= health.restarts_count
+    assert "ApiException" in health.last_error
+    delta_encoder.reset.assert_called_with("Pod")
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_api_error_backoff(_):
+    """
+    A target whose list or watch fails with an API error (e.g. forbidden or
+    a server error) is restarted alone after its backoff delay - a failed
+    watch from its last resource version
+    """
+    for status in (403, 500):
+        failing_list_target = MockWatchTarget(
+            "Pod", [{"a": "b"}], [], ApiException(status=status), None, 0
+        )
+        failing_watch_target = MockWatchTarget(
+            "Node", [{"c": "d"}], [], None, ApiException(status=status), 0
+        )
+        target = MockWatchTarget("Service", [{"e": "f"}], [], None, None, 0)
+        cluster_discovery = _create_supervised_discovery(
+            [failing_list_target, failing_watch_target, target]
+        )
+        await _run_supervised_discovery(cluster_discovery)
+        stats = cluster_discovery.get_stats()
+        assert stats["Pod"]["restarts_count"] >= 3
+        assert stats["Pod"]["lists_count"] == 0
+        assert stats["Node"]["restarts_count"] >= 3
+        assert stats["Node"]["lists_count"] == 1
+        assert all("ApiException" in stats[kind]["last_error"] for kind in ("Pod", "Node"))
+        assert stats["Service"]["state"] == WatchState.WATCHING.value
+        assert stats["Service"]["restarts_count"] == 0
+
+
+class SlowListWatchTarget(MockWatchTarget):
+    """ A watch target whose lists are slow, tracks its concurrent lists """
+
+    lists_count = 0
+    max_lists_count = 0
+
+    async def __call__(self, *args, **kwargs):
+        cls = SlowListWatchTarget
+        cls.lists_count += 1
+        cls.max_lists_count = max(cls.max_lists_count, cls.lists_count)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            cls.lists_count -= 1
+        return await super().__call__(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", WatchMock)
+async def test_bounded_concurrent_lists(_):
+    """
+    The initial lists are staggered - up to the lists semaphore value at
+    once, and all the targets are eventually watched
+    """
+    targets = [
+        SlowListWatchTarget(str(i), [{str(i): str(i)}], [], None, None, 0)
+        for i in range(6)
+    ]
+    cluster_discovery = _create_supervised_discovery(
+        targets,
+        lists_semaphore=asyncio.Semaphore(2)
+    )
+    await _run_supervised_discovery(cluster_discovery)
+    assert SlowListWatchTarget.max_lists_count == 2
+    assert all(
+        health["state"] == WatchState.WATCHING.value
+        for health in cluster_discovery.get_stats().values()
+    )
+
+
 @pytest.mark.asyncio
 @patch("kubernetes_asyncio.client")
 async def test_invalid_retry_interval_seconds(_):
@@ -543,6 +782,57 @@ async def test_invalid_retry_interval_seconds(_):
         ClusterDiscovery(None, retry_interval_seconds=-1)
 
 
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+async def test_namespaced_watch_targets(_):
+    """
+    Tests the watch targets of a namespace - only the namespaced kinds are
+    watched, listed by the namespace
+    """
+    cluster_discovery = ClusterDiscovery(
+        None,
+        should_collect_events=True,
+        namespace="test-namespace"
+    )
+    assert set(cluster_discovery.watch_targets) == {
+        "Pod", "Deployment", "DaemonSet", "StatefulSet", "Event"
+    }
+    assert all(
+        target.args == ("test-namespace",)
+        for target in cluster_discovery.watch_targets.values()
+    )
+    cluster_discovery = ClusterDiscovery(None, kinds=("Node", "Namespace"))
+    assert set(cluster_discovery.watch_targets) == {"Node", "Namespace"}
+    assert all(
+        not target.args for target in cluster_discovery.watch_targets.values()
+    )
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+async def test_watch_targets_count(_):
+    """
+    The watch targets count of a cluster wide discovery, before it is
+    created, is its built-in watch targets count (plus its resources)
+    """
+    for should_collect_resources in (True, False):
+        for should_collect_events in (True, False):
+            cluster_discovery = ClusterDiscovery(
+                None,
+                should_collect_resources=should_collect_resources,
+                should_collect_events=should_collect_events
+            )
+            assert ClusterDiscovery.get_watch_targets_count(
+                should_collect_resources,
+                should_collect_events
+            ) == len(cluster_discovery.watch_targets)
+    assert ClusterDiscovery.get_watch_targets_count(
+        False,
+        False,
+        resources=[DynamicResource("apps", "v1", "replicasets")]
+    ) == 1
+
+
 @pytest.mark.asyncio
 @patch("kubernetes_asyncio.client")
 @patch("kubernetes_asyncio.watch.Watch", WatchMock)
@@ -560,3 +850,278 @@ async def test_stop(_, target_resource_lists, raw_target_events):
     await asyncio.sleep(0.1)
     for task in cluster_discovery.discover_tasks:
         assert task.done() or task.cancelled()
+
+
+class RawWatchMock:
+    """
+    A mock class for the kubernetes client Watch class, in raw (str) mode
+    """
+    def __init__(self, return_type=None):
+        assert return_type == "str"
+
+    def stream(self, target: MockWatchTarget, resource_version=None):
+        """
+        Gets the raw events stream - each event is dumped to json
+        """
+        assert resource_version == TEST_RESOURCE_VERSION
+        return EventsGenerator(
+            [json.dumps(event) for event in target.watch_events]
+        )
+
+
+class RawPodWatchTarget(MockWatchTarget):
+    """ Pods watch target mock """
+
+    async def __call__(self, *args, **kwargs):
+        """
+        Lists the pods
+
+        :rtype: V1PodList
+        """
+        return await super().__call__(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", RawWatchMock)
+async def test_raw_watch_events(_):
+    """
+    Tests the raw watch mode - watch events are written as is, with the
+    watched object model type, to the raw watch event handler.
+    """
+    raw_events = [
+        {
+            "type": "ADDED",
+            "object": {"metadata": {"uid": str(i), "resourceVersion": str(i)}},
+        }
+        for i in range(3)
+    ]
+    manager = EventsManager()
+    written_raw_events = []
+
+    async def raw_watch_event_handler(event):
+        written_raw_events.append(event)
+
+    cluster_discovery = ClusterDiscovery(
+        manager.write_event,
+        raw_watch_event_handler=raw_watch_event_handler
+    )
+    target = RawPodWatchTarget("Pod", [{"a": "b"}], raw_events, None, None, 0)
+    _patch_cluster_discovery_watch_targets(
+        cluster_discovery, [target], ClientMock()
+    )
+    task = (await run_coroutines_with_timeout(
+        (cluster_discovery.start(),),
+        verify_tasks_finished=False,
+        timeout=0.2
+    ))[0]
+    assert not task.done()
+    task.cancel()
+    assert written_raw_events == [
+        RawWatchEvent("V1Pod", str(i), json.dumps(event))
+        for i, event in enumerate(raw_events)
+    ]
+    assert manager.events == {
+        CLUSTER_EVENT,
+        WatchKubernetesEvent(WatchKubernetesEventType.ADDED, {"a": "b"}),
+    }
+    assert cluster_discovery.watch_targets["Pod"].last_resource_version == "2"
+
+
+class EndingEventsGenerator(EventsGenerator):
+    """ A watch stream which ends once its events are read """
+
+    async def __anext__(self):
+        if self.i >= len(self.events):
+            raise StopAsyncIteration
+        return await super().__anext__()
+
+
+class EndingRawWatchMock:
+    """
+    A raw watch mock whose first stream ends (by the apiserver timeout),
+    tracks the resource version of each stream
+    """
+    resource_versions = []
+
+    def __init__(self, return_type=None):
+        assert return_type == "str"
+
+    def stream(self, target: MockWatchTarget, resource_version=None):
+        EndingRawWatchMock.resource_versions.append(resource_version)
+        if len(EndingRawWatchMock.resource_versions) > 1:
+            return EventsGenerator([])
+        return EndingEventsGenerator(
+            [json.dumps(event) for event in target.watch_events]
+        )
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+@patch("kubernetes_asyncio.watch.Watch", EndingRawWatchMock)
+async def test_raw_watch_restart_resource_version(_):
+    """
+    An ended raw watch stream is restarted from its last received resource
+    version, rather than from the listed one - events aren't replayed
+    """
+    raw_events = [
+        {
+            "type": "MODIFIED",
+            "object": {"metadata": {"uid": "1", "resourceVersion": str(i)}},
+        }
+        for i in range(3)
+    ]
+    written_raw_events = []
+
+    async def raw_watch_event_handler(event):
+        written_raw_events.append(event)
+
+    cluster_discovery = ClusterDiscovery(
+        EventsManager().write_event,
+        raw_watch_event_handler=raw_watch_event_handler
+    )
+    target = RawPodWatchTarget("Pod", [], raw_events, None, None, 0)
+    _patch_cluster_discovery_watch_targets(
+        cluster_discovery, [target], ClientMock()
+    )
+    task = (await run_coroutines_with_timeout(
+        (cluster_discovery.start(),),
+        verify_tasks_finished=False,
+        timeout=0.2
+    ))[0]
+    assert not task.done()
+    task.cancel()
+    assert EndingRawWatchMock.resource_versions == [TEST_RESOURCE_VERSION, "2"]
+    assert len(written_raw_events) == len(raw_events)
+
+
+class RawResponse:
+    """ A not preloaded (raw) response mock """
+    def __init__(self, body: str):
+        self.body = body
+        self.is_released = False
+
+    async def read(self):
+        return self.body.encode()
+
+    def release(self):
+        self.is_released = True
+
+
+class RecordedPodWatchTarget(RawPodWatchTarget):
+    """ Pods watch target mock, lists raw responses """
+
+    async def __call__(self, *arg, _preload_content=True, **kwargs):
+        """
+        Lists the pods, as a not preloaded response
+
+        :rtype: V1PodList
+        """
+        assert not _preload_content
+        return RawResponse(json.dumps({
+            "metadata": {"resourceVersion": TEST_RESOURCE_VERSION},
+            "items": self.resource_list,
+        }))
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.watch.Watch", RawWatchMock)
+async def test_record_raw_watch_events(tmp_path):
+    """
+    Tests the recording mode - the raw list response & watch events are
+    recorded, and the listed objects are deserialized as usual.
+    """
+    pod = {"metadata": {"name": "pod", "uid": "1", "resourceVersion": "1"}}
+    raw_events = [
+        {"type": "MODIFIED", "object": pod},
+        {"type": "DELETED", "object": pod},
+    ]
+    manager = EventsManager()
+    written_raw_events = []
+
+    async def raw_watch_event_handler(event):
+        written_raw_events.append(event)
+
+    recorder = WatchRecorder(str(tmp_path))
+    cluster_discovery = ClusterDiscovery(
+        manager.write_event,
+        raw_watch_event_handler=raw_watch_event_handler,
+        recorder=recorder
+    )
+    target = RecordedPodWatchTarget("Pod", [pod], raw_events, None, None, 0)
+    _patch_cluster_discovery_watch_targets(
+        cluster_discovery, [target], ClientMock()
+    )
+    task = (await run_coroutines_with_timeout(
+        (cluster_discovery.start(),),
+        verify_tasks_finished=False,
+        timeout=0.2
+    ))[0]
+    task.cancel()
+    await asyncio.wait([task])
+    await cluster_discovery.client.api_client.close()
+    recorder.close()
+    assert len(written_raw_events) == 2
+    assert len(manager.events) == 2
+    listed_event = (manager.events - {CLUSTER_EVENT}).pop()
+    assert listed_event.data["metadata"]["uid"] == "1"
+    assert listed_event.data["kind"] == "Pod"
+    records = list(read_recording(get_recording_path(str(tmp_path), "Pod")))
+    assert [record.phase for record in records] == ["list", "watch", "watch"]
+    assert json.loads(records[0].data)["items"] == [pod]
+    assert [json.loads(record.data) for record in records[1:]] == raw_events
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.watch.Watch", RawWatchMock)
+async def test_decoded_watch_events():
+    """
+    Tests the model decoder mode - the listed & watched objects are decoded
+    straight to dicts, which equal the client models dicts
+    """
+    pod = {
+        "metadata": {
+            "name": "pod",
+            "uid": "1",
+            "resourceVersion": "1",
+            "creationTimestamp": "2021-01-01T00:00:00Z",
+        },
+        "spec": {"containers": [{"name": "container", "image": "image"}]},
+    }
+    raw_events = [
+        {"type": "MODIFIED", "object": pod},
+        {"type": "DELETED", "object": pod},
+        {"type": "UNSUPPORTED", "object": pod},
+    ]
+    manager = EventsManager()
+    cluster_discovery = ClusterDiscovery(
+        manager.write_event,
+        model_decoder=ModelDecoder()
+    )
+    target = RecordedPodWatchTarget("Pod", [pod], raw_events, None, None, 0)
+    _patch_cluster_discovery_watch_targets(
+        cluster_discovery, [target], ClientMock()
+    )
+    task = (await run_coroutines_with_timeout(
+        (cluster_discovery.start(),),
+        verify_tasks_finished=False,
+        timeout=0.2
+    ))[0]
+    assert not task.done()
+    assert cluster_discovery.watch_targets["Pod"].last_resource_version == "1"
+    task.cancel()
+    await asyncio.wait([task])
+    api_client = cluster_discovery.client.api_client
+    pod_model = api_client.deserialize(
+        response=SimpleNamespace(data=json.dumps(pod)),
+        response_type="V1Pod"
+    )
+    await api_client.close()
+    listed_pod = pod_model.to_dict()
+    listed_pod["kind"] = "Pod"
+    assert manager.events == {
+        CLUSTER_EVENT,
+        WatchKubernetesEvent(WatchKubernetesEventType.ADDED, listed_pod),
+        WatchKubernetesEvent.from_watch_dict({"type": "MODIFIED", "object": pod_model}),
+        WatchKubernetesEvent.from_watch_dict({"type": "DELETED", "object": pod_model}),
+    }
@@ -0,0 +1,98 @@
+"""
+ConfWatcher tests
+"""
+import os
+import asyncio
+import pytest
+from conf_watcher import ConfWatcher
+
+TEST_KEY = "test_key"
+
+
+class HandlerMock:
+    """ Configuration handler mock, saves the given values """
+    def __init__(self):
+        self.values = []
+
+    def __call__(self, value):
+        self.values.append(value)
+
+
+def _write_conf(conf_dir, key, value):
+    """ Writes a configuration value, updating its modification time """
+    path = os.path.join(conf_dir, key)
+    with open(path, "w") as writer:
+        writer.write(value)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+
+@pytest.mark.asyncio
+async def test_invalid_poll_interval(tmpdir):
+    """ Tests invalid poll interval seconds param """
+    with pytest.raises(ValueError):
+        ConfWatcher(str(tmpdir), poll_interval_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_reload_sanity(tmpdir):
+    """ reload sanity test - handler is called on every value change """
+    handler = HandlerMock()
+    watcher = ConfWatcher(str(tmpdir))
+    watcher.register(TEST_KEY, handler)
+    watcher.reload()
+    _write_conf(str(tmpdir), TEST_KEY, "1\n")
+    watcher.reload()
+    watcher.reload()
+    _write_conf(str(tmpdir), TEST_KEY, "2")
+    watcher.reload()
+    os.remove(os.path.join(str(tmpdir), TEST_KEY))
+    watcher.reload()
+    assert handler.values == [None, "1", "2", None]
+
+
+@pytest.mark.asyncio
+async def test_reload_same_value(tmpdir):
+    """ reload test - handler is not called if only the mtime changed """
+    handler = HandlerMock()
+    watcher = ConfWatcher(str(tmpdir))
+    watcher.register(TEST_KEY, handler)
+    _write_conf(str(tmpdir), TEST_KEY, "1")
+    watcher.reload()
+    _write_conf(str(tmpdir), TEST_KEY, "1")
+    watcher.reload(force=True)
+    assert handler.values == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_reload_handler_error(tmpdir):
+    """ reload test - a failing handler doesn't affect other handlers """
+    def failing_handler(value):
+        raise ValueError(value)
+
+    handler = HandlerMock()
+    watcher = ConfWatcher(str(tmpdir))
+    watcher.register("failing", failing_handler)
+    watcher.register(TEST_KEY, handler)
+    _write_conf(str(tmpdir), "failing", "x")
+    _write_conf(str(tmpdir), TEST_KEY, "1")
+    watcher.reload()
+    assert handler.values == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_start_applies_changes(tmpdir):
+    """
+    Runs the watcher and changes the configuration, expects the change
+    to be applied without an explicit reload.
+    """
+    handler = HandlerMock()
+    watcher = ConfWatcher(str(tmpdir), poll_interval_seconds=0.05)
+    watcher.register(TEST_KEY, handler)
+    task = asyncio.create_task(watcher.start())
+    await asyncio.sleep(0.1)
+    _write_conf(str(tmpdir), TEST_KEY, "1")
+    await asyncio.sleep(0.2)
+    task.cancel()
+    await asyncio.sleep(0)
+    assert handler.values == [None, "1"]
@@ -0,0 +1,107 @@
+"""
+Connection pool tests - the requests are sent to a local slow server
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+import kubernetes_asyncio
+from aiohttp import web
+from connection_pool import ConnectionPoolMetrics, create_api_client, get_pool_size
+
+RESPONSE_DELAY_SECONDS = 0.1
+VERSION_INFO = {
+    "buildDate": "2023-08-15T00:00:00Z",
+    "compiler": "gc",
+    "gitCommit": "0",
+    "gitTreeState": "clean",
+    "gitVersion": "v1.28.0",
+    "goVersion": "go1.20",
+    "major": "1",
+    "minor": "28",
+    "platform": "linux/amd64",
+}
+
+
+@asynccontextmanager
+async def _serve_slow_apiserver():
+    """
+    Serves an apiserver whose version responses are slow
+    :return: its configuration
+    """
+    async def get_version(_request):
+        await asyncio.sleep(RESPONSE_DELAY_SECONDS)
+        return web.json_response(VERSION_INFO)
+
+    app = web.Application()
+    app.router.add_get("/version/", get_version)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    configuration = kubernetes_asyncio.client.Configuration()
+    configuration.host = f"http://127.0.0.1:{port}"
+    try:
+        yield configuration
+    finally:
+        await runner.cleanup()
+
+
+def test_get_pool_size():
+    """ The pool fits all the watches, plus the headroom """
+    assert get_pool_size(7) == 17
+    assert get_pool_size(0, headroom=1) == 1
+    with pytest.raises(ValueError):
+        get_pool_size(-1)
+    with pytest.raises(ValueError):
+        get_pool_size(1, headroom=0)
+
+
+@pytest.mark.asyncio
+async def test_invalid_pool_size():
+    """ Tests a negative pool size """
+    with pytest.raises(ValueError):
+        create_api_client(-1)
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics():
+    """
+    Requests beyond the pool size wait for a free connection, the wait is
+    measured, and the released connections are reused
+    """
+    async with _serve_slow_apiserver() as configuration:
+        metrics = ConnectionPoolMetrics()
+        api_client = create_api_client(1, metrics=metrics, configuration=configuration)
+        try:
+            version_client = kubernetes_asyncio.client.VersionApi(api_client=api_client)
+            await asyncio.gather(version_client.get_code(), version_client.get_code())
+            stats = metrics.get_stats()
+            assert stats["limit"] == 1
+            assert stats["created_connections"] == 1
+            assert stats["waited_requests"] == 1
+            assert stats["waiting_requests"] == 0
+            assert stats["max_wait_seconds"] >= RESPONSE_DELAY_SECONDS / 2
+            assert stats["total_wait_seconds"] == stats["max_wait_seconds"]
+            await version_client.get_code()
+            stats = metrics.get_stats()
+            assert stats["reused_connections"] >= 1
+            assert stats["connections_in_use"] == 0
+        finally:
+            await api_client.close()
+
+
+@pytest.mark.asyncio
+async def test_unlimited_pool():
+    """ A pool of size 0 isn't limited, requests never wait """
+    async with _serve_slow_apiserver() as configuration:
+        metrics = ConnectionPoolMetrics()
+        api_client = create_api_client(0, metrics=metrics, configuration=configuration)
+        try:
+            version_client = kubernetes_asyncio.client.VersionApi(api_client=api_client)
+            await asyncio.gather(*(version_client.get_code() for _ in range(5)))
+            stats = metrics.get_stats()
+            assert stats["created_connections"] == 5
+            assert stats["waited_requests"] == 0
+        finally:
+            await api_client.close()
@@ -0,0 +1,88 @@
+"""
+Debug server tests
+"""
+import asyncio
+import pytest
+import aiohttp
+from debug_server import DEBUG_PATH, DebugServer
+from profiler import Profiler
+
+
+async def _request(debug_server: DebugServer, method: str, path: str, **kwargs):
+    """
+    Starts the given debug server, and sends it a request
+    :return: the response status & JSON body
+    """
+    debug_server.port = 0
+    task = asyncio.create_task(debug_server.start())
+    try:
+        # the server picks a free port once started
+        await asyncio.sleep(0.1)
+        url = f"http://{debug_server.host}:{debug_server.port}"
+        async with aiohttp.ClientSession() as session:
+            async with session.request(
+                    method, f"{url}{DEBUG_PATH}{path}", **kwargs
+            ) as response:
+                body = None
+                if response.content_type == "application/json":
+                    body = await response.json()
+                return response.status, body
+    finally:
+        task.cancel()
+        await asyncio.wait([task])
+
+
+@pytest.mark.asyncio
+async def test_get_stats(tmpdir):
+    """ Tests getting the stats of all the providers & of a single provider """
+    debug_server = DebugServer(Profiler(str(tmpdir)), 0)
+    debug_server.add_stats_provider("a", lambda: {"value": 1})
+    debug_server.add_stats_provider("b", lambda: {"value": 2})
+    status, body = await _request(debug_server, "GET", "/stats")
+    assert status == 200
+    assert body == {"a": {"value": 1}, "b": {"value": 2}}
+    status, body = await _request(debug_server, "GET", "/stats/b")
+    assert status == 200
+    assert body == {"value": 2}
+    status, _ = await _request(debug_server, "GET", "/stats/c")
+    assert status == 404
+
+
+@pytest.mark.asyncio
+async def test_profile_cpu(tmpdir):
+    """ Tests triggering a CPU profile """
+    debug_server = DebugServer(Profiler(str(tmpdir)), 0)
+    status, body = await _request(
+        debug_server, "POST", "/profile/cpu", params={"duration": "0.1"}
+    )
+    assert status == 200
+    assert body["path"].startswith(str(tmpdir))
+    status, _ = await _request(
+        debug_server, "POST", "/profile/cpu", params={"duration": "invalid"}
+    )
+    assert status == 400
+
+
+@pytest.mark.asyncio
+async def test_profile_memory(tmpdir):
+    """
+    Tests triggering a memory snapshot - the first request starts tracing,
+    the second writes the allocations diff
+    """
+    debug_server = DebugServer(Profiler(str(tmpdir)), 0)
+    status, body = await _request(debug_server, "POST", "/profile/memory")
+    assert status == 200
+    assert body == {"path": None, "is_tracing": True}
+    status, body = await _request(debug_server, "POST", "/profile/memory")
+    assert status == 200
+    assert not body["is_tracing"]
+    assert body["path"].startswith(str(tmpdir))
+
+
+@pytest.mark.asyncio
+async def test_dump_tasks(tmpdir):
+    """ Tests triggering a tasks dump """
+    debug_server = DebugServer(Profiler(str(tmpdir)), 0)
+    status, body = await _request(debug_server, "POST", "/tasks")
+    assert status == 200
+    assert body["path"].startswith(str(tmpdir))
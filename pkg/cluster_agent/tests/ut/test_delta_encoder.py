@@ -0,0 +1,177 @@
+"""
+DeltaEncoder tests
+"""
+import copy
+import json
+import pytest
+from asynctest.mock import patch, MagicMock
+import json_patch
+from delta_encoder import DeltaEncoder
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    WatchDeltaKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+
+
+def _generate_pod(uid="uid-1", resource_version=1, phase="Running"):
+    """ Generates a pod object dict """
+    return {
+        "kind": "Pod",
+        "metadata": {
+            "name": f"pod-{uid}",
+            "namespace": "default",
+            "uid": uid,
+            "resource_version": str(resource_version),
+            "labels": {f"label-{i}": f"value-{i}" for i in range(20)},
+        },
+        "status": {"phase": phase},
+    }
+
+
+def _modified(pod) -> WatchKubernetesEvent:
+    """ Creates a MODIFIED watch event of given pod """
+    return WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+
+
+@pytest.mark.asyncio
+async def test_invalid_max_objects():
+    """ Tests invalid max objects param """
+    with pytest.raises(ValueError):
+        DeltaEncoder(max_objects=0)
+
+
+@pytest.mark.asyncio
+async def test_encode_delta():
+    """
+    encode test - the first event is sent in full, the next MODIFIED event
+    as a patch against it
+    """
+    encoder = DeltaEncoder()
+    pod = _generate_pod()
+    added_event = WatchKubernetesEvent(WatchKubernetesEventType.ADDED, pod)
+    assert encoder.encode(added_event) is added_event
+    modified_pod = _generate_pod(resource_version=2, phase="Succeeded")
+    delta_event = encoder.encode(_modified(modified_pod))
+    assert isinstance(delta_event, WatchDeltaKubernetesEvent)
+    assert delta_event.event_type == KubernetesEventType.WATCH_DELTA
+    assert delta_event.get_resource_version() == "2"
+    delta_dict = json.loads(delta_event.serialize())
+    assert delta_dict["metadata"]["kind"] == KubernetesEventType.WATCH_DELTA.value
+    assert delta_dict["payload"]["type"] == WatchKubernetesEventType.MODIFIED.value
+    assert delta_dict["payload"]["metadata"]["uid"] == "uid-1"
+    assert delta_dict["payload"]["base_resource_version"] == "1"
+    assert json_patch.apply(pod, delta_dict["payload"]["patch"]) == modified_pod
+    assert pod == _generate_pod()
+
+    stats = encoder.get_stats()
+    assert stats["full_events"] == 1
+    assert stats["delta_events"] == 1
+    assert 0 < stats["delta_bytes"] < stats["delta_full_bytes"]
+    assert 0 < stats["delta_size_ratio"] < 1
+
+
+@pytest.mark.asyncio
+async def test_encode_not_encoded_events():
+    """ encode test - events which are returned as is """
+    encoder = DeltaEncoder()
+    events = [
+        KubernetesEvent(KubernetesEventType.CLUSTER, {"version": "1"}),
+        _modified({"metadata": {"name": "no-uid"}}),
+        _modified(_generate_pod()),
+    ]
+    for event in events:
+        assert encoder.encode(event) is event
+
+
+@pytest.mark.asyncio
+async def test_encode_max_deltas():
+    """ encode test - a full event is sent every max_deltas deltas """
+    encoder = DeltaEncoder(max_deltas=2)
+    encoded_types = [
+        type(encoder.encode(_modified(_generate_pod(resource_version=i))))
+        for i in range(6)
+    ]
+    assert encoded_types == [
+        WatchKubernetesEvent,
+        WatchDeltaKubernetesEvent,
+        WatchDeltaKubernetesEvent,
+    ] * 2
+
+
+@pytest.mark.asyncio
+async def test_encode_snapshot_interval():
+    """ encode test - a full event is sent every snapshot interval """
+    encoder = DeltaEncoder(snapshot_interval_seconds=10)
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        encoder.encode(_modified(_generate_pod(resource_version=1)))
+        event = encoder.encode(_modified(_generate_pod(resource_version=2)))
+        assert isinstance(event, WatchDeltaKubernetesEvent)
+    with patch("time.monotonic", MagicMock(return_value=110)):
+        event = encoder.encode(_modified(_generate_pod(resource_version=3)))
+        assert isinstance(event, WatchKubernetesEvent)
+
+
+@pytest.mark.asyncio
+async def test_encode_full_after_delete_and_reset():
+    """
+    encode test - full events are sent after the object is deleted, and
+    after the encoder is reset
+    """
+    encoder = DeltaEncoder()
+    encoder.encode(_modified(_generate_pod(resource_version=1)))
+    encoder.encode(WatchKubernetesEvent(
+        WatchKubernetesEventType.DELETED,
+        _generate_pod(resource_version=2)
+    ))
+    event = _modified(_generate_pod(resource_version=3))
+    assert encoder.encode(event) is event
+    encoder.reset("Node")
+    event = _modified(_generate_pod(resource_version=4))
+    assert isinstance(encoder.encode(event), WatchDeltaKubernetesEvent)
+    encoder.reset("Pod")
+    event = _modified(_generate_pod(resource_version=5))
+    assert encoder.encode(event) is event
+    encoder.reset()
+    event = _modified(_generate_pod(resource_version=6))
+    assert encoder.encode(event) is event
+
+
+@pytest.mark.asyncio
+async def test_encode_patch_bigger_than_full():
+    """ encode test - the full event is sent if the patch isn't smaller """
+    encoder = DeltaEncoder()
+    pod = _generate_pod()
+    encoder.encode(_modified(pod))
+    other_pod = copy.deepcopy(pod)
+    other_pod["metadata"]["labels"] = {
+        f"other-{i}": f"value-{i}" for i in range(20)
+    }
+    event = _modified(other_pod)
+    assert encoder.encode(event) is event
+    assert encoder.get_stats()["delta_events"] == 0
+
+
+@pytest.mark.asyncio
+async def test_encode_max_objects():
+    """ encode test - the oldest object is dropped once max objects reached """
+    encoder = DeltaEncoder(max_objects=2)
+    for uid in ("uid-1", "uid-2", "uid-3"):
+        encoder.encode(_modified(_generate_pod(uid=uid)))
+    assert encoder.get_stats()["objects"] == 2
+    event = _modified(_generate_pod(uid="uid-1", resource_version=2))
+    assert encoder.encode(event) is event
+    event = _modified(_generate_pod(uid="uid-3", resource_version=2))
+    assert isinstance(encoder.encode(event), WatchDeltaKubernetesEvent)
+
+
+@pytest.mark.asyncio
+async def test_excluded_kinds():
+    """ The events of the excluded kinds are returned as is """
+    encoder = DeltaEncoder(excluded_kinds=("Pod",))
+    for resource_version in range(1, 4):
+        event = _modified(_generate_pod(resource_version=resource_version))
+        assert encoder.encode(event) is event
+    assert encoder.get_stats()["objects"] == 0
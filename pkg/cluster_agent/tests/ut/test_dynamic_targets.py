@@ -0,0 +1,305 @@
+"""
+Dynamic watch targets tests - the resources are discovered, listed & watched
+from a local fake apiserver
+"""
+import json
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+import kubernetes_asyncio
+from aiohttp import web
+from cluster_discovery import ClusterDiscovery, RawWatchEvent
+from dynamic_targets import (
+    DYNAMIC_OBJECT_TYPE,
+    DiscoveredResource,
+    DynamicObject,
+    DynamicResource,
+    discover_resources,
+    parse_resources,
+)
+from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from multiprocess_pipeline import convert_raw_watch_event
+
+WIDGETS = DynamicResource("example.com", "v1", "widgets")
+WIDGETS_COUNT = 3
+WATCH_EVENTS_COUNT = 30
+
+
+def _create_widget(index: int, resource_version: int) -> dict:
+    """ Creates a raw widget custom object """
+    return {
+        "metadata": {
+            "name": f"widget-{index}",
+            "namespace": "default",
+            "uid": f"uid-{index}",
+            "resourceVersion": str(resource_version),
+            "labels": {"app.kubernetes.io/name": "widget"},
+            "ownerReferences": [{"apiVersion": "v1", "kind": "Pod", "name": "pod"}],
+        },
+        "spec": {"replicaCount": index},
+    }
+
+
+class FakeApiServer:
+    """
+    Fake apiserver stand-in - serves the version, the example.com/v1
+    discovery document, and lists & watches its widgets
+    """
+
+    def __init__(self):
+        self.list_paths = []
+
+    async def _get_version(self, _request):
+        return web.json_response({"gitVersion": "v1.28.0"})
+
+    async def _get_resources(self, _request):
+        return web.json_response({
+            "kind": "APIResourceList",
+            "groupVersion": "example.com/v1",
+            "resources": [
+                {"name": "widgets", "kind": "Widget", "namespaced": True, "verbs": ["list", "watch"]},
+                {"name": "widgets/status", "kind": "Widget", "namespaced": True, "verbs": ["get"]},
+                {"name": "gadgets", "kind": "Gadget", "namespaced": False, "verbs": ["get"]},
+            ],
+        })
+
+    async def _list_widgets(self, request):
+        self.list_paths.append(request.path)
+        if request.query.get("watch") != "True":
+            return web.json_response({
+                "kind": "WidgetList",
+                "apiVersion": "example.com/v1",
+                "metadata": {"resourceVersion": "100"},
+                "items": [_create_widget(i, i + 1) for i in range(WIDGETS_COUNT)],
+            })
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for i in range(WATCH_EVENTS_COUNT):
+            event = {"type": "MODIFIED", "object": _create_widget(0, 101 + i)}
+            await response.write(json.dumps(event).encode() + b"\n")
+        # the watch stays open
+        await asyncio.sleep(1)
+        return response
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/version/", self._get_version)
+        app.router.add_get("/apis/example.com/v1", self._get_resources)
+        app.router.add_get("/apis/example.com/v1/widgets", self._list_widgets)
+        app.router.add_get(
+            "/apis/example.com/v1/namespaces/{namespace}/widgets",
+            self._list_widgets
+        )
+        return app
+
+
+@asynccontextmanager
+async def _serve_fake_apiserver():
+    """
+    Serves a fake apiserver
+    :return: the fake apiserver & a kubernetes API client of it
+    """
+    server = FakeApiServer()
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    configuration = kubernetes_asyncio.client.Configuration()
+    configuration.host = f"http://127.0.0.1:{port}"
+    api_client = kubernetes_asyncio.client.ApiClient(configuration)
+    try:
+        yield server, api_client
+    finally:
+        await api_client.close()
+        await runner.cleanup()
+
+
+async def _run_discovery(cluster_discovery: ClusterDiscovery, duration: float = 0.3):
+    """ Runs the given cluster discovery for given duration """
+    task = asyncio.create_task(cluster_discovery.start())
+    await asyncio.sleep(duration)
+    task.cancel()
+    await asyncio.wait([task])
+
+
+def test_parse_resources():
+    """ parse_resources test - core & named groups, with & without rates """
+    assert parse_resources("apps/v1/replicasets, v1/services=50,") == [
+        DynamicResource("apps", "v1", "replicasets"),
+        DynamicResource("", "v1", "services", events_rate=50),
+    ]
+    assert parse_resources("") == []
+    assert str(DynamicResource("", "v1", "services")) == "v1/services"
+    assert DynamicResource("", "v1", "services").api_path == "/api/v1"
+    assert WIDGETS.api_path == "/apis/example.com/v1"
+    for value in ("replicasets", "apps/v1/replicasets/extra", "apps//replicasets"):
+        with pytest.raises(ValueError):
+            DynamicResource.parse(value)
+
+
+def test_watch_return_type():
+    """
+    Built-in resources are converted by their client models, CRDs are kept
+    as is
+    """
+    replica_sets = DynamicResource("apps", "v1", "replicasets")
+    assert DiscoveredResource(replica_sets, "ReplicaSet", True).watch_return_type == "V1ReplicaSet"
+    autoscalers = DynamicResource("autoscaling", "v2", "horizontalpodautoscalers")
+    assert (
+        DiscoveredResource(autoscalers, "HorizontalPodAutoscaler", True).watch_return_type ==
+        "V2HorizontalPodAutoscaler"
+    )
+    crd = DynamicResource("example.com", "v1", "pods")
+    assert DiscoveredResource(crd, "Pod", True).watch_return_type == DYNAMIC_OBJECT_TYPE
+
+
+def test_dynamic_object_to_dict():
+    """
+    DynamicObject.to_dict test - the metadata is converted as the client
+    models convert it, the rest is kept as is
+    """
+    obj = DynamicObject(_create_widget(0, 1))
+    obj.kind = "Widget"
+    data = obj.to_dict()
+    assert data["kind"] == "Widget"
+    assert data["spec"] == {"replicaCount": 0}
+    assert data["metadata"]["resource_version"] == "1"
+    assert data["metadata"]["labels"] == {"app.kubernetes.io/name": "widget"}
+    assert data["metadata"]["owner_references"] == [
+        {"api_version": "v1", "kind": "Pod", "name": "pod"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_discover_resources():
+    """
+    discover_resources test - resources which aren't served or can't be
+    watched are skipped
+    """
+    async with _serve_fake_apiserver() as (_, api_client):
+        resources = [
+            WIDGETS,
+            DynamicResource("example.com", "v1", "gadgets"),
+            DynamicResource("example.com", "v1", "missing"),
+            DynamicResource("missing.com", "v1", "widgets"),
+        ]
+        assert await discover_resources(api_client, resources) == [
+            DiscoveredResource(WIDGETS, "Widget", True)
+        ]
+
+
+@pytest.mark.asyncio
+async def test_watch_dynamic_target():
+    """
+    The cluster discovery lists & watches the discovered resources, as it
+    does the built-in targets
+    """
+    async with _serve_fake_apiserver() as (fake_apiserver, api_client):
+        events = []
+
+        async def write_event(event):
+            events.append(event)
+
+        cluster_discovery = ClusterDiscovery(
+            write_event,
+            should_collect_resources=False,
+            api_client=api_client,
+            resources=[WIDGETS],
+        )
+        await _run_discovery(cluster_discovery)
+        assert fake_apiserver.list_paths[0] == "/apis/example.com/v1/widgets"
+        watch_events = [event for event in events if isinstance(event, WatchKubernetesEvent)]
+        assert len(watch_events) == WIDGETS_COUNT + WATCH_EVENTS_COUNT
+        listed_event = watch_events[0]
+        assert listed_event.watch_event_type == WatchKubernetesEventType.ADDED
+        assert listed_event.data["kind"] == "Widget"
+        assert listed_event.data["apiVersion"] == "example.com/v1"
+        watched_event = watch_events[-1]
+        assert watched_event.watch_event_type == WatchKubernetesEventType.MODIFIED
+        assert watched_event.get_resource_version() == str(100 + WATCH_EVENTS_COUNT)
+
+
+@pytest.mark.asyncio
+async def test_raw_watch_dynamic_target():
+    """
+    The raw watch events of the discovered resources are converted by the
+    workers as the cluster discovery converts them
+    """
+    async with _serve_fake_apiserver() as (_, api_client):
+        raw_events = []
+
+        async def write_raw_event(event):
+            raw_events.append(event)
+
+        cluster_discovery = ClusterDiscovery(
+            write_raw_event,
+            should_collect_resources=False,
+            api_client=api_client,
+            raw_watch_event_handler=write_raw_event,
+            resources=[WIDGETS],
+            namespace="default",
+        )
+        await _run_discovery(cluster_discovery)
+        raw_watch_events = [event for event in raw_events if isinstance(event, RawWatchEvent)]
+        assert len(raw_watch_events) == WATCH_EVENTS_COUNT
+        assert raw_watch_events[0].return_type == DYNAMIC_OBJECT_TYPE
+        event = convert_raw_watch_event(raw_watch_events[-1], api_client)
+        assert event.data["metadata"]["uid"] == "uid-0"
+        assert event.get_resource_version() == str(100 + WATCH_EVENTS_COUNT)
+
+
+@pytest.mark.asyncio
+async def test_dynamic_target_scope():
+    """
+    Namespaced resources are listed in the discovery namespace, and aren't
+    watched by a cluster scoped (kinds filtered) discovery
+    """
+    async with _serve_fake_apiserver() as (fake_apiserver, api_client):
+        cluster_discovery = ClusterDiscovery(
+            None,
+            api_client=api_client,
+            resources=[WIDGETS],
+            namespace="default",
+        )
+        await cluster_discovery._add_dynamic_watch_targets()
+        assert set(cluster_discovery.watch_targets) == {
+            "Pod", "Deployment", "DaemonSet", "StatefulSet", "Widget"
+        }
+        endpoint = cluster_discovery.watch_targets["Widget"].endpoint
+        assert endpoint.path == "/apis/example.com/v1/namespaces/default/widgets"
+        cluster_discovery = ClusterDiscovery(
+            None,
+            api_client=api_client,
+            resources=[WIDGETS],
+            kinds=ClusterDiscovery.CLUSTER_SCOPED_KINDS,
+        )
+        await cluster_discovery._add_dynamic_watch_targets()
+        assert set(cluster_discovery.watch_targets) == {"Node", "Namespace"}
+
+
+@pytest.mark.asyncio
+async def test_dynamic_target_rate_limit():
+    """
+    Each dynamic target watch events rate is limited, once its burst is used
+    """
+    async with _serve_fake_apiserver() as (_, api_client):
+        events = []
+
+        async def write_event(event):
+            events.append(event)
+
+        cluster_discovery = ClusterDiscovery(
+            write_event,
+            should_collect_resources=False,
+            api_client=api_client,
+            resources=[DynamicResource("example.com", "v1", "widgets", events_rate=1)],
+        )
+        await _run_discovery(cluster_discovery)
+        watch_events = [
+            event for event in events
+            if isinstance(event, WatchKubernetesEvent) and
+            event.watch_event_type == WatchKubernetesEventType.MODIFIED
+        ]
+        # a burst of 10 seconds
+        assert len(watch_events) == 10
@@ -0,0 +1,130 @@
+"""
+Encoders tests
+"""
+import json
+from datetime import datetime, timezone
+import pytest
+import encoders
+from encoders import (
+    DateTimeEncoder,
+    JsonSerializer,
+    JsonSerializerException,
+    get_available_backends,
+)
+
+TEST_DATA = {
+    "kind": "Pod",
+    "metadata": {
+        "name": "pod-1",
+        "uid": "1a2b3c",
+        "labels": {"app": "web", "team/owner": "a&b <c>"},
+        "creation_timestamp": datetime(2021, 1, 1, tzinfo=timezone.utc),
+        "deletion_timestamp": None,
+        "generation": 12345678901234,
+    },
+    "spec": {
+        "containers": [
+            {
+                "name": "app",
+                "args": ["--path", "/var/run", "--text", "é ü 日本 😀  "],
+                "ports": [{"container_port": 8080, "host_port": None}],
+                "privileged": False,
+            }
+        ],
+        "priority": -1,
+    },
+    "status": {
+        "conditions": [
+            {
+                "type": "Ready",
+                "status": "True",
+                "last_transition_time": datetime(2021, 1, 1, 1, 2, 3, 456),
+                "message": "quote \" backslash \\ newline \n tab \t control \x1f",
+            }
+        ],
+        "ratio": 0.25,
+        "annotations": {1: "non string key"},
+    },
+}
+
+
+def _get_expected_json():
+    """ Gets the expected serialized TEST_DATA """
+    return json.dumps(
+        TEST_DATA,
+        cls=DateTimeEncoder,
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_available_backends():
+    """ The standard library backend is always available, and the last one """
+    assert get_available_backends()[-1] == "json"
+    assert JsonSerializer().backend == get_available_backends()[0]
+
+
+@pytest.mark.asyncio
+async def test_invalid_backend():
+    """ Tests unknown & uninstalled backends """
+    with pytest.raises(JsonSerializerException):
+        JsonSerializer("invalid")
+    for backend in JsonSerializer.DUMPS_FUNCTIONS:
+        if backend not in get_available_backends():
+            with pytest.raises(JsonSerializerException):
+                JsonSerializer(backend)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", get_available_backends())
+async def test_dumps_identical(backend):
+    """
+    dumps test - each backend output is byte identical to the compact
+    DateTimeEncoder output
+    """
+    assert JsonSerializer(backend).dumps(TEST_DATA) == _get_expected_json()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", get_available_backends())
+async def test_dumps_sort_keys(backend):
+    """
+    dumps test - with sorted keys, the output doesn't depend on the dicts
+    keys order, and is identical to the sorted DateTimeEncoder output
+    """
+    data = {"b": {"d": 1, "c": [{"f": None, "e": True}]}, "a": "a"}
+    reordered_data = {"a": "a", "b": {"c": [{"e": True, "f": None}], "d": 1}}
+    serializer = JsonSerializer(backend)
+    assert serializer.dumps(data) != serializer.dumps(reordered_data)
+    assert serializer.dumps(data, sort_keys=True) == json.dumps(
+        data,
+        cls=DateTimeEncoder,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=True
+    ).encode("utf-8")
+    assert serializer.dumps(data, sort_keys=True) == serializer.dumps(
+        reordered_data,
+        sort_keys=True
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", get_available_backends())
+async def test_dumps_unsupported_type(backend):
+    """ dumps test - unsupported types are not serialized """
+    with pytest.raises(TypeError):
+        JsonSerializer(backend).dumps({"a": object()})
+
+
+@pytest.mark.asyncio
+async def test_set_json_backend():
+    """ set_json_backend test - sets the backend used by dumps """
+    default_backend = encoders.get_json_backend()
+    try:
+        encoders.set_json_backend("json")
+        assert encoders.get_json_backend() == "json"
+        assert encoders.dumps(TEST_DATA) == _get_expected_json()
+    finally:
+        encoders.set_json_backend(default_backend)
@@ -3,6 +3,7 @@ EpsagonClient tests
 """
 import base64
 import pytest
+from aiohttp.client_exceptions import ClientResponseError
 from epsagon_client import EpsagonClient
 
 TEST_EPSAGON_TOKEN = "123"
@@ -31,3 +32,30 @@ async def test_post(httpserver):
     ).respond_with_handler(handler)
     client = await EpsagonClient.create(TEST_EPSAGON_TOKEN)
     await client.post(httpserver.url_for(TEST_PATH), data)
+
+
+@pytest.mark.asyncio
+async def test_post_retries(httpserver):
+    """
+    post test - server errors are retried, conflicts aren't, and the final
+    error response is raised
+    """
+    httpserver.expect_oneshot_request(TEST_PATH, method="POST").respond_with_data(
+        "",
+        status=500
+    )
+    httpserver.expect_oneshot_request(TEST_PATH, method="POST").respond_with_data("")
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_data(
+        "",
+        status=409
+    )
+    client = await EpsagonClient.create(TEST_EPSAGON_TOKEN, retry_attempts=3)
+    try:
+        await client.post(httpserver.url_for(TEST_PATH), "{}")
+        assert len(httpserver.log) == 2
+        with pytest.raises(ClientResponseError) as exception_info:
+            await client.post(httpserver.url_for(TEST_PATH), "{}")
+        assert exception_info.value.status == 409
+        assert len(httpserver.log) == 3
+    finally:
+        await client.close()
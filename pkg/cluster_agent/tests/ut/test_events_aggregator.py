@@ -0,0 +1,275 @@
+"""
+EventsAggregator tests
+"""
+import asyncio
+import pytest
+from asynctest.mock import patch, MagicMock
+from cluster_discovery import ClusterDiscovery
+from delta_encoder import DeltaEncoder
+from events_aggregator import EVENT_KIND, EventsAggregator
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    WatchDeltaKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+
+
+class EventsCollector:
+    """ Collects the written events """
+
+    def __init__(self):
+        self.events = []
+
+    async def write_event(self, event):
+        self.events.append(event)
+
+
+def _generate_event(
+        name="pod-1",
+        namespace="default",
+        reason="BackOff",
+        count=1,
+        involved_object_uid="uid-1",
+        event_type=WatchKubernetesEventType.MODIFIED,
+):
+    """ Generates a core/v1 Event watch event """
+    return WatchKubernetesEvent(
+        event_type,
+        {
+            "kind": "Event",
+            "metadata": {"name": f"{name}.event", "namespace": namespace},
+            "involved_object": {
+                "kind": "Pod",
+                "name": name,
+                "namespace": namespace,
+                "uid": involved_object_uid,
+            },
+            "reason": reason,
+            "type": "Warning",
+            "count": count,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_invalid_window_seconds():
+    """ Tests invalid window seconds param """
+    with pytest.raises(ValueError):
+        EventsAggregator(EventsCollector().write_event, window_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_other_events_pass_through():
+    """ Tests events which aren't core/v1 Events are written as is """
+    collector = EventsCollector()
+    aggregator = EventsAggregator(collector.write_event)
+    pod_event = WatchKubernetesEvent(
+        WatchKubernetesEventType.MODIFIED,
+        {"kind": "Pod", "metadata": {"name": "pod-1"}}
+    )
+    cluster_event = KubernetesEvent(KubernetesEventType.CLUSTER, {"version": "1"})
+    for _ in range(3):
+        await aggregator.write_event(pod_event)
+    await aggregator.write_event(cluster_event)
+    assert collector.events == [pod_event] * 3 + [cluster_event]
+
+
+@pytest.mark.asyncio
+async def test_collapse():
+    """
+    Tests Event updates within a window are collapsed - the first is written
+    right away, the latest once the window ends
+    """
+    collector = EventsCollector()
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(collector.write_event, window_seconds=10)
+        events = [_generate_event(count=i) for i in range(1, 6)]
+        for event in events:
+            await aggregator.write_event(event)
+        other_event = _generate_event(reason="Unhealthy")
+        await aggregator.write_event(other_event)
+        assert collector.events == [events[0], other_event]
+        await aggregator.flush()
+        assert len(collector.events) == 2
+    with patch("time.monotonic", MagicMock(return_value=110)):
+        await aggregator.flush()
+    assert collector.events == [events[0], other_event, events[-1]]
+    assert aggregator.collapsed_events_count == 3
+
+
+@pytest.mark.asyncio
+async def test_collapse_new_window():
+    """
+    Tests an Event update after the window ends writes the window pending
+    update and starts a new window
+    """
+    collector = EventsCollector()
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(collector.write_event, window_seconds=10)
+        first_event = _generate_event(count=1)
+        pending_event = _generate_event(count=2)
+        await aggregator.write_event(first_event)
+        await aggregator.write_event(pending_event)
+    with patch("time.monotonic", MagicMock(return_value=115)):
+        last_event = _generate_event(count=3)
+        await aggregator.write_event(last_event)
+    assert collector.events == [first_event, pending_event, last_event]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit():
+    """
+    Tests Events are rate limited per namespace & per reason, and the
+    suppressed Events are counted in the summary
+    """
+    collector = EventsCollector()
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(
+            collector.write_event,
+            namespace_rate=1,
+            namespace_burst=2,
+            reason_rate=1,
+            reason_burst=3,
+        )
+        for i in range(3):
+            await aggregator.write_event(
+                _generate_event(name=f"pod-{i}", involved_object_uid=f"uid-{i}")
+            )
+        for i in range(2):
+            await aggregator.write_event(_generate_event(
+                name=f"pod-{i}",
+                namespace="other",
+                involved_object_uid=f"other-uid-{i}"
+            ))
+    # 2 allowed in default (namespace burst), then 1 in other (reason burst)
+    assert len(collector.events) == 3
+    await aggregator.write_summary()
+    summary_event = collector.events[-1]
+    assert summary_event.event_type == KubernetesEventType.EVENTS_SUMMARY
+    assert summary_event.data["collapsed_events"] == 0
+    assert sorted(
+        summary_event.data["suppressed_events"], key=lambda x: x["namespace"]
+    ) == [
+        {"namespace": "default", "reason": "BackOff", "count": 1},
+        {"namespace": "other", "reason": "BackOff", "count": 1},
+    ]
+    # counts are reset
+    await aggregator.write_summary()
+    assert len(collector.events) == 4
+
+
+@pytest.mark.asyncio
+async def test_deleted_events():
+    """
+    Tests Event deletions are written right away even when over the rate
+    limits, and drop the pending update of the deleted Event
+    """
+    collector = EventsCollector()
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(
+            collector.write_event,
+            window_seconds=10,
+            namespace_rate=1,
+            namespace_burst=1,
+        )
+        first_event = _generate_event(count=1)
+        await aggregator.write_event(first_event)
+        await aggregator.write_event(_generate_event(count=2))
+        deleted_event = _generate_event(
+            count=2,
+            event_type=WatchKubernetesEventType.DELETED
+        )
+        await aggregator.write_event(deleted_event)
+    assert collector.events == [first_event, deleted_event]
+    with patch("time.monotonic", MagicMock(return_value=110)):
+        await aggregator.flush(should_flush_all=True)
+    assert collector.events == [first_event, deleted_event]
+
+
+@pytest.mark.asyncio
+async def test_deleted_event_other_pending():
+    """
+    Tests an Event deletion writes the pending update of another Event of
+    the same key (involved object, reason & type)
+    """
+    collector = EventsCollector()
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(collector.write_event, window_seconds=10)
+        first_event = _generate_event(count=1)
+        # another Event of the same involved object
+        other_event = _generate_event(name="pod-2")
+        deleted_event = _generate_event(event_type=WatchKubernetesEventType.DELETED)
+        for event in (first_event, other_event, deleted_event):
+            await aggregator.write_event(event)
+    assert collector.events == [first_event, other_event, deleted_event]
+
+
+@pytest.mark.asyncio
+async def test_start_flush_on_cancel():
+    """
+    Tests the pending Events & a last summary are written once the
+    aggregator is cancelled
+    """
+    collector = EventsCollector()
+    aggregator = EventsAggregator(collector.write_event, window_seconds=60)
+    first_event = _generate_event(count=1)
+    for i in range(1, 4):
+        await aggregator.write_event(_generate_event(count=i))
+    task = asyncio.create_task(aggregator.start())
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.wait([task])
+    assert len(collector.events) == 3
+    assert collector.events[0].data == first_event.data
+    assert collector.events[1].data["count"] == 3
+    assert collector.events[2].event_type == KubernetesEventType.EVENTS_SUMMARY
+    assert collector.events[2].data["collapsed_events"] == 1
+
+
+@pytest.mark.asyncio
+@patch("kubernetes_asyncio.client")
+async def test_aggregate_with_deltas(_):
+    """
+    With delta events enabled, the Events written by the cluster discovery
+    are still aggregated - they are excluded from the delta encoder, so a
+    collapsed or suppressed Event is never the base of a delta. Other kinds
+    are still encoded as deltas.
+    """
+    collector = EventsCollector()
+    delta_encoder = DeltaEncoder(excluded_kinds=(EVENT_KIND,))
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        aggregator = EventsAggregator(collector.write_event, window_seconds=10)
+        cluster_discovery = ClusterDiscovery(
+            aggregator.write_event,
+            delta_encoder=delta_encoder
+        )
+        events = []
+        for count in range(1, 5):
+            event = _generate_event(count=count)
+            event.data["metadata"].update(uid="event-uid", resource_version=str(count))
+            event.data["message"] = "Back-off restarting failed container " * 10
+            events.append(event)
+            await cluster_discovery._write_event(event)
+        assert collector.events == [events[0]]
+        assert aggregator.collapsed_events_count == 2
+        pod = {
+            "kind": "Pod",
+            "metadata": {"name": "pod-1", "uid": "uid-1", "resource_version": "1"},
+            "spec": {"containers": [{"name": f"app-{i}"} for i in range(20)]},
+        }
+        for resource_version in ("1", "2"):
+            pod = dict(pod, metadata=dict(pod["metadata"], resource_version=resource_version))
+            await cluster_discovery._write_event(
+                WatchKubernetesEvent(WatchKubernetesEventType.MODIFIED, pod)
+            )
+    with patch("time.monotonic", MagicMock(return_value=110)):
+        await aggregator.flush()
+    assert collector.events[-1] == events[-1]
+    assert isinstance(collector.events[2], WatchDeltaKubernetesEvent)
+    assert not any(
+        isinstance(event, WatchDeltaKubernetesEvent) and
+        event.data["kind"] == EVENT_KIND
+        for event in collector.events
+    )
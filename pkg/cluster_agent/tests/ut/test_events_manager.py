@@ -4,7 +4,11 @@ EventsManager tests
 import asyncio
 import pytest
 from events_manager import InMemoryEventsManager
-from kubernetes_event import WatchKubernetesEvent, WatchKubernetesEventType
+from kubernetes_event import (
+    SerializedKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
 from .conftest import run_coroutines_with_timeout
 
 DEFAULT_MAX_SIZE = 2
@@ -127,3 +131,89 @@ async def test_clean_no_events(in_memory_events_manager):
     assert in_memory_events_manager.is_empty()
     in_memory_events_manager.clean()
     assert in_memory_events_manager.is_empty()
+
+
+def _generate_events(count: int):
+    """ Generates watch events """
+    return [
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.MODIFIED,
+            {"metadata": {"uid": f"uid-{i}", "resource_version": str(i)}}
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_invalid_compression_params():
+    """ Tests invalid compression threshold & chunk size params """
+    with pytest.raises(ValueError):
+        InMemoryEventsManager(compression_threshold=0)
+    with pytest.raises(ValueError):
+        InMemoryEventsManager(compression_threshold=1, compression_chunk_size=0)
+
+
+@pytest.mark.asyncio
+async def test_compressed_backlog():
+    """
+    Compressed backlog test - events written once the threshold is reached
+    are compressed, and all the events are read in order
+    """
+    events_manager = InMemoryEventsManager(
+        compression_threshold=2,
+        compression_chunk_size=3
+    )
+    events = _generate_events(10)
+    for event in events:
+        await events_manager.write_event(event)
+    assert events_manager.size() == len(events)
+    backlog_events_count, backlog_bytes = events_manager.get_backlog_stats()
+    assert backlog_events_count == len(events) - 2
+    assert backlog_bytes > 0
+
+    read_events = []
+    while not events_manager.is_empty():
+        read_events.extend(await events_manager.get_events(max_size=4))
+    assert read_events[:2] == events[:2]
+    assert isinstance(read_events[2], SerializedKubernetesEvent)
+    assert [event.to_dict() for event in read_events] == [
+        event.to_dict() for event in events
+    ]
+    assert events_manager.get_backlog_stats() == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_compressed_backlog_write_while_reading():
+    """
+    Compressed backlog test - events written while the backlog is drained are
+    read after the backlog events
+    """
+    events_manager = InMemoryEventsManager(
+        compression_threshold=1,
+        compression_chunk_size=2
+    )
+    events = _generate_events(6)
+    for event in events[:4]:
+        await events_manager.write_event(event)
+    read_events = await events_manager.get_events(max_size=2)
+    for event in events[4:]:
+        await events_manager.write_event(event)
+    read_events.extend(await events_manager.get_events(max_size=10))
+    assert [event.to_dict() for event in read_events] == [
+        event.to_dict() for event in events
+    ]
+    assert events_manager.is_empty()
+
+
+@pytest.mark.asyncio
+async def test_clean_compressed_backlog():
+    """ clean test - the compressed backlog is cleaned as well """
+    events_manager = InMemoryEventsManager(
+        compression_threshold=1,
+        compression_chunk_size=2
+    )
+    for event in _generate_events(5):
+        await events_manager.write_event(event)
+    events_manager.clean()
+    assert events_manager.is_empty()
+    assert events_manager.get_backlog_stats() == (0, 0)
@@ -7,6 +7,8 @@ import zlib
 import pytest
 from typing import Dict, List
 from asynctest.mock import patch, MagicMock
+from aiohttp.client_exceptions import ClientResponseError
+from werkzeug.wrappers import Response
 from encoders import DateTimeEncoder
 from epsagon_client import EpsagonClient
 from events_sender import EventsSender
@@ -16,10 +18,13 @@ from kubernetes_event import (
     KubernetesEventType,
     WatchKubernetesEventType,
 )
+from rate_limiter import BandwidthLimiter
+from templates import TemplateEncoder, TemplateException, resolve_templates
 
 TEST_URL = "http://testurl/1"
 TEST_CLUSTER_NAME = "test-cluster-name"
 TEST_EPSAGON_TOKEN = "1234"
+TEST_PATH = "/resources/v1"
 
 
 def _get_expected_data(
@@ -30,7 +35,12 @@ def _get_expected_data(
     Gets the expected data to be sent given events list and events sender
     """
     events = [event.to_dict() for event in events]
-    events_json = json.dumps(events, cls=DateTimeEncoder)
+    events_json = json.dumps(
+        events,
+        cls=DateTimeEncoder,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
     compressed_data = base64.b64encode(
         zlib.compress(events_json.encode("utf-8"))
     ).decode("utf-8")
@@ -76,3 +86,184 @@ async def test_send_no_events(epsagon_client_mock):
     events = []
     await sender.send_events(events)
     epsagon_client_obj.post.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("epsagon_client.EpsagonClient")
+async def test_send_events_bandwidth_limit(epsagon_client_mock):
+    """
+    Tests each request waits for the bandwidth limiter, by its body size
+    """
+    epsagon_client_obj = epsagon_client_mock.return_value
+    bandwidth_limiter = BandwidthLimiter(10 ** 6)
+    sender = EventsSender(
+        epsagon_client_obj,
+        TEST_URL,
+        TEST_CLUSTER_NAME,
+        TEST_EPSAGON_TOKEN,
+        bandwidth_limiter=bandwidth_limiter
+    )
+    events = [
+        WatchKubernetesEvent(WatchKubernetesEventType.ADDED, {"a": "b"}),
+    ]
+    await sender.send_events(events)
+    await sender.send_events(events)
+    expected_data = _get_expected_data(sender, events)
+    assert epsagon_client_obj.post.call_count == 2
+    epsagon_client_obj.post.assert_called_with(TEST_URL, expected_data)
+    assert bandwidth_limiter.sent_bytes == len(expected_data) * 2
+    assert bandwidth_limiter.queued_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_serialize_events():
+    """
+    serialize_events test - same as dumping the events dicts list
+    """
+    events = [
+        KubernetesEvent(KubernetesEventType.CLUSTER, {"a": "b"}),
+        WatchKubernetesEvent(WatchKubernetesEventType.ADDED, {"a": "ü"}),
+        WatchKubernetesEvent(WatchKubernetesEventType.DELETED, {"c": None}),
+    ]
+    serialized = EventsSender.serialize_events(events)
+    assert json.loads(serialized) == [event.to_dict() for event in events]
+    assert json.loads(EventsSender.serialize_events([])) == []
+
+
+def _decode(data: str):
+    """ Decodes compressed data """
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+class StandInCollector:
+    """
+    A stand-in collector - keeps the templates of each session, and resolves
+    the received events template references. Responds with 409 if a
+    referenced template is unknown.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, Dict] = {}
+        self.events: List[Dict] = []
+        self.conflicts_count = 0
+
+    def handle(self, request):
+        """ Handles a received events batch """
+        body = json.loads(request.get_data())
+        templates = self.sessions.setdefault(body["templates_session"], {})
+        templates.update(_decode(body["templates"]))
+        try:
+            self.events.extend(resolve_templates(_decode(body["data"]), templates))
+        except TemplateException:
+            self.conflicts_count += 1
+            return Response("Unknown template", status=409)
+        return Response("")
+
+
+def _generate_pod_events(count: int) -> List[WatchKubernetesEvent]:
+    """ Generates pod events of the same deployment """
+    return [
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.MODIFIED,
+            {
+                "kind": "Pod",
+                "metadata": {"name": f"pod-{i}", "uid": f"uid-{i}"},
+                "spec": {
+                    "containers": [
+                        {"name": f"app-{j}", "image": f"app-{j}:1.0", "args": ["--port", "8080"]}
+                        for j in range(5)
+                    ],
+                },
+            }
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_send_templated_events(httpserver):
+    """
+    Send templated events test - the templates bodies are sent once, and all
+    the template references are resolved by the stand-in collector
+    """
+    collector = StandInCollector()
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_handler(
+        collector.handle
+    )
+    client = await EpsagonClient.create(TEST_EPSAGON_TOKEN)
+    sender = EventsSender(
+        client,
+        httpserver.url_for(TEST_PATH),
+        TEST_CLUSTER_NAME,
+        TEST_EPSAGON_TOKEN,
+        template_encoder=TemplateEncoder()
+    )
+    events = _generate_pod_events(4)
+    await sender.send_events(events[:2])
+    await sender.send_events(events[2:])
+    await client.close()
+    assert collector.conflicts_count == 0
+    assert len(collector.sessions) == 1
+    assert len(_decode(json.loads(httpserver.log[1][0].get_data())["templates"])) == 0
+    assert collector.events == [json.loads(event.serialize()) for event in events]
+
+
+@pytest.mark.asyncio
+async def test_send_templated_events_unknown_session(httpserver):
+    """
+    Send templated events test - once the collector loses the session
+    templates, the events are resent with the templates bodies in a new session
+    """
+    collector = StandInCollector()
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_handler(
+        collector.handle
+    )
+    client = await EpsagonClient.create(TEST_EPSAGON_TOKEN)
+    sender = EventsSender(
+        client,
+        httpserver.url_for(TEST_PATH),
+        TEST_CLUSTER_NAME,
+        TEST_EPSAGON_TOKEN,
+        template_encoder=TemplateEncoder()
+    )
+    events = _generate_pod_events(2)
+    await sender.send_events(events[:1])
+    collector.sessions.clear()
+    await sender.send_events(events[1:])
+    await client.close()
+    # the conflict isn't retried, the events are resent in a new session
+    assert collector.conflicts_count == 1
+    assert len(httpserver.log) == 3
+    assert len(collector.sessions) == 2
+    assert collector.events == [json.loads(event.serialize()) for event in events]
+
+
+@pytest.mark.asyncio
+async def test_send_templated_events_failed_send(httpserver):
+    """
+    Send templated events test - the templates of a failed send aren't
+    considered as sent, the next events carry their bodies
+    """
+    collector = StandInCollector()
+    httpserver.expect_oneshot_request(TEST_PATH, method="POST").respond_with_data(
+        "",
+        status=500
+    )
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_handler(
+        collector.handle
+    )
+    client = await EpsagonClient.create(TEST_EPSAGON_TOKEN, retry_attempts=1)
+    sender = EventsSender(
+        client,
+        httpserver.url_for(TEST_PATH),
+        TEST_CLUSTER_NAME,
+        TEST_EPSAGON_TOKEN,
+        template_encoder=TemplateEncoder()
+    )
+    events = _generate_pod_events(2)
+    with pytest.raises(ClientResponseError):
+        await sender.send_events(events[:1])
+    await sender.send_events(events[1:])
+    await client.close()
+    assert collector.conflicts_count == 0
+    assert collector.events == [json.loads(events[1].serialize())]
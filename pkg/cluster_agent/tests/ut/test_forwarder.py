@@ -64,6 +64,22 @@ class EventsSenderMock:
         self.current_workers_count -= 1
 
 
+class BlockingEventsSenderMock:
+    """ EventsSender mock, each send waits to be released by the test """
+    def __init__(self):
+        self.released = asyncio.Event()
+        self.events = []
+
+    async def send_events(self, events: List[KubernetesEvent]):
+        """
+        Waits to be released, then saves the given events - each release
+        sends a single events batch
+        """
+        await self.released.wait()
+        self.released.clear()
+        self.events.extend(events)
+
+
 async def _write_events(
         events: List[KubernetesEvent],
         events_manager: EventsManager
@@ -221,3 +237,96 @@ async def test_invalid_max_events_to_read():
             events_sender,
             max_events_to_read=max_events_to_read
         )
+
+
+@pytest.mark.asyncio
+async def test_update_max_workers_while_running():
+    """
+    Runs forwarder while writing events and decreases the max workers count,
+    verifies all events are sent and no more than the new max workers count
+    ran concurrently after the update.
+    """
+    max_workers = 1
+    events_manager = EventsManagerMock(DEFAULT_MAX_EVENTS_TO_READ)
+    events_sender = EventsSenderMock(DEFAULT_MAX_WORKERS)
+    forwarder = Forwarder(events_manager, events_sender)
+    forwarder.set_max_workers(max_workers)
+    events_sender.expected_max_workers = max_workers
+    events: List[KubernetesEvent] = _generate_kubernetes_events(DEFAULT_EVENTS_COUNT)
+    events_write_task, forwarder_task = await run_coroutines_with_timeout(
+        (
+            _write_events(events, events_manager),
+            forwarder.start(),
+        ),
+        verify_tasks_finished=False,
+        timeout=2,
+    )
+    assert events_write_task.done()
+    assert not forwarder_task.done()
+    forwarder_task.cancel()
+    assert set(events) == events_sender.events
+
+
+@pytest.mark.asyncio
+async def test_invalid_max_workers_update():
+    """
+    assert value error is raised when updating the max workers to < 1
+    and that the previous value is kept
+    """
+    forwarder = Forwarder(
+        EventsManagerMock(DEFAULT_MAX_EVENTS_TO_READ),
+        EventsSenderMock(DEFAULT_MAX_WORKERS)
+    )
+    with pytest.raises(ValueError):
+        forwarder.set_max_workers(0)
+    with pytest.raises(ValueError):
+        forwarder.set_max_events_to_read(0)
+    assert forwarder.max_workers_count == DEFAULT_MAX_WORKERS
+    assert forwarder.max_events_to_read == DEFAULT_MAX_EVENTS_TO_READ
+
+
+@pytest.mark.asyncio
+async def test_drain_sanity():
+    """
+    Runs forwarder while writing events, then drains the forwarder.
+    Verifies all events are sent, including the ones queued when draining,
+    and that the forwarder task finishes.
+    """
+    events_manager = EventsManagerMock(DEFAULT_MAX_EVENTS_TO_READ)
+    events_sender = EventsSenderMock(DEFAULT_MAX_WORKERS)
+    forwarder = Forwarder(events_manager, events_sender)
+    events: List[KubernetesEvent] = _generate_kubernetes_events(DEFAULT_EVENTS_COUNT)
+    forwarder_task = asyncio.create_task(forwarder.start())
+    await _write_events(events[:DEFAULT_EVENTS_COUNT // 2], events_manager)
+    for event in events[DEFAULT_EVENTS_COUNT // 2:]:
+        await events_manager.write_event(event)
+    events_manager.expected_max_size = Forwarder.DEFAULT_DRAIN_MAX_EVENTS_TO_READ
+    flushed_events_count, lost_events_count = await forwarder.drain(timeout=1)
+    assert forwarder_task.done()
+    assert set(events) == events_sender.events
+    assert lost_events_count == 0
+    assert flushed_events_count <= DEFAULT_EVENTS_COUNT
+    assert events_manager.is_empty()
+
+
+@pytest.mark.asyncio
+async def test_drain_timeout():
+    """
+    Drains the forwarder while the events sender sends a single batch before
+    the given timeout. Verifies the unsent events are counted as lost.
+    """
+    events_manager = EventsManagerMock(DEFAULT_MAX_EVENTS_TO_READ)
+    events_sender = BlockingEventsSenderMock()
+    forwarder = Forwarder(events_manager, events_sender, max_workers=1)
+    events: List[KubernetesEvent] = _generate_kubernetes_events(DEFAULT_EVENTS_COUNT)
+    for event in events:
+        await events_manager.write_event(event)
+    events_sender.released.set()
+    flushed_events_count, lost_events_count = await forwarder.drain(
+        timeout=0.5,
+        max_events_to_read=DEFAULT_MAX_EVENTS_TO_READ
+    )
+    assert events_sender.events == events[:DEFAULT_MAX_EVENTS_TO_READ]
+    assert flushed_events_count == DEFAULT_MAX_EVENTS_TO_READ
+    assert lost_events_count == DEFAULT_EVENTS_COUNT - DEFAULT_MAX_EVENTS_TO_READ
+    assert not forwarder.running_workers
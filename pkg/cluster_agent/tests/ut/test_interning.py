@@ -0,0 +1,108 @@
+"""
+Interner tests
+"""
+from datetime import datetime, timezone
+import pytest
+from interning import Interner
+
+TEST_TIMESTAMP = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def _generate_pod(index: int):
+    """ Generates a pod object dict with unique & repeated fields """
+    return {
+        "metadata": {
+            "uid": f"uid-{index}",
+            "namespace": "".join(("default", "")),
+            "labels": {"app": f"app-{index % 2}"},
+            "creation_timestamp": TEST_TIMESTAMP,
+        },
+        "spec": {
+            "tolerations": [
+                {"key": "node.kubernetes.io/not-ready", "toleration_seconds": 300},
+                {"key": "node.kubernetes.io/unreachable", "toleration_seconds": 300},
+            ],
+            "security_context": {},
+            "priority": 0,
+            "enabled": False,
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_invalid_max_shared_structures():
+    """ Tests invalid max shared structures param """
+    with pytest.raises(ValueError):
+        Interner(max_shared_structures=0)
+
+
+@pytest.mark.asyncio
+async def test_intern_equal():
+    """ intern test - the interned object equals the given object """
+    interner = Interner()
+    for i in range(3):
+        pod = _generate_pod(i)
+        assert interner.intern(pod) == pod
+    for scalar in ("a", 1, None, TEST_TIMESTAMP):
+        assert interner.intern(scalar) == scalar
+
+
+@pytest.mark.asyncio
+async def test_intern_shared_structures():
+    """
+    intern test - identical sub-structures & short strings are shared,
+    unique ones are not
+    """
+    interner = Interner()
+    pods = [interner.intern(_generate_pod(i)) for i in range(3)]
+    assert pods[0]["spec"]["tolerations"] is pods[1]["spec"]["tolerations"]
+    assert pods[0]["spec"]["security_context"] is pods[2]["spec"]["security_context"]
+    assert pods[0]["metadata"]["labels"] is pods[2]["metadata"]["labels"]
+    assert pods[0]["metadata"]["labels"] is not pods[1]["metadata"]["labels"]
+    assert pods[0]["metadata"] is not pods[1]["metadata"]
+    assert pods[0]["metadata"]["namespace"] is pods[1]["metadata"]["namespace"]
+    assert interner.deduped_structures_count > 0
+
+
+@pytest.mark.asyncio
+async def test_intern_distinct_scalar_types():
+    """ intern test - equal scalars of different types aren't shared """
+    interner = Interner()
+    assert interner.intern([True]) == [True]
+    for value in (1, 1.0):
+        interned = interner.intern([value])
+        assert interned == [value]
+        assert type(interned[0]) is type(value)
+
+
+@pytest.mark.asyncio
+async def test_intern_max_shared_items():
+    """ intern test - structures with more than max_shared_items aren't shared """
+    interner = Interner(max_shared_items=2)
+    first = interner.intern({"a": [1, 2, 3], "b": [1, 2]})
+    second = interner.intern({"a": [1, 2, 3], "b": [1, 2]})
+    assert first["a"] is not second["a"]
+    assert first["b"] is second["b"]
+    assert first is not second
+
+
+@pytest.mark.asyncio
+async def test_intern_max_shared_structures():
+    """ intern test - held structures are released once the limit is reached """
+    interner = Interner(max_shared_structures=2)
+    first = interner.intern({"a": {"b": 1}})
+    interner.intern({"c": {"d": 1}})
+    assert interner.intern({"a": {"b": 1}}) is not first
+    assert interner.intern({"a": {"b": 1}}) == first
+
+
+@pytest.mark.asyncio
+async def test_intern_unsupported_types():
+    """ intern test - structures with unsupported items aren't shared """
+    interner = Interner()
+    value = ("a", "tuple")
+    first = interner.intern({"a": value})
+    second = interner.intern({"a": value})
+    assert first == second
+    assert first is not second
+    assert interner.intern(value) is value
@@ -0,0 +1,86 @@
+"""
+JSON patch tests
+"""
+import pytest
+import json_patch
+from json_patch import JsonPatchException
+
+TEST_DOCUMENT = {
+    "metadata": {"name": "pod-1", "labels": {"app/name": "web", "a~b": "c"}},
+    "spec": {"containers": [{"name": "a"}, {"name": "b"}], "priority": 0},
+    "status": {"phase": "Pending", "ready": False},
+}
+
+
+@pytest.mark.parametrize("target", (
+        TEST_DOCUMENT,
+        {
+            "metadata": {"name": "pod-1", "labels": {"app/name": "db"}},
+            "spec": {"containers": [{"name": "a"}, {"name": "b"}], "priority": 0},
+            "status": {"phase": "Running", "ready": True, "pod_ip": "10.0.0.1"},
+        },
+        {
+            "metadata": TEST_DOCUMENT["metadata"],
+            "spec": {"containers": [{"name": "c"}], "priority": False},
+            "status": None,
+        },
+        {
+            "metadata": TEST_DOCUMENT["metadata"],
+            "spec": {"containers": [{"name": "a"}, {"name": "b"}, {"name": "c"}]},
+            "status": TEST_DOCUMENT["status"],
+        },
+        ["not", "a", "dict"],
+))
+@pytest.mark.asyncio
+async def test_diff_apply(target):
+    """ diff & apply test - applying the diff patch results in the target """
+    patch = json_patch.diff(TEST_DOCUMENT, target)
+    assert json_patch.apply(TEST_DOCUMENT, patch) == target
+
+
+@pytest.mark.asyncio
+async def test_diff_operations():
+    """ diff test - minimal operations with escaped paths """
+    target = {
+        "metadata": {"name": "pod-1", "labels": {"app/name": "db"}},
+        "spec": TEST_DOCUMENT["spec"],
+        "status": {"phase": "Running", "ready": False},
+    }
+    assert json_patch.diff(TEST_DOCUMENT, target) == [
+        {"op": "remove", "path": "/metadata/labels/a~0b"},
+        {"op": "replace", "path": "/metadata/labels/app~1name", "value": "db"},
+        {"op": "replace", "path": "/status/phase", "value": "Running"},
+    ]
+    assert json_patch.diff(TEST_DOCUMENT, TEST_DOCUMENT) == []
+    assert json_patch.diff({"a": 0}, {"a": False}) == [
+        {"op": "replace", "path": "/a", "value": False},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_apply_not_changing_document():
+    """ apply test - the patched document isn't changed """
+    document = {"a": [1, 2], "b": {"c": 1}}
+    patched = json_patch.apply(document, [
+        {"op": "add", "path": "/a/-", "value": 3},
+        {"op": "add", "path": "/a/0", "value": 0},
+        {"op": "remove", "path": "/b/c"},
+    ])
+    assert patched == {"a": [0, 1, 2, 3], "b": {}}
+    assert document == {"a": [1, 2], "b": {"c": 1}}
+
+
+@pytest.mark.parametrize("operation", (
+        {"op": "move", "from": "/a", "path": "/b"},
+        {"op": "remove", "path": ""},
+        {"op": "remove", "path": "/missing"},
+        {"op": "replace", "path": "/a/5", "value": 1},
+        {"op": "add", "path": "/a/x", "value": 1},
+        {"op": "add", "path": "/b/c/d", "value": 1},
+        {"op": "add", "path": "a", "value": 1},
+))
+@pytest.mark.asyncio
+async def test_apply_invalid_operation(operation):
+    """ apply test - invalid & unsupported operations """
+    with pytest.raises(JsonPatchException):
+        json_patch.apply({"a": [1], "b": {"c": 1}}, [operation])
@@ -1,11 +1,15 @@
 """
 KubernetesEvent tests
 """
+import json
 import time
+from datetime import datetime, timezone
 import pytest
 from asynctest.mock import patch, MagicMock
+from encoders import DateTimeEncoder
 from kubernetes_event import (
     KubernetesEvent,
+    SerializedKubernetesEvent,
     WatchKubernetesEvent,
     KubernetesEventType,
     WatchKubernetesEventType,
@@ -189,3 +193,143 @@ async def test_watch_equity():
     ]
     assert events[0] == events[1]
     assert events[0] != events[2]
+
+
+@pytest.mark.asyncio
+async def test_no_instance_dict():
+    """ events have no instance __dict__ (compact representation) """
+    for event in (
+            KubernetesEvent(KubernetesEventType.CLUSTER, {}),
+            WatchKubernetesEvent(WatchKubernetesEventType.ADDED, {}),
+    ):
+        assert not hasattr(event, "__dict__")
+
+
+@pytest.mark.asyncio
+@patch("time.time_ns", MagicMock(return_value=FAKE_TIMESTAMP))
+async def test_serialize():
+    """ serialize test - the event dict is serialized once and cached """
+    data = {
+        "A": "a",
+        "time": datetime(2021, 1, 1, tzinfo=timezone.utc),
+    }
+    event = WatchKubernetesEvent(WatchKubernetesEventType.ADDED, data)
+    assert not event.is_serialized()
+    serialized = event.serialize()
+    assert json.loads(serialized) == json.loads(
+        json.dumps(_get_expected_dict(event), cls=DateTimeEncoder)
+    )
+    assert event.serialize() is serialized
+    assert event.is_serialized()
+    assert event.get_serialized_size() == len(serialized)
+
+
+def _generate_pod(uid, resource_version, node_name="node-1"):
+    """ Generates a pod object dict """
+    return {
+        "kind": "Pod",
+        "metadata": {
+            "uid": uid,
+            "resource_version": resource_version,
+        },
+        "spec": {
+            "node_name": node_name,
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_watch_identity():
+    """ get_identity test - by kind, uid, resource version & watch type """
+    event_type = WatchKubernetesEventType.MODIFIED
+    event = WatchKubernetesEvent(event_type, _generate_pod("1", "5"))
+    assert event.get_identity() == (
+        KubernetesEventType.WATCH, "Pod", "1", "5", event_type
+    )
+    assert not WatchKubernetesEvent(event_type, {"A": "a"}).get_identity()
+
+
+@pytest.mark.asyncio
+async def test_watch_identity_equity():
+    """
+    __eq__ & __hash__ test - events are equal by identity, even if their
+    data differs
+    """
+    events = [
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.MODIFIED,
+            _generate_pod("1", "5")
+        ),
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.MODIFIED,
+            _generate_pod("1", "5", node_name="node-2")
+        ),
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.MODIFIED,
+            _generate_pod("1", "6")
+        ),
+        WatchKubernetesEvent(
+            WatchKubernetesEventType.DELETED,
+            _generate_pod("1", "6")
+        ),
+    ]
+    assert events[0] == events[1]
+    assert hash(events[0]) == hash(events[1])
+    assert events[0] != events[2]
+    assert events[2] != events[3]
+    assert len(set(events)) == 3
+
+
+@pytest.mark.asyncio
+async def test_content_digest():
+    """
+    get_content_digest test - equal for the same content, regardless of
+    the event timestamp
+    """
+    data = {"A": "a"}
+    event = KubernetesEvent(KubernetesEventType.CLUSTER, data)
+    same_event = KubernetesEvent(KubernetesEventType.CLUSTER, dict(data))
+    other_event = KubernetesEvent(KubernetesEventType.CLUSTER, {"A": "b"})
+    assert event.get_content_digest() == same_event.get_content_digest()
+    assert event.get_content_digest() != other_event.get_content_digest()
+    assert len(event.get_content_digest()) == KubernetesEvent.CONTENT_DIGEST_SIZE
+    assert hash(event) == hash(same_event)
+
+
+@pytest.mark.asyncio
+async def test_content_digest_keys_order():
+    """
+    Events with no identity are equal regardless of their data keys order,
+    hence their digests & hashes are equal as well
+    """
+    event = WatchKubernetesEvent(
+        WatchKubernetesEventType.ADDED,
+        {"metadata": {"name": "a", "labels": {"x": "1", "y": "2"}}, "spec": {}}
+    )
+    reordered_event = WatchKubernetesEvent(
+        WatchKubernetesEventType.ADDED,
+        {"spec": {}, "metadata": {"labels": {"y": "2", "x": "1"}, "name": "a"}}
+    )
+    assert event == reordered_event
+    assert event.get_content_digest() == reordered_event.get_content_digest()
+    assert hash(event) == hash(reordered_event)
+    assert len({event, reordered_event}) == 1
+
+
+@pytest.mark.asyncio
+async def test_serialized_event():
+    """
+    SerializedKubernetesEvent test - restored from a serialized event,
+    compared by its content
+    """
+    event = WatchKubernetesEvent(
+        WatchKubernetesEventType.ADDED,
+        {"metadata": {"uid": "1", "resource_version": "2"}}
+    )
+    serialized_event = SerializedKubernetesEvent(event.serialize())
+    assert serialized_event.serialize() == event.serialize()
+    assert serialized_event.to_dict() == event.to_dict()
+    assert serialized_event.get_formatted_payload() == event.get_formatted_payload()
+    assert serialized_event == SerializedKubernetesEvent(event.serialize())
+    assert serialized_event != event
+    assert len({serialized_event, SerializedKubernetesEvent(event.serialize())}) == 1
@@ -0,0 +1,265 @@
+"""
+Leader election tests - the replicas run against a local fake apiserver,
+which serves the Leases
+"""
+import time
+import asyncio
+import pytest
+from delta_encoder import DeltaEncoder
+from kubernetes_event import (
+    WatchDeltaKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+from leader_election import LeaderElector, WarmStandby
+from .fake_apiserver import TEST_NAMESPACE, serve_fake_apiserver
+
+LEASE_NAME = "test-leader"
+LEASE_DURATION_SECONDS = 0.5
+RENEW_INTERVAL_SECONDS = 0.1
+REPLAY_MARGIN_SECONDS = 0.05
+EVENT_INTERVAL_SECONDS = 0.01
+
+
+def _create_standby(identity: str, api_client, delta_encoder=None) -> WarmStandby:
+    """ Creates a warm standby of the test leader Lease """
+    return WarmStandby(
+        LeaderElector(
+            identity,
+            TEST_NAMESPACE,
+            LEASE_NAME,
+            api_client=api_client,
+            lease_duration_seconds=LEASE_DURATION_SECONDS,
+            renew_interval_seconds=RENEW_INTERVAL_SECONDS,
+        ),
+        replay_margin_seconds=REPLAY_MARGIN_SECONDS,
+        delta_encoder=delta_encoder,
+    )
+
+
+def _modified_pod(event: int) -> WatchKubernetesEvent:
+    """ Creates the given MODIFIED watch event of the test pod """
+    return WatchKubernetesEvent(
+        WatchKubernetesEventType.MODIFIED,
+        {
+            "kind": "Pod",
+            "metadata": {
+                "name": "pod",
+                "uid": "uid-1",
+                "resource_version": str(event),
+                "labels": {f"label-{i}": f"value-{i}" for i in range(20)},
+            },
+            "status": {"restart_count": event},
+        }
+    )
+
+
+class Replica:
+    """ An agent replica - its standby forwards the watched events to a list """
+
+    def __init__(self, identity: str, api_client, delta_encoder=None):
+        self.standby = _create_standby(identity, api_client, delta_encoder)
+        self.forwarded_events = []
+        self.write_event = self.standby.create_handler(self._forward)
+        self.task = None
+
+    async def _forward(self, event):
+        self.forwarded_events.append(event)
+
+    def start(self):
+        self.task = asyncio.create_task(self.standby.start())
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.wait([self.task])
+
+
+async def _watch(replicas, events_count: int, create_event=None):
+    """
+    Writes the same watch events to the given replicas
+    :param create_event: creates the watch event of its number, if given
+    """
+    for event in range(events_count):
+        if create_event:
+            event = create_event(event)
+        for replica in replicas:
+            await replica.write_event(event)
+        await asyncio.sleep(EVENT_INTERVAL_SECONDS)
+
+
+async def _wait_for_leader(replica: Replica, timeout: float) -> float:
+    """
+    Waits for the given replica to take over
+    :return: the waited seconds
+    """
+    start_time = time.monotonic()
+    while not replica.standby.is_leader:
+        assert time.monotonic() - start_time < timeout
+        await asyncio.sleep(0.01)
+    return time.monotonic() - start_time
+
+
+@pytest.mark.asyncio
+async def test_invalid_params():
+    """ Tests invalid lease durations, replay margin & max buffered events """
+    with pytest.raises(ValueError):
+        LeaderElector("a", TEST_NAMESPACE, LEASE_NAME, renew_interval_seconds=0)
+    with pytest.raises(ValueError):
+        LeaderElector(
+            "a",
+            TEST_NAMESPACE,
+            LEASE_NAME,
+            lease_duration_seconds=10,
+            renew_interval_seconds=5
+        )
+    elector = LeaderElector("a", TEST_NAMESPACE, LEASE_NAME)
+    with pytest.raises(ValueError):
+        WarmStandby(elector, replay_margin_seconds=-1)
+    with pytest.raises(ValueError):
+        WarmStandby(elector, max_buffered_events=0)
+
+
+@pytest.mark.asyncio
+async def test_first_leader_replays_all():
+    """
+    A replica which leads before any other leader was seen replays all its
+    buffered events (e.g. its initial list), then writes through
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        replica = Replica("a", api_client)
+        for event in range(10):
+            await replica.write_event(event)
+        assert not replica.forwarded_events
+        replica.start()
+        await _wait_for_leader(replica, RENEW_INTERVAL_SECONDS)
+        await replica.write_event(10)
+        assert replica.forwarded_events == list(range(11))
+        assert replica.standby.get_stats()["replayed_events"] == 10
+        await replica.stop()
+        assert fake_apiserver.leases[LEASE_NAME]["spec"]["holderIdentity"] is None
+
+
+@pytest.mark.asyncio
+async def test_standby_prunes_buffer():
+    """
+    A standby drops the buffered events from before the leader was last seen
+    alive (minus the replay margin), and the oldest events above the max
+    """
+    standby = WarmStandby(
+        LeaderElector("b", TEST_NAMESPACE, LEASE_NAME),
+        replay_margin_seconds=0,
+        max_buffered_events=5,
+    )
+    write_event = standby.create_handler(None)
+    for event in range(10):
+        await write_event(event)
+    assert standby.get_stats()["buffered_events"] == 5
+    assert standby.get_stats()["dropped_events"] == 5
+    assert standby.estimate_memory_bytes() > 0
+    standby.elector._observed_leases[LEASE_NAME] = (
+        ("a", "renew-time"),
+        time.monotonic() + standby.elector.renew_interval_seconds
+    )
+    await write_event(10)
+    assert standby.get_stats()["buffered_events"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failover():
+    """
+    Once the leader crashes, the standby takes over within the Lease
+    duration and replays only the events since the leader was last seen
+    alive - no events are lost, and the events before aren't resent
+    """
+    async with serve_fake_apiserver() as (_, api_client):
+        leader = Replica("a", api_client)
+        standby = Replica("b", api_client)
+        leader.start()
+        await _wait_for_leader(leader, RENEW_INTERVAL_SECONDS)
+        standby.start()
+        events_count = int(4 * LEASE_DURATION_SECONDS / EVENT_INTERVAL_SECONDS)
+        watch_task = asyncio.create_task(_watch([leader, standby], events_count))
+        await asyncio.sleep(LEASE_DURATION_SECONDS)
+
+        async def crash():
+            pass
+
+        # the crashed leader doesn't release its Lease, nor forwards
+        leader.standby.elector.release = crash
+        await leader.stop()
+        failover_seconds = await _wait_for_leader(
+            standby,
+            LEASE_DURATION_SECONDS + 2 * RENEW_INTERVAL_SECONDS
+        )
+        await watch_task
+        stats = standby.standby.get_stats()
+        assert failover_seconds > LEASE_DURATION_SECONDS - RENEW_INTERVAL_SECONDS
+        assert stats["takeovers"] == 1
+        assert stats["last_takeover_seconds"] > LEASE_DURATION_SECONDS
+        assert stats["replayed_events"] > 0
+        forwarded_events = set(leader.forwarded_events) | set(standby.forwarded_events)
+        assert forwarded_events == set(range(events_count))
+        assert standby.forwarded_events[0] > 0
+        # the standby replays its events since about a renew interval
+        # before the leader crashed
+        duplicate_events = set(leader.forwarded_events) & set(standby.forwarded_events)
+        assert len(duplicate_events) * EVENT_INTERVAL_SECONDS < (
+            2 * RENEW_INTERVAL_SECONDS + REPLAY_MARGIN_SECONDS + 0.1
+        )
+        await standby.stop()
+
+
+@pytest.mark.asyncio
+async def test_graceful_failover():
+    """
+    Once the leader stops, it releases the leader Lease and the standby
+    takes over right away
+    """
+    async with serve_fake_apiserver() as (_, api_client):
+        leader = Replica("a", api_client)
+        standby = Replica("b", api_client)
+        leader.start()
+        await _wait_for_leader(leader, RENEW_INTERVAL_SECONDS)
+        standby.start()
+        await asyncio.sleep(2 * RENEW_INTERVAL_SECONDS)
+        assert not standby.standby.is_leader
+        await leader.stop()
+        failover_seconds = await _wait_for_leader(standby, 2 * RENEW_INTERVAL_SECONDS)
+        assert failover_seconds < LEASE_DURATION_SECONDS
+        await standby.stop()
+
+
+@pytest.mark.asyncio
+async def test_failover_with_deltas():
+    """
+    Once the standby takes over, it sends full objects until it has sent its
+    own deltas bases - its deltas are never against versions it didn't send
+    """
+    async with serve_fake_apiserver() as (_, api_client):
+        leader = Replica("a", api_client, DeltaEncoder())
+        standby = Replica("b", api_client, DeltaEncoder())
+        leader.start()
+        await _wait_for_leader(leader, RENEW_INTERVAL_SECONDS)
+        standby.start()
+        events_count = int(4 * LEASE_DURATION_SECONDS / EVENT_INTERVAL_SECONDS)
+        watch_task = asyncio.create_task(
+            _watch([leader, standby], events_count, _modified_pod)
+        )
+        await asyncio.sleep(LEASE_DURATION_SECONDS)
+
+        async def crash():
+            pass
+
+        leader.standby.elector.release = crash
+        await leader.stop()
+        await _wait_for_leader(standby, LEASE_DURATION_SECONDS + 2 * RENEW_INTERVAL_SECONDS)
+        await watch_task
+        assert standby.standby.delta_encoder.get_stats()["delta_events"] > 0
+        for replica in (leader, standby):
+            assert isinstance(replica.forwarded_events[0], WatchKubernetesEvent)
+            sent_versions = set()
+            for event in replica.forwarded_events:
+                if isinstance(event, WatchDeltaKubernetesEvent):
+                    assert event.data["base_resource_version"] in sent_versions
+                sent_versions.add(event.get_resource_version())
+        await standby.stop()
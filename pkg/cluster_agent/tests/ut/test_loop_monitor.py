@@ -0,0 +1,77 @@
+"""
+LoopLagMonitor tests
+"""
+import time
+import asyncio
+import logging
+import pytest
+from loop_monitor import LoopLagMonitor
+
+
+@pytest.mark.asyncio
+async def test_invalid_params():
+    """ Tests invalid sample interval & slow callback threshold params """
+    with pytest.raises(ValueError):
+        LoopLagMonitor(sample_interval_seconds=0)
+    with pytest.raises(ValueError):
+        LoopLagMonitor(slow_callback_threshold_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_record():
+    """ record test - samples are counted in the matching buckets """
+    monitor = LoopLagMonitor()
+    for lag in (0, 0.002, 0.002, 0.7, 100):
+        monitor.record(lag)
+    histogram = monitor.get_histogram()
+    assert histogram["le_0.001"] == 1
+    assert histogram["le_0.005"] == 2
+    assert histogram["le_1"] == 1
+    assert histogram["le_inf"] == 1
+    assert sum(histogram.values()) == monitor.samples_count == 5
+    assert monitor.max_lag_seconds == 100
+
+
+@pytest.mark.asyncio
+async def test_start_samples_lag():
+    """
+    Runs the monitor while blocking the event loop, expects a sample
+    with at least the blocking duration.
+    """
+    monitor = LoopLagMonitor(sample_interval_seconds=0.01)
+    task = asyncio.create_task(monitor.start())
+    await asyncio.sleep(0.05)
+    time.sleep(0.1)
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.sleep(0)
+    assert monitor.samples_count > 1
+    assert monitor.max_lag_seconds >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_slow_callback_stack_logged(caplog):
+    """
+    Runs the monitor with a slow callback threshold while blocking the event
+    loop, expects the blocking function stack to be logged once.
+    """
+    def blocking_function():
+        time.sleep(0.3)
+
+    monitor = LoopLagMonitor(
+        sample_interval_seconds=0.01,
+        slow_callback_threshold_seconds=0.1
+    )
+    task = asyncio.create_task(monitor.start())
+    await asyncio.sleep(0.05)
+    with caplog.at_level(logging.WARNING):
+        blocking_function()
+        await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.sleep(0)
+    records = [
+        record for record in caplog.records
+        if "Event loop is blocked" in record.getMessage()
+    ]
+    assert len(records) == 1
+    assert "blocking_function" in records[0].getMessage()
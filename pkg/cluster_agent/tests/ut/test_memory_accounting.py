@@ -0,0 +1,155 @@
+"""
+Memory accounting tests
+"""
+import sys
+import asyncio
+import pytest
+from events_manager import InMemoryEventsManager
+from forwarder import Forwarder
+from kubernetes_event import (
+    KubernetesEventType,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+from memory_accounting import (
+    MemoryAccountant,
+    estimate_items_size,
+    estimate_size,
+    get_peak_rss_bytes,
+    get_rss_bytes,
+)
+
+
+def _create_event(index: int) -> WatchKubernetesEvent:
+    """ Creates a watch event of a pod with a big annotation """
+    return WatchKubernetesEvent(
+        WatchKubernetesEventType.ADDED,
+        {
+            "kind": "Pod",
+            "metadata": {
+                "uid": f"uid-{index}",
+                "annotations": {"data": "x" * 10000},
+            },
+        }
+    )
+
+
+def test_estimate_size_nested():
+    """ estimate_size test - nested containers are counted """
+    value = "x" * 1000
+    obj = {"a": [value], "b": ({"c": value},)}
+    assert estimate_size(obj) > sys.getsizeof(value)
+    assert estimate_size(obj) > estimate_size({"a": [value]})
+
+
+def test_estimate_size_shared_objects():
+    """ estimate_size test - a shared object is counted once """
+    value = "x" * 10000
+    assert estimate_size([value, value]) < 2 * sys.getsizeof(value)
+    seen = set()
+    first_size = estimate_size([value], seen)
+    assert estimate_size([value], seen) < first_size - sys.getsizeof(value) + 100
+
+
+def test_estimate_size_slots():
+    """ estimate_size test - slotted objects attributes are counted """
+    event = _create_event(0)
+    assert estimate_size(event) > 10000
+    assert estimate_size(event) >= estimate_size(event.data)
+
+
+def test_estimate_size_skips_shared_types():
+    """ estimate_size test - enums & types aren't counted """
+    assert estimate_size(KubernetesEventType.WATCH) == 0
+    assert estimate_size(int) == 0
+
+
+def test_estimate_items_size():
+    """
+    estimate_items_size test - extrapolates the sample size to the items
+    count
+    """
+    items = [str(i) * 1000 for i in range(10)]
+    item_size = sys.getsizeof(items[0])
+    assert estimate_items_size(items, len(items), sample_size=2) == item_size * 10
+    assert estimate_items_size(items, 100, sample_size=2) == item_size * 100
+    assert estimate_items_size([], 0) == 0
+    assert estimate_items_size(items, 0) == 0
+
+
+def test_get_rss_bytes():
+    """ get_rss_bytes & get_peak_rss_bytes test """
+    assert get_rss_bytes() > 0
+    assert get_peak_rss_bytes() > 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_log_interval():
+    """ Tests invalid log interval param """
+    with pytest.raises(ValueError):
+        MemoryAccountant(log_interval_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_get_stats():
+    """
+    get_stats test - the registered components are estimated and summed,
+    a failing estimator is reported as None
+    """
+    def failing_estimator():
+        raise RuntimeError("failed")
+
+    accountant = MemoryAccountant()
+    accountant.register("a", lambda: 10)
+    accountant.register("b", lambda: 20)
+    accountant.register("failing", failing_estimator)
+    accountant.register("removed", lambda: 30)
+    accountant.unregister("removed")
+    stats = accountant.get_stats()
+    assert stats["components_bytes"] == {"a": 10, "b": 20, "failing": None}
+    assert stats["accounted_bytes"] == 30
+    assert stats["rss_bytes"] > 0
+    assert stats["peak_rss_bytes"] > 0
+
+
+@pytest.mark.asyncio
+async def test_events_manager_estimate_memory_bytes():
+    """
+    InMemoryEventsManager.estimate_memory_bytes test - queued & compressed
+    backlog events are counted
+    """
+    events_manager = InMemoryEventsManager(
+        compression_threshold=10,
+        compression_chunk_size=5
+    )
+    assert events_manager.estimate_memory_bytes() == 0
+    for i in range(10):
+        await events_manager.write_event(_create_event(i))
+    queued_bytes = events_manager.estimate_memory_bytes()
+    assert queued_bytes > 10 * 10000
+    for i in range(10):
+        await events_manager.write_event(_create_event(i))
+    _, backlog_bytes = events_manager.get_backlog_stats()
+    assert backlog_bytes > 0
+    assert events_manager.estimate_memory_bytes() == queued_bytes + backlog_bytes
+
+
+@pytest.mark.asyncio
+async def test_forwarder_estimate_memory_bytes():
+    """
+    Forwarder.estimate_memory_bytes test - the in-flight batches are counted
+    until sent
+    """
+    send_event = asyncio.Event()
+
+    class BlockingSender:
+        async def send_events(self, _events):
+            await send_event.wait()
+
+    forwarder = Forwarder(InMemoryEventsManager(), BlockingSender())
+    assert forwarder.estimate_memory_bytes() == 0
+    forwarder._add_worker([_create_event(i) for i in range(5)])
+    assert forwarder.estimate_memory_bytes() > 5 * 10000
+    send_event.set()
+    await asyncio.wait(forwarder.running_workers)
+    assert forwarder.estimate_memory_bytes() == 0
@@ -0,0 +1,116 @@
+"""
+Model decoder tests - the decoded objects must equal the client models dicts
+"""
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+import kubernetes_asyncio
+from benchmarks.fake_apiserver import to_api_object
+from benchmarks.fixtures import POD_SIZES, generate_deployment, generate_node, generate_pod
+from model_decoder import ModelDecoder
+from recorder import WatchRecorder, get_recording_path, read_recording
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """ a kubernetes API client, used to deserialize objects only """
+    loop = asyncio.new_event_loop()
+
+    async def create_api_client():
+        return kubernetes_asyncio.client.ApiClient()
+
+    client = loop.run_until_complete(create_api_client())
+    yield client
+    loop.run_until_complete(client.close())
+    loop.close()
+
+
+def _to_model_dict(api_client, obj, return_type: str):
+    """ Deserializes the given raw object as the client does, to its dict """
+    return api_client.deserialize(
+        response=SimpleNamespace(data=json.dumps(obj)),
+        response_type=return_type
+    ).to_dict()
+
+
+def _assert_decoded(api_client, obj, return_type: str):
+    decoded = ModelDecoder().decode(json.loads(json.dumps(obj)), return_type)
+    assert decoded == _to_model_dict(api_client, obj, return_type)
+
+
+@pytest.mark.parametrize("pod_size", list(POD_SIZES))
+def test_decode_pod(api_client, pod_size):
+    pod = generate_pod(1, containers_count=POD_SIZES[pod_size])
+    _assert_decoded(api_client, to_api_object(pod, "V1Pod"), "V1Pod")
+
+
+def test_decode_node_and_deployment(api_client):
+    _assert_decoded(api_client, to_api_object(generate_node(1), "V1Node"), "V1Node")
+    _assert_decoded(
+        api_client,
+        to_api_object(generate_deployment(1), "V1Deployment"),
+        "V1Deployment"
+    )
+
+
+def test_decode_edge_cases(api_client):
+    """
+    Missing & null fields, primitives of other types, int-or-string fields,
+    datetimes which aren't in the apiserver format & unknown fields
+    """
+    service = {
+        "metadata": {
+            "name": "service",
+            "labels": None,
+            "creationTimestamp": "2021-01-01T10:20:30.123456+02:00",
+            "deletionGracePeriodSeconds": "30",
+            "unknownField": "ignored",
+        },
+        "spec": {
+            "ports": [
+                {"port": 80, "targetPort": "http"},
+                {"port": 443, "targetPort": 8443},
+                None,
+            ],
+            "selector": {"app": "service"},
+        },
+    }
+    _assert_decoded(api_client, service, "V1Service")
+    _assert_decoded(api_client, {"metadata": "not an object"}, "V1Pod")
+    assert ModelDecoder().decode(None, "V1Pod") is None
+
+
+def test_decode_recursive_model(api_client):
+    """ Models which nest themselves, such as the CRDs schemas """
+    schema = {
+        "type": "object",
+        "properties": {
+            "spec": {
+                "type": "object",
+                "properties": {"replicas": {"type": "integer", "minimum": 1}},
+            },
+        },
+    }
+    _assert_decoded(api_client, schema, "V1JSONSchemaProps")
+
+
+def test_decode_recording(api_client, tmp_path):
+    """
+    The objects of a recording (a list response & watch events, as recorded
+    by the cluster discovery) are decoded as the client deserializes them
+    """
+    pods = [to_api_object(pod, "V1Pod") for pod in map(generate_pod, range(20))]
+    recorder = WatchRecorder(str(tmp_path))
+    recorder.record_list("Pod", json.dumps({"items": pods}))
+    for pod in pods:
+        recorder.record_watch_event("Pod", json.dumps({"type": "MODIFIED", "object": pod}))
+    recorder.close()
+    model_decoder = ModelDecoder()
+    records = list(read_recording(get_recording_path(str(tmp_path), "Pod")))
+    recorded_pods = json.loads(records[0].data)["items"] + [
+        json.loads(record.data)["object"] for record in records[1:]
+    ]
+    assert len(recorded_pods) == 2 * len(pods)
+    for pod in recorded_pods:
+        assert model_decoder.decode(pod, "V1Pod") == _to_model_dict(api_client, pod, "V1Pod")
@@ -0,0 +1,282 @@
+"""
+Multi process pipeline tests
+"""
+import json
+import time
+import zlib
+import base64
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+import kubernetes_asyncio
+from typing import Dict, List
+from werkzeug import Response
+from cluster_discovery import RawWatchEvent
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    WatchKubernetesEventType,
+)
+from model_decoder import ModelDecoder
+from multiprocess_pipeline import (
+    ShardedEventsDispatcher,
+    WorkerConfig,
+    _WorkerHandle,
+    convert_raw_watch_event,
+    get_shard,
+)
+
+TEST_PATH = "/resources/v1"
+TEST_CLUSTER_NAME = "test-cluster-name"
+TEST_EPSAGON_TOKEN = "1234"
+TEST_UIDS = ("uid-1", "uid-2", "uid-3", "uid-4")
+TEST_VERSIONS_COUNT = 5
+
+
+def _generate_raw_watch_event(
+        uid: str,
+        resource_version: int,
+        event_type: str = "MODIFIED"
+) -> RawWatchEvent:
+    """ Generates a raw pod watch event, as streamed by the apiserver """
+    data = json.dumps({
+        "type": event_type,
+        "object": {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": f"pod-{uid}",
+                "namespace": "default",
+                "uid": uid,
+                "resourceVersion": str(resource_version),
+            },
+            "spec": {
+                "nodeName": "node-1",
+                "containers": [{"name": "app", "image": "app:1.0"}],
+            },
+        },
+    })
+    return RawWatchEvent("V1Pod", uid, data)
+
+
+def _decode_sent_events(httpserver) -> List[Dict]:
+    """ Decodes all the events sent to the test http server """
+    events = []
+    for request, _ in httpserver.log:
+        body = json.loads(request.get_data())
+        assert body["epsagon_token"] == TEST_EPSAGON_TOKEN
+        assert body["cluster_name"] == TEST_CLUSTER_NAME
+        events.extend(json.loads(zlib.decompress(base64.b64decode(body["data"]))))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_get_shard():
+    """ get_shard test - shards are stable and in range """
+    shards_count = 3
+    for uid in TEST_UIDS:
+        shard = get_shard(uid, shards_count)
+        assert 0 <= shard < shards_count
+        assert shard == get_shard(uid, shards_count)
+    assert get_shard(None, shards_count) == 0
+    assert len({get_shard(f"uid-{i}", shards_count) for i in range(100)}) == 3
+
+
+@pytest.mark.asyncio
+async def test_invalid_workers_count():
+    """ Tests invalid workers count param """
+    with pytest.raises(ValueError):
+        ShardedEventsDispatcher(
+            0,
+            WorkerConfig(TEST_EPSAGON_TOKEN, TEST_PATH, TEST_CLUSTER_NAME)
+        )
+    with pytest.raises(ValueError):
+        ShardedEventsDispatcher(
+            1,
+            WorkerConfig(TEST_EPSAGON_TOKEN, TEST_PATH, TEST_CLUSTER_NAME),
+            max_queued_events=0
+        )
+
+
+@pytest.mark.asyncio
+async def test_convert_raw_watch_event():
+    """
+    convert_raw_watch_event test - the converted event data is the watched
+    object model dict, as converted by the cluster discovery
+    """
+    api_client = kubernetes_asyncio.client.ApiClient()
+    event = convert_raw_watch_event(
+        _generate_raw_watch_event("uid-1", 7, event_type="ADDED"),
+        api_client
+    )
+    await api_client.close()
+    assert event.watch_event_type == WatchKubernetesEventType.ADDED
+    assert event.get_resource_version() == "7"
+    assert event.data["metadata"]["uid"] == "uid-1"
+    assert event.data["spec"]["node_name"] == "node-1"
+
+
+@pytest.mark.asyncio
+async def test_convert_raw_watch_event_decoded():
+    """
+    A raw watch event converted by a model decoder equals the event
+    converted by its client model
+    """
+    raw_event = _generate_raw_watch_event("uid-1", 7)
+    api_client = kubernetes_asyncio.client.ApiClient()
+    event = convert_raw_watch_event(raw_event, api_client)
+    decoded_event = convert_raw_watch_event(raw_event, api_client, ModelDecoder())
+    await api_client.close()
+    assert decoded_event.watch_event_type == event.watch_event_type
+    assert decoded_event.data == event.data
+
+
+@pytest.mark.asyncio
+async def test_dispatch_sanity(httpserver):
+    """
+    Dispatches events to 2 worker processes and drains the dispatcher.
+    Verifies all events are sent and the events order of each object
+    is preserved.
+    """
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_data("")
+    dispatcher = ShardedEventsDispatcher(
+        2,
+        WorkerConfig(
+            TEST_EPSAGON_TOKEN,
+            httpserver.url_for(TEST_PATH),
+            TEST_CLUSTER_NAME,
+            max_events_to_read=3,
+            shutdown_timeout_seconds=10,
+        )
+    )
+    dispatcher.start_workers()
+    await dispatcher.write_event(
+        KubernetesEvent(KubernetesEventType.CLUSTER, {"version": "v1.18"})
+    )
+    for resource_version in range(TEST_VERSIONS_COUNT):
+        for uid in TEST_UIDS:
+            await dispatcher.write_raw_watch_event(
+                _generate_raw_watch_event(uid, resource_version)
+            )
+    delivered_events_count, lost_events_count = await dispatcher.drain(10)
+    expected_events_count = 1 + TEST_VERSIONS_COUNT * len(TEST_UIDS)
+    assert delivered_events_count == expected_events_count
+    assert lost_events_count == 0
+
+    events = _decode_sent_events(httpserver)
+    assert len(events) == expected_events_count
+    cluster_events = [
+        event for event in events
+        if event["metadata"]["kind"] == KubernetesEventType.CLUSTER.value
+    ]
+    assert [event["payload"] for event in cluster_events] == [{"version": "v1.18"}]
+    for uid in TEST_UIDS:
+        resource_versions = [
+            int(event["payload"]["object"]["metadata"]["resource_version"])
+            for event in events
+            if event["metadata"]["kind"] == KubernetesEventType.WATCH.value and
+            event["payload"]["object"]["metadata"]["uid"] == uid
+        ]
+        assert resource_versions == list(range(TEST_VERSIONS_COUNT))
+
+
+class BlockingConnection:
+    """ A worker connection whose sends block until released """
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.messages = []
+
+    def send_bytes(self, message: bytes):
+        self.released.wait()
+        self.messages.append(message)
+
+    def close(self):
+        pass
+
+
+async def _write_uid_events(dispatcher: ShardedEventsDispatcher, events_count: int):
+    """ Dispatches the raw watch events of a single uid """
+    for resource_version in range(events_count):
+        await dispatcher.write_raw_watch_event(
+            _generate_raw_watch_event(TEST_UIDS[0], resource_version)
+        )
+
+
+@pytest.mark.asyncio
+async def test_dispatch_full_queue_waits():
+    """
+    Once a worker queue is full, the writes wait for the worker - the
+    dispatcher never queues more than its max queued events
+    """
+    dispatcher = ShardedEventsDispatcher(
+        1,
+        WorkerConfig(TEST_EPSAGON_TOKEN, TEST_PATH, TEST_CLUSTER_NAME),
+        max_queued_events=2
+    )
+    connection = BlockingConnection()
+    dispatcher._workers = [
+        _WorkerHandle(SimpleNamespace(name="worker"), connection, None, 2)
+    ]
+    write_task = asyncio.create_task(_write_uid_events(dispatcher, 10))
+    await asyncio.sleep(0.2)
+    assert not write_task.done()
+    # the sender thread holds one message, the others are queued
+    assert dispatcher.dispatched_events_count == 3
+    assert dispatcher.full_queue_waits_count >= 1
+    connection.released.set()
+    await asyncio.wait_for(write_task, 1)
+    assert dispatcher.dispatched_events_count == 10
+    dispatcher._workers[0].close(time.monotonic())
+    dispatcher._workers[0].sender_thread.join(1)
+    # the events & the drain message
+    assert len(connection.messages) == 11
+
+
+@pytest.mark.asyncio
+async def test_drain_slow_collector(httpserver):
+    """
+    The workers are drained by the dispatcher drain deadline, so they exit
+    on time even if their collector is slow - the events they couldn't send
+    are counted as lost
+    """
+    def slow_collector(_request):
+        time.sleep(0.2)
+        return Response("")
+
+    httpserver.expect_request(TEST_PATH, method="POST").respond_with_handler(slow_collector)
+    dispatcher = ShardedEventsDispatcher(
+        2,
+        WorkerConfig(
+            TEST_EPSAGON_TOKEN,
+            httpserver.url_for(TEST_PATH),
+            TEST_CLUSTER_NAME,
+            max_events_to_read=1,
+        )
+    )
+    dispatcher.start_workers()
+    # waits for the workers to start forwarding
+    await dispatcher.write_event(
+        KubernetesEvent(KubernetesEventType.CLUSTER, {"version": "v1.18"})
+    )
+    start_time = time.monotonic()
+    while not httpserver.log:
+        assert time.monotonic() - start_time < 30
+        await asyncio.sleep(0.1)
+    for resource_version in range(TEST_VERSIONS_COUNT):
+        for uid in TEST_UIDS:
+            await dispatcher.write_raw_watch_event(
+                _generate_raw_watch_event(uid, resource_version)
+            )
+    drain_timeout = 0.5
+    start_time = time.monotonic()
+    flushed_events_count, lost_events_count = await dispatcher.drain(drain_timeout)
+    assert time.monotonic() - start_time < (
+        drain_timeout + ShardedEventsDispatcher.WORKER_EXIT_GRACE_SECONDS
+    )
+    assert all(worker.process.exitcode == 0 for worker in dispatcher._workers)
+    assert flushed_events_count + lost_events_count == dispatcher.dispatched_events_count
+    assert lost_events_count > 0
+    # cancelled requests might still reach the collector
+    assert flushed_events_count <= len(_decode_sent_events(httpserver))
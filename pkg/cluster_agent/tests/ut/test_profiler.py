@@ -0,0 +1,87 @@
+"""
+Profiler tests
+"""
+import asyncio
+import tracemalloc
+import pytest
+from profiler import Profiler
+
+
+def _read(path):
+    """ Reads the given file content """
+    with open(path, "r") as reader:
+        return reader.read()
+
+
+def _busy_function():
+    """ A function to find in the CPU profile """
+    return sum(i for i in range(10000))
+
+
+@pytest.mark.asyncio
+async def test_invalid_cpu_profile_duration(tmpdir):
+    """ Tests invalid CPU profile duration param """
+    with pytest.raises(ValueError):
+        Profiler(str(tmpdir), cpu_profile_duration_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_profile_cpu(tmpdir):
+    """
+    profile_cpu test - profiles the event loop while a function runs,
+    expects the function in the profile stats
+    """
+    async def busy_task():
+        while True:
+            _busy_function()
+            await asyncio.sleep(0.001)
+
+    profiler = Profiler(str(tmpdir))
+    task = asyncio.create_task(busy_task())
+    output_path = await profiler.profile_cpu(duration_seconds=0.1)
+    task.cancel()
+    assert "_busy_function" in _read(output_path)
+    assert len(tmpdir.listdir()) == 2
+    assert not profiler.is_profiling_cpu
+
+
+@pytest.mark.asyncio
+async def test_profile_cpu_already_profiling(tmpdir):
+    """ profile_cpu test - only one profile is taken at a time """
+    profiler = Profiler(str(tmpdir))
+    task = asyncio.create_task(profiler.profile_cpu(duration_seconds=0.1))
+    await asyncio.sleep(0)
+    assert await profiler.profile_cpu(duration_seconds=0.1) is None
+    await task
+    assert len(tmpdir.listdir()) == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_memory(tmpdir):
+    """
+    snapshot_memory test - the first call starts tracing, the second writes
+    the allocations diff grouped by module and stops tracing
+    """
+    profiler = Profiler(str(tmpdir), modules=("test_profiler",))
+    assert profiler.snapshot_memory() is None
+    assert tracemalloc.is_tracing()
+    allocated = [str(i) * 10 for i in range(10000)]
+    output_path = profiler.snapshot_memory()
+    assert not tracemalloc.is_tracing()
+    output = _read(output_path)
+    assert "test_profiler: +" in output
+    assert len(allocated) == 10000
+
+
+@pytest.mark.asyncio
+async def test_dump_tasks(tmpdir):
+    """ dump_tasks test - all the tasks stacks are written """
+    async def sleeping_task():
+        await asyncio.sleep(10)
+
+    profiler = Profiler(str(tmpdir))
+    task = asyncio.create_task(sleeping_task())
+    await asyncio.sleep(0)
+    output = _read(profiler.dump_tasks())
+    task.cancel()
+    assert "sleeping_task" in output
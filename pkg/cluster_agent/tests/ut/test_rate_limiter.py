@@ -0,0 +1,103 @@
+"""
+Rate limiter tests
+"""
+import asyncio
+import pytest
+from asynctest.mock import patch, MagicMock
+from rate_limiter import BandwidthLimiter, TokenBucket, KeyedTokenBuckets
+
+
+@pytest.mark.asyncio
+async def test_invalid_params():
+    """ Tests invalid rate & capacity params """
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(1, capacity=0)
+    with pytest.raises(ValueError):
+        KeyedTokenBuckets(-1)
+
+
+@pytest.mark.asyncio
+async def test_try_acquire():
+    """
+    try_acquire test - the bucket starts full, and is refilled at its rate
+    up to its capacity
+    """
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        bucket = TokenBucket(2, capacity=4)
+        for _ in range(4):
+            assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert bucket.get_wait_time() == 0.5
+    with patch("time.monotonic", MagicMock(return_value=101)):
+        assert bucket.get_tokens() == 2
+        assert bucket.try_acquire(2)
+        assert not bucket.try_acquire()
+    with patch("time.monotonic", MagicMock(return_value=200)):
+        assert bucket.get_tokens() == 4
+
+
+@pytest.mark.asyncio
+async def test_acquire():
+    """
+    acquire test - waits for the missing tokens, tokens counts bigger than
+    the capacity put the bucket into debt
+    """
+    bucket = TokenBucket(1000, capacity=10)
+    await bucket.acquire(10)
+    with patch("asyncio.sleep", side_effect=asyncio.sleep) as sleep_mock:
+        await bucket.acquire(20)
+        assert sleep_mock.call_count == 1
+        assert 0 < sleep_mock.call_args[0][0] <= 0.01
+    assert bucket.get_tokens() < 0
+
+
+@pytest.mark.asyncio
+async def test_keyed_token_buckets():
+    """
+    KeyedTokenBuckets test - a bucket per key, all dropped once max keys
+    is reached
+    """
+    buckets = KeyedTokenBuckets(1, capacity=1, max_keys=2)
+    assert buckets.get("a") is buckets.get("a")
+    assert buckets.get("a").try_acquire()
+    assert not buckets.get("a").try_acquire()
+    assert buckets.get("b").try_acquire()
+    # drops all the buckets
+    buckets.get("c")
+    assert buckets.get("a").try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_bandwidth_limiter():
+    """
+    BandwidthLimiter test - requests over the burst wait for the bucket,
+    the waiting bytes & throttled time are tracked
+    """
+    limiter = BandwidthLimiter(100000, burst_bytes=1000, rate_window_seconds=1)
+    await limiter.acquire(1000)
+    assert limiter.throttled_seconds < 0.005
+    acquire_task = asyncio.create_task(limiter.acquire(2000))
+    await asyncio.sleep(0)
+    assert limiter.queued_bytes == 2000
+    await acquire_task
+    stats = limiter.get_stats()
+    assert stats["queued_bytes"] == 0
+    assert stats["sent_bytes"] == 3000
+    assert stats["throttled_seconds"] >= 0.005
+    assert stats["current_bytes_per_second"] == 3000
+    assert stats["bytes_per_second_limit"] == 100000
+
+
+@pytest.mark.asyncio
+async def test_bandwidth_limiter_current_rate():
+    """ Tests the current rate counts only the last rate window """
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        limiter = BandwidthLimiter(1000, burst_bytes=1000, rate_window_seconds=10)
+        await limiter.acquire(500)
+    with patch("time.monotonic", MagicMock(return_value=105)):
+        await limiter.acquire(300)
+        assert limiter.get_current_rate() == 80
+    with patch("time.monotonic", MagicMock(return_value=111)):
+        assert limiter.get_current_rate() == 30
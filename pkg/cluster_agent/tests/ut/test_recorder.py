@@ -0,0 +1,72 @@
+"""
+WatchRecorder tests
+"""
+import gzip
+import json
+import pytest
+from asynctest.mock import patch, MagicMock
+from recorder import (
+    WatchRecord,
+    WatchRecorder,
+    WatchRecordPhase,
+    get_recording_path,
+    read_recording,
+)
+
+
+@pytest.mark.asyncio
+async def test_record(tmp_path):
+    """ Tests the records are written per kind, with their timing """
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        recorder = WatchRecorder(str(tmp_path / "recording"))
+    with patch("time.monotonic", MagicMock(return_value=101)):
+        recorder.record_list("Pod", '{"items": []}')
+        recorder.record_list("Node", '{"items": [1]}')
+    with patch("time.monotonic", MagicMock(return_value=102.5)):
+        recorder.record_watch_event("Pod", '{"type": "ADDED"}\n')
+    recorder.close()
+    assert recorder.records_count == 3
+    assert list(read_recording(get_recording_path(recorder.output_dir, "Pod"))) == [
+        WatchRecord(1, WatchRecordPhase.LIST, '{"items": []}'),
+        WatchRecord(2.5, WatchRecordPhase.WATCH, '{"type": "ADDED"}'),
+    ]
+    assert list(read_recording(get_recording_path(recorder.output_dir, "Node"))) == [
+        WatchRecord(1, WatchRecordPhase.LIST, '{"items": [1]}'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_record_duration(tmp_path):
+    """ Tests the recording stops once its duration is reached """
+    with patch("time.monotonic", MagicMock(return_value=100)):
+        recorder = WatchRecorder(str(tmp_path), duration_seconds=10)
+    with patch("time.monotonic", MagicMock(return_value=105)):
+        recorder.record_watch_event("Pod", "1")
+    with patch("time.monotonic", MagicMock(return_value=110)):
+        recorder.record_watch_event("Pod", "2")
+        assert not recorder.is_recording
+        recorder.record_watch_event("Pod", "3")
+    assert [
+        record.data for record in read_recording(get_recording_path(str(tmp_path), "Pod"))
+    ] == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_read_truncated_recording(tmp_path):
+    """
+    Tests a truncated recording is read up to its last complete record
+    """
+    path = str(tmp_path / "Pod.ndjson.gz")
+    records = [
+        json.dumps({"time": i, "phase": "watch", "data": str(i) * 1000})
+        for i in range(100)
+    ]
+    with gzip.open(path, "wb") as writer:
+        writer.write("\n".join(records).encode() + b"\n")
+    with open(path, "rb") as reader:
+        data = reader.read()
+    with open(path, "wb") as writer:
+        writer.write(data[:len(data) // 2])
+    read_records = list(read_recording(path))
+    assert 0 < len(read_records) < 100
+    assert [record.time for record in read_records] == list(range(len(read_records)))
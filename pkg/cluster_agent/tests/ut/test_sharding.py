@@ -0,0 +1,317 @@
+"""
+Sharding tests - the shard coordinators run against a local fake apiserver,
+which serves the namespaces & the Leases
+"""
+import asyncio
+from collections import Counter
+import pytest
+from sharding import (
+    SHARD_GROUP_LABEL,
+    HashRing,
+    ShardAssignment,
+    ShardCoordinator,
+    ShardedClusterDiscovery,
+)
+from .fake_apiserver import TEST_NAMESPACE, TEST_NAMESPACES, serve_fake_apiserver
+
+TEST_GROUP = "test-group"
+LEASE_DURATION_SECONDS = 0.5
+RENEW_INTERVAL_SECONDS = 0.2
+
+
+def _create_coordinator(identity: str, api_client) -> ShardCoordinator:
+    """ Creates a shard coordinator of the test group """
+    return ShardCoordinator(
+        identity,
+        TEST_NAMESPACE,
+        TEST_GROUP,
+        api_client=api_client,
+        lease_duration_seconds=LEASE_DURATION_SECONDS,
+        renew_interval_seconds=RENEW_INTERVAL_SECONDS,
+    )
+
+
+def test_hash_ring_owners():
+    """ HashRing test - keys are owned by the members, deterministically """
+    members = ["a", "b", "c"]
+    ring = HashRing(members)
+    owners = Counter(ring.get_owner(key) for key in TEST_NAMESPACES * 20)
+    assert set(owners) == set(members)
+    assert HashRing(reversed(members)).get_owner("key") == ring.get_owner("key")
+    assert HashRing([]).get_owner("key") is None
+    with pytest.raises(ValueError):
+        HashRing(members, virtual_nodes=0)
+
+
+def test_hash_ring_rebalance():
+    """
+    HashRing test - once a member is added, only keys which the new member
+    owns move
+    """
+    keys = [f"key-{i}" for i in range(1000)]
+    ring = HashRing(["a", "b", "c"])
+    new_ring = HashRing(["a", "b", "c", "d"])
+    moved_keys = [key for key in keys if ring.get_owner(key) != new_ring.get_owner(key)]
+    assert moved_keys
+    assert all(new_ring.get_owner(key) == "d" for key in moved_keys)
+    # about a quarter of the keys move to the new member
+    assert len(moved_keys) < len(keys) / 2
+
+
+def test_invalid_coordinator_params():
+    """ Tests invalid renew interval & lease duration params """
+    with pytest.raises(ValueError):
+        ShardCoordinator("a", TEST_NAMESPACE, TEST_GROUP, renew_interval_seconds=0)
+    with pytest.raises(ValueError):
+        ShardCoordinator(
+            "a",
+            TEST_NAMESPACE,
+            TEST_GROUP,
+            lease_duration_seconds=10,
+            renew_interval_seconds=5
+        )
+
+
+@pytest.mark.asyncio
+async def test_single_replica():
+    """ A single replica leads and owns all the namespaces """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        coordinator = _create_coordinator("a", api_client)
+        assignment = await coordinator._coordinate()
+        assert assignment == ShardAssignment(True, frozenset(TEST_NAMESPACES), frozenset({"a"}))
+        leader_lease = fake_apiserver.leases[coordinator.leader_lease_name]
+        assert leader_lease["spec"]["holderIdentity"] == "a"
+        member_lease = fake_apiserver.leases[coordinator.member_lease_name]
+        assert member_lease["metadata"]["labels"] == {SHARD_GROUP_LABEL: TEST_GROUP}
+        # renewals replace the existing leases
+        assert await coordinator._coordinate() == assignment
+        assert len(fake_apiserver.leases) == 2
+
+
+@pytest.mark.asyncio
+async def test_replicas_split_namespaces():
+    """
+    Replicas split the namespaces, each namespace is owned by a single
+    replica, and a single replica leads
+    """
+    async with serve_fake_apiserver() as (_, api_client):
+        coordinators = [_create_coordinator(identity, api_client) for identity in "abc"]
+        for coordinator in coordinators:
+            await coordinator._renew_member_lease()
+        assignments = [await coordinator._coordinate() for coordinator in coordinators]
+        assert [assignment.is_leader for assignment in assignments] == [True, False, False]
+        owned_namespaces = [
+            namespace for assignment in assignments for namespace in assignment.namespaces
+        ]
+        assert sorted(owned_namespaces) == sorted(TEST_NAMESPACES)
+        assert all(assignment.namespaces for assignment in assignments)
+        assert all(assignment.members == frozenset("abc") for assignment in assignments)
+
+
+@pytest.mark.asyncio
+async def test_leader_conflict():
+    """
+    A replica which writes the leader lease with a stale resource version
+    doesn't lead
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        coordinator = _create_coordinator("a", api_client)
+        other_coordinator = _create_coordinator("b", api_client)
+        assert await coordinator._try_acquire_leadership()
+        leader_lease = fake_apiserver.leases[coordinator.leader_lease_name]
+        leader_lease["spec"]["holderIdentity"] = None
+        stale_resource_version = leader_lease["metadata"]["resourceVersion"]
+
+        original_read = other_coordinator._read_lease
+
+        async def read_then_renew(name):
+            lease = await original_read(name)
+            # the leader renews between the read & the write
+            fake_apiserver.resource_version += 1
+            leader_lease["metadata"]["resourceVersion"] = str(fake_apiserver.resource_version)
+            return lease
+
+        other_coordinator._read_lease = read_then_renew
+        assert not await other_coordinator._try_acquire_leadership()
+        assert leader_lease["metadata"]["resourceVersion"] != stale_resource_version
+
+
+@pytest.mark.asyncio
+async def test_release_rebalances():
+    """
+    Once a replica releases its leases, the other replica takes over its
+    namespaces & leadership right away
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        leader = _create_coordinator("a", api_client)
+        other = _create_coordinator("b", api_client)
+        await other._renew_member_lease()
+        assert (await leader._coordinate()).is_leader
+        assert not (await other._coordinate()).is_leader
+        await leader.release()
+        assert leader.member_lease_name not in fake_apiserver.leases
+        assignment = await other._coordinate()
+        assert assignment == ShardAssignment(True, frozenset(TEST_NAMESPACES), frozenset({"b"}))
+
+
+@pytest.mark.asyncio
+async def test_expired_member():
+    """
+    A replica which stops renewing its leases expires - the other replica
+    takes over its namespaces & leadership, and deletes its member lease
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        stopped = _create_coordinator("a", api_client)
+        other = _create_coordinator("b", api_client)
+        assert (await stopped._coordinate()).is_leader
+        assert not (await other._coordinate()).is_leader
+        await asyncio.sleep(LEASE_DURATION_SECONDS * 1.5)
+        assignment = await other._coordinate()
+        assert assignment.is_leader
+        assert assignment.namespaces == frozenset(TEST_NAMESPACES)
+        assert stopped.member_lease_name not in fake_apiserver.leases
+
+
+@pytest.mark.asyncio
+async def test_leader_steps_down():
+    """
+    A leader which can't reach the apiserver steps down & drops its
+    namespaces before its leases expire
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        coordinator = _create_coordinator("a", api_client)
+        assignments = []
+
+        async def on_assignment(assignment):
+            assignments.append(assignment)
+
+        task = asyncio.create_task(coordinator.start(on_assignment))
+        await asyncio.sleep(RENEW_INTERVAL_SECONDS / 2)
+        assert assignments[-1].is_leader
+        fake_apiserver.namespaces = []
+        fake_apiserver.leases = {}
+        api_client.configuration.host = "http://127.0.0.1:1"
+        await asyncio.sleep(LEASE_DURATION_SECONDS)
+        task.cancel()
+        await asyncio.wait([task])
+        assert not assignments[-1].is_leader
+        assert assignments[-1].namespaces == frozenset()
+
+
+@pytest.mark.asyncio
+async def test_member_drops_namespaces():
+    """
+    A replica whose Leases requests fail (while the other API requests
+    succeed) keeps its namespaces until its member lease renew deadline,
+    then drops them - before the other replicas take them over. Once the
+    Leases are renewed again, the replica owns its namespaces again.
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        coordinator = _create_coordinator("a", api_client)
+        assignments = []
+
+        async def on_assignment(assignment):
+            assignments.append(assignment)
+
+        task = asyncio.create_task(coordinator.start(on_assignment))
+        await asyncio.sleep(RENEW_INTERVAL_SECONDS / 2)
+        fake_apiserver.leases_error_status = 403
+        # the first failed renewal is within the renew deadline
+        await asyncio.sleep(RENEW_INTERVAL_SECONDS)
+        assert len(assignments) == 1
+        await asyncio.sleep(LEASE_DURATION_SECONDS - RENEW_INTERVAL_SECONDS)
+        assert assignments[-1] == ShardAssignment(False, frozenset(), frozenset({"a"}))
+        fake_apiserver.leases_error_status = None
+        await asyncio.sleep(RENEW_INTERVAL_SECONDS * 1.5)
+        task.cancel()
+        await asyncio.wait([task])
+        assert assignments[-1].namespaces == frozenset(TEST_NAMESPACES)
+
+
+class MockDiscovery:
+    """ A cluster discovery mock, which runs until cancelled """
+
+    def __init__(self, started, stopped, namespace=None, kinds=None):
+        self.key = kinds if namespace is None else namespace
+        self.started = started
+        self.stopped = stopped
+
+    async def start(self):
+        self.started.append(self.key)
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.stopped.append(self.key)
+
+
+@pytest.mark.asyncio
+async def test_sharded_discovery_apply():
+    """
+    ShardedClusterDiscovery.apply test - only the discoveries of the changed
+    namespaces & leadership are started & stopped
+    """
+    started = []
+    stopped = []
+    sharded_discovery = ShardedClusterDiscovery(
+        _create_coordinator("a", None),
+        lambda **scope: MockDiscovery(started, stopped, **scope)
+    )
+    await sharded_discovery.apply(
+        ShardAssignment(True, frozenset({"x", "y"}), frozenset({"a"}))
+    )
+    await asyncio.sleep(0)
+    assert sorted(started, key=str) == [("Node", "Namespace"), "x", "y"]
+    started.clear()
+    await sharded_discovery.apply(
+        ShardAssignment(False, frozenset({"y", "z"}), frozenset({"a", "b"}))
+    )
+    await asyncio.sleep(0)
+    assert started == ["z"]
+    assert sorted(stopped, key=str) == [("Node", "Namespace"), "x"]
+    await sharded_discovery._stop_discoveries(list(sharded_discovery._discovery_tasks))
+
+
+@pytest.mark.asyncio
+async def test_sharded_discovery_start():
+    """
+    ShardedClusterDiscovery.start test - runs the assigned discoveries until
+    cancelled, then stops them and releases the leases
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        started = []
+        stopped = []
+        sharded_discovery = ShardedClusterDiscovery(
+            _create_coordinator("a", api_client),
+            lambda **scope: MockDiscovery(started, stopped, **scope)
+        )
+        task = asyncio.create_task(sharded_discovery.start())
+        await asyncio.sleep(RENEW_INTERVAL_SECONDS / 2)
+        assert len(started) == len(TEST_NAMESPACES) + 1
+        task.cancel()
+        await asyncio.wait([task])
+        assert sorted(stopped, key=str) == sorted(started, key=str)
+        assert fake_apiserver.leases[
+            sharded_discovery.coordinator.leader_lease_name
+        ]["spec"]["holderIdentity"] is None
+        assert sharded_discovery.coordinator.member_lease_name not in fake_apiserver.leases
+
+
+@pytest.mark.asyncio
+async def test_sharded_discovery_failure():
+    """
+    ShardedClusterDiscovery.start test - a failed discovery error is raised
+    """
+    async with serve_fake_apiserver() as (fake_apiserver, api_client):
+        class FailingDiscovery:
+            def __init__(self, **_scope):
+                pass
+
+            async def start(self):
+                raise RuntimeError("discovery failed")
+
+        sharded_discovery = ShardedClusterDiscovery(
+            _create_coordinator("a", api_client),
+            FailingDiscovery
+        )
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(sharded_discovery.start(), 1)
@@ -0,0 +1,173 @@
+"""
+Templates tests
+"""
+import json
+import copy
+import pytest
+from events_manager import InMemoryEventsManager
+from kubernetes_event import (
+    KubernetesEvent,
+    KubernetesEventType,
+    SerializedKubernetesEvent,
+    WatchKubernetesEvent,
+    WatchKubernetesEventType,
+)
+from templates import (
+    TEMPLATE_KEY,
+    TemplateEncoder,
+    TemplateException,
+    get_template_hash,
+    resolve_templates,
+)
+
+TEST_CONTAINERS = [
+    {"name": f"container-{i}", "image": f"registry.example.com/app-{i}:1.0"}
+    for i in range(5)
+]
+
+
+def _generate_pod_event(index: int, containers=TEST_CONTAINERS):
+    """ Generates a pod watch event """
+    return WatchKubernetesEvent(
+        WatchKubernetesEventType.MODIFIED,
+        {
+            "kind": "Pod",
+            "metadata": {"name": f"pod-{index}", "uid": f"uid-{index}"},
+            "spec": {
+                "node_name": f"node-{index}",
+                "containers": copy.deepcopy(containers),
+                "tolerations": [],
+            },
+        }
+    )
+
+
+def _resolve(events_json: bytes, templates_json: bytes, templates=None):
+    """ Resolves the encoded events, as done by the collector """
+    templates = dict(templates or {})
+    templates.update(json.loads(templates_json))
+    return resolve_templates(json.loads(events_json), templates), templates
+
+
+@pytest.mark.asyncio
+async def test_invalid_max_session_templates():
+    """ Tests invalid max session templates param """
+    with pytest.raises(ValueError):
+        TemplateEncoder(max_session_templates=0)
+
+
+@pytest.mark.asyncio
+async def test_encode_event():
+    """
+    encode_event test - the large sub-documents are replaced by template
+    references, the event isn't changed
+    """
+    encoder = TemplateEncoder()
+    event = _generate_pod_event(1)
+    expected_dict = json.loads(event.serialize())
+    serialized_event, templates = encoder.encode_event(event)
+    encoded_dict = json.loads(serialized_event)
+    reference = encoded_dict["payload"]["object"]["spec"]["containers"]
+    assert list(reference) == [TEMPLATE_KEY]
+    assert reference[TEMPLATE_KEY] in templates
+    assert get_template_hash(templates[reference[TEMPLATE_KEY]]) == reference[TEMPLATE_KEY]
+    # small & empty sub-documents aren't replaced
+    assert encoded_dict["payload"]["object"]["spec"]["tolerations"] == []
+    assert event.data["spec"]["containers"] == TEST_CONTAINERS
+    assert resolve_templates(
+        encoded_dict,
+        {key: json.loads(body) for key, body in templates.items()}
+    ) == expected_dict
+
+
+@pytest.mark.asyncio
+async def test_encode_event_no_templates():
+    """ encode_event test - events with no templates are serialized as is """
+    encoder = TemplateEncoder()
+    for event in (
+            KubernetesEvent(KubernetesEventType.CLUSTER, {"version": "1"}),
+            _generate_pod_event(1, containers=[{"name": "small"}]),
+            # not a watch event, while having a template key
+            SerializedKubernetesEvent(KubernetesEvent(
+                KubernetesEventType.CLUSTER,
+                {"containers": TEST_CONTAINERS}
+            ).serialize()),
+    ):
+        assert encoder.encode_event(event) == (event.serialize(), {})
+
+
+@pytest.mark.asyncio
+async def test_encode_events_session():
+    """
+    encode_events test - each template body is sent once per session
+    """
+    encoder = TemplateEncoder()
+    events = [_generate_pod_event(i) for i in range(3)]
+    session_id, events_json, templates_json, template_hashes = (
+        encoder.encode_events(events)
+    )
+    assert len(json.loads(templates_json)) == 1
+    assert template_hashes == list(json.loads(templates_json))
+    resolved_events, templates = _resolve(events_json, templates_json)
+    assert resolved_events == [json.loads(event.serialize()) for event in events]
+
+    # the templates aren't sent until marked as sent
+    _, _, templates_json, _ = encoder.encode_events(events)
+    assert len(json.loads(templates_json)) == 1
+    encoder.mark_sent("another-session", template_hashes)
+    _, _, templates_json, _ = encoder.encode_events(events)
+    assert len(json.loads(templates_json)) == 1
+    encoder.mark_sent(session_id, template_hashes)
+
+    next_session_id, events_json, templates_json, template_hashes = (
+        encoder.encode_events(events)
+    )
+    assert next_session_id == session_id
+    assert json.loads(templates_json) == {}
+    assert template_hashes == []
+    with pytest.raises(TemplateException):
+        _resolve(events_json, templates_json)
+    resolved_events, _ = _resolve(events_json, templates_json, templates)
+    assert resolved_events == [json.loads(event.serialize()) for event in events]
+
+    encoder.reset_session("another-session")
+    assert encoder.session_id == session_id
+    encoder.reset_session(session_id)
+    assert encoder.session_id != session_id
+    _, _, templates_json, _ = encoder.encode_events(events)
+    assert len(json.loads(templates_json)) == 1
+
+
+@pytest.mark.asyncio
+async def test_encode_events_max_session_templates():
+    """ encode_events test - a new session starts once the limit is reached """
+    encoder = TemplateEncoder(max_session_templates=1)
+    events = [_generate_pod_event(1)]
+    session_id, _, _, template_hashes = encoder.encode_events(events)
+    encoder.mark_sent(session_id, template_hashes)
+    next_session_id, _, templates_json, _ = encoder.encode_events(events)
+    assert next_session_id != session_id
+    assert len(json.loads(templates_json)) == 1
+
+
+@pytest.mark.asyncio
+async def test_encode_compressed_backlog_events():
+    """
+    encode_events test - the events restored from a compressed backlog are
+    encoded with template references, as the uncompressed events are
+    """
+    events_manager = InMemoryEventsManager(compression_threshold=4, compression_chunk_size=4)
+    events = [_generate_pod_event(i) for i in range(20)]
+    for event in events:
+        await events_manager.write_event(event)
+    backlog_events = await events_manager.get_events(len(events))
+    assert any(isinstance(event, SerializedKubernetesEvent) for event in backlog_events)
+    encoder = TemplateEncoder()
+    _, events_json, templates_json, _ = encoder.encode_events(backlog_events)
+    encoded_events = json.loads(events_json)
+    assert all(
+        list(event["payload"]["object"]["spec"]["containers"]) == [TEMPLATE_KEY]
+        for event in encoded_events
+    )
+    resolved_events, _ = _resolve(events_json, templates_json)
+    assert resolved_events == [json.loads(event.serialize()) for event in events]